@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+Measure the cost of decoding robot responses, with no network involved
+
+    python benchmarks/bench_decode.py [--number N] [--repeat N] [--json PATH]
+
+The preferences flags, GetMission, GetWiFiDetails and GetSchedule decoders
+are compared against the original straightforward implementations where there
+is one, and each installed JSON codec is timed decoding a mission response
+body.
+"""
+
+from __future__ import print_function
+import argparse
+import gc
+import json
+import time
+
+from common import Results
+
+from pyirobot import Robot
+from pyirobot.codec import CODECS
+from pyirobot.test import reference
+from pyirobot.test.util import SampleMission, SamplePreferences, SampleWiFiDetails
+
+def SampleSchedule():
+    return {"cycle" : ["none", "start", "start", "none", "start", "none", "none"], "h" : [9] * 7, "m" : [0, 30, 0, 0, 15, 0, 0]}
+
+def Cases():
+    """
+    Get the decoders to benchmark
+
+    Returns:
+        A list of (name, reference function or None, optimized function, function that makes the input)
+    """
+    robot = Robot("127.0.0.1", "password")
+    flags = SamplePreferences()["flags"]
+    return [
+        ("prefs flags", reference.DecodePreferencesFlags, robot._DecodePreferencesFlags, lambda: flags),
+        ("mssn", reference.TransformMission, robot._TransformMission, lambda: SampleMission(phase="run", flags=8, error=17)),
+        ("wlstat", reference.TransformWiFiDetails, robot._TransformWiFiDetails, SampleWiFiDetails),
+        ("week", None, robot._TransformSchedule, SampleSchedule)
+    ]
+
+def CodecCases():
+    """
+    Get the installed codecs to benchmark
+
+    Returns:
+        A list of (name, None, decode function, function that makes the input)
+    """
+    body = json.dumps({"ok" : SampleMission(), "id" : 1}).encode("utf-8")
+    cases = []
+    for codec_type in CODECS:
+        try:
+            codec = codec_type()
+        except ImportError:
+            continue
+        cases.append(("{} body".format(codec.name), None, codec.Decode, lambda: body))
+    return cases
+
+def Measure(func, make, number, repeat):
+    """
+    Time a decoder.  The inputs are made before timing starts, since the decoders modify them.  The fastest of several
+    short runs is the least disturbed by whatever else the machine is doing
+
+    Returns:
+        The cost of one call in microseconds (float)
+    """
+    best = None
+    for _ in range(repeat):
+        inputs = [make() for _ in range(number)]
+        # Like timeit, keep the garbage collector from running in the middle of a measurement
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for value in inputs:
+                func(value)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best / number * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="calls per run")
+    parser.add_argument("--repeat", type=int, default=25, help="runs per measurement, of which the fastest is kept")
+    parser.add_argument("--json", default=None, help="save the results to this file, for compare.py")
+    args = parser.parse_args()
+
+    results = Results("decode")
+    print("{:<14} {:>14} {:>14} {:>8}".format("decoder", "reference us", "optimized us", "speedup"))
+    for name, ref, fast, make in Cases() + CodecCases():
+        fast_us = Measure(fast, make, args.number, args.repeat)
+        results.Add(name, fast_us, "us")
+        if ref is None:
+            print("{:<14} {:>14} {:>14.3f} {:>8}".format(name, "-", fast_us, "-"))
+            continue
+        ref_us = Measure(ref, make, args.number, args.repeat)
+        print("{:<14} {:>14.3f} {:>14.3f} {:>7.2f}x".format(name, ref_us, fast_us, ref_us / fast_us))
+
+    if args.json:
+        results.Write(args.json)
+
+if __name__ == "__main__":
+    main()
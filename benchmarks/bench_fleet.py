@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Measure how a GetMission fan-out across a fleet scales with the number of
+robots, with RobotFleet (threads) and AsyncRobot (asyncio)
+
+    python benchmarks/bench_fleet.py [--sizes 1,10,100,1000] [--latency S] [--json PATH]
+
+The robots are simulated in a separate process on one shared port.  The first
+round trip to each robot includes the TLS handshake, so it is reported
+separately ("cold") from the best of the following rounds ("warm"), which
+reuse the keep-alive connections.
+"""
+
+from __future__ import print_function
+import argparse
+import asyncio
+import time
+
+from common import Results, SimulatorProcess, HIGHER_IS_BETTER
+
+from pyirobot import Robot
+from pyirobot.aio import AsyncRobot
+from pyirobot.fleet import RobotFleet, DEFAULT_MAX_WORKERS
+
+WARM_ROUNDS = 3
+
+def MeasureThreads(robots, maxWorkers):
+    """
+    Time GetMission across a RobotFleet
+
+    Returns:
+        A tuple of (cold seconds, warm seconds, failures)
+    """
+    fleet = RobotFleet([Robot(address, password) for address, password in robots], maxWorkers=maxWorkers)
+    with fleet:
+        timings = []
+        failures = 0
+        for _ in range(1 + WARM_ROUNDS):
+            start = time.perf_counter()
+            results = fleet.GetMission()
+            timings.append(time.perf_counter() - start)
+            failures += sum(1 for result in results if not result.ok)
+        for robot in fleet:
+            robot.Close()
+    return timings[0], min(timings[1:]), failures
+
+def MeasureAsync(robots):
+    """
+    Time GetMission across AsyncRobots with asyncio.gather
+
+    Returns:
+        A tuple of (cold seconds, warm seconds, failures)
+    """
+    async def run():
+        clients = [AsyncRobot(address, password) for address, password in robots]
+        timings = []
+        failures = 0
+        for _ in range(1 + WARM_ROUNDS):
+            start = time.perf_counter()
+            results = await asyncio.gather(*[client.GetMission() for client in clients], return_exceptions=True)
+            timings.append(time.perf_counter() - start)
+            failures += sum(1 for result in results if isinstance(result, Exception))
+        for client in clients:
+            await client.Close()
+        return timings[0], min(timings[1:]), failures
+    return asyncio.run(run())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1,10,100,1000", help="comma separated fleet sizes")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds each simulated robot takes to answer")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS, help="RobotFleet thread pool size")
+    parser.add_argument("--json", default=None, help="save the results to this file, for compare.py")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = Results("fleet")
+    print("{:<8} {:>6} {:>10} {:>10} {:>12} {:>9}".format("client", "robots", "cold ms", "warm ms", "robots/s", "failures"))
+    with SimulatorProcess(max(sizes), latency=args.latency) as robots:
+        for size in sizes:
+            for client, measure in (("threads", lambda: MeasureThreads(robots[:size], args.max_workers)),
+                                    ("asyncio", lambda: MeasureAsync(robots[:size]))):
+                cold, warm, failures = measure()
+                print("{:<8} {:>6} {:>10.1f} {:>10.1f} {:>12.0f} {:>9}".format(client, size, cold * 1e3, warm * 1e3,
+                                                                              size / warm, failures))
+                results.Add("{}.{}.cold".format(client, size), cold * 1e3, "ms")
+                results.Add("{}.{}.warm".format(client, size), warm * 1e3, "ms")
+                results.Add("{}.{}.throughput".format(client, size), size / warm, "robots/s", HIGHER_IS_BETTER)
+                results.Add("{}.{}.failures".format(client, size), failures, "requests")
+
+    if args.json:
+        results.Write(args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Measure how long "import pyirobot" takes in a fresh interpreter, and check
+that it does not pull in modules that are only needed once a robot is used
+
+    python benchmarks/bench_import.py [--runs N] [--max-ms MS] [--json PATH]
+
+Each run starts a new interpreter, with bytecode cached in a temporary
+directory so every run after the first warm-up measures a normal import.  The
+time reported is the cumulative import time of pyirobot from -X importtime,
+next to the wall time of the whole interpreter for reference.  With --max-ms
+the script exits with status 1 if the median import time is over the limit, or
+if any of the deferred modules was imported.
+"""
+
+from __future__ import print_function
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, Results
+
+# Modules that importing pyirobot must not import
+DEFERRED_MODULES = ("requests", "urllib3", "concurrent.futures", "asyncio", "numpy", "socket", "orjson", "ujson")
+
+def _Environment(cacheDir):
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env["PYTHONPYCACHEPREFIX"] = cacheDir
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+def ImportOnce(env):
+    """
+    Import pyirobot in a new interpreter
+
+    Returns:
+        A tuple of (import time in ms, wall time in ms, deferred modules that were imported)
+    """
+    code = "import sys, pyirobot; print(' '.join(m for m in {!r} if m in sys.modules))".format(DEFERRED_MODULES)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    wall = (time.perf_counter() - start) * 1000
+    import_us = None
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == "pyirobot":
+            import_us = int(fields[1])
+    return import_us / 1000.0, wall, result.stdout.split()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=20, help="number of interpreters to start")
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the median import time is over this")
+    parser.add_argument("--json", default=None, help="save the results to this file, for compare.py")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="pyirobot-bench-")
+    try:
+        env = _Environment(cache_dir)
+        ImportOnce(env)
+        samples = [ImportOnce(env) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(cache_dir)
+
+    import_ms = sorted(sample[0] for sample in samples)
+    wall_ms = sorted(sample[1] for sample in samples)
+    deferred = sorted(set(module for sample in samples for module in sample[2]))
+    print("{:<14} {:>10} {:>10} {:>10}".format("", "min ms", "median ms", "max ms"))
+    print("{:<14} {:>10.2f} {:>10.2f} {:>10.2f}".format("import", import_ms[0], import_ms[len(import_ms) // 2], import_ms[-1]))
+    print("{:<14} {:>10.2f} {:>10.2f} {:>10.2f}".format("interpreter", wall_ms[0], wall_ms[len(wall_ms) // 2], wall_ms[-1]))
+    print("deferred modules imported: {}".format(", ".join(deferred) or "none"))
+
+    if args.json:
+        results = Results("import")
+        results.Add("import.median", import_ms[len(import_ms) // 2], "ms")
+        results.Add("deferredImported", len(deferred), "modules")
+        results.Write(args.json)
+
+    if args.max_ms is not None and (import_ms[len(import_ms) // 2] > args.max_ms or deferred):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
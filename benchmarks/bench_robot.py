@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Measure the latency and throughput of every public Robot method against a
+simulated robot on localhost
+
+    python benchmarks/bench_robot.py [--calls N] [--latency S] [--json PATH]
+
+Each method is called --calls times in a row over the same keep-alive
+connection, after a few warm-up calls.  With no simulated latency this
+measures the client's own overhead per call: building and encoding the
+request, the HTTPS round trip on loopback, and decoding the response.
+"""
+
+from __future__ import print_function
+import argparse
+import datetime
+import inspect
+import time
+
+from common import Percentile, Results, SimulatorProcess, HIGHER_IS_BETTER
+
+from pyirobot import CarpetBoost, CleaningPasses, EdgeClean, FinishWhenBinFull, Robot
+
+def _SetPreferences(robot):
+    with robot.PreferencesTransaction() as transaction:
+        transaction.Set(CarpetBoost.PrefName(), CarpetBoost.Eco)
+        transaction.Set(EdgeClean.PrefName(), EdgeClean.Off)
+
+def Calls(robot, address, password):
+    """
+    Get a way to call every public Robot method
+
+    Returns:
+        A list of (method name, function that calls it)
+    """
+    prefs = robot.GetCleaningPreferences()
+    schedule = robot.GetSchedule()
+    now = datetime.datetime.now()
+    # A keyframe every poll, so each step of the generator is one GetMission
+    watch = robot.WatchMission(interval=0, keyframeInterval=0)
+    return [
+        ("GetPassword", lambda: Robot.GetPassword(address, transport=robot.transport)),
+        ("GetBLID", lambda: Robot.GetBLID(address, password, transport=robot.transport)),
+        ("StartCleaning", robot.StartCleaning),
+        ("PauseCleaning", robot.PauseCleaning),
+        ("ResumeCleaning", robot.ResumeCleaning),
+        ("EndCleaning", robot.EndCleaning),
+        ("ReturnHome", robot.ReturnHome),
+        ("GetCleaningPreferences", robot.GetCleaningPreferences),
+        ("GetTime", robot.GetTime),
+        ("GetSchedule", robot.GetSchedule),
+        ("GetMission", robot.GetMission),
+        ("GetMissionSnapshot", robot.GetMissionSnapshot),
+        ("WatchMission", lambda: next(watch)),
+        ("GetWiFiDetails", robot.GetWiFiDetails),
+        ("GetWiFiStatus", robot.GetWiFiStatus),
+        ("GetCloudConfig", robot.GetCloudConfig),
+        ("GetSKU", robot.GetSKU),
+        ("GetSys", robot.GetSys),
+        ("GetBBRun", robot.GetBBRun),
+        ("GetWiFiSettings", robot.GetWiFiSettings),
+        ("GetSnapshot", lambda: robot.GetSnapshot(["prefs", "mssn", "wllaststat"])),
+        ("GetStatus", robot.GetStatus),
+        ("SetCleaningPreferences", lambda: robot.SetCleaningPreferences(prefs)),
+        ("PreferencesTransaction", lambda: _SetPreferences(robot)),
+        ("SetCarpetBoost", lambda: robot.SetCarpetBoost(CarpetBoost.Perf)),
+        ("SetCleaningPasses", lambda: robot.SetCleaningPasses(CleaningPasses.Two)),
+        ("SetFinishWhenBinFull", lambda: robot.SetFinishWhenBinFull(FinishWhenBinFull.On)),
+        ("SetEdgeClean", lambda: robot.SetEdgeClean(EdgeClean.On)),
+        ("SetTimezone", lambda: robot.SetTimezone("America/Denver")),
+        ("SetTime", lambda: robot.SetTime(now)),
+        ("SetTimeNow", robot.SetTimeNow),
+        ("SetSchedule", lambda: robot.SetSchedule(schedule)),
+    ]
+
+def Uncovered(calls):
+    """
+    Get the public Robot methods the benchmark does not call, so new methods are not silently left out
+
+    Returns:
+        The method names (list of str)
+    """
+    covered = set(name for name, _ in calls)
+    return sorted(name for name, _ in inspect.getmembers(Robot, callable)
+                  if name[0].isupper() and name not in covered and name != "Close")
+
+def Measure(call, calls):
+    """
+    Time calls to a method
+
+    Returns:
+        The time each call took in seconds (list of float)
+    """
+    for _ in range(min(5, calls)):
+        call()
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200, help="calls per method")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the simulated robot takes to answer")
+    parser.add_argument("--json", default=None, help="save the results to this file, for compare.py")
+    args = parser.parse_args()
+
+    results = Results("robot")
+    with SimulatorProcess(1, latency=args.latency, pairing=True) as robots:
+        address, password = robots[0]
+        with Robot(address, password) as robot:
+            calls = Calls(robot, address, password)
+            missing = Uncovered(calls)
+            if missing:
+                print("not measured: {}".format(", ".join(missing)))
+
+            print("{:<24} {:>10} {:>10} {:>10} {:>10}".format("method", "mean ms", "p50 ms", "p99 ms", "calls/s"))
+            for name, call in calls:
+                samples = Measure(call, args.calls)
+                mean = sum(samples) / len(samples)
+                p50 = Percentile(samples, 0.5)
+                p99 = Percentile(samples, 0.99)
+                print("{:<24} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.0f}".format(name, mean * 1e3, p50 * 1e3, p99 * 1e3, 1 / mean))
+                results.Add("{}.p50".format(name), p50 * 1e3, "ms")
+                results.Add("{}.p99".format(name), p99 * 1e3, "ms")
+                results.Add("{}.throughput".format(name), 1 / mean, "calls/s", HIGHER_IS_BETTER)
+
+    if args.json:
+        results.Write(args.json)
+
+if __name__ == "__main__":
+    main()
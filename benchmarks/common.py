@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Helpers shared by the benchmarks: summarizing timings, saving results in a
+form compare.py can check between commits, and running simulated robots in a
+separate process so the server does not compete with the client for the GIL
+"""
+
+from __future__ import print_function
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, ROOT)
+
+LOWER_IS_BETTER = "lower"
+HIGHER_IS_BETTER = "higher"
+
+def Percentile(samples, fraction):
+    """
+    Get a percentile of a list of samples
+
+    Args:
+        samples:    the samples, in any order (list of float)
+        fraction:   the percentile, between 0 and 1 (float)
+
+    Returns:
+        The nearest sample at or above the percentile (float)
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def _Commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Results(object):
+    """
+    Named measurements from a benchmark run, which can be saved as JSON and compared with compare.py
+    """
+
+    def __init__(self, benchmark):
+        """
+        Args:
+            benchmark:  the name of the benchmark (str)
+        """
+        self.benchmark = benchmark
+        self.metrics = {}
+
+    def Add(self, name, value, unit, better=LOWER_IS_BETTER):
+        """
+        Record a measurement
+
+        Args:
+            name:   a name that stays the same between runs, e.g. "GetMission.p50" (str)
+            value:  the measurement (float)
+            unit:   the unit of the measurement, e.g. "ms" (str)
+            better: LOWER_IS_BETTER or HIGHER_IS_BETTER (str)
+        """
+        self.metrics[name] = {"value" : value, "unit" : unit, "better" : better}
+
+    def Write(self, path):
+        """
+        Save the results, with the commit, Python version and machine they were measured on
+
+        Args:
+            path:   the file to write (str)
+        """
+        data = {"benchmark" : self.benchmark,
+                "commit" : _Commit(),
+                "python" : platform.python_version(),
+                "machine" : "{} {}".format(platform.system(), platform.machine()),
+                "time" : datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "metrics" : self.metrics}
+        with open(path, "w") as handle:
+            json.dump(data, handle, indent=2, sort_keys=True)
+
+class SimulatorProcess(object):
+    """
+    Runs python -m pyirobot.simulator in a child process, with every robot on one shared port
+
+        with SimulatorProcess(100) as robots:
+            for address, password in robots:
+                ...
+    """
+
+    def __init__(self, count, latency=0.0, speed=1.0, pairing=False):
+        """
+        Args:
+            count:      the number of robots to simulate (int)
+            latency:    seconds the simulator waits before answering each request (float)
+            speed:      simulated seconds per second (float)
+            pairing:    let the robots give out their password, for GetPassword (bool)
+        """
+        self.args = [sys.executable, "-m", "pyirobot.simulator", "--shared-port", "--robots", str(count),
+                     "--latency", str(latency), "--speed", str(speed)]
+        if pairing:
+            self.args.append("--pairing")
+        self.count = count
+        self._process = None
+
+    def __enter__(self):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+        self._process = subprocess.Popen(self.args, stdout=subprocess.PIPE, env=env, universal_newlines=True)
+        robots = []
+        while len(robots) < self.count:
+            line = self._process.stdout.readline()
+            if not line:
+                raise RuntimeError("The simulator exited before it started")
+            address, password = line.split()
+            robots.append((address, password))
+        return robots
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._process.terminate()
+        self._process.wait()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Compare two benchmark results saved with --json, and fail if any measurement
+got worse by more than the tolerance
+
+    python benchmarks/compare.py BASELINE.json CURRENT.json [--tolerance 0.2]
+
+Timings on shared machines are noisy, so the default tolerance is generous;
+save the baseline and the current results on the same machine.
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import sys
+
+from common import HIGHER_IS_BETTER
+
+def Compare(baseline, current, tolerance):
+    """
+    Compare the metrics of two results
+
+    Args:
+        baseline:   the earlier results (dict)
+        current:    the later results (dict)
+        tolerance:  the fraction a measurement may get worse by before it counts as a regression (float)
+
+    Returns:
+        A list of (name, baseline value, current value, change as a fraction, regressed) for every metric in both (list)
+    """
+    rows = []
+    for name in sorted(set(baseline["metrics"]) & set(current["metrics"])):
+        before = baseline["metrics"][name]
+        after = current["metrics"][name]
+        if before["value"]:
+            change = (after["value"] - before["value"]) / float(before["value"])
+        else:
+            change = 0.0 if not after["value"] else float("inf")
+        worse = -change if after["better"] == HIGHER_IS_BETTER else change
+        rows.append((name, before["value"], after["value"], change, worse > tolerance))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline", help="the earlier results")
+    parser.add_argument("current", help="the later results")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="fraction a measurement may get worse by")
+    args = parser.parse_args()
+
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    if baseline["benchmark"] != current["benchmark"]:
+        sys.exit("Cannot compare {} results with {} results".format(baseline["benchmark"], current["benchmark"]))
+
+    print("{} {} -> {}".format(current["benchmark"], baseline.get("commit"), current.get("commit")))
+    rows = Compare(baseline, current, args.tolerance)
+    regressions = 0
+    for name, before, after, change, regressed in rows:
+        regressions += regressed
+        print("{:<36} {:>12.3f} {:>12.3f} {:>+8.1%} {}".format(name, before, after, change, "REGRESSED" if regressed else ""))
+    missing = sorted(set(baseline["metrics"]) - set(current["metrics"]))
+    if missing:
+        print("no longer measured: {}".format(", ".join(missing)))
+    if regressions:
+        sys.exit("{} measurements regressed by more than {:.0%}".format(regressions, args.tolerance))
+
+if __name__ == "__main__":
+    main()
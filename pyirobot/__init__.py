@@ -10,23 +10,58 @@ import collections
 import datetime
 from enum import Enum
 import json
-import requests
-import socket
 import struct
+import threading
+import time
+from .codec import DefaultCodec, _JSONTypes, _JSONValue
+from .dispatch import RequestPriority
+from .retry import CircuitBreaker, DeadlineExceeded, RetryPolicy
+from .singleflight import RequestKey, SingleFlight
+from .transport import HTTPSTransport, DEFAULT_POOL_SIZE, DEFAULT_IDLE_TIMEOUT, DEFAULT_TIMEOUT
+
+try:
+    from collections.abc import Iterable as _Iterable
+except ImportError:
+    _Iterable = collections.Iterable
+
+class JSONEncoder(json.JSONEncoder):
+    """
+    A JSON encoder that can encode the enums and datetime.time values in the results from a robot
+
+        json.dumps(robot.GetMission(), cls=JSONEncoder)
+    """
+
+    def default(self, o): #pylint: disable=method-hidden
+        if isinstance(o, _JSONTypes):
+            return _JSONValue(o)
+        return super(JSONEncoder, self).default(o)
 
-# Disable SSL warning from requests - the Roomba's SSL certificate is self signed
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+def ToJSON(obj, **kwargs):
+    """
+    Convert the result of a robot call into JSON
+
+    Args:
+        obj:    the result to convert (dict)
+        kwargs: additional arguments for json.dumps
+
+    Returns:
+        The JSON (str)
+    """
+    kwargs.setdefault("cls", JSONEncoder)
+    return json.dumps(obj, **kwargs)
 
-# Monkey patch the json module to be able to encode Enums and datetime.time
-_json_default = json.JSONEncoder().default
+_json_default = json.JSONEncoder.default
 def _encode_enum(self, obj):
-    if isinstance(obj, Enum):
-        return obj.name
-    if isinstance(obj, datetime.time):
-        return str(obj)
+    if isinstance(obj, _JSONTypes):
+        return _JSONValue(obj)
     return _json_default(self, obj)
-json.JSONEncoder.default = _encode_enum
+
+def PatchJSONEncoder():
+    """
+    Make every json.dumps in the process able to encode the enums and datetime.time values in the results from a robot,
+    as importing pyirobot used to.  Prefer ToJSON or JSONEncoder, which only affect the calls that use them
+    """
+    json.JSONEncoder.default = _encode_enum
 
 class CarpetBoost(Enum):
     Unknown = -1
@@ -123,6 +158,62 @@ _MissionCycleToCleaningPasses = {
     "clean" : CleaningPasses.Two
 }
 
+# The "get" resources that can be requested in a snapshot, and the method used to transform each one (None to return it as is)
+_SnapshotResources = collections.OrderedDict([
+    ("prefs", "_TransformCleaningPreferences"),
+    ("mssn", "_TransformMission"),
+    ("time", "_TransformTime"),
+    ("week", "_TransformSchedule"),
+    ("wlstat", "_TransformWiFiDetails"),
+    ("wllaststat", "_TransformWiFiStatus"),
+    ("cloudcfg", None),
+    ("sku", None),
+    ("sys", None),
+    ("bbrun", None),
+    ("wlconfig", None)
+])
+
+# Lookup tables for decoding responses, so decoding does not have to construct enums or test bits one at a time
+_ReadyStatusByValue = dict((status.value, status) for status in ReadyStatus)
+_RobotStatusByValue = dict((status.value, status) for status in RobotStatus)
+# Indexed by the BinFull and BinMissing bits of the mission flags; BinMissing takes priority
+_BinStatusByFlags = (BinStatus.Normal, BinStatus.Full, BinStatus.Missing, BinStatus.Missing)
+_BinFlagsMask = MissionState.BinFull.value | MissionState.BinMissing.value
+_ResumingFlag = MissionState.Resuming.value
+_HexByte = [hex(i)[2:] for i in range(256)]
+
+# Robots report the same few addresses over and over, so remember how each one is formatted
+_IPAddressStrings = {}
+_IPAddressStringsMax = 4096
+
+_monotonic = getattr(time, "monotonic", time.time)
+_perfCounter = getattr(time, "perf_counter", time.time)
+
+def _FormatIPAddress(value):
+    """
+    Format an IP address the robot sends as an integer
+
+    Args:
+        value:  the address (int)
+
+    Returns:
+        The address in dotted quad notation (str)
+    """
+    address = _IPAddressStrings.get(value)
+    if address is None:
+        # Same as socket.inet_ntoa, without importing socket
+        address = "{}.{}.{}.{}".format(*bytearray(struct.pack("I", value)))
+        if len(_IPAddressStrings) >= _IPAddressStringsMax:
+            _IPAddressStrings.clear()
+        _IPAddressStrings[value] = address
+    return address
+
+_PreferenceEnums = dict((conf.PrefName(), conf) for conf in (CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean))
+
+# For each preference in the flags: (enum, preference name, mask of the bits it uses, enum for each masked value)
+_PreferenceDecoders = [(conf, conf.PrefName(), max(conf, key=lambda x: x.value).value, dict((pref.value, pref) for pref in conf))
+                       for conf in (CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean)]
+
 class RobotError(Exception):
     """ Exception thrown when there is an error """
 
@@ -132,57 +223,165 @@ class RobotError(Exception):
     def __str__(self):
         return "Error code {}".format(self.errorCode)
 
-class Robot(object):
+def _BuildUMIRequest(cmd, args, requestID, codec=None):
     """
-    This object represents an iRobot cleaning robot
+    Build the body of a request to a robot's /umi endpoint
+
+    Args:
+        cmd:        the "do" argument for the request (str)
+        args:       the "args" argument for the request (str or list)
+        requestID:  the "id" argument for the request (int)
+        codec:      the codec to encode the request with, or None for the default (JSONCodec)
+
+    Returns:
+        The JSON encoded request body (bytes)
     """
+    if isinstance(args, str) or not isinstance(args, _Iterable):
+        args = [args]
+    return (codec or DefaultCodec()).Encode({"do" : cmd,
+                                             "args" : args,
+                                             "id" : requestID})
 
-    @staticmethod
-    def GetPassword(robotIP):
-        """
-        Get the password for this robot
+def _ParseUMIResponse(res):
+    """
+    Check a parsed response from a robot's /umi endpoint for errors
 
-        Before calling this method, place the robot on its dock and then hold down the home button for 3-4 seconds,
-        until the LEDs illuminate and the robot emits a series of tones.  Then quickly call this method
+    Args:
+        res:    the JSON response parsed into a dictionary (dict)
 
-        Returns:
-            The robot password (str)
-        """
-        result = requests.post("https://{}/umi".format(robotIP),
-                                data=json.dumps({"do" : "get",
-                                                 "args" : ["passwd"],
-                                                 "id" : 0}),
-                                headers={"Content-Type" : "application/json"},
-                                verify=False)
-        res = result.json()
-        if "err" in res:
-            raise RobotError(res["err"])
-        return res["ok"]["passwd"]
+    Returns:
+        The "ok" part of the response (dict)
+    """
+    if "err" in res:
+        raise RobotError(res["err"])
+    return res["ok"]
 
-    @staticmethod
-    def GetBLID(robotIP, password):
-        """
-        Get this robot's BLID, which you need for making cloud-based calls to the robot
+# Hooks called with a RequestEvent after every request sent to a robot; see pyirobot.metrics.  When the list is empty
+# the only cost per request is checking it
+_RequestHooks = []
 
-        Returns:
-            The robot BLID (str)
-        """
-        result = requests.post("https://{}/umi".format(robotIP),
-                                data=json.dumps({"do" : "get",
-                                                 "args" : ["sys"],
-                                                 "id" : 0}),
-                                auth=("user", password),
-                                headers={"Content-Type" : "application/json"},
-                                verify=False)
-        res = result.json()
-        if "err" in res:
-            raise RobotError(res["err"])
-        return "".join([i[2:] for i in map(hex, res["ok"]["blid"])])
-
-    def __init__(self, robotIP, robotPassword):
+def _ResourceName(cmd, args):
+    """
+    Get the name of the resource a request is for, for reporting
+
+    Args:
+        cmd:    the "do" argument for the request (str)
+        args:   the "args" argument for the request (str or list)
+
+    Returns:
+        The resource name, e.g. "mssn", "prefs" or "cmd" (str)
+    """
+    if isinstance(args, str):
+        return args
+    if not isinstance(args, _Iterable):
+        return str(args)
+    names = [arg for arg in args if isinstance(arg, str)]
+    if cmd == "get":
+        return ",".join(names)
+    return names[0] if names else ""
+
+def _ReportRequest(robotIP, cmd, args, latency, requestBytes, responseBytes, error):
+    """
+    Call the request hooks for a finished request
+
+    Args:
+        robotIP:        the IP address of the robot (str)
+        cmd:            the "do" argument for the request (str)
+        args:           the "args" argument for the request (str or list)
+        latency:        the time the request took, in seconds (float)
+        requestBytes:   the size of the request body (int)
+        responseBytes:  the size of the response body, or None if there was no response (int)
+        error:          the exception the request raised, or None (Exception)
+    """
+    from .metrics import RequestEvent
+    event = RequestEvent(robotIP, cmd, _ResourceName(cmd, args), latency, requestBytes, responseBytes, error)
+    for hook in tuple(_RequestHooks):
+        hook(event)
+
+def _SendUMI(transport, robotIP, postData, auth, timeout):
+    """
+    Send a request body to a robot's /umi endpoint
+
+    Returns:
+        The HTTP response (requests.Response)
+    """
+    if transport is None:
+        with HTTPSTransport(poolSize=1) as oneoff:
+            return oneoff.Post("https://{}/umi".format(robotIP), postData, auth=auth, timeout=timeout)
+    return transport.Post("https://{}/umi".format(robotIP), postData, auth=auth, timeout=timeout)
+
+def _PostUMI(transport, robotIP, password, cmd, args, requestID, timeout=None, codec=None):
+    """
+    Send a request to a robot's /umi endpoint and get the response
+
+    Args:
+        transport:  the transport to send the request over, or None to use a one-off connection (HTTPSTransport)
+        robotIP:    the IP address of the robot (str)
+        password:   the robot password, or None to send the request without authentication (str)
+        cmd:        the "do" argument for the request (str)
+        args:       the "args" argument for the request (str or list)
+        requestID:  the "id" argument for the request (int)
+        timeout:    the (connect, read) timeouts, or None for the transport's timeouts (tuple of float)
+        codec:      the codec to encode the request and decode the response with, or None for the default (JSONCodec)
+
+    Returns:
+        The "ok" part of the JSON response (dict)
+    """
+    codec = codec or DefaultCodec()
+    post_data = _BuildUMIRequest(cmd, args, requestID, codec)
+    auth = ("user", password) if password is not None else None
+    if not _RequestHooks:
+        return _ParseUMIResponse(codec.Decode(_SendUMI(transport, robotIP, post_data, auth, timeout).content))
+
+    start = _perfCounter()
+    response_bytes = None
+    error = None
+    try:
+        result = _SendUMI(transport, robotIP, post_data, auth, timeout)
+        response_bytes = len(result.content)
+        return _ParseUMIResponse(codec.Decode(result.content))
+    except BaseException as ex:
+        error = ex
+        raise
+    finally:
+        _ReportRequest(robotIP, cmd, args, _perfCounter() - start, len(post_data), response_bytes, error)
+
+def _DecodeBLID(sysInfo):
+    """
+    Decode the BLID from the result of a "sys" request
+
+    Args:
+        sysInfo:    the result of a "sys" request (dict)
+
+    Returns:
+        The robot BLID (str)
+    """
+    return "".join([i[2:] for i in map(hex, sysInfo["blid"])])
+
+class _RobotBase(object):
+    """
+    Request building and response decoding shared by the blocking and asyncio robot clients
+    """
+
+    def __init__(self, robotIP, robotPassword, cache=None, deadline=None, retryPolicy=None, circuitBreaker=None, dispatcher=None,
+                 codec=None):
         self.ip = robotIP
         self.password = robotPassword
+        self.cache = cache
         self.nextID = 1
+        # Whether the robot answers a single "get" with several args; None until we have tried it
+        self.supportsMultiGet = None
+        self.deadline = deadline
+        self.retryPolicy = RetryPolicy() if retryPolicy is None else retryPolicy
+        self.circuitBreaker = CircuitBreaker() if circuitBreaker is None else circuitBreaker
+        self.dispatcher = dispatcher
+        self.codec = DefaultCodec() if codec is None else codec
+        # The number of requests that have been retried
+        self.retries = 0
+        # Guards nextID and retries, so a robot can be shared between threads
+        self._counterLock = threading.Lock()
+        # Coalesces identical concurrent "get" requests; set by the subclass
+        self.singleFlight = None
 
     def _GetRequestID(self):
         """
@@ -191,38 +390,66 @@ class Robot(object):
         Returns:
             A request ID (int)
         """
-        rid = self.nextID
-        self.nextID += 1
+        with self._counterLock:
+            rid = self.nextID
+            self.nextID += 1
         return rid
 
-    def _PostToRobot(self, cmd, args):
+    def _CallDeadline(self):
         """
-        Send a command to the robot and get the response
+        Get the time a call starting now must finish by
+
+        Returns:
+            The deadline on the time.monotonic clock, or None if there is no deadline (float)
+        """
+        return None if self.deadline is None else _monotonic() + self.deadline
+
+    def _AttemptTimeout(self, deadline):
+        """
+        Get the timeouts for the next attempt at a request, shortened to fit before the deadline
 
         Args:
-            cmd:    the "do" argument for the request (str)
-            args:   the "args" argument for the request (str or list)
+            deadline:   the deadline from _CallDeadline (float)
 
         Returns:
-            The JSON response parsed into a dictionary (dict)
+            The (connect, read) timeouts, or None for the transport's timeouts (tuple of float)
+        """
+        if deadline is None:
+            return None
+        remaining = deadline - _monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(self.deadline)
+        connect_timeout, read_timeout = self.transport.timeout
+        return (min(connect_timeout, remaining), min(read_timeout, remaining))
+
+    def _RetryDelay(self, cmd, error, attempt, deadline):
+        """
+        Record a failed attempt at a request with the circuit breaker, and decide whether to retry it
+
+        Args:
+            cmd:        the "do" argument for the request (str)
+            error:      the exception the attempt raised (Exception)
+            attempt:    the number of attempts made so far (int)
+            deadline:   the deadline from _CallDeadline (float)
+
+        Returns:
+            The seconds to wait before retrying, or None to not retry (float)
         """
-        if isinstance(args, str) or not isinstance(args, collections.Iterable):
-            args = [args]
-        post_data = json.dumps({"do" : cmd,
-                                "args" : args,
-                                "id" : self._GetRequestID()})
-#        print(post_data)
-        result = requests.post("https://{}/umi".format(self.ip),
-                                data=post_data,
-                                auth=("user", self.password),
-                                headers={"Content-Type" : "application/json"},
-                                verify=False)
-#        print(result.request.body)
-#        print(result.text)
-        res = result.json()
-        if "err" in res:
-            raise RobotError(res["err"])
-        return res["ok"]
+        if isinstance(error, RobotError):
+            # The robot answered, so it is up
+            self.circuitBreaker.RecordSuccess()
+            return None
+        if not isinstance(error, IOError):
+            return None
+        self.circuitBreaker.RecordFailure()
+        if self.circuitBreaker.state != CircuitBreaker.CLOSED:
+            return None
+        remaining = None if deadline is None else deadline - _monotonic()
+        delay = self.retryPolicy.Delay(cmd, error, attempt, remaining)
+        if delay is not None:
+            with self._counterLock:
+                self.retries += 1
+        return delay
 
     def _DecodePreferencesFlags(self, flags):
         """
@@ -236,13 +463,8 @@ class Robot(object):
             A dictionary of preferences (dict)
         """
         prefs = {}
-        for conf in (CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean):
-            pref_name = conf.PrefName()
-            test = flags & max(conf, key=lambda x: x.value).value
-            try:
-                prefs[pref_name] = conf(test)
-            except ValueError:
-                prefs[pref_name] = conf["Unknown"]
+        for conf, pref_name, mask, values in _PreferenceDecoders:
+            prefs[pref_name] = values.get(flags & mask, conf.Unknown)
         return prefs
 
     def _EncodePreferencesFlags(self, prefs):
@@ -263,52 +485,16 @@ class Robot(object):
             flags += prefs[pref_name].value
         return flags
 
-    def StartCleaning(self):
-        """
-        Start a cleaning cycle
-        """
-        self._PostToRobot("set", ["cmd", {"op" : "start"}])
-
-    def PauseCleaning(self):
-        """
-        Pause the current cleaning cycle
-
-        This command has no effect if the robot is not currently cleaning
-        """
-        self._PostToRobot("set", ["cmd", {"op" : "pause"}])
-
-    def ResumeCleaning(self):
-        """
-        Resume a paused cleaning cycle
-
-        This command has no effect if the robot is not currently paused
-        """
-        self._PostToRobot("set", ["cmd", {"op" : "resume"}])
-
-    def EndCleaning(self):
-        """
-        End the current cleaning cycle
-
-        This command has no effect if the robot is not currently cleaning or paused
-        """
-        self._PostToRobot("set", ["cmd", {"op" : "stop"}])
-
-    def ReturnHome(self):
-        """
-        Send the robot back to the home dock
-
-        The robot must be stopped or paused first
+    def _TransformCleaningPreferences(self, result):
         """
-        self._PostToRobot("set", ["cmd", {"op" : "dock"}])
+        Transform the result of a "prefs" request into a dictionary of preferences
 
-    def GetCleaningPreferences(self):
-        """
-        Get this robot's cleaning preferences
+        Args:
+            result: the result of the request (dict)
 
         Returns:
             A dictionary of preferences (dict)
         """
-        result = self._PostToRobot("get", "prefs")
         prefs = {}
         for key, value in list(result.items()):
             if key == "flags":
@@ -319,28 +505,32 @@ class Robot(object):
         prefs.update(self._DecodePreferencesFlags(result["flags"]))
         return prefs
 
-    def GetTime(self):
+    def _TransformTime(self, result):
         """
-        Get the time this robot is set to
+        Transform the result of a "time" request into a time of day and day of week
+
+        Args:
+            result: the result of the request (dict)
 
         Returns:
             A dictionary with the time of day and day of week (dict)
         """
-        result = self._PostToRobot("get", "time")
         day_idx = [idx for idx, day in enumerate(calendar.day_abbr) if day.lower() == result["d"]][0]
         return {
             "time" : datetime.time(result["h"], result["m"]),
             "weekday" : calendar.day_name[day_idx]
         }
 
-    def GetSchedule(self):
+    def _TransformSchedule(self, res):
         """
-        Get the cleaning schedule for this robot
+        Transform the result of a "week" request into a schedule per day
+
+        Args:
+            res:    the result of the request (dict)
 
         Returns:
             A dictionary representing the schedule per day (dict)
         """
-        res = self._PostToRobot("get", "week")
         schedule = {}
         for idx in range(7):
             cal_day_idx = idx - 1
@@ -352,16 +542,17 @@ class Robot(object):
             }
         return schedule
 
-    def GetMission(self):
+    def _TransformMission(self, res):
         """
-        Get the real-time status and position of the robot
+        Transform the result of a "mssn" request to be more user friendly and
+        closer to how the app presents it
+
+        Args:
+            res:    the result of the request, which is modified in place (dict)
 
         Returns:
             A dictionary with the current robot status (dict)
         """
-        res = self._PostToRobot("get", "mssn")
-
-        # Transform the data to be more user friendly and closer to how the app presents it
         res["batteryPercentage"] = res.pop("batPct")
 
         if res["expireM"] <= 0:
@@ -372,10 +563,10 @@ class Robot(object):
         res["missionElapsedMinutes"] = res.pop("mssnM")
 
         try:
-            res["readyStatus"] = ReadyStatus(res["notReady"])
-        except ValueError:
+            res["readyStatus"] = _ReadyStatusByValue.get(res["notReady"], ReadyStatus.Unknown)
+        except TypeError:
             res["readyStatus"] = ReadyStatus.Unknown
-        if res["readyStatus"] != ReadyStatus.Unknown:
+        if res["readyStatus"] is not ReadyStatus.Unknown:
             res.pop("notReady")
 
         res["robotPosition"] = res.pop("pos")
@@ -387,20 +578,18 @@ class Robot(object):
 
         res["missionCoveredSquareFootage"] = res.pop("sqft")
 
-        res["binStatus"] = BinStatus.Normal
-        if res["flags"] & MissionState.BinMissing.value == MissionState.BinMissing.value:
-            res["binStatus"] = BinStatus.Missing
-        elif res["flags"] & MissionState.BinFull.value == MissionState.BinFull.value:
-            res["binStatus"] = BinStatus.Full
+        flags = res["flags"]
+        res["binStatus"] = _BinStatusByFlags[flags & _BinFlagsMask]
 
         try:
-            res["robotStatus"] = RobotStatus(res["phase"])
-        except ValueError:
-            res["robotStatus"] = RobotStatus.Unknown
-        if res["robotStatus"] == RobotStatus.Cleaning and res["flags"] & MissionState.Resuming.value == MissionState.Resuming.value:
-            res["robotStatus"] = RobotStatus.Resuming
-
-        if res["robotStatus"] != RobotStatus.Unknown:
+            status = _RobotStatusByValue.get(res["phase"], RobotStatus.Unknown)
+        except TypeError:
+            status = RobotStatus.Unknown
+        if status is RobotStatus.Cleaning and flags & _ResumingFlag:
+            status = RobotStatus.Resuming
+        res["robotStatus"] = status
+
+        if status is not RobotStatus.Unknown:
             res.pop("flags")
             res.pop("phase")
 
@@ -416,184 +605,211 @@ class Robot(object):
 
         return res
 
-    def GetWiFiDetails(self):
+    def _TransformWiFiDetails(self, res):
         """
-        Get detailed information about the robot's WiFi connection
+        Transform the result of a "wlstat" request to be more user friendly and
+        closer to how the app presents it
+
+        Args:
+            res:    the result of the request, which is modified in place (dict)
 
         Returns:
             A dictionary of wifi information (dict)
         """
-        res = self._PostToRobot("get", "wlstat")
-
-        # Transform the data to be more user friendly and closer to how the app presents it
-        res["bssid"] = ":".join([i[2:] for i in map(hex, res["bssid"])])
+        res["bssid"] = ":".join([_HexByte[i] if 0 <= i < 256 else hex(i)[2:] for i in res["bssid"]])
         res["dhcp"] = True if res["dhcp"] == 1 else False
-        res["ipAddress"] = socket.inet_ntoa(struct.pack("I", res.pop("addr")))
-        res["subnetMask"] = socket.inet_ntoa(struct.pack("I", res.pop("mask")))
-        res["router"] = socket.inet_ntoa(struct.pack("I", res.pop("gtwy")))
-        res["dns1"] = socket.inet_ntoa(struct.pack("I", res.pop("dns1")))
-        res["dns2"] = socket.inet_ntoa(struct.pack("I", res.pop("dns2")))
+        res["ipAddress"] = _FormatIPAddress(res.pop("addr"))
+        res["subnetMask"] = _FormatIPAddress(res.pop("mask"))
+        res["router"] = _FormatIPAddress(res.pop("gtwy"))
+        res["dns1"] = _FormatIPAddress(res.pop("dns1"))
+        res["dns2"] = _FormatIPAddress(res.pop("dns2"))
         res["signalStrength"] = res.pop("strssi")
         res["securityType"] = "WPA2" if res["sec"] == 4 else str(res["sec"])
         res.pop("sec")
 
         return res
 
-    def GetWiFiStatus(self):
+    def _TransformWiFiStatus(self, res):
         """
-        Get a simple check of the robot's WiFi status
+        Transform the result of a "wllaststat" request to better match GetWiFiDetails
+
+        Args:
+            res:    the result of the request, which is modified in place (dict)
 
         Returns:
             A dictionary of status (dict)
         """
-        res = self._PostToRobot("get", "wllaststat")
-
-        # Transform data to better match GetWiFiDetails
         res["signalStrength"] = res.pop("strssi")
         return res
 
-    def GetCloudConfig(self):
-        return self._PostToRobot("get", "cloudcfg")
+    def _ReadCache(self, cmd, args):
+        """
+        Look up the result of a request in the cache
 
-    def GetSKU(self):
-        return self._PostToRobot("get", "sku")
+        Args:
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
 
-    def GetSys(self):
-        return self._PostToRobot("get", "sys")
+        Returns:
+            The cached result, or None if it is not cached (dict)
+        """
+        if self.cache is None or cmd != "get" or not isinstance(args, str):
+            return None
+        return self.cache.Get(self.ip, args)
 
-    def GetBBRun(self):
-        return self._PostToRobot("get", "bbrun")
+    def _CacheGeneration(self, cmd, args):
+        """
+        Get the generation of the cache entry for a request, to take before sending it
 
-    def GetWiFiSettings(self):
-        return self._PostToRobot("get", "wlconfig")
+        Args:
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
 
-    def GetStatus(self):
-        """
-        Get a combined view of preferences and mission in a single call
+        Returns:
+            The generation, or None if the request is not cached (tuple)
         """
-        return {
-            "cleaningPreferences" : self.GetCleaningPreferences(),
-            "mission" : self.GetMission()
-        }
+        if self.cache is None or cmd != "get" or not isinstance(args, str):
+            return None
+        return self.cache.Generation(self.ip, args)
 
-    def SetCleaningPreferences(self, prefs):
+    def _WriteCache(self, cmd, args, result, generation=None):
         """
-        Set the cleaning preferences for this robot. All of the fields are
-        required in the preferences dictionary, even if you are not changing
-        them.
-        
-        The easiest way to use this function is to call GetCleaningPreferences,
-        modify the result, and use that as the input to this function.
+        Store the result of a request in the cache, if it is cacheable
 
         Args:
-            prefs:  a dictionary of preferences
+            cmd:        the "do" argument for the request (str)
+            args:       the "args" argument for the request (str or list)
+            result:     the result of the request (dict)
+            generation: the _CacheGeneration from before the request was sent, so the result is dropped if a "set"
+                        invalidated the entry while it was in flight (tuple)
         """
-        newprefs = collections.OrderedDict([
-            ("flags", self._EncodePreferencesFlags(prefs)),
-            ("lang", prefs["lang"]),
-            ("timezone", prefs["timezone"]),
-            ("name", prefs["name"])
-        ])
-        self._PostToRobot("set", ["prefs", newprefs])
+        if self.cache is None or cmd != "get" or not isinstance(args, str):
+            return
+        self.cache.Put(self.ip, args, result, generation=generation)
 
-    def SetCarpetBoost(self, newValue):
+    def _InvalidateCache(self, cmd, args):
         """
-        Set the Carpet Boost cleaning preference
+        Remove any cache entries affected by a request
 
         Args:
-            newValue:  the value to set (CarpetBoost)
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
         """
-        assert isinstance(newValue, CarpetBoost), "newValue must be a CarpetBoost enum value"
-        prefs = self.GetCleaningPreferences()
-        prefs[CarpetBoost.PrefName()] = newValue
-        self.SetCleaningPreferences(prefs)
-
-    def SetCleaningPasses(self, newValue):
+        if cmd != "set":
+            return
+        if self.singleFlight is not None:
+            self.singleFlight.Forget()
+        if self.cache is not None:
+            self.cache.InvalidateForSet(self.ip, args[0])
+
+    def _CheckSnapshotResources(self, resources):
         """
-        Set the Cleaning Passes cleaning preference
+        Validate a list of snapshot resources
 
         Args:
-            newValue:  the value to set (CleaningPasses)
+            resources:  the resource names (list of str)
+
+        Returns:
+            The resource names with duplicates removed (list of str)
         """
-        assert isinstance(newValue, CleaningPasses), "newValue must be a CleaningPasses enum value"
-        prefs = self.GetCleaningPreferences()
-        prefs[CleaningPasses.PrefName()] = newValue
-        self.SetCleaningPreferences(prefs)
+        resources = list(collections.OrderedDict.fromkeys(resources))
+        assert resources, "at least one resource must be requested"
+        for resource in resources:
+            assert resource in _SnapshotResources, "{} is not a valid snapshot resource".format(resource)
+        return resources
 
-    def SetFinishWhenBinFull(self, newValue):
+    def _CheckMultiGetResult(self, resources, res):
         """
-        Set the Finish When Bin Full cleaning preference
+        Check whether the result of a multi-arg "get" contains every resource that was asked for, and remember the
+        answer so we only probe the robot once
 
         Args:
-            newValue:  the value to set (FinishWhenBinFull)
+            resources:  the resource names that were requested (list of str)
+            res:        the result from the robot, or None if the robot returned an error (dict)
+
+        Returns:
+            True if the result can be used (bool)
         """
-        assert isinstance(newValue, FinishWhenBinFull), "newValue must be a FinishWhenBinFull enum value"
-        prefs = self.GetCleaningPreferences()
-        prefs[FinishWhenBinFull.PrefName()] = newValue
-        self.SetCleaningPreferences(prefs)
+        self.supportsMultiGet = isinstance(res, dict) and all(isinstance(res.get(resource), dict) for resource in resources)
+        return self.supportsMultiGet
 
-    def SetEdgeClean(self, newValue):
+    def _ReadSnapshotCache(self, resources):
         """
-        Set the Edge Clean cleaning preference
+        Get the cached results for a list of snapshot resources
 
         Args:
-            newValue:  the value to set (EdgeClean)
+            resources:  the resource names (list of str)
+
+        Returns:
+            A tuple of (the raw cached result for each resource found (dict), the resources not found (list of str))
         """
-        assert isinstance(newValue, EdgeClean), "newValue must be an EdgeClean enum value"
-        prefs = self.GetCleaningPreferences()
-        prefs[EdgeClean.PrefName()] = newValue
-        self.SetCleaningPreferences(prefs)
+        raw = {}
+        for resource in resources:
+            cached = self._ReadCache("get", resource)
+            if cached is not None:
+                raw[resource] = cached
+        return raw, [resource for resource in resources if resource not in raw]
+
+    def _TransformSnapshot(self, raw):
+        """
+        Transform the raw results of several "get" requests
 
-    def SetTimezone(self, newValue):
+        Args:
+            raw:    the raw result for each resource (dict)
+
+        Returns:
+            The decoded result for each resource (dict)
         """
-        Set the robot's timezone. The time zone must be a tz database name.
-        https://en.wikipedia.org/wiki/List_of_tz_database_time_zones
+        snapshot = {}
+        for resource, res in raw.items():
+            transform = _SnapshotResources[resource]
+            snapshot[resource] = getattr(self, transform)(res) if transform else res
+        return snapshot
 
-        For instance, common US time zones:
-            Pacific time:  'America/Los_Angeles' or 'US/Pacific'
-            Mountain time: 'America/Denver' or 'US/Mountain'
-            Central time:  'America/Chicago' or 'US/Central'
-            Eastern time:  'America/New_York' or 'US/Eastern'
+    def _BuildCleaningPreferences(self, prefs):
+        """
+        Build the "prefs" argument for setting the cleaning preferences
 
         Args:
-            newValue:   the time zone name (str)
+            prefs:  a dictionary of preferences (dict)
+
+        Returns:
+            The preferences in the form the robot expects (OrderedDict)
         """
-        prefs = self.GetCleaningPreferences()
-        prefs["timezone"] = newValue
-        self.SetCleaningPreferences(prefs)
+        return collections.OrderedDict([
+            ("flags", self._EncodePreferencesFlags(prefs)),
+            ("lang", prefs["lang"]),
+            ("timezone", prefs["timezone"]),
+            ("name", prefs["name"])
+        ])
 
-    def SetTime(self, newTime):
+    def _BuildTime(self, newTime):
         """
-        Set the robot's time. The robot only cares about weekday, hour and
-        minute, so those are the only fields that need to be accurate in
-        the datetime object.
+        Build the "time" argument for setting the robot's time
 
         Args:
             newTime:    the time to set the robot to (datetime)
+
+        Returns:
+            The time in the form the robot expects (OrderedDict)
         """
         weekday = newTime.isoweekday()
         if weekday > 6:
             weekday = 0
-        self._PostToRobot("set", ["time", collections.OrderedDict([
+        return collections.OrderedDict([
             ("d", weekday),
             ("h", newTime.hour),
             ("m", newTime.minute)])
-        ])
-
-    def SetTimeNow(self):
-        """
-        Set the robot's time to the current time
-        """
-        self.SetTime(datetime.datetime.now())
 
-    def SetSchedule(self, newSchedule):
+    def _BuildSchedule(self, newSchedule):
         """
-        Set the cleaning schedule for this robot.
-        The easiest way to use this function is to call GetSchedule, modify
-        the result, and use that as the input to this function
+        Build the "week" argument for setting the cleaning schedule
 
         Args:
-            schedule:   the schedule to set (dict)
+            newSchedule:    the schedule to set (dict)
+
+        Returns:
+            The schedule in the form the robot expects (OrderedDict)
         """
         # Sort calendar day names into the order the robot expects
         days = {}
@@ -614,5 +830,607 @@ class Robot(object):
                 sched["cycle"].append("none")
             sched["h"].append(newSchedule[dayname]["startTime"].hour)
             sched["m"].append(newSchedule[dayname]["startTime"].minute)
+        return sched
+
+class PreferencesTransaction(object):
+    """
+    A batch of cleaning preference changes that is read once and written in a single request
+
+    Use Robot.PreferencesTransaction to create one.  Changing N preferences
+    this way costs one "get prefs" and one "set prefs" instead of N of each,
+    and the robot's preferences lock is held from the read until the write so
+    concurrent transactions on the same Robot cannot overwrite each other.
+
+        with robot.PreferencesTransaction() as transaction:
+            transaction.Set(CarpetBoost.Perf)
+            transaction.Set(EdgeClean.Off)
+            transaction.Set("timezone", "US/Pacific")
+    """
+
+    def __init__(self, robot, skipUnchanged=True):
+        """
+        Args:
+            robot:          the robot to change (Robot)
+            skipUnchanged:  do not send the write if no preference was changed (bool)
+        """
+        self.robot = robot
+        self.skipUnchanged = skipUnchanged
+        self.original = None
+        self.prefs = None
+        self.written = False
+
+    def __enter__(self):
+        return self.Begin()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.Commit()
+        else:
+            self.Rollback()
 
-        self._PostToRobot("set", ["week", sched])
+    def __getitem__(self, name):
+        return self.prefs[name]
+
+    def __setitem__(self, name, value):
+        self.Set(name, value)
+
+    def _Start(self, prefs):
+        """
+        Start the transaction from the current preferences
+
+        Args:
+            prefs:  the current preferences from GetCleaningPreferences (dict)
+        """
+        self.original = dict(prefs)
+        self.prefs = dict(prefs)
+        self.written = False
+
+    def _NeedsWrite(self):
+        """
+        Check if the preferences need to be written at commit
+
+        Returns:
+            True if a write is needed (bool)
+        """
+        return not self.skipUnchanged or bool(self.Changes())
+
+    def _Finish(self):
+        """
+        End the transaction
+        """
+        self.prefs = None
+        self.robot._preferencesLock.release()
+
+    def Set(self, name, value=None):
+        """
+        Change a preference.  The enum preferences can be given as just the
+        enum value, e.g. Set(CarpetBoost.Perf)
+
+        Args:
+            name:   the name of the preference, or a preference enum value (str or Enum)
+            value:  the value to set
+
+        Returns:
+            This transaction, so calls can be chained (PreferencesTransaction)
+        """
+        if value is None and isinstance(name, Enum):
+            name, value = type(name).PrefName(), name
+        assert self.prefs is not None, "the transaction has not been started"
+        if name in _PreferenceEnums:
+            assert isinstance(value, _PreferenceEnums[name]), "{} must be a {} enum".format(name, _PreferenceEnums[name].__name__)
+        self.prefs[name] = value
+        return self
+
+    def Changes(self):
+        """
+        Get the preferences that have been changed in this transaction
+
+        Returns:
+            The new value of each changed preference (dict)
+        """
+        return dict((name, value) for name, value in self.prefs.items() if self.original.get(name) != value)
+
+    def Begin(self):
+        """
+        Lock the robot's preferences and read the current values
+
+        Returns:
+            This transaction (PreferencesTransaction)
+        """
+        self.robot._preferencesLock.acquire()
+        try:
+            self._Start(self.robot.GetCleaningPreferences())
+        except:
+            self.robot._preferencesLock.release()
+            raise
+        return self
+
+    def Commit(self):
+        """
+        Write the changed preferences to the robot in a single request
+
+        Returns:
+            True if the preferences were written (bool)
+        """
+        assert self.prefs is not None, "the transaction has not been started"
+        try:
+            if self._NeedsWrite():
+                self.robot.SetCleaningPreferences(self.prefs)
+                self.written = True
+        finally:
+            self._Finish()
+        return self.written
+
+    def Rollback(self):
+        """
+        End the transaction without writing anything
+        """
+        assert self.prefs is not None, "the transaction has not been started"
+        self._Finish()
+
+class Robot(_RobotBase):
+    """
+    This object represents an iRobot cleaning robot
+    """
+
+    @staticmethod
+    def GetPassword(robotIP, transport=None):
+        """
+        Get the password for this robot
+
+        Before calling this method, place the robot on its dock and then hold down the home button for 3-4 seconds,
+        until the LEDs illuminate and the robot emits a series of tones.  Then quickly call this method
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            transport:  an existing transport to send the request over (HTTPSTransport)
+
+        Returns:
+            The robot password (str)
+        """
+        res = _PostUMI(transport, robotIP, None, "get", ["passwd"], 0)
+        return res["passwd"]
+
+    @staticmethod
+    def GetBLID(robotIP, password, transport=None):
+        """
+        Get this robot's BLID, which you need for making cloud-based calls to the robot
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            password:   the robot password (str)
+            transport:  an existing transport to send the request over (HTTPSTransport)
+
+        Returns:
+            The robot BLID (str)
+        """
+        return _DecodeBLID(_PostUMI(transport, robotIP, password, "get", ["sys"], 0))
+
+    def __init__(self, robotIP, robotPassword, poolSize=DEFAULT_POOL_SIZE, idleTimeout=DEFAULT_IDLE_TIMEOUT, cache=None,
+                 timeout=DEFAULT_TIMEOUT, deadline=None, retryPolicy=None, circuitBreaker=None, coalesce=True, resultWindow=0, dispatcher=None,
+                 codec=None):
+        """
+        Args:
+            robotIP:        the IP address of the robot (str)
+            robotPassword:  the robot password (str)
+            poolSize:       the maximum number of keep-alive connections to keep open to the robot (int)
+            idleTimeout:    seconds of inactivity before idle connections are closed (float)
+            cache:          a cache for resources that rarely change, which may be shared between robots (ResourceCache)
+            timeout:        the (connect, read) timeouts for each request, in seconds (tuple of float)
+            deadline:       the most seconds a call may take, including retries, or None for no limit (float)
+            retryPolicy:    when to retry failed requests, or None to retry "get" requests up to 3 times (RetryPolicy)
+            circuitBreaker: the breaker that fails requests fast while the robot is down, or None for a new one (CircuitBreaker)
+            coalesce:       send identical concurrent "get" requests only once and share the result (bool)
+            resultWindow:   seconds to keep sharing a "get" result after it arrives, when coalescing (float)
+            dispatcher:     queues requests to limit their concurrency and rate, which may be shared by every Robot for the
+                            same robot (RobotDispatcher)
+            codec:          the codec for request and response bodies, or None for the fastest one installed (JSONCodec)
+        """
+        super(Robot, self).__init__(robotIP, robotPassword, cache=cache, deadline=deadline, retryPolicy=retryPolicy,
+                                    circuitBreaker=circuitBreaker, dispatcher=dispatcher, codec=codec)
+        self.transport = HTTPSTransport(poolSize=poolSize, idleTimeout=idleTimeout, timeout=timeout)
+        self.singleFlight = SingleFlight(window=resultWindow) if coalesce else None
+        self._executor = None
+        self._preferencesLock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def Close(self):
+        """
+        Close any open connections to the robot
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.transport.Close()
+
+    def _PostToRobot(self, cmd, args):
+        """
+        Send a command to the robot and get the response
+
+        Args:
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
+
+        Returns:
+            The JSON response parsed into a dictionary (dict)
+        """
+        cached = self._ReadCache(cmd, args)
+        if cached is not None:
+            return cached
+        key = RequestKey(cmd, args) if self.singleFlight is not None else None
+        if key is not None:
+            return self.singleFlight.Do(key, lambda: self._FetchFromRobot(cmd, args))
+        return self._FetchFromRobot(cmd, args)
+
+    def _FetchFromRobot(self, cmd, args):
+        """
+        Send a command to the robot and update the cache with the response
+
+        Args:
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
+
+        Returns:
+            The JSON response parsed into a dictionary (dict)
+        """
+        generation = self._CacheGeneration(cmd, args)
+        try:
+            result = self._SendToRobot(cmd, args)
+        finally:
+            self._InvalidateCache(cmd, args)
+        self._WriteCache(cmd, args, result, generation)
+        return result
+
+    def _SendToRobot(self, cmd, args):
+        """
+        Send a command to the robot over the network, retrying and failing fast according to the retry policy,
+        circuit breaker and deadline, and waiting for the dispatcher if there is one
+
+        Args:
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
+
+        Returns:
+            The JSON response parsed into a dictionary (dict)
+        """
+        trial = self.circuitBreaker.Allow(self.ip)
+        try:
+            deadline = self._CallDeadline()
+            priority = RequestPriority(cmd, args)
+            attempt = 0
+            while True:
+                attempt += 1
+                if self.dispatcher is not None and self.dispatcher.Acquire(priority, deadline) is None:
+                    raise DeadlineExceeded(self.deadline)
+                try:
+                    timeout = self._AttemptTimeout(deadline)
+                    result = _PostUMI(self.transport, self.ip, self.password, cmd, args, self._GetRequestID(), timeout=timeout,
+                                      codec=self.codec)
+                except DeadlineExceeded:
+                    raise
+                except Exception as ex:
+                    delay = self._RetryDelay(cmd, ex, attempt, deadline)
+                    if delay is None:
+                        raise
+                else:
+                    self.circuitBreaker.RecordSuccess()
+                    return result
+                finally:
+                    if self.dispatcher is not None:
+                        self.dispatcher.Release()
+                time.sleep(delay)
+        finally:
+            # A trial that ended without an answer or a network error, e.g. a bad response, the deadline or a
+            # cancellation; once the trial was recorded this does nothing
+            self.circuitBreaker.EndTrial(trial)
+
+    def StartCleaning(self):
+        """
+        Start a cleaning cycle
+        """
+        self._PostToRobot("set", ["cmd", {"op" : "start"}])
+
+    def PauseCleaning(self):
+        """
+        Pause the current cleaning cycle
+
+        This command has no effect if the robot is not currently cleaning
+        """
+        self._PostToRobot("set", ["cmd", {"op" : "pause"}])
+
+    def ResumeCleaning(self):
+        """
+        Resume a paused cleaning cycle
+
+        This command has no effect if the robot is not currently paused
+        """
+        self._PostToRobot("set", ["cmd", {"op" : "resume"}])
+
+    def EndCleaning(self):
+        """
+        End the current cleaning cycle
+
+        This command has no effect if the robot is not currently cleaning or paused
+        """
+        self._PostToRobot("set", ["cmd", {"op" : "stop"}])
+
+    def ReturnHome(self):
+        """
+        Send the robot back to the home dock
+
+        The robot must be stopped or paused first
+        """
+        self._PostToRobot("set", ["cmd", {"op" : "dock"}])
+
+    def GetCleaningPreferences(self):
+        """
+        Get this robot's cleaning preferences
+
+        Returns:
+            A dictionary of preferences (dict)
+        """
+        return self._TransformCleaningPreferences(self._PostToRobot("get", "prefs"))
+
+    def GetTime(self):
+        """
+        Get the time this robot is set to
+
+        Returns:
+            A dictionary with the time of day and day of week (dict)
+        """
+        return self._TransformTime(self._PostToRobot("get", "time"))
+
+    def GetSchedule(self):
+        """
+        Get the cleaning schedule for this robot
+
+        Returns:
+            A dictionary representing the schedule per day (dict)
+        """
+        return self._TransformSchedule(self._PostToRobot("get", "week"))
+
+    def GetMission(self):
+        """
+        Get the real-time status and position of the robot
+
+        Returns:
+            A dictionary with the current robot status (dict)
+        """
+        return self._TransformMission(self._PostToRobot("get", "mssn"))
+
+    def GetMissionSnapshot(self):
+        """
+        Get the real-time status and position of the robot as a compact typed object
+
+        Returns:
+            The current robot status (MissionSnapshot)
+        """
+        from .mission import MissionSnapshot
+        return MissionSnapshot.FromMission(self.GetMission())
+
+    def WatchMission(self, interval=5, keyframeEvery=None, keyframeInterval=None):
+        """
+        Poll GetMission and yield only what changes, with a full keyframe first and every so often after
+
+        Nothing is yielded for polls where nothing changed, unless a keyframe is due.  Errors from GetMission end the
+        generator, after the robot's retry policy has given up on the request.
+
+        Args:
+            interval:           seconds from the start of one poll to the start of the next (float)
+            keyframeEvery:      the most changes between keyframes, or None for the default (int)
+            keyframeInterval:   the most seconds between keyframes, or None for the default (float)
+
+        Returns:
+            A generator of changes (generator of mission.MissionChange)
+        """
+        from .mission import MissionWatcher, DEFAULT_KEYFRAME_EVERY, DEFAULT_KEYFRAME_INTERVAL
+        watcher = MissionWatcher(DEFAULT_KEYFRAME_EVERY if keyframeEvery is None else keyframeEvery,
+                                 DEFAULT_KEYFRAME_INTERVAL if keyframeInterval is None else keyframeInterval)
+        while True:
+            start = _monotonic()
+            change = watcher.Update(self.GetMission())
+            if change is not None:
+                yield change
+            time.sleep(max(0, interval - (_monotonic() - start)))
+
+    def GetWiFiDetails(self):
+        """
+        Get detailed information about the robot's WiFi connection
+
+        Returns:
+            A dictionary of wifi information (dict)
+        """
+        return self._TransformWiFiDetails(self._PostToRobot("get", "wlstat"))
+
+    def GetWiFiStatus(self):
+        """
+        Get a simple check of the robot's WiFi status
+
+        Returns:
+            A dictionary of status (dict)
+        """
+        return self._TransformWiFiStatus(self._PostToRobot("get", "wllaststat"))
+
+    def GetCloudConfig(self):
+        return self._PostToRobot("get", "cloudcfg")
+
+    def GetSKU(self):
+        return self._PostToRobot("get", "sku")
+
+    def GetSys(self):
+        return self._PostToRobot("get", "sys")
+
+    def GetBBRun(self):
+        return self._PostToRobot("get", "bbrun")
+
+    def GetWiFiSettings(self):
+        return self._PostToRobot("get", "wlconfig")
+
+    def GetSnapshot(self, resources=("prefs", "mssn")):
+        """
+        Get several "get" resources from the robot at once, in the lowest wall time possible
+
+        If the robot accepts several args in one "get" request they are fetched in a single round trip, otherwise
+        the requests are sent concurrently over the connection pool.  Each resource is decoded the same way as the
+        corresponding Get method, e.g. "mssn" like GetMission and "week" like GetSchedule.
+
+        Args:
+            resources:  the names of the resources to get - prefs, mssn, time, week, wlstat, wllaststat, cloudcfg,
+                        sku, sys, bbrun, wlconfig (list of str)
+
+        Returns:
+            A dictionary of decoded results keyed by resource name (dict)
+        """
+        raw, missing = self._ReadSnapshotCache(self._CheckSnapshotResources(resources))
+
+        if len(missing) > 1 and self.supportsMultiGet is not False:
+            generations = [self._CacheGeneration("get", resource) for resource in missing]
+            try:
+                res = self._PostToRobot("get", missing)
+            except RobotError:
+                res = None
+            if self._CheckMultiGetResult(missing, res):
+                for resource, generation in zip(missing, generations):
+                    self._WriteCache("get", resource, res[resource], generation)
+                    raw[resource] = res[resource]
+                missing = []
+
+        if len(missing) == 1:
+            raw[missing[0]] = self._PostToRobot("get", missing[0])
+        elif missing:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.transport.poolSize)
+            results = self._executor.map(lambda resource: self._PostToRobot("get", resource), missing)
+            raw.update(zip(missing, results))
+        return self._TransformSnapshot(raw)
+
+    def GetStatus(self):
+        """
+        Get a combined view of preferences and mission in a single call
+        """
+        snapshot = self.GetSnapshot(["prefs", "mssn"])
+        return {
+            "cleaningPreferences" : snapshot["prefs"],
+            "mission" : snapshot["mssn"]
+        }
+
+    def SetCleaningPreferences(self, prefs):
+        """
+        Set the cleaning preferences for this robot. All of the fields are
+        required in the preferences dictionary, even if you are not changing
+        them.
+        
+        The easiest way to use this function is to call GetCleaningPreferences,
+        modify the result, and use that as the input to this function.
+
+        Args:
+            prefs:  a dictionary of preferences
+        """
+        self._PostToRobot("set", ["prefs", self._BuildCleaningPreferences(prefs)])
+
+    def PreferencesTransaction(self, skipUnchanged=True):
+        """
+        Start a batch of cleaning preference changes that are written in a single request.  See PreferencesTransaction
+
+        Args:
+            skipUnchanged:  do not send the write if no preference was changed (bool)
+
+        Returns:
+            A transaction to use as a context manager (PreferencesTransaction)
+        """
+        return PreferencesTransaction(self, skipUnchanged=skipUnchanged)
+
+    def SetCarpetBoost(self, newValue):
+        """
+        Set the Carpet Boost cleaning preference
+
+        Args:
+            newValue:  the value to set (CarpetBoost)
+        """
+        assert isinstance(newValue, CarpetBoost), "newValue must be a CarpetBoost enum value"
+        with self.PreferencesTransaction() as transaction:
+            transaction.Set(CarpetBoost.PrefName(), newValue)
+
+    def SetCleaningPasses(self, newValue):
+        """
+        Set the Cleaning Passes cleaning preference
+
+        Args:
+            newValue:  the value to set (CleaningPasses)
+        """
+        assert isinstance(newValue, CleaningPasses), "newValue must be a CleaningPasses enum value"
+        with self.PreferencesTransaction() as transaction:
+            transaction.Set(CleaningPasses.PrefName(), newValue)
+
+    def SetFinishWhenBinFull(self, newValue):
+        """
+        Set the Finish When Bin Full cleaning preference
+
+        Args:
+            newValue:  the value to set (FinishWhenBinFull)
+        """
+        assert isinstance(newValue, FinishWhenBinFull), "newValue must be a FinishWhenBinFull enum value"
+        with self.PreferencesTransaction() as transaction:
+            transaction.Set(FinishWhenBinFull.PrefName(), newValue)
+
+    def SetEdgeClean(self, newValue):
+        """
+        Set the Edge Clean cleaning preference
+
+        Args:
+            newValue:  the value to set (EdgeClean)
+        """
+        assert isinstance(newValue, EdgeClean), "newValue must be an EdgeClean enum value"
+        with self.PreferencesTransaction() as transaction:
+            transaction.Set(EdgeClean.PrefName(), newValue)
+
+    def SetTimezone(self, newValue):
+        """
+        Set the robot's timezone. The time zone must be a tz database name.
+        https://en.wikipedia.org/wiki/List_of_tz_database_time_zones
+
+        For instance, common US time zones:
+            Pacific time:  'America/Los_Angeles' or 'US/Pacific'
+            Mountain time: 'America/Denver' or 'US/Mountain'
+            Central time:  'America/Chicago' or 'US/Central'
+            Eastern time:  'America/New_York' or 'US/Eastern'
+
+        Args:
+            newValue:   the time zone name (str)
+        """
+        with self.PreferencesTransaction() as transaction:
+            transaction.Set("timezone", newValue)
+
+    def SetTime(self, newTime):
+        """
+        Set the robot's time. The robot only cares about weekday, hour and
+        minute, so those are the only fields that need to be accurate in
+        the datetime object.
+
+        Args:
+            newTime:    the time to set the robot to (datetime)
+        """
+        self._PostToRobot("set", ["time", self._BuildTime(newTime)])
+
+    def SetTimeNow(self):
+        """
+        Set the robot's time to the current time
+        """
+        self.SetTime(datetime.datetime.now())
+
+    def SetSchedule(self, newSchedule):
+        """
+        Set the cleaning schedule for this robot.
+        The easiest way to use this function is to call GetSchedule, modify
+        the result, and use that as the input to this function
+
+        Args:
+            schedule:   the schedule to set (dict)
+        """
+        self._PostToRobot("set", ["week", self._BuildSchedule(newSchedule)])
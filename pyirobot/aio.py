@@ -0,0 +1,890 @@
+#!/usr/bin/env python
+"""
+asyncio client for iRobot cleaning robots
+
+AsyncRobot has the same operations as Robot, but each one returns an awaitable
+and the requests are sent over non-blocking keep-alive HTTPS connections, so a
+single event loop can have requests to thousands of robots in flight at once.
+"""
+
+import asyncio
+import base64
+import collections
+import copy
+import datetime
+import ssl
+import time
+from . import DefaultCodec, RobotError, PreferencesTransaction, _RobotBase, _BuildUMIRequest, _ParseUMIResponse, _DecodeBLID, _RequestHooks, _ReportRequest, CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean
+from .dispatch import PRIORITY_TELEMETRY, RequestPriority, _DispatcherBase, _monotonic
+from .retry import DeadlineExceeded
+from .singleflight import RequestKey, _Call, _SingleFlightBase
+from .transport import DEFAULT_POOL_SIZE, DEFAULT_IDLE_TIMEOUT, DEFAULT_TIMEOUT
+
+def _DefaultSSLContext():
+    """
+    Create an SSL context for talking to a robot - the Roomba's SSL certificate is self signed
+
+    Returns:
+        An SSL context that does not verify the server certificate (ssl.SSLContext)
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+class AsyncHTTPSTransport(object):
+    """
+    A pool of persistent keep-alive HTTPS connections to a robot, using asyncio streams
+    """
+
+    def __init__(self, poolSize=DEFAULT_POOL_SIZE, idleTimeout=DEFAULT_IDLE_TIMEOUT, sslContext=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            poolSize:       the maximum number of connections to have open at once (int)
+            idleTimeout:    seconds an idle connection is kept before it is closed, or None to never expire (float)
+            sslContext:     the SSL context to use, None for the default, or False to use plain HTTP (ssl.SSLContext)
+            timeout:        the (connect, read) timeouts for each request, in seconds (tuple of float)
+        """
+        self.poolSize = poolSize
+        self.idleTimeout = idleTimeout
+        self.timeout = timeout
+        self.sslContext = _DefaultSSLContext() if sslContext is None else sslContext
+        self._idle = collections.deque()
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.Close()
+
+    @staticmethod
+    async def _CloseWriter(writer, timeout):
+        """
+        Close a connection and wait for it to finish closing, for at most timeout seconds
+        """
+        writer.close()
+        try:
+            await asyncio.wait_for(writer.wait_closed(), timeout)
+        except (OSError, asyncio.TimeoutError):
+            # Already reset by the robot, or it is not answering the TLS close; the transport is closed either way
+            pass
+
+    async def _Connect(self, host, connectTimeout):
+        """
+        Get an open connection to a host, reusing an idle one if possible
+
+        Args:
+            host:           the host to connect to, optionally with a port (str)
+            connectTimeout: the most seconds to wait for a new connection (float)
+
+        Returns:
+            A tuple of (reader, writer, reused)
+        """
+        now = time.monotonic()
+        while self._idle:
+            idle_host, reader, writer, last_used = self._idle.pop()
+            if idle_host != host or reader.at_eof() or \
+               (self.idleTimeout is not None and now - last_used > self.idleTimeout):
+                await self._CloseWriter(writer, connectTimeout)
+                continue
+            return reader, writer, True
+
+        hostname, _, port = host.partition(":")
+        port = int(port) if port else (443 if self.sslContext else 80)
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(hostname, port, ssl=self.sslContext or None), connectTimeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timed out connecting to {}".format(host))
+        return reader, writer, False
+
+    def _Release(self, host, reader, writer):
+        """
+        Return a connection to the idle pool
+        """
+        if len(self._idle) >= self.poolSize:
+            writer.close()
+            return
+        self._idle.append((host, reader, writer, time.monotonic()))
+
+    async def _ReadResponse(self, reader):
+        """
+        Read an HTTP response from a connection
+
+        Returns:
+            A tuple of (status, body, keepAlive)
+        """
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by robot")
+        status = int(status_line.split(None, 2)[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, body, keep_alive
+
+    async def _Exchange(self, host, request, connectTimeout):
+        """
+        Send a request and read the response, on a pooled connection
+
+        Returns:
+            A tuple of (status, body)
+        """
+        while True:
+            reader, writer, reused = await self._Connect(host, connectTimeout)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, body, keep_alive = await self._ReadResponse(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as ex:
+                writer.close()
+                # The robot may have closed an idle connection just as we reused it, so try again on a fresh one
+                if reused:
+                    continue
+                if isinstance(ex, asyncio.IncompleteReadError):
+                    # An EOFError, which would not be retried or counted by the circuit breaker like other network
+                    # errors, or like the blocking transport's error for the same thing
+                    raise ConnectionError("Connection closed by robot in the middle of the response") from ex
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            break
+
+        if keep_alive:
+            self._Release(host, reader, writer)
+        else:
+            writer.close()
+        return status, body
+
+    async def Post(self, host, path, data, auth=None, timeout=None):
+        """
+        Post data to a robot over a pooled connection
+
+        Args:
+            host:       the host to post to (str)
+            path:       the path to post to (str)
+            data:       the request body (bytes)
+            auth:       the (username, password) to authenticate with (tuple)
+            timeout:    the (connect, read) timeouts for this request, or None for the transport's timeouts (tuple of float)
+
+        Returns:
+            The response body (bytes), which for an HTTP 4xx status, e.g. the 401 for a wrong password, is the error
+            page, as with the blocking transport; decoding it fails instead of it counting as a network error
+        """
+        status, body = await self.Send(host, path, data, auth=auth, timeout=timeout)
+        if status >= 500:
+            raise ConnectionError("HTTP error {} from {}".format(status, host))
+        return body
+
+    async def Send(self, host, path, data, auth=None, timeout=None):
+        """
+        Post data to a robot over a pooled connection, and get the response whatever its HTTP status.  See Post
+
+        Returns:
+            A tuple of (the HTTP status (int), the response body (bytes))
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.poolSize)
+        connect_timeout, read_timeout = self.timeout if timeout is None else timeout
+
+        request = ["POST {} HTTP/1.1".format(path),
+                   "Host: {}".format(host),
+                   "Content-Type: application/json",
+                   "Content-Length: {}".format(len(data)),
+                   "Connection: keep-alive"]
+        if auth is not None:
+            token = base64.b64encode("{}:{}".format(*auth).encode("utf-8")).decode("ascii")
+            request.append("Authorization: Basic {}".format(token))
+        request = ("\r\n".join(request) + "\r\n\r\n").encode("latin-1") + data
+
+        async with self._semaphore:
+            try:
+                status, body = await asyncio.wait_for(self._Exchange(host, request, connect_timeout), connect_timeout + read_timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError("Timed out waiting for a response from {}".format(host))
+        return status, body
+
+    async def Close(self):
+        """
+        Close all of the idle connections in the pool
+        """
+        closing = []
+        while self._idle:
+            _, _, writer, _ = self._idle.pop()
+            closing.append(self._CloseWriter(writer, self.timeout[0]))
+        if closing:
+            await asyncio.gather(*closing)
+
+async def _SendUMIAsync(transport, robotIP, postData, auth, timeout):
+    """
+    Send a request body to a robot's /umi endpoint
+
+    Returns:
+        The response body (bytes)
+    """
+    if transport is None:
+        async with AsyncHTTPSTransport(poolSize=1) as oneoff:
+            return await oneoff.Post(robotIP, "/umi", postData, auth=auth, timeout=timeout)
+    return await transport.Post(robotIP, "/umi", postData, auth=auth, timeout=timeout)
+
+async def _PostUMIAsync(transport, robotIP, password, cmd, args, requestID, timeout=None, codec=None):
+    """
+    Send a request to a robot's /umi endpoint and get the response
+
+    Args:
+        transport:  the transport to send the request over, or None to use a one-off connection (AsyncHTTPSTransport)
+        robotIP:    the IP address of the robot (str)
+        password:   the robot password, or None to send the request without authentication (str)
+        cmd:        the "do" argument for the request (str)
+        args:       the "args" argument for the request (str or list)
+        requestID:  the "id" argument for the request (int)
+        timeout:    the (connect, read) timeouts, or None for the transport's timeouts (tuple of float)
+        codec:      the codec to encode the request and decode the response with, or None for the default (JSONCodec)
+
+    Returns:
+        The "ok" part of the JSON response (dict)
+    """
+    codec = codec or DefaultCodec()
+    post_data = _BuildUMIRequest(cmd, args, requestID, codec)
+    auth = ("user", password) if password is not None else None
+    if not _RequestHooks:
+        body = await _SendUMIAsync(transport, robotIP, post_data, auth, timeout)
+        return _ParseUMIResponse(codec.Decode(body))
+
+    start = time.perf_counter()
+    response_bytes = None
+    error = None
+    try:
+        body = await _SendUMIAsync(transport, robotIP, post_data, auth, timeout)
+        response_bytes = len(body)
+        return _ParseUMIResponse(codec.Decode(body))
+    except BaseException as ex:
+        error = ex
+        raise
+    finally:
+        _ReportRequest(robotIP, cmd, args, time.perf_counter() - start, len(post_data), response_bytes, error)
+
+class AsyncSingleFlight(_SingleFlightBase):
+    """
+    Coalesces identical concurrent calls from many tasks into one
+    """
+
+    async def Do(self, key, fetch):
+        """
+        Get the result of fetch, sharing it with any other callers with the same key
+
+        Args:
+            key:    the key identical calls share (hashable)
+            fetch:  the coroutine function to get the result (callable)
+
+        Returns:
+            The result of fetch
+        """
+        while True:
+            recent = self._Recent(key)
+            if recent is not None:
+                return copy.deepcopy(recent[1])
+            call = self._calls.get(key)
+            if call is None:
+                break
+            call.waiters += 1
+            self.coalesced += 1
+            await call.event.wait()
+            if isinstance(call.error, asyncio.CancelledError):
+                # Only the task that was sending the request was cancelled, e.g. by its own timeout; send it again
+                continue
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        call = self._calls[key] = _Call(asyncio.Event(), self._generation)
+        self.requests += 1
+        try:
+            call.result = await fetch()
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            self._Finish(key, call)
+            call.event.set()
+        if not call.waiters and not self.window:
+            return call.result
+        return copy.deepcopy(call.result)
+
+class AsyncRobotDispatcher(_DispatcherBase):
+    """
+    Limits the concurrency and rate of requests to one robot from AsyncRobot, sending the highest priority requests first
+    """
+
+    def __init__(self, maxConcurrent=1, rate=None, burst=1):
+        super(AsyncRobotDispatcher, self).__init__(maxConcurrent=maxConcurrent, rate=rate, burst=burst)
+        # Set to wake every waiting request, then replaced; all of this runs on one event loop, so no lock is needed
+        self._wake = None
+
+    async def Acquire(self, priority=PRIORITY_TELEMETRY, deadline=None):
+        """
+        Wait for a turn to send a request.  Every successful Acquire must be followed by a Release
+
+        Args:
+            priority:   the priority class of the request (int)
+            deadline:   the time.monotonic time to give up waiting at, or None to wait as long as it takes (float)
+
+        Returns:
+            The seconds spent waiting, or None if the deadline passed first (float)
+        """
+        start = _monotonic()
+        entry = self._Enqueue(priority)
+        while True:
+            delay = self._TryStart(entry)
+            if delay == 0:
+                self._Wake()
+                break
+            if deadline is not None:
+                remaining = deadline - _monotonic()
+                if remaining <= 0:
+                    self._Dequeue(entry)
+                    self._Wake()
+                    return None
+                delay = remaining if delay is None else min(delay, remaining)
+            if self._wake is None:
+                self._wake = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            except BaseException:
+                self._Dequeue(entry)
+                self._Wake()
+                raise
+        wait = _monotonic() - start
+        self._Record(priority, wait)
+        return wait
+
+    def Release(self):
+        """
+        Finish a request, letting the next one start
+        """
+        self._active -= 1
+        self._Wake()
+
+    def _Wake(self):
+        """
+        Wake every waiting request to check whether it can start now
+        """
+        if self._wake is not None:
+            self._wake.set()
+            self._wake = None
+
+    def Stats(self):
+        """
+        Get the number of requests in flight and queued, and how long requests of each priority have waited
+
+        Returns:
+            A dict of active, queued and waits, which has the count, meanWait and maxWait for each priority class (dict)
+        """
+        return self._Stats()
+
+class AsyncPreferencesTransaction(PreferencesTransaction):
+    """
+    A batch of cleaning preference changes that is read once and written in a single request, for AsyncRobot
+
+        async with robot.PreferencesTransaction() as transaction:
+            transaction.Set(CarpetBoost.Perf)
+            transaction.Set(EdgeClean.Off)
+    """
+
+    def __enter__(self):
+        raise TypeError("use 'async with' for an AsyncPreferencesTransaction")
+
+    async def __aenter__(self):
+        return await self.Begin()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.Commit()
+        else:
+            self.Rollback()
+
+    async def Begin(self):
+        """
+        Lock the robot's preferences and read the current values
+
+        Returns:
+            This transaction (AsyncPreferencesTransaction)
+        """
+        await self.robot._preferencesLock.acquire()
+        try:
+            self._Start(await self.robot.GetCleaningPreferences())
+        except BaseException:
+            self.robot._preferencesLock.release()
+            raise
+        return self
+
+    async def Commit(self):
+        """
+        Write the changed preferences to the robot in a single request
+
+        Returns:
+            True if the preferences were written (bool)
+        """
+        assert self.prefs is not None, "the transaction has not been started"
+        try:
+            if self._NeedsWrite():
+                await self.robot.SetCleaningPreferences(self.prefs)
+                self.written = True
+        finally:
+            self._Finish()
+        return self.written
+
+class AsyncRobot(_RobotBase):
+    """
+    This object represents an iRobot cleaning robot, controlled with asyncio
+    """
+
+    @staticmethod
+    async def GetPassword(robotIP, transport=None):
+        """
+        Get the password for this robot
+
+        See Robot.GetPassword for how to put the robot into the right mode first
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            transport:  an existing transport to send the request over (AsyncHTTPSTransport)
+
+        Returns:
+            The robot password (str)
+        """
+        res = await _PostUMIAsync(transport, robotIP, None, "get", ["passwd"], 0)
+        return res["passwd"]
+
+    @staticmethod
+    async def GetBLID(robotIP, password, transport=None):
+        """
+        Get this robot's BLID, which you need for making cloud-based calls to the robot
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            password:   the robot password (str)
+            transport:  an existing transport to send the request over (AsyncHTTPSTransport)
+
+        Returns:
+            The robot BLID (str)
+        """
+        return _DecodeBLID(await _PostUMIAsync(transport, robotIP, password, "get", ["sys"], 0))
+
+    def __init__(self, robotIP, robotPassword, poolSize=DEFAULT_POOL_SIZE, idleTimeout=DEFAULT_IDLE_TIMEOUT, sslContext=None, cache=None,
+                 timeout=DEFAULT_TIMEOUT, deadline=None, retryPolicy=None, circuitBreaker=None, coalesce=True, resultWindow=0, dispatcher=None,
+                 codec=None):
+        """
+        Args:
+            robotIP:        the IP address of the robot (str)
+            robotPassword:  the robot password (str)
+            poolSize:       the maximum number of keep-alive connections to keep open to the robot (int)
+            idleTimeout:    seconds of inactivity before idle connections are closed (float)
+            sslContext:     the SSL context to connect with, or None for the default (ssl.SSLContext)
+            cache:          a cache for resources that rarely change, which may be shared between robots (ResourceCache)
+            timeout:        the (connect, read) timeouts for each request, in seconds (tuple of float)
+            deadline:       the most seconds a call may take, including retries, or None for no limit (float)
+            retryPolicy:    when to retry failed requests, or None to retry "get" requests up to 3 times (RetryPolicy)
+            circuitBreaker: the breaker that fails requests fast while the robot is down, or None for a new one (CircuitBreaker)
+            coalesce:       send identical concurrent "get" requests only once and share the result (bool)
+            resultWindow:   seconds to keep sharing a "get" result after it arrives, when coalescing (float)
+            dispatcher:     queues requests to limit their concurrency and rate, which may be shared by every AsyncRobot for
+                            the same robot (AsyncRobotDispatcher)
+            codec:          the codec for request and response bodies, or None for the fastest one installed (JSONCodec)
+        """
+        super(AsyncRobot, self).__init__(robotIP, robotPassword, cache=cache, deadline=deadline, retryPolicy=retryPolicy,
+                                         circuitBreaker=circuitBreaker, dispatcher=dispatcher, codec=codec)
+        self.transport = AsyncHTTPSTransport(poolSize=poolSize, idleTimeout=idleTimeout, sslContext=sslContext, timeout=timeout)
+        self.singleFlight = AsyncSingleFlight(window=resultWindow) if coalesce else None
+        self._preferencesLock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.Close()
+
+    async def Close(self):
+        """
+        Close any open connections to the robot
+        """
+        await self.transport.Close()
+
+    async def _PostToRobot(self, cmd, args):
+        """
+        Send a command to the robot and get the response
+
+        Args:
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
+
+        Returns:
+            The JSON response parsed into a dictionary (dict)
+        """
+        cached = self._ReadCache(cmd, args)
+        if cached is not None:
+            return cached
+        key = RequestKey(cmd, args) if self.singleFlight is not None else None
+        if key is not None:
+            return await self.singleFlight.Do(key, lambda: self._FetchFromRobot(cmd, args))
+        return await self._FetchFromRobot(cmd, args)
+
+    async def _FetchFromRobot(self, cmd, args):
+        """
+        Send a command to the robot and update the cache with the response
+
+        Args:
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
+
+        Returns:
+            The JSON response parsed into a dictionary (dict)
+        """
+        generation = self._CacheGeneration(cmd, args)
+        try:
+            result = await self._SendToRobot(cmd, args)
+        finally:
+            self._InvalidateCache(cmd, args)
+        self._WriteCache(cmd, args, result, generation)
+        return result
+
+    async def _SendToRobot(self, cmd, args):
+        """
+        Send a command to the robot over the network, retrying and failing fast according to the retry policy,
+        circuit breaker and deadline, and waiting for the dispatcher if there is one
+
+        Args:
+            cmd:    the "do" argument for the request (str)
+            args:   the "args" argument for the request (str or list)
+
+        Returns:
+            The JSON response parsed into a dictionary (dict)
+        """
+        trial = self.circuitBreaker.Allow(self.ip)
+        try:
+            deadline = self._CallDeadline()
+            priority = RequestPriority(cmd, args)
+            attempt = 0
+            while True:
+                attempt += 1
+                if self.dispatcher is not None and await self.dispatcher.Acquire(priority, deadline) is None:
+                    raise DeadlineExceeded(self.deadline)
+                try:
+                    timeout = self._AttemptTimeout(deadline)
+                    result = await _PostUMIAsync(self.transport, self.ip, self.password, cmd, args, self._GetRequestID(), timeout=timeout,
+                                               codec=self.codec)
+                except DeadlineExceeded:
+                    raise
+                except Exception as ex:
+                    delay = self._RetryDelay(cmd, ex, attempt, deadline)
+                    if delay is None:
+                        raise
+                else:
+                    self.circuitBreaker.RecordSuccess()
+                    return result
+                finally:
+                    if self.dispatcher is not None:
+                        self.dispatcher.Release()
+                await asyncio.sleep(delay)
+        finally:
+            # A trial that ended without an answer or a network error, e.g. a bad response, the deadline or a
+            # cancellation; once the trial was recorded this does nothing
+            self.circuitBreaker.EndTrial(trial)
+
+    async def StartCleaning(self):
+        """
+        Start a cleaning cycle
+        """
+        await self._PostToRobot("set", ["cmd", {"op" : "start"}])
+
+    async def PauseCleaning(self):
+        """
+        Pause the current cleaning cycle
+        """
+        await self._PostToRobot("set", ["cmd", {"op" : "pause"}])
+
+    async def ResumeCleaning(self):
+        """
+        Resume a paused cleaning cycle
+        """
+        await self._PostToRobot("set", ["cmd", {"op" : "resume"}])
+
+    async def EndCleaning(self):
+        """
+        End the current cleaning cycle
+        """
+        await self._PostToRobot("set", ["cmd", {"op" : "stop"}])
+
+    async def ReturnHome(self):
+        """
+        Send the robot back to the home dock
+        """
+        await self._PostToRobot("set", ["cmd", {"op" : "dock"}])
+
+    async def GetCleaningPreferences(self):
+        """
+        Get this robot's cleaning preferences
+
+        Returns:
+            A dictionary of preferences (dict)
+        """
+        return self._TransformCleaningPreferences(await self._PostToRobot("get", "prefs"))
+
+    async def GetTime(self):
+        """
+        Get the time this robot is set to
+
+        Returns:
+            A dictionary with the time of day and day of week (dict)
+        """
+        return self._TransformTime(await self._PostToRobot("get", "time"))
+
+    async def GetSchedule(self):
+        """
+        Get the cleaning schedule for this robot
+
+        Returns:
+            A dictionary representing the schedule per day (dict)
+        """
+        return self._TransformSchedule(await self._PostToRobot("get", "week"))
+
+    async def GetMission(self):
+        """
+        Get the real-time status and position of the robot
+
+        Returns:
+            A dictionary with the current robot status (dict)
+        """
+        return self._TransformMission(await self._PostToRobot("get", "mssn"))
+
+    async def GetMissionSnapshot(self):
+        """
+        Get the real-time status and position of the robot as a compact typed object
+
+        Returns:
+            The current robot status (MissionSnapshot)
+        """
+        from .mission import MissionSnapshot
+        return MissionSnapshot.FromMission(await self.GetMission())
+
+    async def WatchMission(self, interval=5, keyframeEvery=None, keyframeInterval=None):
+        """
+        Poll GetMission and yield only what changes, with a full keyframe first and every so often after.  See
+        Robot.WatchMission
+
+        Returns:
+            An async generator of changes (async generator of mission.MissionChange)
+        """
+        from .mission import MissionWatcher, DEFAULT_KEYFRAME_EVERY, DEFAULT_KEYFRAME_INTERVAL
+        watcher = MissionWatcher(DEFAULT_KEYFRAME_EVERY if keyframeEvery is None else keyframeEvery,
+                                 DEFAULT_KEYFRAME_INTERVAL if keyframeInterval is None else keyframeInterval)
+        while True:
+            start = time.monotonic()
+            change = watcher.Update(await self.GetMission())
+            if change is not None:
+                yield change
+            await asyncio.sleep(max(0, interval - (time.monotonic() - start)))
+
+    async def GetWiFiDetails(self):
+        """
+        Get detailed information about the robot's WiFi connection
+
+        Returns:
+            A dictionary of wifi information (dict)
+        """
+        return self._TransformWiFiDetails(await self._PostToRobot("get", "wlstat"))
+
+    async def GetWiFiStatus(self):
+        """
+        Get a simple check of the robot's WiFi status
+
+        Returns:
+            A dictionary of status (dict)
+        """
+        return self._TransformWiFiStatus(await self._PostToRobot("get", "wllaststat"))
+
+    async def GetCloudConfig(self):
+        return await self._PostToRobot("get", "cloudcfg")
+
+    async def GetSKU(self):
+        return await self._PostToRobot("get", "sku")
+
+    async def GetSys(self):
+        return await self._PostToRobot("get", "sys")
+
+    async def GetBBRun(self):
+        return await self._PostToRobot("get", "bbrun")
+
+    async def GetWiFiSettings(self):
+        return await self._PostToRobot("get", "wlconfig")
+
+    async def GetSnapshot(self, resources=("prefs", "mssn")):
+        """
+        Get several "get" resources from the robot at once, in a single request if the robot supports it or
+        concurrently otherwise.  See Robot.GetSnapshot
+
+        Args:
+            resources:  the names of the resources to get (list of str)
+
+        Returns:
+            A dictionary of decoded results keyed by resource name (dict)
+        """
+        raw, missing = self._ReadSnapshotCache(self._CheckSnapshotResources(resources))
+
+        if len(missing) > 1 and self.supportsMultiGet is not False:
+            generations = [self._CacheGeneration("get", resource) for resource in missing]
+            try:
+                res = await self._PostToRobot("get", missing)
+            except RobotError:
+                res = None
+            if self._CheckMultiGetResult(missing, res):
+                for resource, generation in zip(missing, generations):
+                    self._WriteCache("get", resource, res[resource], generation)
+                    raw[resource] = res[resource]
+                missing = []
+
+        results = await asyncio.gather(*[self._PostToRobot("get", resource) for resource in missing])
+        raw.update(zip(missing, results))
+        return self._TransformSnapshot(raw)
+
+    async def GetStatus(self):
+        """
+        Get a combined view of preferences and mission, fetched concurrently
+        """
+        snapshot = await self.GetSnapshot(["prefs", "mssn"])
+        return {
+            "cleaningPreferences" : snapshot["prefs"],
+            "mission" : snapshot["mssn"]
+        }
+
+    async def SetCleaningPreferences(self, prefs):
+        """
+        Set the cleaning preferences for this robot. All of the fields are
+        required in the preferences dictionary, even if you are not changing
+        them.
+
+        Args:
+            prefs:  a dictionary of preferences
+        """
+        await self._PostToRobot("set", ["prefs", self._BuildCleaningPreferences(prefs)])
+
+    def PreferencesTransaction(self, skipUnchanged=True):
+        """
+        Start a batch of cleaning preference changes that are written in a single request
+
+        Args:
+            skipUnchanged:  do not send the write if no preference was changed (bool)
+
+        Returns:
+            A transaction to use as an async context manager (AsyncPreferencesTransaction)
+        """
+        return AsyncPreferencesTransaction(self, skipUnchanged=skipUnchanged)
+
+    async def _SetPreference(self, name, newValue):
+        """
+        Change a single cleaning preference
+
+        Args:
+            name:       the name of the preference (str)
+            newValue:   the value to set
+        """
+        async with self.PreferencesTransaction() as transaction:
+            transaction.Set(name, newValue)
+
+    async def SetCarpetBoost(self, newValue):
+        """
+        Set the Carpet Boost cleaning preference
+
+        Args:
+            newValue:  the value to set (CarpetBoost)
+        """
+        assert isinstance(newValue, CarpetBoost), "newValue must be a CarpetBoost enum value"
+        await self._SetPreference(CarpetBoost.PrefName(), newValue)
+
+    async def SetCleaningPasses(self, newValue):
+        """
+        Set the Cleaning Passes cleaning preference
+
+        Args:
+            newValue:  the value to set (CleaningPasses)
+        """
+        assert isinstance(newValue, CleaningPasses), "newValue must be a CleaningPasses enum value"
+        await self._SetPreference(CleaningPasses.PrefName(), newValue)
+
+    async def SetFinishWhenBinFull(self, newValue):
+        """
+        Set the Finish When Bin Full cleaning preference
+
+        Args:
+            newValue:  the value to set (FinishWhenBinFull)
+        """
+        assert isinstance(newValue, FinishWhenBinFull), "newValue must be a FinishWhenBinFull enum value"
+        await self._SetPreference(FinishWhenBinFull.PrefName(), newValue)
+
+    async def SetEdgeClean(self, newValue):
+        """
+        Set the Edge Clean cleaning preference
+
+        Args:
+            newValue:  the value to set (EdgeClean)
+        """
+        assert isinstance(newValue, EdgeClean), "newValue must be an EdgeClean enum value"
+        await self._SetPreference(EdgeClean.PrefName(), newValue)
+
+    async def SetTimezone(self, newValue):
+        """
+        Set the robot's timezone. The time zone must be a tz database name.
+
+        Args:
+            newValue:   the time zone name (str)
+        """
+        await self._SetPreference("timezone", newValue)
+
+    async def SetTime(self, newTime):
+        """
+        Set the robot's time. The robot only cares about weekday, hour and
+        minute.
+
+        Args:
+            newTime:    the time to set the robot to (datetime)
+        """
+        await self._PostToRobot("set", ["time", self._BuildTime(newTime)])
+
+    async def SetTimeNow(self):
+        """
+        Set the robot's time to the current time
+        """
+        await self.SetTime(datetime.datetime.now())
+
+    async def SetSchedule(self, newSchedule):
+        """
+        Set the cleaning schedule for this robot.
+
+        Args:
+            newSchedule:    the schedule to set (dict)
+        """
+        await self._PostToRobot("set", ["week", self._BuildSchedule(newSchedule)])
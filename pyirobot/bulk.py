@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+"""
+Bulk decoding of archived preference flags and mission records
+
+Each function takes a whole column of raw values, e.g. the "flags" field of a
+million archived "prefs" responses, and decodes it in one vectorized pass.
+The results are columns of integer codes:
+
+    CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean, ReadyStatus:
+        the enum value, with the Unknown value for anything unrecognized
+    BinStatus:
+        0 for Normal, 1 for Full, 2 for Missing
+    RobotStatus:
+        the index of the status in ROBOT_STATUSES, with 0 for Unknown
+
+and ToEnums converts a column of codes into the enums themselves.  Decoding
+follows exactly the same rules as Robot.GetCleaningPreferences and
+Robot.GetMission.
+
+If NumPy is installed the inputs are converted to NumPy arrays and the
+results are NumPy arrays; otherwise the results are array.array columns.
+"""
+
+from __future__ import print_function
+import array
+import collections
+from . import BinStatus, MissionState, ReadyStatus, RobotStatus, _ErrorMessages, _PreferenceDecoders
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The RobotStatus for each robot status code
+ROBOT_STATUSES = tuple(RobotStatus)
+
+_RobotStatusCodes = dict((status.value, code) for code, status in enumerate(ROBOT_STATUSES))
+_CleaningCode = ROBOT_STATUSES.index(RobotStatus.Cleaning)
+_ResumingCode = ROBOT_STATUSES.index(RobotStatus.Resuming)
+
+def _CodeTable(codes, size, default):
+    """
+    Build a list that maps each value in range(size) to its code
+
+    Args:
+        codes:      the code for each known value (dict)
+        size:       the number of entries in the table (int)
+        default:    the code for values not in codes (int)
+
+    Returns:
+        The table (list)
+    """
+    table = [default] * size
+    for value, code in codes.items():
+        if 0 <= value < size:
+            table[value] = code
+    return table
+
+# (preference name, mask, table of codes indexed by the masked flags)
+_PreferenceTables = [(pref_name, mask, _CodeTable(dict((value, value) for value in values), mask + 1, conf.Unknown.value))
+                     for conf, pref_name, mask, values in _PreferenceDecoders]
+
+_ReadyStatusTable = _CodeTable(dict((status.value, status.value) for status in ReadyStatus if status.value >= 0),
+                               max(status.value for status in ReadyStatus) + 1,
+                               ReadyStatus.Unknown.value)
+
+# Indexed by the BinFull and BinMissing bits of the mission flags; BinMissing takes priority
+_BinStatusTable = [0, 1, 2, 2]
+_BinFlagsMask = MissionState.BinFull.value | MissionState.BinMissing.value
+
+# The enum for each code, for ToEnums
+_EnumsByCode = dict((conf, dict((pref.value, pref) for pref in conf)) for conf, _, _, _ in _PreferenceDecoders)
+_EnumsByCode[ReadyStatus] = dict((status.value, status) for status in ReadyStatus)
+# Most of the BinStatus values are accidentally single element tuples
+_EnumsByCode[BinStatus] = dict((status.value[0] if isinstance(status.value, tuple) else status.value, status) for status in BinStatus)
+_EnumsByCode[RobotStatus] = dict(enumerate(ROBOT_STATUSES))
+
+_CodesByEnum = dict((enum, code) for enums in _EnumsByCode.values() for code, enum in enums.items())
+
+def _IntColumn(values):
+    """
+    Convert a column of raw integers for the NumPy path
+
+    Returns:
+        The values (numpy.ndarray)
+    """
+    return numpy.asarray(values, dtype=numpy.int64)
+
+def _Lookup(values, table, default):
+    """
+    Look up each value in a code table
+
+    Args:
+        values:     the raw values (sequence of int)
+        table:      the code for each value in range(len(table)) (list)
+        default:    the code for values outside of the table (int)
+
+    Returns:
+        The codes (numpy.ndarray or array.array)
+    """
+    size = len(table)
+    if numpy is not None:
+        values = _IntColumn(values)
+        in_range = (values >= 0) & (values < size)
+        codes = numpy.array(table, dtype=numpy.int16)[numpy.where(in_range, values, 0)]
+        return numpy.where(in_range, codes, default).astype(numpy.int16)
+    return array.array("h", [table[value] if 0 <= value < size else default for value in values])
+
+def DecodePreferencesFlags(flags):
+    """
+    Decode a column of "flags" values from preferences calls
+
+    Args:
+        flags:  the raw flags values (sequence of int)
+
+    Returns:
+        A column of enum values for each preference, keyed by preference name (OrderedDict)
+    """
+    columns = collections.OrderedDict()
+    if numpy is not None:
+        flags = _IntColumn(flags)
+        for pref_name, mask, table in _PreferenceTables:
+            columns[pref_name] = numpy.array(table, dtype=numpy.int16)[flags & mask]
+        return columns
+    for pref_name, mask, table in _PreferenceTables:
+        columns[pref_name] = array.array("h", [table[flag & mask] for flag in flags])
+    return columns
+
+def DecodeReadyStatus(notReady):
+    """
+    Decode a column of "notReady" values from mission calls
+
+    Args:
+        notReady:   the raw notReady values (sequence of int)
+
+    Returns:
+        A column of ReadyStatus values (numpy.ndarray or array.array)
+    """
+    return _Lookup(notReady, _ReadyStatusTable, ReadyStatus.Unknown.value)
+
+def DecodeBinStatus(flags):
+    """
+    Decode the bin status from a column of "flags" values from mission calls
+
+    Args:
+        flags:  the raw flags values (sequence of int)
+
+    Returns:
+        A column of bin status codes (numpy.ndarray or array.array)
+    """
+    if numpy is not None:
+        return numpy.array(_BinStatusTable, dtype=numpy.int16)[_IntColumn(flags) & _BinFlagsMask]
+    return array.array("h", [_BinStatusTable[flag & _BinFlagsMask] for flag in flags])
+
+def DecodeRobotStatus(phase, flags):
+    """
+    Decode the robot status from columns of "phase" and "flags" values from mission calls
+
+    Args:
+        phase:  the raw phase values (sequence of str)
+        flags:  the raw flags values (sequence of int)
+
+    Returns:
+        A column of robot status codes, indexes into ROBOT_STATUSES (numpy.ndarray or array.array)
+    """
+    if numpy is not None:
+        # There are only a handful of distinct phases, so decode each one once
+        unique, inverse = numpy.unique(numpy.asarray(phase), return_inverse=True)
+        codes = numpy.array([_RobotStatusCodes.get(value, 0) for value in unique.tolist()], dtype=numpy.int16)[inverse.ravel()]
+        resuming = (codes == _CleaningCode) & ((_IntColumn(flags) & MissionState.Resuming.value) != 0)
+        codes[resuming] = _ResumingCode
+        return codes
+    codes = array.array("h", [_RobotStatusCodes.get(value, 0) for value in phase])
+    for idx, flag in enumerate(flags):
+        if codes[idx] == _CleaningCode and flag & MissionState.Resuming.value:
+            codes[idx] = _ResumingCode
+    return codes
+
+def DecodeErrorMessages(errors):
+    """
+    Look up the message for a column of "error" values from mission calls
+
+    Args:
+        errors: the raw error values (sequence of int)
+
+    Returns:
+        The message for each error, or None for no error or an unknown error (list)
+    """
+    if numpy is not None:
+        unique, inverse = numpy.unique(_IntColumn(errors), return_inverse=True)
+        messages = numpy.array([_ErrorMessages.get(value) for value in unique.tolist()], dtype=object)
+        return messages[inverse.ravel()].tolist()
+    return [_ErrorMessages.get(error) for error in errors]
+
+def DecodeMissions(flags, notReady, phase, error=None):
+    """
+    Decode columns of mission records
+
+    Args:
+        flags:      the raw flags values (sequence of int)
+        notReady:   the raw notReady values (sequence of int)
+        phase:      the raw phase values (sequence of str)
+        error:      the raw error values (sequence of int)
+
+    Returns:
+        Columns of readyStatus, binStatus and robotStatus codes, and error codes and errorMessage if error is given (OrderedDict)
+    """
+    columns = collections.OrderedDict([
+        ("readyStatus", DecodeReadyStatus(notReady)),
+        ("binStatus", DecodeBinStatus(flags)),
+        ("robotStatus", DecodeRobotStatus(phase, flags))
+    ])
+    if error is not None:
+        columns["error"] = _IntColumn(error) if numpy is not None else array.array("l", error)
+        columns["errorMessage"] = DecodeErrorMessages(error)
+    return columns
+
+def ToEnums(codes, enumClass):
+    """
+    Convert a column of codes from one of the decode functions into enums
+
+    Args:
+        codes:      the codes (sequence of int)
+        enumClass:  the enum the codes are for, e.g. CarpetBoost or RobotStatus (Enum)
+
+    Returns:
+        The enums (list)
+    """
+    enums = _EnumsByCode[enumClass]
+    if numpy is not None:
+        low = min(enums)
+        table = numpy.empty(max(enums) - low + 1, dtype=object)
+        for code, enum in enums.items():
+            table[code - low] = enum
+        return table[_IntColumn(codes) - low].tolist()
+    return [enums[code] for code in codes]
+
+def ToCode(enum):
+    """
+    Get the code a decode function uses for an enum, e.g. for comparing against a column of codes
+
+    Args:
+        enum:   the enum (CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean, ReadyStatus, BinStatus or RobotStatus)
+
+    Returns:
+        The code (int)
+    """
+    return _CodesByEnum[enum]
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Read-through cache for robot resources that rarely change
+"""
+
+from __future__ import print_function
+import collections
+import copy
+import threading
+import time
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+# Default time to live in seconds for each cacheable "get" resource
+DEFAULT_TTLS = {
+    "sys" : 3600,
+    "sku" : 86400,
+    "cloudcfg" : 3600,
+    "wlconfig" : 3600,
+    "prefs" : 300,
+    "week" : 300
+}
+
+# The cached resources affected by each "set", when it is not just the resource being set
+_SetInvalidates = {
+    "cmd" : ("mssn",),
+    "prefs" : ("prefs",),
+    "wlconfig" : ("wlconfig", "wlstat", "wllaststat")
+}
+
+class ResourceCache(object):
+    """
+    A TTL cache of raw "get" results, keyed by robot and resource
+
+    Each resource has its own time to live, and only resources with a TTL are
+    cached.  The cache holds at most maxSize entries and evicts the least
+    recently used entry when it is full, so a single cache can be shared by
+    every robot in a fleet.  Any "set" sent through a Robot using the cache
+    invalidates the entries it affects.
+
+    Every invalidation also moves the entry's generation on, so a "get" that
+    was already in flight when a "set" was sent does not put the value from
+    before the write back into the cache.
+    """
+
+    def __init__(self, ttls=None, maxSize=1024, clock=_monotonic):
+        """
+        Args:
+            ttls:       the time to live in seconds for each resource to cache (dict)
+            maxSize:    the maximum number of entries to hold (int)
+            clock:      function returning the current time in seconds (callable)
+        """
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.maxSize = maxSize
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        # Invalidation counts by (robotIP, resource), with resource None for invalidating every resource of a robot
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def Cacheable(self, resource):
+        """
+        Check if a resource is cached
+
+        Args:
+            resource:   the resource name (str)
+
+        Returns:
+            True if the resource has a TTL (bool)
+        """
+        return self.ttls.get(resource) is not None
+
+    def Get(self, robotIP, resource):
+        """
+        Look up a resource in the cache
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            resource:   the resource name (str)
+
+        Returns:
+            A copy of the cached value, or None if it is not cached or has expired (dict)
+        """
+        key = (robotIP, resource)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if self.clock() >= expires:
+                del self._entries[key]
+                return None
+            self._entries.pop(key)
+            self._entries[key] = entry
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def Generation(self, robotIP, resource):
+        """
+        Get how often an entry has been invalidated, to pass to Put with a value fetched after this call
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            resource:   the resource name (str)
+
+        Returns:
+            The generation of the entry (tuple)
+        """
+        with self._lock:
+            return self._Generation(robotIP, resource)
+
+    def _Generation(self, robotIP, resource):
+        return (self._generations.get((robotIP, None), 0), self._generations.get((robotIP, resource), 0))
+
+    def Put(self, robotIP, resource, value, fetched=True, generation=None):
+        """
+        Store a value fetched from a robot.  Each value stored counts as a miss,
+        since it had to be fetched from the robot.
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            resource:   the resource name (str)
+            value:      the raw result of the "get" (dict)
+            fetched:    False to prime the cache with a value known some other way, which is not a miss (bool)
+            generation: the Generation of the entry from before the value was fetched; the value is not stored if
+                        the entry has been invalidated since (tuple)
+        """
+        if not self.Cacheable(resource):
+            return
+        key = (robotIP, resource)
+        entry = (self.clock() + self.ttls[resource], copy.deepcopy(value))
+        with self._lock:
+            if generation is not None and generation != self._Generation(robotIP, resource):
+                return
+            if fetched:
+                self.misses += 1
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxSize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def Invalidate(self, robotIP, resource=None):
+        """
+        Remove entries from the cache
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            resource:   the resource to remove, or None to remove every resource for this robot (str)
+        """
+        with self._lock:
+            self._generations[(robotIP, resource)] = self._generations.get((robotIP, resource), 0) + 1
+            if resource is not None:
+                self._entries.pop((robotIP, resource), None)
+                return
+            for key in [key for key in self._entries if key[0] == robotIP]:
+                del self._entries[key]
+
+    def InvalidateForSet(self, robotIP, resource):
+        """
+        Remove the entries affected by a "set" request
+
+        Args:
+            robotIP:    the IP address of the robot (str)
+            resource:   the resource that was set (str)
+        """
+        for affected in _SetInvalidates.get(resource, (resource,)):
+            self.Invalidate(robotIP, affected)
+
+    def Clear(self):
+        """
+        Remove every entry from the cache
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def Stats(self):
+        """
+        Get the cache counters
+
+        Returns:
+            A dictionary of hits, misses, evictions and size (dict)
+        """
+        with self._lock:
+            return {
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions,
+                "size" : len(self._entries)
+            }
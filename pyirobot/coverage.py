@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+"""
+Coverage maps built from the robotPosition reported by GetMission
+
+A TrajectoryRecorder keeps the positions from successive polls in compact
+arrays, and a CoverageGrid rasterizes the path between them into a grid of
+visit counts that can be used as a coverage heatmap.  The grid is updated
+incrementally as each poll arrives, and can also be rebuilt from a whole
+trajectory in one vectorized pass when NumPy is installed.
+"""
+
+from __future__ import print_function
+import array
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def _Position(mission):
+    """
+    Get the position from a GetMission result
+
+    Args:
+        mission:    the result of GetMission or GetMissionSnapshot (dict or MissionSnapshot)
+
+    Returns:
+        A tuple of (x, y, theta), or None if there is no position
+    """
+    if isinstance(mission, dict):
+        position = mission.get("robotPosition")
+        if position is None:
+            return None
+        return position["point"]["x"], position["point"]["y"], position["theta"]
+    if mission.x is None:
+        return None
+    return mission.x, mission.y, mission.theta
+
+class TrajectoryRecorder(object):
+    """
+    The positions of a robot over time, stored in compact arrays rather than
+    as Python objects per point
+    """
+
+    def __init__(self):
+        self.x = array.array("i")
+        self.y = array.array("i")
+        self.theta = array.array("i")
+        self.timestamps = array.array("d")
+
+    def __len__(self):
+        return len(self.x)
+
+    def Append(self, mission, timestamp=None):
+        """
+        Record the position from a mission poll
+
+        Args:
+            mission:    the result of GetMission or GetMissionSnapshot (dict or MissionSnapshot)
+            timestamp:  the time of the poll, or None for now (float)
+
+        Returns:
+            True if the mission had a position to record (bool)
+        """
+        position = _Position(mission)
+        if position is None:
+            return False
+        self.x.append(position[0])
+        self.y.append(position[1])
+        self.theta.append(position[2])
+        self.timestamps.append(time.time() if timestamp is None else timestamp)
+        return True
+
+    def Clear(self):
+        """
+        Remove all of the recorded positions
+        """
+        for column in (self.x, self.y, self.theta, self.timestamps):
+            del column[:]
+
+class CoverageGrid(object):
+    """
+    A grid of how many times the robot's path passed through each cell
+
+    The path between successive positions is rasterized as a straight line, so
+    each new position costs time proportional to the distance moved since the
+    last one, which is bounded by the poll interval, not by the size of the
+    trajectory.  The grid grows as needed to hold every position.
+    """
+
+    def __init__(self, cellSize=10, initialCells=64):
+        """
+        Args:
+            cellSize:       the width and height of each cell, in robot position units (int)
+            initialCells:   the initial width and height of the grid, in cells (int)
+        """
+        self.cellSize = cellSize
+        self.originX = -(initialCells // 2)
+        self.originY = -(initialCells // 2)
+        self.width = initialCells
+        self.height = initialCells
+        self._cells = self._NewCells(self.width, self.height)
+        self._last = None
+
+    @staticmethod
+    def _NewCells(width, height):
+        if numpy is not None:
+            return numpy.zeros((height, width), dtype=numpy.uint32)
+        return array.array("I", [0]) * (width * height)
+
+    def _Include(self, minX, minY, maxX, maxY):
+        """
+        Grow the grid if needed so that it includes a range of cells, doubling
+        its size so that growth is amortized
+        """
+        if minX >= self.originX and minY >= self.originY and \
+           maxX < self.originX + self.width and maxY < self.originY + self.height:
+            return
+        new_origin_x = min(self.originX, minX)
+        new_origin_y = min(self.originY, minY)
+        new_width = self.width
+        while new_origin_x + new_width <= max(maxX, self.originX + self.width - 1):
+            new_width *= 2
+        new_height = self.height
+        while new_origin_y + new_height <= max(maxY, self.originY + self.height - 1):
+            new_height *= 2
+        # Leave room to grow in the direction we just grew
+        if new_origin_x < self.originX:
+            new_origin_x -= new_width // 4
+            new_width += new_width // 4
+        if new_origin_y < self.originY:
+            new_origin_y -= new_height // 4
+            new_height += new_height // 4
+
+        cells = self._NewCells(new_width, new_height)
+        off_x = self.originX - new_origin_x
+        off_y = self.originY - new_origin_y
+        if numpy is not None:
+            cells[off_y:off_y + self.height, off_x:off_x + self.width] = self._cells
+        else:
+            for row in range(self.height):
+                start = (row + off_y) * new_width + off_x
+                cells[start:start + self.width] = self._cells[row * self.width:(row + 1) * self.width]
+        self._cells = cells
+        self.originX, self.originY, self.width, self.height = new_origin_x, new_origin_y, new_width, new_height
+
+    def _Mark(self, cellX, cellY):
+        if numpy is not None:
+            self._cells[cellY - self.originY, cellX - self.originX] += 1
+        else:
+            self._cells[(cellY - self.originY) * self.width + cellX - self.originX] += 1
+
+    def Add(self, x, y):
+        """
+        Add the next position on the path
+
+        Args:
+            x:  the x position (int)
+            y:  the y position (int)
+        """
+        cell_x = x // self.cellSize
+        cell_y = y // self.cellSize
+        if self._last is None:
+            self._Include(cell_x, cell_y, cell_x, cell_y)
+            self._Mark(cell_x, cell_y)
+        else:
+            last_x, last_y = self._last
+            self._Include(min(last_x, cell_x), min(last_y, cell_y), max(last_x, cell_x), max(last_y, cell_y))
+            dx = cell_x - last_x
+            dy = cell_y - last_y
+            steps = max(abs(dx), abs(dy))
+            # Integer DDA, rounding half up, so this matches AddTrajectory exactly
+            for step in range(1, steps + 1):
+                self._Mark(last_x + (2 * dx * step + steps) // (2 * steps),
+                           last_y + (2 * dy * step + steps) // (2 * steps))
+        self._last = (cell_x, cell_y)
+
+    def AddTrajectory(self, xs, ys):
+        """
+        Add a sequence of positions on the path.  With NumPy this is done in a single vectorized pass
+
+        Args:
+            xs: the x positions (sequence of int)
+            ys: the y positions (sequence of int)
+        """
+        if numpy is None or len(xs) == 0:
+            for x, y in zip(xs, ys):
+                self.Add(x, y)
+            return
+
+        cell_x = numpy.floor_divide(numpy.asarray(xs, dtype=numpy.int64), self.cellSize)
+        cell_y = numpy.floor_divide(numpy.asarray(ys, dtype=numpy.int64), self.cellSize)
+        if self._last is None:
+            self.Add(int(xs[0]), int(ys[0]))
+            cell_x = cell_x[1:]
+            cell_y = cell_y[1:]
+        if len(cell_x) == 0:
+            return
+        start_x = numpy.concatenate(([self._last[0]], cell_x[:-1]))
+        start_y = numpy.concatenate(([self._last[1]], cell_y[:-1]))
+        self._Include(int(min(start_x.min(), cell_x.min())), int(min(start_y.min(), cell_y.min())),
+                      int(max(start_x.max(), cell_x.max())), int(max(start_y.max(), cell_y.max())))
+
+        # Expand every segment into its cells, excluding the cell it starts in
+        dx = cell_x - start_x
+        dy = cell_y - start_y
+        steps = numpy.maximum(numpy.abs(dx), numpy.abs(dy))
+        segment = numpy.repeat(numpy.arange(len(steps)), steps)
+        step = numpy.arange(len(segment)) - numpy.repeat(numpy.cumsum(steps) - steps, steps) + 1
+        seg_steps = steps[segment]
+        mark_x = start_x[segment] + (2 * dx[segment] * step + seg_steps) // (2 * seg_steps)
+        mark_y = start_y[segment] + (2 * dy[segment] * step + seg_steps) // (2 * seg_steps)
+        numpy.add.at(self._cells, (mark_y - self.originY, mark_x - self.originX), 1)
+        self._last = (int(cell_x[-1]), int(cell_y[-1]))
+
+    def Count(self, x, y):
+        """
+        Get how many times the path passed through the cell containing a position
+
+        Args:
+            x:  the x position (int)
+            y:  the y position (int)
+
+        Returns:
+            The visit count (int)
+        """
+        cell_x = x // self.cellSize - self.originX
+        cell_y = y // self.cellSize - self.originY
+        if not (0 <= cell_x < self.width and 0 <= cell_y < self.height):
+            return 0
+        if numpy is not None:
+            return int(self._cells[cell_y, cell_x])
+        return self._cells[cell_y * self.width + cell_x]
+
+    def Grid(self):
+        """
+        Get the grid of visit counts.  Row 0, column 0 is the cell at (originX, originY)
+
+        Returns:
+            The counts (2D numpy.ndarray, or list of array.array rows without NumPy)
+        """
+        if numpy is not None:
+            return self._cells
+        return [self._cells[row * self.width:(row + 1) * self.width] for row in range(self.height)]
+
+    def CoveredCells(self):
+        """
+        Get the number of cells the path has passed through
+
+        Returns:
+            The number of cells (int)
+        """
+        if numpy is not None:
+            return int(numpy.count_nonzero(self._cells))
+        return sum(1 for count in self._cells if count)
+
+    def CoveredArea(self):
+        """
+        Get the area of the cells the path has passed through
+
+        Returns:
+            The area in square robot position units (int)
+        """
+        return self.CoveredCells() * self.cellSize * self.cellSize
+
+    def Clear(self):
+        """
+        Reset the grid
+        """
+        if numpy is not None:
+            self._cells.fill(0)
+        else:
+            self._cells = self._NewCells(self.width, self.height)
+        self._last = None
+
+class CoverageMap(object):
+    """
+    A live coverage map for one robot, fed with mission polls
+
+    A new map is started whenever the mission number (nMssn) changes.
+
+        coverage = dict((robot, CoverageMap()) for robot in robots)
+        poller = MissionPoller(robots, callback=lambda robot, mission, error: mission and coverage[robot].Update(mission))
+    """
+
+    def __init__(self, cellSize=10):
+        """
+        Args:
+            cellSize:   the width and height of each grid cell, in robot position units (int)
+        """
+        self.trajectory = TrajectoryRecorder()
+        self.grid = CoverageGrid(cellSize=cellSize)
+        self.missionNumber = None
+
+    def Update(self, mission, timestamp=None):
+        """
+        Add the position from a mission poll
+
+        Args:
+            mission:    the result of GetMission or GetMissionSnapshot (dict or MissionSnapshot)
+            timestamp:  the time of the poll, or None for now (float)
+        """
+        number = mission.get("nMssn") if isinstance(mission, dict) else mission.nMssn
+        if number != self.missionNumber:
+            self.Reset()
+            self.missionNumber = number
+        if self.trajectory.Append(mission, timestamp):
+            self.grid.Add(self.trajectory.x[-1], self.trajectory.y[-1])
+
+    def Reset(self):
+        """
+        Start a new map
+        """
+        self.trajectory.Clear()
+        self.grid.Clear()
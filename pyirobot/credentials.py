@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+"""
+Persistent store of robot credentials, BLIDs and static robot information
+
+GetPassword needs someone to hold the robot's home button, and GetBLID,
+GetSys and GetSKU each cost a round trip, so a service that manages a fleet
+should learn them once and keep them.  CredentialStore keeps them in a SQLite
+database, indexed by both IP address and BLID, and builds Robots or a
+RobotFleet straight from it with no network calls:
+
+    store = CredentialStore("/var/lib/robots/credentials.db")
+    store.Enroll("192.168.1.20")            # after holding the home button
+    with store.Fleet() as fleet:
+        print(fleet.GetMission())
+
+The database is in write-ahead log mode, so any number of readers, in this or
+other processes, can read while one writer updates it, and every update is a
+single transaction.
+"""
+
+from __future__ import print_function
+import json
+import sqlite3
+import threading
+import time
+from . import Robot, _DecodeBLID
+
+DEFAULT_BUSY_TIMEOUT = 30
+
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS robots (
+    ip TEXT PRIMARY KEY,
+    blid TEXT UNIQUE,
+    password TEXT NOT NULL,
+    name TEXT,
+    sys TEXT,
+    sku TEXT,
+    updated REAL NOT NULL
+)
+"""
+
+_COLUMNS = "ip, blid, password, name, sys, sku, updated"
+
+# Keeps the stored value of any field the update leaves out
+_UPSERT = """
+INSERT INTO robots (ip, blid, password, name, sys, sku, updated) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (ip) DO UPDATE SET
+    blid = COALESCE(excluded.blid, blid),
+    password = excluded.password,
+    name = COALESCE(excluded.name, name),
+    sys = COALESCE(excluded.sys, sys),
+    sku = COALESCE(excluded.sku, sku),
+    updated = excluded.updated
+"""
+
+class CredentialRecord(object):
+    """
+    What the store knows about one robot
+
+    Attributes:
+        ip:         the robot's IP address (str)
+        blid:       the robot BLID, or None if it is not known (str)
+        password:   the robot password (str)
+        name:       the robot name, or None if it is not known (str)
+        sys:        the result of GetSys, or None if it is not known (dict)
+        sku:        the result of GetSKU, or None if it is not known (dict)
+        updated:    when the record was last written, in seconds since the epoch (float)
+    """
+    __slots__ = ("ip", "blid", "password", "name", "sys", "sku", "updated")
+
+    def __init__(self, ip, blid, password, name=None, sys=None, sku=None, updated=None):
+        self.ip = ip
+        self.blid = blid
+        self.password = password
+        self.name = name
+        self.sys = sys
+        self.sku = sku
+        self.updated = updated
+
+    @classmethod
+    def _FromRow(cls, row):
+        ip, blid, password, name, sys_info, sku, updated = row
+        return cls(ip, blid, password, name, json.loads(sys_info) if sys_info else None, json.loads(sku) if sku else None,
+                   updated)
+
+    def __eq__(self, other):
+        if not isinstance(other, CredentialRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        # Leave the password out, so records can be logged
+        return "CredentialRecord(ip={!r}, blid={!r}, name={!r})".format(self.ip, self.blid, self.name)
+
+def _DumpJSON(value):
+    return None if value is None else json.dumps(value, separators=(",", ":"), sort_keys=True)
+
+class CredentialStore(object):
+    """
+    A SQLite database of robot credentials, keyed by IP address and by BLID
+
+    Each thread gets its own connection to the database, so one store can be
+    shared between threads.  A robot has one record; if a robot with a known
+    BLID is stored under a new IP address, for example after its DHCP lease
+    changed, its old record is replaced.
+    """
+
+    def __init__(self, path, busyTimeout=DEFAULT_BUSY_TIMEOUT):
+        """
+        Args:
+            path:           the database file, which is created if it does not exist (str)
+            busyTimeout:    the most seconds to wait for another writer to finish (float)
+        """
+        self.path = path
+        self.busyTimeout = busyTimeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        connection = self._Connection()
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        assert version <= _SCHEMA_VERSION, "{} was written by a newer version of pyirobot".format(path)
+        if version < _SCHEMA_VERSION:
+            with connection:
+                connection.execute(_SCHEMA)
+                connection.execute("PRAGMA user_version = {}".format(_SCHEMA_VERSION))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def __len__(self):
+        return self._Connection().execute("SELECT COUNT(*) FROM robots").fetchone()[0]
+
+    def __contains__(self, robotIP):
+        return self.Get(robotIP) is not None
+
+    def _Connection(self):
+        """
+        Get this thread's connection to the database, opening it if necessary
+
+        Returns:
+            The connection (sqlite3.Connection)
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busyTimeout, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def Put(self, robotIP, password, blid=None, name=None, sys=None, sku=None):
+        """
+        Add or update the record for a robot.  Fields given as None keep their stored value
+
+        Args:
+            robotIP:    the robot's IP address (str)
+            password:   the robot password (str)
+            blid:       the robot BLID (str)
+            name:       the robot name (str)
+            sys:        the result of GetSys (dict)
+            sku:        the result of GetSKU (dict)
+
+        Returns:
+            The stored record (CredentialRecord)
+        """
+        self.PutMany([(robotIP, password, blid, name, sys, sku)])
+        return self.Get(robotIP)
+
+    def PutMany(self, records):
+        """
+        Add or update the records for many robots in a single transaction.  Either all of them are written or none are
+
+        Args:
+            records:    (robotIP, password[, blid[, name[, sys[, sku]]]]) for each robot, or CredentialRecords
+                        (iterable of tuple or CredentialRecord)
+        """
+        now = time.time()
+        rows = []
+        for record in records:
+            if isinstance(record, CredentialRecord):
+                record = (record.ip, record.password, record.blid, record.name, record.sys, record.sku)
+            ip, password, blid, name, sys_info, sku = tuple(record) + (None,) * (6 - len(record))
+            assert ip and password, "every record needs an IP address and a password"
+            if blid is None and sys_info is not None:
+                blid = _DecodeBLID(sys_info)
+            rows.append((ip, blid, password, name, _DumpJSON(sys_info), _DumpJSON(sku), now))
+        connection = self._Connection()
+        with connection:
+            for row in rows:
+                if row[1] is not None:
+                    connection.execute("DELETE FROM robots WHERE blid = ? AND ip != ?", (row[1], row[0]))
+                connection.execute(_UPSERT, row)
+
+    def Get(self, robotIP):
+        """
+        Look up a robot by IP address
+
+        Args:
+            robotIP:    the robot's IP address (str)
+
+        Returns:
+            The record, or None if the robot is not in the store (CredentialRecord)
+        """
+        row = self._Connection().execute("SELECT {} FROM robots WHERE ip = ?".format(_COLUMNS), (robotIP,)).fetchone()
+        return None if row is None else CredentialRecord._FromRow(row)
+
+    def GetByBLID(self, blid):
+        """
+        Look up a robot by BLID
+
+        Args:
+            blid:   the robot BLID (str)
+
+        Returns:
+            The record, or None if the robot is not in the store (CredentialRecord)
+        """
+        row = self._Connection().execute("SELECT {} FROM robots WHERE blid = ?".format(_COLUMNS), (blid,)).fetchone()
+        return None if row is None else CredentialRecord._FromRow(row)
+
+    def Records(self):
+        """
+        Get every record, in IP address order
+
+        Returns:
+            The records (list of CredentialRecord)
+        """
+        rows = self._Connection().execute("SELECT {} FROM robots ORDER BY ip".format(_COLUMNS)).fetchall()
+        return [CredentialRecord._FromRow(row) for row in rows]
+
+    def Remove(self, robotIP):
+        """
+        Remove a robot from the store
+
+        Args:
+            robotIP:    the robot's IP address (str)
+
+        Returns:
+            True if the robot was in the store (bool)
+        """
+        connection = self._Connection()
+        with connection:
+            return connection.execute("DELETE FROM robots WHERE ip = ?", (robotIP,)).rowcount > 0
+
+    def Enroll(self, robotIP, password=None):
+        """
+        Learn a robot's BLID, name and static information from the robot, and store them with its password
+
+        Args:
+            robotIP:    the robot's IP address (str)
+            password:   the robot password, or None to get it with Robot.GetPassword, which needs the home button held
+                        down first (str)
+
+        Returns:
+            The stored record (CredentialRecord)
+        """
+        if password is None:
+            password = Robot.GetPassword(robotIP)
+        with Robot(robotIP, password) as robot:
+            sys_info = robot.GetSys()
+            sku = robot.GetSKU()
+            name = robot.GetCleaningPreferences()["name"]
+        return self.Put(robotIP, password, blid=_DecodeBLID(sys_info), name=name, sys=sys_info, sku=sku)
+
+    def Robots(self, cache=None, robotClass=Robot, **kwargs):
+        """
+        Create a robot object for every robot in the store, with no network calls
+
+        Args:
+            cache:      a cache to give every robot, which is primed with the stored GetSys and GetSKU results so those
+                        are not fetched again.  That is two entries per robot, so a cache with a smaller maxSize is
+                        grown to hold them, or they would be evicted before they are used (ResourceCache)
+            robotClass: the class of robot to create, e.g. aio.AsyncRobot (type)
+            kwargs:     more arguments for each robot, see Robot
+
+        Returns:
+            The robots, in IP address order (list of Robot)
+        """
+        if cache is None:
+            # Skip decoding the static information nobody is going to use
+            rows = self._Connection().execute("SELECT ip, password FROM robots ORDER BY ip").fetchall()
+            return [robotClass(ip, password, **kwargs) for ip, password in rows]
+        robots = []
+        records = self.Records()
+        cache.maxSize = max(cache.maxSize, 2 * len(records))
+        for record in records:
+            if record.sys is not None:
+                cache.Put(record.ip, "sys", record.sys, fetched=False)
+            if record.sku is not None:
+                cache.Put(record.ip, "sku", record.sku, fetched=False)
+            robots.append(robotClass(record.ip, record.password, cache=cache, **kwargs))
+        return robots
+
+    def Fleet(self, maxWorkers=None, cache=None, **kwargs):
+        """
+        Create a RobotFleet of every robot in the store, with no network calls
+
+        Args:
+            maxWorkers: the maximum number of robots to talk to at once, or None for the default (int)
+            cache:      a cache to give every robot, see Robots (ResourceCache)
+            kwargs:     more arguments for each robot, see Robot
+
+        Returns:
+            The fleet (fleet.RobotFleet)
+        """
+        from .fleet import RobotFleet, DEFAULT_MAX_WORKERS
+        return RobotFleet(self.Robots(cache=cache, **kwargs),
+                          maxWorkers=DEFAULT_MAX_WORKERS if maxWorkers is None else maxWorkers)
+
+    def Close(self):
+        """
+        Close every thread's connection to the database
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
@@ -0,0 +1,473 @@
+#!/usr/bin/env python
+"""
+Find robots on the local network
+
+Robots answer iRobot's discovery query, the datagram "irobotmcs" sent to UDP
+port 5678, with a JSON description of themselves:
+
+    {"ver" : "3", "hostname" : "Roomba-3115850251687850", "robotname" : "Kitchen",
+     "ip" : "192.168.1.20", "mac" : "...", "sw" : "v2.4.6-3", "sku" : "R980020", ...}
+
+so one broadcast finds every robot on the same subnet within a second or two.
+Broadcasts do not cross routers, so RobotDiscovery can also sweep address
+ranges, probing each address's /umi endpoint with an unauthenticated
+"get passwd" - the request GetPassword sends, which every robot answers - with
+tight timeouts and many probes in flight at once.  Where the password for an
+address is known the probe asks for "sys" and "sku" instead, which gives the
+robot's BLID and model.
+
+Robots are yielded as soon as they are found:
+
+    discovery = RobotDiscovery(maxConcurrent=512)
+    async for robot in discovery.Discover(["10.20.0.0/16", "10.21.4.0/22"]):
+        print(robot.ip, robot.blid, robot.sku)
+
+From blocking code, DiscoverRobots runs a discovery to the end and returns the
+robots.  A /16 of silent addresses with the default timeouts takes a little over
+two minutes: each of its 65534 addresses costs one 0.5 second connect timeout,
+and DEFAULT_MAX_CONCURRENT (256) of them are waited on at once.  Addresses that
+refuse the connection cost next to nothing.
+"""
+
+from __future__ import print_function
+import asyncio
+import ipaddress
+import json
+import socket
+from . import DefaultCodec, _BuildUMIRequest, _DecodeBLID
+
+DISCOVERY_PORT = 5678
+DISCOVERY_QUERY = b"irobotmcs"
+DEFAULT_BROADCAST_ADDRESS = "255.255.255.255"
+DEFAULT_BROADCAST_TIMEOUT = 3
+DEFAULT_BROADCAST_ATTEMPTS = 3
+DEFAULT_MAX_CONCURRENT = 256
+# The (connect, read) timeouts for each probe.  Robots on a LAN connect in a few milliseconds, and almost every address
+# in a sweep has nothing listening, so the connect timeout is what a sweep's time is spent on
+DEFAULT_PROBE_TIMEOUT = (0.5, 2.0)
+
+# The hostname prefixes robots announce themselves with, followed by the BLID
+_HOSTNAME_PREFIXES = ("Roomba-", "iRobot-")
+
+class DiscoveredRobot(object):
+    """
+    A robot found on the network
+
+    Attributes:
+        ip:         the address to reach the robot at, with a port if it is not the default (str)
+        blid:       the robot BLID, or None if it could not be found out (str)
+        name:       the robot name, or None if it could not be found out (str)
+        sku:        the robot model number, or None if it could not be found out (str)
+        sw:         the robot firmware version, or None if it could not be found out (str)
+        mac:        the robot MAC address, or None if it could not be found out (str)
+        source:     how the robot was found, "broadcast" or "sweep" (str)
+        pairing:    True if the robot gave out its password to the probe, meaning its home button is being held and it
+                    can be enrolled now (bool)
+    """
+    __slots__ = ("ip", "blid", "name", "sku", "sw", "mac", "source", "pairing")
+
+    def __init__(self, ip, blid=None, name=None, sku=None, sw=None, mac=None, source="sweep", pairing=False):
+        self.ip = ip
+        self.blid = blid
+        self.name = name
+        self.sku = sku
+        self.sw = sw
+        self.mac = mac
+        self.source = source
+        self.pairing = pairing
+
+    def __eq__(self, other):
+        if not isinstance(other, DiscoveredRobot):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "DiscoveredRobot(ip={!r}, blid={!r}, sku={!r}, source={!r})".format(self.ip, self.blid, self.sku,
+                                                                                   self.source)
+
+def _ParseAnnouncement(data, sender):
+    """
+    Decode a robot's answer to the discovery query
+
+    Args:
+        data:   the datagram (bytes)
+        sender: the address the datagram came from (str)
+
+    Returns:
+        The robot, or None if the datagram is not from a robot (DiscoveredRobot)
+    """
+    try:
+        announcement = json.loads(data.decode("utf-8"))
+    except ValueError:
+        # Including our own query, if the broadcast loops back
+        return None
+    if not isinstance(announcement, dict):
+        return None
+    hostname = announcement.get("hostname") or ""
+    if not hostname.startswith(_HOSTNAME_PREFIXES):
+        return None
+    return DiscoveredRobot(announcement.get("ip") or sender, blid=hostname.partition("-")[2] or None,
+                           name=announcement.get("robotname"), sku=announcement.get("sku"), sw=announcement.get("sw"),
+                           mac=announcement.get("mac"), source="broadcast")
+
+def _IsAddress(value):
+    try:
+        ipaddress.ip_address(value.strip())
+    except ValueError:
+        # A host name, which may have a "-" in it
+        return False
+    return True
+
+def ExpandTargets(targets, port=443):
+    """
+    Turn address ranges into the hosts to probe, lazily, so a large network is never held in memory
+
+    Args:
+        targets:    networks ("10.0.0.0/16" or ipaddress.IPv4Network), ranges ("10.0.0.10-10.0.0.99"), addresses, or
+                    addresses with a port ("10.0.0.5:8443") (iterable of str or ipaddress object)
+        port:       the port to probe where a target does not give one (int)
+
+    Returns:
+        The hosts, with the port if it is not 443 (generator of str)
+    """
+    suffix = "" if port == 443 else ":{}".format(port)
+    for target in targets:
+        if isinstance(target, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+            for address in target.hosts():
+                yield "{}{}".format(address, suffix)
+            continue
+        if isinstance(target, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            yield "{}{}".format(target, suffix)
+            continue
+        first, _, last = target.partition("-")
+        if "/" in target:
+            for address in ipaddress.ip_network(target, strict=False).hosts():
+                yield "{}{}".format(address, suffix)
+        elif last and _IsAddress(first) and _IsAddress(last):
+            first = int(ipaddress.ip_address(first.strip()))
+            last = int(ipaddress.ip_address(last.strip()))
+            assert first <= last, "{} is not a range from a lower to a higher address".format(target)
+            for address in range(first, last + 1):
+                yield "{}{}".format(ipaddress.ip_address(address), suffix)
+        elif ":" in target:
+            yield target
+        else:
+            yield "{}{}".format(target, suffix)
+
+def _HostKey(host, port=443):
+    """
+    Put an address in the form ExpandTargets gives it, so the same robot is recognized however it was found
+
+    Args:
+        host:   the address, optionally with a port (str)
+        port:   the port the address is on if it does not give one (int)
+
+    Returns:
+        The address, with the port if it is not 443 (str)
+    """
+    if not _IsAddress(host):
+        name, _, explicit = host.rpartition(":")
+        if name and explicit.isdigit():
+            host, port = name, int(explicit)
+    return host if port == 443 else "{}:{}".format(host, port)
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    """
+    Queue every datagram that arrives on the discovery socket
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def datagram_received(self, data, addr):
+        self.queue.put_nowait((data, addr[0]))
+
+    def error_received(self, exc):
+        # The socket is not connected, so this can only be a query that could not be sent
+        self.queue.put_nowait((exc, None))
+
+class RobotDiscovery(object):
+    """
+    Find robots with the UDP discovery broadcast, by sweeping address ranges, or both at once
+
+    Each way of finding robots is an async generator that yields a
+    DiscoveredRobot as soon as each robot is found, and each robot at most once.
+    """
+
+    def __init__(self, maxConcurrent=DEFAULT_MAX_CONCURRENT, timeout=DEFAULT_PROBE_TIMEOUT, port=443, sslContext=None,
+                 broadcastAddress=DEFAULT_BROADCAST_ADDRESS, broadcastTimeout=DEFAULT_BROADCAST_TIMEOUT,
+                 broadcastAttempts=DEFAULT_BROADCAST_ATTEMPTS, codec=None):
+        """
+        Args:
+            maxConcurrent:      the most addresses to probe at once; keep it below the open file limit (int)
+            timeout:            the (connect, read) timeouts for each probe, in seconds (tuple of float)
+            port:               the port to probe where a target does not give one (int)
+            sslContext:         the SSL context to probe with, None for the default, or False to probe plain HTTP
+                                (ssl.SSLContext)
+            broadcastAddress:   the address to send the discovery query to, optionally with a port, which is otherwise
+                                DISCOVERY_PORT; a subnet's broadcast address to search only that subnet (str)
+            broadcastTimeout:   seconds to wait for robots to answer the discovery query (float)
+            broadcastAttempts:  how many times to send the query over broadcastTimeout, since datagrams can be lost
+                                (int)
+            codec:              the codec to encode probes and decode answers with, or None for the default
+                                (codec.JSONCodec)
+        """
+        assert maxConcurrent > 0, "maxConcurrent must be at least 1"
+        assert broadcastAttempts > 0, "broadcastAttempts must be at least 1"
+        self.maxConcurrent = maxConcurrent
+        self.timeout = timeout
+        self.port = port
+        if sslContext is None:
+            from .aio import _DefaultSSLContext
+            sslContext = _DefaultSSLContext()
+        # One context for every probe; creating one costs more than a probe to a missing host
+        self.sslContext = sslContext
+        self.broadcastAddress = broadcastAddress
+        self.broadcastTimeout = broadcastTimeout
+        self.broadcastAttempts = broadcastAttempts
+        self.codec = DefaultCodec() if codec is None else codec
+        self._stats = dict.fromkeys(("probed", "answered", "announced", "found"), 0)
+
+    async def Broadcast(self):
+        """
+        Send the discovery query and yield each robot that answers, until broadcastTimeout passes
+
+        Raises:
+            OSError if the query cannot be sent, e.g. on a host with no broadcast route
+
+        Returns:
+            The robots, as they answer (async generator of DiscoveredRobot)
+        """
+        host, _, port = self.broadcastAddress.partition(":")
+        loop = asyncio.get_running_loop()
+        # Resolve the address once here, rather than blocking the event loop on it in every sendto
+        addresses = await loop.getaddrinfo(host, int(port) if port else DISCOVERY_PORT, family=socket.AF_INET,
+                                           type=socket.SOCK_DGRAM)
+        destination = addresses[0][4]
+        queue = asyncio.Queue()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _DiscoveryProtocol(queue), family=socket.AF_INET,
+                                                           allow_broadcast=True)
+        seen = set()
+        interval = float(self.broadcastTimeout) / self.broadcastAttempts
+        deadline = loop.time() + self.broadcastTimeout
+        next_query = loop.time()
+        sent = 0
+        try:
+            while True:
+                now = loop.time()
+                if now >= deadline:
+                    return
+                if sent < self.broadcastAttempts and now >= next_query:
+                    transport.sendto(DISCOVERY_QUERY, destination)
+                    sent += 1
+                    next_query = now + interval
+                wake = min(deadline, next_query) if sent < self.broadcastAttempts else deadline
+                try:
+                    data, sender = await asyncio.wait_for(queue.get(), max(0, wake - now))
+                except asyncio.TimeoutError:
+                    continue
+                if isinstance(data, OSError):
+                    raise data
+                robot = _ParseAnnouncement(data, sender)
+                if robot is None or robot.ip in seen:
+                    continue
+                seen.add(robot.ip)
+                self._stats["announced"] += 1
+                yield robot
+        finally:
+            transport.close()
+
+    async def Probe(self, host, password=None):
+        """
+        Check whether a robot is listening at an address
+
+        Args:
+            host:       the address to probe, optionally with a port (str)
+            password:   the robot password if it is known, to get the robot's BLID and SKU (str)
+
+        Returns:
+            The robot, or None if nothing answered like a robot (DiscoveredRobot)
+        """
+        from .aio import AsyncHTTPSTransport
+        self._stats["probed"] += 1
+        auth = None if password is None else ("user", password)
+        try:
+            # One connection, reused for the second request when the password is known
+            async with AsyncHTTPSTransport(poolSize=1, sslContext=self.sslContext, timeout=self.timeout) as transport:
+                args = ["passwd"] if password is None else ["sys"]
+                status, body = await transport.Send(host, "/umi", _BuildUMIRequest("get", args, 0, self.codec), auth=auth)
+                if status == 401:
+                    # What robots answer a wrong password with.  Without one, a robot answers "get passwd" itself, so
+                    # this is some other device behind basic auth, e.g. a router or printer
+                    if password is None:
+                        return None
+                    self._stats["answered"] += 1
+                    return DiscoveredRobot(host)
+                response = self.codec.Decode(body) if status == 200 else None
+                if not isinstance(response, dict) or not ("ok" in response or "err" in response):
+                    return None
+                self._stats["answered"] += 1
+                if password is None:
+                    return DiscoveredRobot(host, pairing="ok" in response)
+                robot = DiscoveredRobot(host)
+                sys_info = response.get("ok")
+                if isinstance(sys_info, dict):
+                    robot.blid = _DecodeBLID(sys_info) if "blid" in sys_info else None
+                    robot.sw = sys_info.get("sw")
+                    robot.mac = sys_info.get("mac")
+                status, body = await transport.Send(host, "/umi", _BuildUMIRequest("get", ["sku"], 1, self.codec),
+                                                    auth=auth)
+                response = self.codec.Decode(body) if status == 200 else None
+                if isinstance(response, dict) and isinstance(response.get("ok"), dict):
+                    robot.sku = response["ok"].get("sku")
+                return robot
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+            # Refused, timed out, not TLS, or not HTTP; IncompleteReadError is an EOFError
+            return None
+
+    async def Sweep(self, targets, passwords=None, exclude=None):
+        """
+        Probe every address in some ranges, maxConcurrent at a time, and yield each robot as it is found
+
+        The addresses are handed out to a fixed set of probing tasks as they go, so a sweep of a /8 needs no more
+        memory than a sweep of a /24.
+
+        Args:
+            targets:    the addresses to probe, see ExpandTargets (iterable)
+            passwords:  the password for each address, for the addresses where it is known, e.g.
+                        dict((record.ip, record.password) for record in store.Records()) (dict)
+            exclude:    addresses not to probe, e.g. robots already found some other way; checked as each address
+                        comes up, so it can grow during the sweep.  Addresses without a port are on the port being
+                        swept (set of str)
+
+        Returns:
+            The robots, as they are found (async generator of DiscoveredRobot)
+        """
+        passwords = passwords or {}
+        exclude = set() if exclude is None else exclude
+        exclude.update([_HostKey(host, self.port) for host in exclude])
+        hosts = ExpandTargets(targets, self.port)
+        found = asyncio.Queue()
+
+        async def probe():
+            # Every task pulls the next address from the same generator
+            for host in hosts:
+                if _HostKey(host, self.port) in exclude:
+                    continue
+                robot = await self.Probe(host, passwords.get(host))
+                if robot is not None:
+                    found.put_nowait(robot)
+
+        workers = [asyncio.ensure_future(probe()) for _ in range(self.maxConcurrent)]
+        finished = asyncio.gather(*workers)
+        finished.add_done_callback(lambda _: found.put_nowait(None))
+        try:
+            while True:
+                robot = await found.get()
+                if robot is None:
+                    break
+                key = _HostKey(robot.ip, self.port)
+                if key in exclude:
+                    continue
+                exclude.add(key)
+                self._stats["found"] += 1
+                yield robot
+            # Raise anything a probing task failed with
+            await finished
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def Discover(self, targets=None, passwords=None, broadcast=True):
+        """
+        Broadcast the discovery query and sweep address ranges at the same time, and yield each robot once, as soon
+        as either finds it.  Addresses that answer the broadcast are not probed
+
+        If the broadcast cannot be sent the sweep goes on without it.
+
+        Args:
+            targets:    the addresses to sweep, see ExpandTargets, or None to only broadcast (iterable)
+            passwords:  the password for each address where it is known, see Sweep (dict)
+            broadcast:  send the discovery query (bool)
+
+        Returns:
+            The robots, as they are found (async generator of DiscoveredRobot)
+        """
+        seen = set()
+        found = asyncio.Queue()
+        sources = []
+        if broadcast:
+            # Only an error if there is nothing else to search with
+            sources.append((self.Broadcast(), targets is not None))
+        if targets is not None:
+            sources.append((self.Sweep(targets, passwords=passwords, exclude=seen), False))
+
+        async def drain(source, optional):
+            try:
+                async for robot in source:
+                    found.put_nowait(robot)
+            except OSError:
+                if not optional:
+                    raise
+
+        tasks = [asyncio.ensure_future(drain(source, optional)) for source, optional in sources]
+        finished = asyncio.gather(*tasks)
+        finished.add_done_callback(lambda _: found.put_nowait(None))
+        try:
+            while True:
+                robot = await found.get()
+                if robot is None:
+                    break
+                if robot.source == "broadcast":
+                    # Robots announce a bare address, which the sweep knows with the port it probes
+                    key = _HostKey(robot.ip, self.port)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield robot
+            await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def Stats(self):
+        """
+        Get the discovery counters, over every search this object has run
+
+        Returns:
+            A dict of probed (addresses), answered (probes that found a /umi endpoint), announced (robots that answered
+            a broadcast) and found (robots found by sweeps) (dict)
+        """
+        return dict(self._stats)
+
+def DiscoverRobots(targets=None, passwords=None, broadcast=True, callback=None, **kwargs):
+    """
+    Find robots from blocking code; see RobotDiscovery.Discover
+
+    Args:
+        targets:    the addresses to sweep, see ExpandTargets, or None to only broadcast (iterable)
+        passwords:  the password for each address where it is known (dict)
+        broadcast:  send the discovery query (bool)
+        callback:   function called with each robot as soon as it is found (callable)
+        kwargs:     arguments for the RobotDiscovery, see RobotDiscovery
+
+    Returns:
+        The robots, in the order they were found (list of DiscoveredRobot)
+    """
+    async def run():
+        robots = []
+        async for robot in RobotDiscovery(**kwargs).Discover(targets, passwords=passwords, broadcast=broadcast):
+            robots.append(robot)
+            if callback is not None:
+                callback(robot)
+        return robots
+
+    return asyncio.run(run())
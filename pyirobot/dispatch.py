@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Per-robot request scheduling
+
+The robot's /umi server only handles a few requests at a time, so when many
+callers share a robot their requests are better queued on our side than at
+the robot.  A RobotDispatcher limits how many requests are in flight to a
+robot at once and how fast they are sent (with a token bucket), and lets
+requests from more important callers jump the queue: control commands
+(StartCleaning, ReturnHome, ...) go first, then other settings changes, then
+"get" polls.  Requests of the same priority are sent in the order they arrive.
+
+    dispatcher = RobotDispatcher(maxConcurrent=1, rate=5, burst=2)
+    dashboard = Robot(ip, password, dispatcher=dispatcher)
+    controller = Robot(ip, password, dispatcher=dispatcher)
+    ...
+    print(dispatcher.Stats())
+"""
+
+from __future__ import print_function
+import heapq
+import itertools
+import threading
+import time
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+PRIORITY_CONTROL = 0
+PRIORITY_SETTINGS = 1
+PRIORITY_TELEMETRY = 2
+PRIORITY_NAMES = ("control", "settings", "telemetry")
+
+def RequestPriority(cmd, args):
+    """
+    Get the priority class of a request
+
+    Args:
+        cmd:    the "do" argument for the request (str)
+        args:   the "args" argument for the request (str or list)
+
+    Returns:
+        PRIORITY_CONTROL, PRIORITY_SETTINGS or PRIORITY_TELEMETRY (int)
+    """
+    if cmd == "get":
+        return PRIORITY_TELEMETRY
+    if not isinstance(args, str) and args and args[0] == "cmd":
+        return PRIORITY_CONTROL
+    return PRIORITY_SETTINGS
+
+class _DispatcherBase(object):
+    """
+    Scheduling state shared by the threaded and asyncio dispatchers; the caller holds the lock
+    """
+
+    def __init__(self, maxConcurrent=1, rate=None, burst=1):
+        """
+        Args:
+            maxConcurrent:  the most requests to have in flight to the robot at once (int)
+            rate:           the most requests to send per second on average, or None for no limit (float)
+            burst:          the most requests to send back to back before the rate applies (int)
+        """
+        assert maxConcurrent >= 1
+        assert burst >= 1
+        self.maxConcurrent = maxConcurrent
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._refilled = _monotonic()
+        self._active = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._waits = [[0, 0.0, 0.0] for _ in PRIORITY_NAMES]
+
+    def _Enqueue(self, priority):
+        entry = [priority, next(self._sequence)]
+        heapq.heappush(self._waiting, entry)
+        return entry
+
+    def _Dequeue(self, entry):
+        self._waiting.remove(entry)
+        heapq.heapify(self._waiting)
+
+    def _TryStart(self, entry):
+        """
+        Start a queued request if it is at the head of the queue and there is a free slot and a token
+
+        Returns:
+            0 if the request was started, the seconds until the next token if it is waiting for one, or None if it is
+            waiting for a slot or for requests ahead of it (float)
+        """
+        if self._waiting[0] is not entry or self._active >= self.maxConcurrent:
+            return None
+        if self.rate is not None:
+            now = _monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        heapq.heappop(self._waiting)
+        self._active += 1
+        return 0
+
+    def _Record(self, priority, wait):
+        stats = self._waits[priority]
+        stats[0] += 1
+        stats[1] += wait
+        stats[2] = max(stats[2], wait)
+
+    def _Stats(self):
+        waits = dict((name, {"count" : count, "meanWait" : total / count if count else 0.0, "maxWait" : longest})
+                     for name, (count, total, longest) in zip(PRIORITY_NAMES, self._waits))
+        return {"active" : self._active, "queued" : len(self._waiting), "waits" : waits}
+
+class RobotDispatcher(_DispatcherBase):
+    """
+    Limits the concurrency and rate of requests to one robot, sending the highest priority requests first
+    """
+
+    def __init__(self, maxConcurrent=1, rate=None, burst=1):
+        super(RobotDispatcher, self).__init__(maxConcurrent=maxConcurrent, rate=rate, burst=burst)
+        self._condition = threading.Condition()
+
+    def Acquire(self, priority=PRIORITY_TELEMETRY, deadline=None):
+        """
+        Wait for a turn to send a request.  Every successful Acquire must be followed by a Release
+
+        Args:
+            priority:   the priority class of the request (int)
+            deadline:   the time.monotonic time to give up waiting at, or None to wait as long as it takes (float)
+
+        Returns:
+            The seconds spent waiting, or None if the deadline passed first (float)
+        """
+        start = _monotonic()
+        with self._condition:
+            entry = self._Enqueue(priority)
+            while True:
+                delay = self._TryStart(entry)
+                if delay == 0:
+                    # The next request in the queue may be able to start too
+                    self._condition.notify_all()
+                    break
+                if deadline is not None:
+                    remaining = deadline - _monotonic()
+                    if remaining <= 0:
+                        self._Dequeue(entry)
+                        self._condition.notify_all()
+                        return None
+                    delay = remaining if delay is None else min(delay, remaining)
+                try:
+                    self._condition.wait(delay)
+                except BaseException:
+                    self._Dequeue(entry)
+                    self._condition.notify_all()
+                    raise
+            wait = _monotonic() - start
+            self._Record(priority, wait)
+        return wait
+
+    def Release(self):
+        """
+        Finish a request, letting the next one start
+        """
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def Stats(self):
+        """
+        Get the number of requests in flight and queued, and how long requests of each priority have waited
+
+        Returns:
+            A dict of active, queued and waits, which has the count, meanWait and maxWait for each priority class (dict)
+        """
+        with self._condition:
+            return self._Stats()
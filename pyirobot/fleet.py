@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+"""
+Run commands and queries across many robots concurrently
+"""
+
+from __future__ import print_function
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from . import Robot
+
+DEFAULT_MAX_WORKERS = 32
+
+class RobotResult(object):
+    """
+    The outcome of calling a method on one robot in a fleet
+    """
+    __slots__ = ("robot", "value", "error")
+
+    def __init__(self, robot, value=None, error=None):
+        self.robot = robot
+        self.value = value
+        self.error = error
+
+    @property
+    def ok(self):
+        """
+        True if the call succeeded (bool)
+        """
+        return self.error is None
+
+    def __repr__(self):
+        if self.ok:
+            return "RobotResult({}, value={!r})".format(self.robot.ip, self.value)
+        return "RobotResult({}, error={!r})".format(self.robot.ip, self.error)
+
+class RobotFleet(object):
+    """
+    A collection of robots that can all be sent the same call at once
+
+    Any public Robot method can be called on the fleet, for example
+    fleet.GetMission() or fleet.SetTimeNow(), and it is run on every robot in
+    parallel on a bounded thread pool.  An error from one robot, either a
+    RobotError or a network failure, is captured in that robot's result and
+    does not affect the others.
+    """
+
+    def __init__(self, robots=None, maxWorkers=DEFAULT_MAX_WORKERS):
+        """
+        Args:
+            robots:     the robots in the fleet (list of Robot)
+            maxWorkers: the maximum number of robots to talk to at once (int)
+        """
+        self.robots = list(robots or [])
+        self.maxWorkers = maxWorkers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.robots)
+
+    def __iter__(self):
+        return iter(self.robots)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not callable(getattr(Robot, name, None)):
+            raise AttributeError(name)
+        def call(*args, **kwargs):
+            return self.Call(name, *args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = "Call Robot.{} on every robot in the fleet and return the list of RobotResult".format(name)
+        return call
+
+    def Add(self, robot):
+        """
+        Add a robot to the fleet
+
+        Args:
+            robot:  the robot to add (Robot)
+        """
+        self.robots.append(robot)
+
+    def _GetExecutor(self):
+        """
+        Get the thread pool, creating it if necessary
+
+        Returns:
+            The thread pool (ThreadPoolExecutor)
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.maxWorkers)
+            return self._executor
+
+    @staticmethod
+    def _Invoke(robot, method, args, kwargs):
+        """
+        Call a method on a single robot, capturing any error
+
+        Returns:
+            The result of the call (RobotResult)
+        """
+        try:
+            if callable(method):
+                value = method(robot, *args, **kwargs)
+            else:
+                value = getattr(robot, method)(*args, **kwargs)
+        except Exception as ex: #pylint: disable=broad-except
+            return RobotResult(robot, error=ex)
+        return RobotResult(robot, value=value)
+
+    def Stream(self, method, *args, **kwargs):
+        """
+        Call a method on every robot in the fleet and yield the results as each robot finishes
+
+        Args:
+            method:     the name of a Robot method, or a function that takes a robot as its first argument (str or callable)
+            args:       positional arguments to pass to the method
+            kwargs:     keyword arguments to pass to the method
+
+        Yields:
+            The result from each robot in completion order (RobotResult)
+        """
+        executor = self._GetExecutor()
+        futures = [executor.submit(self._Invoke, robot, method, args, kwargs) for robot in self.robots]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def Call(self, method, *args, **kwargs):
+        """
+        Call a method on every robot in the fleet and wait for all of them to finish
+
+        Args:
+            method:     the name of a Robot method, or a function that takes a robot as its first argument (str or callable)
+            args:       positional arguments to pass to the method
+            kwargs:     keyword arguments to pass to the method
+
+        Returns:
+            The result from each robot, in the same order as the robots in the fleet (list of RobotResult)
+        """
+        executor = self._GetExecutor()
+        futures = [executor.submit(self._Invoke, robot, method, args, kwargs) for robot in self.robots]
+        return [future.result() for future in futures]
+
+    def Close(self):
+        """
+        Shut down the thread pool and close the connections to every robot
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+        for robot in self.robots:
+            robot.Close()
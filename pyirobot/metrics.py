@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""
+Instrumentation of the requests sent to robots
+
+Every request sent to a robot, including GetPassword and GetBLID and requests
+from AsyncRobot, is reported to the installed hooks as a RequestEvent once it
+finishes.  A hook is any callable that takes the event; it is called on the
+thread (or event loop) that made the request, so it should be quick and must
+not raise.  Requests answered from a ResourceCache are not sent, so they are not
+reported.  With no hooks installed the cost per request is a single check.
+
+MetricsRegistry is a hook that keeps latency histograms, byte counts and error
+counts per command and resource, and exports them in the Prometheus text
+format:
+
+    registry = MetricsRegistry()
+    registry.Install()
+    ...
+    print(registry.ExportPrometheus())
+"""
+
+from __future__ import print_function
+import bisect
+import threading
+from . import RobotError, _RequestHooks
+
+# The upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def AddHook(hook):
+    """
+    Start calling a hook after every request
+
+    Args:
+        hook:   the hook to call with each RequestEvent (callable)
+    """
+    _RequestHooks.append(hook)
+
+def RemoveHook(hook):
+    """
+    Stop calling a hook
+
+    Args:
+        hook:   a hook that was added with AddHook (callable)
+    """
+    _RequestHooks.remove(hook)
+
+class RequestEvent(object):
+    """
+    A finished request to a robot
+    """
+
+    __slots__ = ("robot", "cmd", "resource", "latency", "requestBytes", "responseBytes", "error")
+
+    def __init__(self, robot, cmd, resource, latency, requestBytes, responseBytes, error):
+        """
+        Args:
+            robot:          the IP address of the robot (str)
+            cmd:            the "do" argument for the request, e.g. "get" or "set" (str)
+            resource:       the resource the request was for, e.g. "mssn" or "prefs" (str)
+            latency:        the time from sending the request to parsing the response, in seconds (float)
+            requestBytes:   the size of the request body (int)
+            responseBytes:  the size of the response body, or None if there was no response (int)
+            error:          the exception the request raised, or None (Exception)
+        """
+        self.robot = robot
+        self.cmd = cmd
+        self.resource = resource
+        self.latency = latency
+        self.requestBytes = requestBytes
+        self.responseBytes = responseBytes
+        self.error = error
+
+    @property
+    def ok(self):
+        """
+        True if the request succeeded (bool)
+        """
+        return self.error is None
+
+    @property
+    def errorCode(self):
+        """
+        The error code the robot returned, or None if it did not return an error (int)
+        """
+        return self.error.errorCode if isinstance(self.error, RobotError) else None
+
+    def __repr__(self):
+        return "RequestEvent({})".format(", ".join("{}={!r}".format(name, getattr(self, name)) for name in self.__slots__))
+
+def _EscapeLabel(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _FormatLabels(names, values):
+    return ",".join("{}=\"{}\"".format(name, _EscapeLabel(value)) for name, value in zip(names, values))
+
+class _Histogram(object):
+    """
+    The latency distribution for one set of labels
+    """
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, buckets):
+        # One count per bucket plus one for values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+class MetricsRegistry(object):
+    """
+    Latency, payload size and error metrics for requests to robots, keyed by
+    command and resource, and optionally by robot
+
+    Install it as a hook, or pass it events with Record.  Per-robot labels make
+    it easy to find slow robots, but add a set of series for every robot, so
+    they are off by default.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, perRobot=False):
+        """
+        Args:
+            buckets:    the upper bounds of the latency histogram buckets, in seconds (sequence of float)
+            perRobot:   label the metrics with the robot IP address as well (bool)
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.perRobot = perRobot
+        self._lock = threading.Lock()
+        self.Reset()
+
+    def __call__(self, event):
+        self.Record(event)
+
+    def __enter__(self):
+        self.Install()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Uninstall()
+
+    def Install(self):
+        """
+        Start recording every request sent to a robot
+        """
+        AddHook(self)
+
+    def Uninstall(self):
+        """
+        Stop recording requests
+        """
+        RemoveHook(self)
+
+    def Reset(self):
+        """
+        Discard everything recorded so far
+        """
+        with self._lock:
+            self._latency = {}
+            self._requestBytes = {}
+            self._responseBytes = {}
+            self._robotErrors = {}
+            self._transportErrors = {}
+
+    def _Labels(self, event):
+        if self.perRobot:
+            return (event.cmd, event.resource, event.robot)
+        return (event.cmd, event.resource)
+
+    def _LabelNames(self):
+        if self.perRobot:
+            return ("cmd", "resource", "robot")
+        return ("cmd", "resource")
+
+    def Record(self, event):
+        """
+        Record a finished request
+
+        Args:
+            event:  the request (RequestEvent)
+        """
+        labels = self._Labels(event)
+        bucket = bisect.bisect_left(self.buckets, event.latency)
+        with self._lock:
+            histogram = self._latency.get(labels)
+            if histogram is None:
+                histogram = self._latency[labels] = _Histogram(self.buckets)
+            histogram.counts[bucket] += 1
+            histogram.total += event.latency
+            histogram.count += 1
+            self._requestBytes[labels] = self._requestBytes.get(labels, 0) + event.requestBytes
+            if event.responseBytes is not None:
+                self._responseBytes[labels] = self._responseBytes.get(labels, 0) + event.responseBytes
+            if event.error is not None:
+                if isinstance(event.error, RobotError):
+                    key = labels + (event.error.errorCode,)
+                    self._robotErrors[key] = self._robotErrors.get(key, 0) + 1
+                else:
+                    key = labels + (type(event.error).__name__,)
+                    self._transportErrors[key] = self._transportErrors.get(key, 0) + 1
+
+    def Quantile(self, quantile, cmd, resource, robot=None):
+        """
+        Estimate a latency quantile from the histogram, interpolating within the bucket it falls in
+
+        Args:
+            quantile:   the quantile to estimate, between 0 and 1 (float)
+            cmd:        the command, e.g. "get" (str)
+            resource:   the resource, e.g. "mssn" (str)
+            robot:      the robot IP address, if the registry is per robot (str)
+
+        Returns:
+            The estimated latency in seconds, or None if nothing has been recorded (float)
+        """
+        assert 0 <= quantile <= 1
+        labels = (cmd, resource, robot) if self.perRobot else (cmd, resource)
+        with self._lock:
+            histogram = self._latency.get(labels)
+            if histogram is None or histogram.count == 0:
+                return None
+            counts = list(histogram.counts)
+            count = histogram.count
+        rank = quantile * count
+        seen = 0
+        for idx, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if idx == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[idx - 1] if idx > 0 else 0.0
+                return lower + (self.buckets[idx] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def Stats(self):
+        """
+        Get a summary of everything recorded, keyed by the label values
+
+        Returns:
+            A dict of label values to a dict of count, errors, meanLatency, requestBytes and responseBytes (dict)
+        """
+        with self._lock:
+            stats = {}
+            for labels, histogram in self._latency.items():
+                stats[labels] = {
+                    "count" : histogram.count,
+                    "meanLatency" : histogram.total / histogram.count,
+                    "requestBytes" : self._requestBytes.get(labels, 0),
+                    "responseBytes" : self._responseBytes.get(labels, 0),
+                    "robotErrors" : dict((key[-1], value) for key, value in self._robotErrors.items() if key[:-1] == labels),
+                    "transportErrors" : dict((key[-1], value) for key, value in self._transportErrors.items() if key[:-1] == labels)
+                }
+            return stats
+
+    def ExportPrometheus(self):
+        """
+        Export the metrics in the Prometheus text exposition format
+
+        Returns:
+            The metrics (str)
+        """
+        names = self._LabelNames()
+        lines = []
+        with self._lock:
+            lines.append("# HELP pyirobot_request_duration_seconds Time taken by requests to robots")
+            lines.append("# TYPE pyirobot_request_duration_seconds histogram")
+            for labels in sorted(self._latency):
+                histogram = self._latency[labels]
+                label_text = _FormatLabels(names, labels)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append("pyirobot_request_duration_seconds_bucket{{{},le=\"{}\"}} {}".format(label_text, repr(float(bound)), cumulative))
+                lines.append("pyirobot_request_duration_seconds_bucket{{{},le=\"+Inf\"}} {}".format(label_text, histogram.count))
+                lines.append("pyirobot_request_duration_seconds_sum{{{}}} {}".format(label_text, repr(histogram.total)))
+                lines.append("pyirobot_request_duration_seconds_count{{{}}} {}".format(label_text, histogram.count))
+
+            for metric, help_text, values, extra in (
+                    ("pyirobot_request_bytes_total", "Bytes sent in request bodies to robots", self._requestBytes, ()),
+                    ("pyirobot_response_bytes_total", "Bytes received in response bodies from robots", self._responseBytes, ()),
+                    ("pyirobot_robot_errors_total", "Error codes returned by robots", self._robotErrors, ("code",)),
+                    ("pyirobot_transport_errors_total", "Requests to robots that failed without a response from the API", self._transportErrors, ("exception",))):
+                lines.append("# HELP {} {}".format(metric, help_text))
+                lines.append("# TYPE {} counter".format(metric))
+                for labels in sorted(values, key=lambda key: tuple(str(value) for value in key)):
+                    lines.append("{}{{{}}} {}".format(metric, _FormatLabels(names + extra, labels), values[labels]))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+"""
+Compact typed representation of a robot's mission status, and change
+tracking between successive mission statuses
+"""
+
+from __future__ import print_function
+import time
+from . import ToJSON
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+DEFAULT_KEYFRAME_EVERY = 60
+DEFAULT_KEYFRAME_INTERVAL = 600
+
+# The enum fields whose changes are reported as transitions
+TRANSITION_FIELDS = ("robotStatus", "binStatus", "readyStatus")
+
+class MissionSnapshot(object):
+    """
+    The result of GetMission as an object with a fixed set of fields
+
+    Fields that GetMission leaves out of its dictionary are None here, so
+    there is no need to probe for keys, and the robot position is stored as
+    flat x, y and theta fields.  The object uses __slots__, so keeping the
+    last N snapshots for every robot in a fleet takes a fraction of the memory
+    of keeping the dictionaries.
+
+    Any keys the robot sends that are not known fields are kept in extra.
+    """
+
+    __slots__ = ("batteryPercentage", "binStatus", "cycle", "error", "errorMessage", "flags",
+                 "minutesUntilMissionCancelled", "missionCoveredSquareFootage", "missionElapsedMinutes", "nMssn",
+                 "notReady", "phase", "readyStatus", "rechargeMinutesRemaining", "robotStatus", "x", "y", "theta",
+                 "extra")
+
+    # Fields that are copied straight from the GetMission dictionary
+    _FIELDS = ("batteryPercentage", "binStatus", "cycle", "error", "errorMessage", "flags",
+               "minutesUntilMissionCancelled", "missionCoveredSquareFootage", "missionElapsedMinutes", "nMssn",
+               "notReady", "phase", "readyStatus", "rechargeMinutesRemaining", "robotStatus")
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.pop(name, None))
+        assert not fields, "unknown fields {}".format(", ".join(sorted(fields)))
+
+    @classmethod
+    def FromMission(cls, mission):
+        """
+        Create a snapshot from the result of GetMission
+
+        Args:
+            mission:    the result of GetMission (dict)
+
+        Returns:
+            A new snapshot (MissionSnapshot)
+        """
+        snapshot = cls.__new__(cls)
+        extra = dict(mission)
+        for name in cls._FIELDS:
+            setattr(snapshot, name, extra.pop(name, None))
+        position = extra.pop("robotPosition", None)
+        if position is not None:
+            snapshot.x = position["point"]["x"]
+            snapshot.y = position["point"]["y"]
+            snapshot.theta = position["theta"]
+        else:
+            snapshot.x = snapshot.y = snapshot.theta = None
+        snapshot.extra = extra or None
+        return snapshot
+
+    @property
+    def robotPosition(self):
+        """
+        The robot position in the same form as GetMission (dict)
+        """
+        if self.x is None:
+            return None
+        return {"point" : {"x" : self.x, "y" : self.y}, "theta" : self.theta}
+
+    def ToDict(self):
+        """
+        Convert this snapshot back into the dictionary GetMission returns
+
+        Returns:
+            The mission status (dict)
+        """
+        mission = dict(self.extra) if self.extra else {}
+        for name in self._FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                mission[name] = value
+        if self.x is not None:
+            mission["robotPosition"] = self.robotPosition
+        return mission
+
+    def ToJSON(self, **kwargs):
+        """
+        Convert this snapshot into JSON
+
+        Args:
+            kwargs: additional arguments for json.dumps
+
+        Returns:
+            The mission status as JSON (str)
+        """
+        return ToJSON(self.ToDict(), **kwargs)
+
+    def __eq__(self, other):
+        if not isinstance(other, MissionSnapshot):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "MissionSnapshot({})".format(", ".join("{}={!r}".format(name, getattr(self, name))
+                                                      for name in self.__slots__ if getattr(self, name) is not None))
+
+class Transition(object):
+    """
+    A change in one of the enum fields of a robot's mission status, such as
+    robotStatus going from RobotStatus.Cleaning to RobotStatus.Stuck
+    """
+    __slots__ = ("field", "previous", "current")
+
+    def __init__(self, field, previous, current):
+        self.field = field
+        self.previous = previous
+        self.current = current
+
+    def ToDict(self):
+        return {"field" : self.field, "previous" : self.previous, "current" : self.current}
+
+    def __eq__(self, other):
+        if not isinstance(other, Transition):
+            return NotImplemented
+        return (self.field, self.previous, self.current) == (other.field, other.previous, other.current)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Transition({!r}, {!r}, {!r})".format(self.field, self.previous, self.current)
+
+class MissionChange(object):
+    """
+    What changed in a robot's mission status since the last change
+
+    A keyframe holds every field that is set, so a consumer can start from it.
+    Otherwise fields only holds the fields that changed, with None for a field
+    that is no longer set.  Field names are MissionSnapshot's, so the position
+    is flat x, y and theta fields.
+
+    Attributes:
+        sequence:       counts up by one with every change a watcher emits (int)
+        keyframe:       whether this is a full keyframe (bool)
+        fields:         the changed fields, or every set field for a keyframe (dict)
+        transitions:    the changes to the enum fields in TRANSITION_FIELDS (list of Transition)
+        snapshot:       the whole mission status after the change (MissionSnapshot)
+    """
+    __slots__ = ("sequence", "keyframe", "fields", "transitions", "snapshot")
+
+    def __init__(self, sequence, keyframe, fields, transitions, snapshot):
+        self.sequence = sequence
+        self.keyframe = keyframe
+        self.fields = fields
+        self.transitions = transitions
+        self.snapshot = snapshot
+
+    def Apply(self, snapshot=None):
+        """
+        Apply this change to the previous mission status, as a consumer of the changes would
+
+        Args:
+            snapshot:   the mission status before this change, which may be None for a keyframe (MissionSnapshot)
+
+        Returns:
+            The mission status after the change (MissionSnapshot)
+        """
+        assert self.keyframe or snapshot is not None, "a change that is not a keyframe needs the previous snapshot"
+        result = MissionSnapshot()
+        if not self.keyframe:
+            for name in MissionSnapshot.__slots__:
+                setattr(result, name, getattr(snapshot, name))
+        for name, value in self.fields.items():
+            setattr(result, name, value)
+        return result
+
+    def ToDict(self):
+        """
+        Convert this change into a compact dictionary, without the snapshot
+
+        Returns:
+            A dictionary of seq, fields, and keyframe and transitions when they are set (dict)
+        """
+        result = {"seq" : self.sequence, "fields" : self.fields}
+        if self.keyframe:
+            result["keyframe"] = True
+        if self.transitions:
+            result["transitions"] = [transition.ToDict() for transition in self.transitions]
+        return result
+
+    def ToJSON(self, **kwargs):
+        """
+        Convert this change into compact JSON
+
+        Args:
+            kwargs: additional arguments for json.dumps
+
+        Returns:
+            The change as JSON (str)
+        """
+        kwargs.setdefault("separators", (",", ":"))
+        return ToJSON(self.ToDict(), **kwargs)
+
+    def __repr__(self):
+        return "MissionChange(sequence={}, keyframe={}, fields={!r}, transitions={!r})".format(
+            self.sequence, self.keyframe, self.fields, self.transitions)
+
+class MissionWatcher(object):
+    """
+    Compare successive mission statuses of one robot and work out what changed
+
+    Update returns None when nothing changed, so an idle robot produces
+    nothing at all between keyframes.  A keyframe is sent first, then after
+    keyframeEvery changes, so a consumer that joins late or misses a change
+    does not have to wait long for the whole state, and at least every
+    keyframeInterval seconds, so a quiet robot still shows it is alive.
+    """
+
+    def __init__(self, keyframeEvery=DEFAULT_KEYFRAME_EVERY, keyframeInterval=DEFAULT_KEYFRAME_INTERVAL, clock=_monotonic):
+        """
+        Args:
+            keyframeEvery:      the most changes between keyframes, or None for no limit (int)
+            keyframeInterval:   the most seconds between keyframes, or None for no limit (float)
+            clock:              returns the current time in seconds (callable)
+        """
+        self.keyframeEvery = keyframeEvery
+        self.keyframeInterval = keyframeInterval
+        self.clock = clock
+        self.snapshot = None
+        self._sequence = 0
+        self._sinceKeyframe = 0
+        self._keyframeTime = None
+
+    def Reset(self):
+        """
+        Forget the last mission status, so the next update is a keyframe
+        """
+        self.snapshot = None
+
+    def Update(self, mission):
+        """
+        Compare a mission status with the last one
+
+        Args:
+            mission:    the result of GetMission (dict) or GetMissionSnapshot (MissionSnapshot)
+
+        Returns:
+            The change, or None if nothing changed and no keyframe is due (MissionChange)
+        """
+        snapshot = mission if isinstance(mission, MissionSnapshot) else MissionSnapshot.FromMission(mission)
+        previous = self.snapshot
+        now = self.clock()
+        keyframe = previous is None or \
+                   (self.keyframeEvery is not None and self._sinceKeyframe >= self.keyframeEvery) or \
+                   (self.keyframeInterval is not None and now - self._keyframeTime >= self.keyframeInterval)
+
+        transitions = []
+        if previous is None:
+            changed = {}
+        else:
+            changed = dict((name, getattr(snapshot, name)) for name in MissionSnapshot.__slots__
+                           if getattr(snapshot, name) != getattr(previous, name))
+            for name in TRANSITION_FIELDS:
+                if name in changed:
+                    transitions.append(Transition(name, getattr(previous, name), changed[name]))
+        self.snapshot = snapshot
+
+        if keyframe:
+            fields = dict((name, getattr(snapshot, name)) for name in MissionSnapshot.__slots__
+                          if getattr(snapshot, name) is not None)
+            self._sinceKeyframe = 0
+            self._keyframeTime = now
+        elif changed:
+            fields = changed
+            self._sinceKeyframe += 1
+        else:
+            return None
+        self._sequence += 1
+        return MissionChange(self._sequence, keyframe, fields, transitions, snapshot)
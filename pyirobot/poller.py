@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+"""
+Adaptive GetMission polling for a fleet of robots
+"""
+
+from __future__ import print_function
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import random
+import threading
+import time
+from . import ReadyStatus, RobotStatus
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+# Seconds between polls for a robot in each state
+DEFAULT_STATUS_INTERVALS = {
+    RobotStatus.Cleaning : 5,
+    RobotStatus.Resuming : 5,
+    RobotStatus.Stuck : 5,
+    RobotStatus.ReturningHome : 10,
+    RobotStatus.Cancelling : 10,
+    RobotStatus.Stopped : 30,
+    RobotStatus.Unknown : 30,
+    RobotStatus.Charging : 300,
+    RobotStatus.Idle : 300
+}
+
+# Ready states that do not need closer attention
+_QuietReadyStatus = (ReadyStatus.Ready, ReadyStatus.Charging)
+
+class _PollState(object):
+    """
+    The polling state of a single robot
+    """
+    __slots__ = ("robot", "failures", "removed", "mission", "error")
+
+    def __init__(self, robot):
+        self.robot = robot
+        self.failures = 0
+        self.removed = False
+        self.mission = None
+        self.error = None
+
+class MissionPoller(object):
+    """
+    Poll GetMission on many robots from a small worker pool, at a rate that
+    adapts to what each robot is doing
+
+    Polls are kept in a heap ordered by due time.  After each poll the robot's
+    next poll is scheduled using the interval for its robotStatus, shortened to
+    errorInterval if it reports an error or is not ready, with random jitter so
+    robots do not all poll in step.  A robot that cannot be reached backs off
+    exponentially up to maxBackoff.  The callback is called from a worker
+    thread with (robot, mission, error) after every poll.
+    """
+
+    def __init__(self, robots=None, callback=None, workers=8, intervals=None, errorInterval=5, jitter=0.1, backoffBase=5, maxBackoff=600):
+        """
+        Args:
+            robots:         the robots to poll (list of Robot)
+            callback:       function called with (robot, mission, error) after each poll (callable)
+            workers:        the number of polls to run at once (int)
+            intervals:      seconds between polls for each RobotStatus (dict)
+            errorInterval:  the longest time between polls for a robot with an error or not ready (float)
+            jitter:         the fraction each interval is randomly varied by (float)
+            backoffBase:    seconds to wait after the first failed poll, doubling with each failure (float)
+            maxBackoff:     the longest time to wait between polls of an unreachable robot (float)
+        """
+        self.callback = callback
+        self.workers = workers
+        self.intervals = dict(DEFAULT_STATUS_INTERVALS if intervals is None else intervals)
+        self.errorInterval = errorInterval
+        self.jitter = jitter
+        self.backoffBase = backoffBase
+        self.maxBackoff = maxBackoff
+        self.clock = _monotonic
+
+        self._heap = []
+        self._states = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = None
+        self._dispatcher = None
+        self._stopping = False
+
+        self._queued = 0
+        self._inFlight = 0
+        self._polls = 0
+        self._failures = 0
+        self._lastLag = 0.0
+        self._maxLag = 0.0
+        self._meanLag = 0.0
+
+        for robot in robots or []:
+            self.Add(robot)
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Stop()
+
+    def Interval(self, mission):
+        """
+        Get the time to wait before polling a robot again, before jitter
+
+        Args:
+            mission:    the result of GetMission (dict)
+
+        Returns:
+            The interval in seconds (float)
+        """
+        interval = self.intervals.get(mission.get("robotStatus"), self.intervals[RobotStatus.Unknown])
+        if mission.get("error") or mission.get("readyStatus", ReadyStatus.Ready) not in _QuietReadyStatus:
+            interval = min(interval, self.errorInterval)
+        return interval
+
+    def Backoff(self, failures):
+        """
+        Get the time to wait before polling an unreachable robot again, before jitter
+
+        Args:
+            failures:   the number of polls in a row that have failed (int)
+
+        Returns:
+            The interval in seconds (float)
+        """
+        return min(self.maxBackoff, self.backoffBase * (2 ** min(failures - 1, 32)))
+
+    def _Jitter(self, interval):
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _Schedule(self, state, delay):
+        """
+        Schedule the next poll of a robot.  Must be called with the condition held
+        """
+        heapq.heappush(self._heap, (self.clock() + delay, next(self._sequence), state))
+        self._condition.notify()
+
+    def Add(self, robot, delay=None):
+        """
+        Start polling a robot
+
+        Args:
+            robot:  the robot to poll (Robot)
+            delay:  seconds until the first poll, or None to pick a random time within the Unknown status interval
+                    so that adding many robots at once does not poll them all at once (float)
+        """
+        if delay is None:
+            delay = random.uniform(0, self.intervals[RobotStatus.Unknown])
+        with self._condition:
+            if robot in self._states:
+                return
+            state = _PollState(robot)
+            self._states[robot] = state
+            self._Schedule(state, delay)
+
+    def Remove(self, robot):
+        """
+        Stop polling a robot
+
+        Args:
+            robot:  the robot to stop polling (Robot)
+        """
+        with self._condition:
+            state = self._states.pop(robot, None)
+            if state is not None:
+                state.removed = True
+
+    def LastMission(self, robot):
+        """
+        Get the result of the most recent successful poll of a robot
+
+        Args:
+            robot:  the robot (Robot)
+
+        Returns:
+            The result of GetMission, or None if the robot has not been polled yet (dict)
+        """
+        state = self._states.get(robot)
+        return state.mission if state is not None else None
+
+    def Start(self):
+        """
+        Start polling in the background
+        """
+        with self._condition:
+            if self._dispatcher is not None:
+                return
+            self._stopping = False
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            self._dispatcher = threading.Thread(target=self._Dispatch, name="MissionPoller")
+            self._dispatcher.daemon = True
+            self._dispatcher.start()
+
+    def Stop(self):
+        """
+        Stop polling and wait for any polls in progress to finish
+        """
+        with self._condition:
+            if self._dispatcher is None:
+                return
+            self._stopping = True
+            self._condition.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+        self._dispatcher = None
+        self._executor = None
+
+    def _Dispatch(self):
+        """
+        Hand each poll to the worker pool when it is due
+        """
+        while True:
+            with self._condition:
+                while not self._stopping:
+                    if self._heap:
+                        wait = self._heap[0][0] - self.clock()
+                        if wait <= 0:
+                            break
+                    else:
+                        wait = None
+                    self._condition.wait(wait)
+                if self._stopping:
+                    return
+                due, _, state = heapq.heappop(self._heap)
+                if state.removed:
+                    continue
+                self._queued += 1
+            self._executor.submit(self._Poll, state, due)
+
+    def _Poll(self, state, due):
+        """
+        Poll a single robot and schedule its next poll
+        """
+        lag = max(0.0, self.clock() - due)
+        with self._condition:
+            self._queued -= 1
+            self._inFlight += 1
+            self._polls += 1
+            self._lastLag = lag
+            self._maxLag = max(self._maxLag, lag)
+            self._meanLag += (lag - self._meanLag) * 0.05
+
+        mission = None
+        error = None
+        try:
+            mission = state.robot.GetMission()
+        except Exception as ex: #pylint: disable=broad-except
+            error = ex
+
+        with self._condition:
+            self._inFlight -= 1
+            if error is None:
+                state.failures = 0
+                state.mission = mission
+                delay = self.Interval(mission)
+            else:
+                state.failures += 1
+                self._failures += 1
+                delay = self.Backoff(state.failures)
+            state.error = error
+            # Even while stopping, so that the robot is polled again after the next Start
+            if not state.removed:
+                self._Schedule(state, self._Jitter(delay))
+
+        if self.callback is not None:
+            self.callback(state.robot, mission, error)
+
+    def Stats(self):
+        """
+        Get the scheduler counters, for sizing the worker pool
+
+        queueDepth is the number of polls that are due but waiting for a free
+        worker, and lag is how late polls start compared to when they were due.
+        If lag keeps growing there are not enough workers.
+
+        Returns:
+            A dictionary of counters (dict)
+        """
+        with self._condition:
+            return {
+                "robots" : len(self._states),
+                "scheduled" : len(self._heap),
+                "queueDepth" : self._queued,
+                "inFlight" : self._inFlight,
+                "polls" : self._polls,
+                "failures" : self._failures,
+                "lastLag" : self._lastLag,
+                "meanLag" : self._meanLag,
+                "maxLag" : self._maxLag
+            }
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+"""
+Bring the schedules, cleaning preferences and clocks of many robots in line
+with a desired configuration, writing only what differs
+
+    standard = DesiredState(schedule=schedule, preferences=[CarpetBoost.Perf, EdgeClean.On],
+                            timezone="America/Denver", maxClockDrift=2)
+    results = Reconciler().Reconcile([(robot, standard) for robot in robots], dryRun=True)
+    for result in results:
+        print(result.robot.ip, result.changes)
+
+Each robot's current state is read with one GetSnapshot of just the resources
+the desired state mentions, and the robots are read concurrently.  A robot
+that already matches gets no writes at all; otherwise it gets at most one
+"set prefs", one "set week" and one "set time".
+"""
+
+from __future__ import print_function
+import asyncio
+import calendar
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+from .fleet import DEFAULT_MAX_WORKERS
+
+_MINUTES_PER_WEEK = 7 * 24 * 60
+_DayIndex = dict((name, idx) for idx, name in enumerate(calendar.day_name))
+
+class DesiredState(object):
+    """
+    The configuration a robot or group of robots should have.  Anything left as None is not enforced
+    """
+    __slots__ = ("schedule", "preferences", "timezone", "maxClockDrift")
+
+    def __init__(self, schedule=None, preferences=None, timezone=None, maxClockDrift=None):
+        """
+        Args:
+            schedule:       the schedule for some or all days, in the form GetSchedule returns; days that are left out
+                            are not enforced (dict)
+            preferences:    the cleaning preferences, as a dictionary like GetCleaningPreferences returns with some or
+                            all of its keys, or a list of preference enum values (dict or list of Enum)
+            timezone:       the tz database name of the robot's timezone (str)
+            maxClockDrift:  the most minutes the robot's clock may be off by before it is set (int)
+        """
+        if preferences is not None and not isinstance(preferences, dict):
+            preferences = dict((type(value).PrefName(), value) for value in preferences)
+        for day in schedule or {}:
+            assert day in _DayIndex, "{} is not a day name".format(day)
+        assert maxClockDrift is None or maxClockDrift >= 0, "maxClockDrift cannot be negative"
+        self.schedule = schedule
+        self.preferences = preferences
+        self.timezone = timezone
+        self.maxClockDrift = maxClockDrift
+
+    def Override(self, **fields):
+        """
+        Make a copy of this state with some fields replaced, e.g. for one robot in a group
+
+        Args:
+            fields: the fields to replace (see __init__)
+
+        Returns:
+            The new state (DesiredState)
+        """
+        values = dict((name, getattr(self, name)) for name in self.__slots__)
+        values.update(fields)
+        return DesiredState(**values)
+
+    def Resources(self):
+        """
+        Get the "get" resources needed to compare a robot with this state
+
+        Returns:
+            The resource names (list of str)
+        """
+        resources = []
+        if self.preferences or self.timezone is not None:
+            resources.append("prefs")
+        if self.schedule:
+            resources.append("week")
+        if self.maxClockDrift is not None:
+            resources.append("time")
+        return resources
+
+    def __repr__(self):
+        return "DesiredState({})".format(", ".join("{}={!r}".format(name, getattr(self, name))
+                                                    for name in self.__slots__ if getattr(self, name) is not None))
+
+class Change(object):
+    """
+    One difference between a robot and its desired state.  For the clock, field is "drift" and current is how many
+    minutes the robot's clock is off by
+    """
+    __slots__ = ("resource", "field", "current", "desired")
+
+    def __init__(self, resource, field, current, desired):
+        self.resource = resource
+        self.field = field
+        self.current = current
+        self.desired = desired
+
+    def ToDict(self):
+        return {"resource" : self.resource, "field" : self.field, "current" : self.current, "desired" : self.desired}
+
+    def __eq__(self, other):
+        if not isinstance(other, Change):
+            return NotImplemented
+        return self.ToDict() == other.ToDict()
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Change({!r}, {!r}, {!r} -> {!r})".format(self.resource, self.field, self.current, self.desired)
+
+class ReconcileResult(object):
+    """
+    What reconciling one robot found and did
+
+    Attributes:
+        robot:      the robot (Robot or AsyncRobot)
+        changes:    the differences from the desired state (list of Change)
+        written:    the resources that were set, in order, which is empty for a dry run (list of str)
+        error:      the error that stopped the robot being read or written, or None (Exception)
+    """
+    __slots__ = ("robot", "changes", "written", "error")
+
+    def __init__(self, robot, changes=None, written=None, error=None):
+        self.robot = robot
+        self.changes = changes or []
+        self.written = written or []
+        self.error = error
+
+    @property
+    def ok(self):
+        """
+        True if the robot was reconciled without an error (bool)
+        """
+        return self.error is None
+
+    def __repr__(self):
+        if not self.ok:
+            return "ReconcileResult({}, error={!r})".format(self.robot.ip, self.error)
+        return "ReconcileResult({}, changes={!r}, written={!r})".format(self.robot.ip, self.changes, self.written)
+
+def ClockDrift(robotTime, now):
+    """
+    Get how far a robot's clock is from the local time.  Robots only keep the weekday, hour and minute
+
+    Args:
+        robotTime:  the robot time, as GetTime returns it (dict)
+        now:        the local time (datetime)
+
+    Returns:
+        The drift in minutes, either way round (int)
+    """
+    robot_minute = _DayIndex[robotTime["weekday"]] * 24 * 60 + robotTime["time"].hour * 60 + robotTime["time"].minute
+    local_minute = now.weekday() * 24 * 60 + now.hour * 60 + now.minute
+    drift = abs(robot_minute - local_minute) % _MINUTES_PER_WEEK
+    return min(drift, _MINUTES_PER_WEEK - drift)
+
+def _ScheduleDayDiffers(current, desired):
+    """
+    Check whether one day of a schedule needs writing; the start time of a day with no cleaning does not matter
+    """
+    if current["clean"] != desired["clean"]:
+        return True
+    return desired["clean"] and current["startTime"] != desired["startTime"]
+
+def Diff(desired, current, now):
+    """
+    Compare a robot's current state with its desired state, and work out the writes that bring it in line
+
+    Args:
+        desired:    the desired state (DesiredState)
+        current:    the robot's current state, as GetSnapshot returns it for desired.Resources() (dict)
+        now:        the local time, to compare the robot's clock with and to set it to (datetime)
+
+    Returns:
+        A tuple of (the differences (list of Change), the writes as (resource, value) in the order to send them, where
+        the value is the argument for SetCleaningPreferences, SetSchedule or SetTime (list of tuple))
+    """
+    changes = []
+    writes = []
+
+    if "prefs" in current:
+        prefs = current["prefs"]
+        wanted = dict(desired.preferences or {})
+        if desired.timezone is not None:
+            wanted["timezone"] = desired.timezone
+        for name in sorted(wanted):
+            if prefs.get(name) != wanted[name]:
+                changes.append(Change("prefs", name, prefs.get(name), wanted[name]))
+        if changes:
+            new_prefs = dict(prefs)
+            new_prefs.update(wanted)
+            writes.append(("prefs", new_prefs))
+
+    if "week" in current:
+        schedule = current["week"]
+        day_changes = [Change("week", day, schedule[day], desired.schedule[day])
+                       for day in sorted(desired.schedule, key=_DayIndex.get)
+                       if _ScheduleDayDiffers(schedule[day], desired.schedule[day])]
+        if day_changes:
+            new_schedule = dict(schedule)
+            new_schedule.update(desired.schedule)
+            writes.append(("week", new_schedule))
+            changes.extend(day_changes)
+
+    if "time" in current:
+        drift = ClockDrift(current["time"], now)
+        if drift > desired.maxClockDrift:
+            changes.append(Change("time", "drift", drift, 0))
+            writes.append(("time", now))
+
+    return changes, writes
+
+# The Robot method that writes each resource
+_Setters = {"prefs" : "SetCleaningPreferences", "week" : "SetSchedule", "time" : "SetTime"}
+
+def _Invalidate(robot, resources):
+    """
+    Drop any cached copies of the resources, so the robot's current state is read
+    """
+    if robot.cache is not None:
+        for resource in resources:
+            robot.cache.Invalidate(robot.ip, resource)
+
+class Reconciler(object):
+    """
+    Reconcile Robots with their desired states, a bounded number at a time on a thread pool
+
+    An error from one robot is kept in its result and does not stop the others.
+    """
+
+    def __init__(self, maxWorkers=DEFAULT_MAX_WORKERS, clock=datetime.datetime.now):
+        """
+        Args:
+            maxWorkers: the most robots to reconcile at once (int)
+            clock:      returns the local time to compare clocks with (callable)
+        """
+        self.maxWorkers = maxWorkers
+        self.clock = clock
+
+    def ReconcileRobot(self, robot, desired, dryRun=False):
+        """
+        Read one robot's current state and write whatever differs from the desired state
+
+        Args:
+            robot:      the robot (Robot)
+            desired:    the state the robot should have (DesiredState)
+            dryRun:     only work out the changes, and do not write them (bool)
+
+        Returns:
+            The changes found and the resources written (ReconcileResult)
+        """
+        result = ReconcileResult(robot)
+        resources = desired.Resources()
+        if not resources:
+            return result
+        try:
+            _Invalidate(robot, resources)
+            current = robot.GetSnapshot(resources)
+            result.changes, writes = Diff(desired, current, self.clock())
+            if not dryRun:
+                for resource, value in writes:
+                    getattr(robot, _Setters[resource])(value)
+                    result.written.append(resource)
+        except Exception as ex: #pylint: disable=broad-except
+            result.error = ex
+        return result
+
+    def Reconcile(self, targets, dryRun=False):
+        """
+        Reconcile many robots concurrently
+
+        Args:
+            targets:    (robot, desired state) pairs; give every robot in a group the same DesiredState
+                        (iterable of tuple of (Robot, DesiredState))
+            dryRun:     only work out the changes, and do not write them (bool)
+
+        Returns:
+            The result for each robot, in the same order as targets (list of ReconcileResult)
+        """
+        targets = list(targets)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.maxWorkers, len(targets)))) as executor:
+            futures = [executor.submit(self.ReconcileRobot, robot, desired, dryRun) for robot, desired in targets]
+            return [future.result() for future in futures]
+
+class AsyncReconciler(Reconciler):
+    """
+    Reconcile AsyncRobots with their desired states from one event loop, with at most maxWorkers robots in progress
+    at once
+    """
+
+    async def ReconcileRobot(self, robot, desired, dryRun=False):
+        """
+        Read one robot's current state and write whatever differs from the desired state.  See
+        Reconciler.ReconcileRobot
+
+        Returns:
+            The changes found and the resources written (ReconcileResult)
+        """
+        result = ReconcileResult(robot)
+        resources = desired.Resources()
+        if not resources:
+            return result
+        try:
+            _Invalidate(robot, resources)
+            current = await robot.GetSnapshot(resources)
+            result.changes, writes = Diff(desired, current, self.clock())
+            if not dryRun:
+                for resource, value in writes:
+                    await getattr(robot, _Setters[resource])(value)
+                    result.written.append(resource)
+        except Exception as ex: #pylint: disable=broad-except
+            result.error = ex
+        return result
+
+    async def Reconcile(self, targets, dryRun=False):
+        """
+        Reconcile many robots concurrently.  See Reconciler.Reconcile
+
+        Returns:
+            The result for each robot, in the same order as targets (list of ReconcileResult)
+        """
+        semaphore = asyncio.Semaphore(self.maxWorkers)
+
+        async def reconcile(robot, desired):
+            async with semaphore:
+                return await self.ReconcileRobot(robot, desired, dryRun)
+
+        return list(await asyncio.gather(*[reconcile(robot, desired) for robot, desired in targets]))
+
+def Summarize(results):
+    """
+    Count the outcomes of a reconciliation, for a nightly report
+
+    Args:
+        results:    the results from Reconcile (list of ReconcileResult)
+
+    Returns:
+        A dict of robots, inSync (robots with no changes), changed (robots with changes), failed (robots with an error),
+        and writes (set requests sent) (dict)
+    """
+    summary = dict.fromkeys(("robots", "inSync", "changed", "failed", "writes"), 0)
+    for result in results:
+        summary["robots"] += 1
+        summary["writes"] += len(result.written)
+        if not result.ok:
+            summary["failed"] += 1
+        elif result.changes:
+            summary["changed"] += 1
+        else:
+            summary["inSync"] += 1
+    return summary
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""
+Retry and circuit breaker policies for requests to robots
+
+A robot that drops off the network should cost its callers a bounded amount
+of time, not a hung worker.  RetryPolicy decides whether and when a failed
+request is tried again, and CircuitBreaker fails requests to a robot
+immediately once it has failed enough times in a row, until a trial request
+gets through.  Robot and AsyncRobot use one of each per robot.
+"""
+
+from __future__ import print_function
+import random
+import threading
+import time
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_RETRY_BACKOFF = 0.2
+DEFAULT_RETRY_MAX_BACKOFF = 2.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30
+
+class CircuitOpenError(IOError):
+    """ Exception thrown instead of sending a request to a robot that is known to be down """
+
+    def __init__(self, robotIP, retryAfter):
+        super(CircuitOpenError, self).__init__()
+        self.robotIP = robotIP
+        self.retryAfter = retryAfter
+    def __str__(self):
+        return "Robot {} is not responding; not retrying for {:.1f} seconds".format(self.robotIP, self.retryAfter)
+
+class DeadlineExceeded(IOError):
+    """ Exception thrown when a call to a robot runs out of time, including any retries """
+
+    def __init__(self, deadline):
+        super(DeadlineExceeded, self).__init__()
+        self.deadline = deadline
+    def __str__(self):
+        return "Call did not complete within {} seconds".format(self.deadline)
+
+class RetryPolicy(object):
+    """
+    When to retry a failed request
+
+    Only commands in retryCommands are retried, since they are idempotent; by
+    default that is "get", so "set" and "cmd" requests are sent exactly once.
+    Only network errors (IOError, which includes timeouts) are retried; an
+    error returned by the robot is not.  The delay before each retry is drawn
+    uniformly between 0 and an exponentially growing cap ("full jitter"), so a
+    fleet of clients that failed together does not retry together.
+    """
+
+    def __init__(self, attempts=DEFAULT_RETRY_ATTEMPTS, backoff=DEFAULT_RETRY_BACKOFF, maxBackoff=DEFAULT_RETRY_MAX_BACKOFF, retryCommands=("get",)):
+        """
+        Args:
+            attempts:       the most times to send a request, including the first (int)
+            backoff:        the cap on the delay before the first retry, doubled for each retry after that (float)
+            maxBackoff:     the largest cap on the delay before a retry (float)
+            retryCommands:  the commands that are safe to retry (sequence of str)
+        """
+        assert attempts >= 1
+        self.attempts = attempts
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.retryCommands = frozenset(retryCommands)
+
+    def Delay(self, cmd, error, attempt, remaining=None):
+        """
+        Decide whether to retry a failed request
+
+        Args:
+            cmd:        the "do" argument for the request (str)
+            error:      the exception the request raised (Exception)
+            attempt:    the number of attempts made so far (int)
+            remaining:  the time left before the call's deadline, or None if there is no deadline (float)
+
+        Returns:
+            The seconds to wait before retrying, or None to not retry (float)
+        """
+        if attempt >= self.attempts or cmd not in self.retryCommands:
+            return None
+        if not isinstance(error, IOError) or isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+            return None
+        delay = random.uniform(0, min(self.maxBackoff, self.backoff * 2 ** (attempt - 1)))
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+class CircuitBreaker(object):
+    """
+    Tracks whether a robot is responding, and fails requests fast while it is not
+
+    The breaker starts closed.  After failureThreshold network errors in a row
+    it opens, and requests fail immediately with CircuitOpenError.  After
+    resetTimeout seconds it is half open: one trial request is let through, and
+    the breaker closes if it succeeds or opens again if it fails.  Any answer
+    from the robot, including an error code, counts as a success.  A trial
+    that ends any other way, e.g. by being cancelled, must be given back with
+    EndTrial, so that the next request can be the trial.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failureThreshold=DEFAULT_FAILURE_THRESHOLD, resetTimeout=DEFAULT_RESET_TIMEOUT, clock=_monotonic):
+        """
+        Args:
+            failureThreshold:   the number of failures in a row that opens the breaker, or None to never open (int)
+            resetTimeout:       seconds to fail fast before letting a trial request through (float)
+            clock:              the function to get the current time from (callable)
+        """
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.clock = clock
+        self.failures = 0
+        self.opened = 0
+        self._openedAt = None
+        # The token of the trial request in flight, or None
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        The current state: CLOSED, OPEN or HALF_OPEN (str)
+        """
+        with self._lock:
+            return self._State()
+
+    def _State(self):
+        if self._openedAt is None:
+            return self.CLOSED
+        if self.clock() - self._openedAt >= self.resetTimeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def Allow(self, robotIP=None):
+        """
+        Check that a request may be sent, and raise CircuitOpenError if not
+
+        Args:
+            robotIP:    the IP address of the robot, for the error message (str)
+
+        Returns:
+            A token to give to EndTrial if the request is the half open breaker's trial, otherwise None (object)
+        """
+        with self._lock:
+            state = self._State()
+            if state == self.CLOSED:
+                return None
+            if state == self.HALF_OPEN and self._trial is None:
+                self._trial = object()
+                return self._trial
+            raise CircuitOpenError(robotIP, max(0.0, self._openedAt + self.resetTimeout - self.clock()))
+
+    def RecordSuccess(self):
+        """
+        Record that the robot answered a request
+        """
+        with self._lock:
+            self.failures = 0
+            self._openedAt = None
+            self._trial = None
+
+    def RecordFailure(self):
+        """
+        Record that a request to the robot failed with a network error
+        """
+        with self._lock:
+            self.failures += 1
+            if self._trial is not None or \
+               (self._openedAt is None and self.failureThreshold is not None and self.failures >= self.failureThreshold):
+                self._openedAt = self.clock()
+                self.opened += 1
+            self._trial = None
+
+    def EndTrial(self, trial):
+        """
+        Give back a trial request that ended without RecordSuccess or RecordFailure, leaving the breaker half open
+
+        Args:
+            trial:  the token from Allow, or None (object)
+        """
+        with self._lock:
+            if trial is not None and self._trial is trial:
+                self._trial = None
+
+    def Reset(self):
+        """
+        Close the breaker, e.g. after the robot is known to be back
+        """
+        self.RecordSuccess()
+
+    def Stats(self):
+        """
+        Get the state of the breaker
+
+        Returns:
+            A dict with the state, the current run of failures and the number of times the breaker has opened (dict)
+        """
+        with self._lock:
+            return {"state" : self._State(), "failures" : self.failures, "opened" : self.opened}
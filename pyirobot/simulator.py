@@ -0,0 +1,979 @@
+#!/usr/bin/env python
+"""
+A simulated robot /umi server, for testing and benchmarking without hardware
+
+SimulatedRobot answers the same get and set requests as a real robot - prefs,
+mssn, time, week, wlstat, wllaststat, sys, sku, cloudcfg, bbrun, wlconfig,
+passwd and the cmd ops - and keeps mission state that moves on as time
+passes: a started mission covers ground, drains the battery and fills the bin,
+then the robot returns to its dock and charges.  Scheduled cleanings start on
+their own.  Time can run faster than real time with speed, or be driven by a
+fake clock.
+
+RobotSimulator serves any number of simulated robots over HTTPS on localhost
+from one asyncio event loop, either each on its own port or all on one shared
+port.  On a shared port each request goes to the robot whose password it
+authenticates with, so thousands of robots only need one listening socket.  It
+can add latency, answer with robot errors, drop or stall requests at random,
+and limit how many connections each robot accepts, like a real robot does.
+With mqttPort it also stands in for the robots' local MQTT brokers, pushing
+each robot's state to logged in clients as newer firmware does, for testing
+pyirobot.stream.  With discoveryPort it answers the UDP discovery query for
+every robot, for testing pyirobot.discovery.
+
+    simulator = RobotSimulator(latency=0.02, dropRate=0.01)
+    robots = [simulator.AddRobot() for _ in range(1000)]
+    with SimulatorThread(simulator):
+        fleet = RobotFleet([Robot(sim.address, sim.password) for sim in robots])
+        print(fleet.GetMission())
+
+From asyncio code, use "async with simulator:" instead of SimulatorThread.
+Run this module to serve robots from the command line.
+"""
+
+from __future__ import print_function
+import argparse
+import asyncio
+import base64
+import calendar
+import datetime
+import itertools
+import json
+import os
+import random
+import ssl
+import string
+import threading
+import time
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+# The self signed certificate and key the simulator serves HTTPS with
+DEFAULT_CERTIFICATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "simulator.pem")
+DEFAULT_STALL_TIME = 60
+
+# How often a simulated robot pushes changes to its state over MQTT
+DEFAULT_PUSH_INTERVAL = 1.0
+
+# Error codes the simulated robots answer bad requests with
+ERROR_UNKNOWN_RESOURCE = 1
+ERROR_BAD_ARGS = 2
+ERROR_NOT_PAIRING = 3
+ERROR_INJECTED = 11
+
+_DAYS = [calendar.day_abbr[(idx + 6) % 7].lower() for idx in range(7)]
+_MINUTES_PER_WEEK = 7 * 24 * 60
+
+_BIN_FULL = 1
+_BIN_MISSING = 2
+_RESUMING = 8
+
+_RETURN_MINUTES = 2
+_LOW_BATTERY = 15
+_PAUSE_EXPIRE_MINUTES = 90
+# The mission fields a robot reports over MQTT in cleanMissionStatus
+_MISSION_STATUS_FIELDS = ("cycle", "phase", "expireM", "rechrgM", "error", "notReady", "mssnM", "sqft", "nMssn")
+# The error codes a robot reports when it gets stuck, from _ErrorMessages
+_STUCK_ERRORS = (1, 2, 5, 6, 8, 9, 10, 14, 16)
+
+class SimulatedRobot(object):
+    """
+    The state of one simulated robot, and how it answers /umi requests
+    """
+
+    def __init__(self, name=None, password=None, seed=None, clock=_monotonic, speed=1.0, areaSqft=None, binCapacity=1500,
+                 faultRate=0.0, multiGet=False):
+        """
+        Args:
+            name:           the robot name, or None for a random one (str)
+            password:       the robot password, or None for a random one (str)
+            seed:           the seed for the robot's random numbers, or None to seed from the system (int)
+            clock:          returns the current time in seconds (callable)
+            speed:          how many simulated seconds pass per second of the clock (float)
+            areaSqft:       the square feet a mission covers before it is finished, or None for a random area (int)
+            binCapacity:    the square feet of cleaning that fill the bin (int)
+            faultRate:      the chance per simulated minute of cleaning that the robot gets stuck (float)
+            multiGet:       answer a "get" with several args, which real robots do not (bool)
+        """
+        self._random = random.Random(seed)
+        self.name = name or "Roomba-{:04d}".format(self._random.randint(0, 9999))
+        self.password = password or "".join(self._random.choice(string.ascii_letters + string.digits + "|:")
+                                            for _ in range(19))
+        self.blid = [self._random.randint(0, 255) for _ in range(8)]
+        self.clock = clock
+        self.speed = speed
+        self.areaSqft = areaSqft or self._random.randint(400, 900)
+        self.binCapacity = binCapacity
+        self.faultRate = faultRate
+        self.multiGet = multiGet
+        # The address clients should connect to; set when the simulator starts
+        self.address = None
+        # The address MQTT clients should connect to, if the simulator serves MQTT; set when the simulator starts
+        self.mqttAddress = None
+        # False to drop every connection, as if the robot had left the network
+        self.online = True
+        # True while the home button is held, when the robot gives out its password
+        self.pairing = False
+        self.requests = 0
+
+        self.prefs = {"flags" : 1024 + 32, "lang" : 0, "timezone" : "America/Chicago", "name" : self.name}
+        self.week = {"cycle" : ["none"] * 7, "h" : [9] * 7, "m" : [0] * 7}
+        self.mission = {"flags" : 0, "cycle" : "none", "phase" : "charge", "batPct" : 100, "expireM" : 0, "rechrgM" : 0,
+                        "error" : 0, "notReady" : 0, "mssnM" : 0, "sqft" : 0, "nMssn" : self._random.randint(0, 200),
+                        "pos" : {"theta" : 0, "point" : {"x" : 0, "y" : 0}}}
+        self.bbrun = {"hr" : self._random.randint(0, 500), "min" : 0, "sqft" : 0, "nStuck" : 0, "nScrubs" : 0,
+                      "nPicks" : 0, "nPanics" : 0, "nCliffsF" : 0, "nCliffsR" : 0, "nMBStll" : 0, "nWStll" : 0,
+                      "nCBump" : 0}
+        self.signalStrength = self._random.randint(30, 70)
+        self.ipAddress = self._random.randint(2, 254) << 24 | 1 << 16 | 168 << 8 | 192
+        self.binLevel = 0
+        self._heading = 1
+        self._returnLeft = 0
+        now = datetime.datetime.now()
+        self.minuteOfWeek = float(now.isoweekday() % 7 * 24 * 60 + now.hour * 60 + now.minute)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _Advance(self):
+        """
+        Move the robot state on to the current time
+        """
+        now = self.clock()
+        minutes = (now - self._updated) * self.speed / 60.0
+        self._updated = now
+        start = self.minuteOfWeek
+        self.minuteOfWeek += minutes
+        minute = int(start) + 1
+        end = int(self.minuteOfWeek)
+        while minute <= end:
+            if self._IsIdle():
+                # Nothing changes while the robot sits charged or stopped, so skip straight to the next scheduled start
+                next_start = self._NextScheduledStart(minute, end)
+                if next_start is None:
+                    break
+                minute = next_start
+            self._Tick(minute)
+            minute += 1
+        self.minuteOfWeek %= _MINUTES_PER_WEEK
+
+    def _IsIdle(self):
+        phase = self.mission["phase"]
+        if phase == "charge":
+            return self.mission["batPct"] >= 100
+        return phase == "stuck" or (phase in ("stop", "none") and self.mission["cycle"] == "none")
+
+    def _ScheduledAt(self, minute):
+        minute %= _MINUTES_PER_WEEK
+        day, time_of_day = divmod(minute, 24 * 60)
+        return self.week["cycle"][day] == "start" and time_of_day == self.week["h"][day] * 60 + self.week["m"][day]
+
+    def _NextScheduledStart(self, first, last):
+        starts = [day * 24 * 60 + self.week["h"][day] * 60 + self.week["m"][day]
+                  for day in range(7) if self.week["cycle"][day] == "start"]
+        if not starts:
+            return None
+        candidates = [first + (start - first) % _MINUTES_PER_WEEK for start in starts]
+        minute = min(candidates)
+        return minute if minute <= last else None
+
+    def _Tick(self, minute):
+        """
+        Move the robot state on by one simulated minute
+        """
+        mission = self.mission
+        mission["flags"] &= ~_RESUMING
+        phase = mission["phase"]
+        if self._ScheduledAt(minute) and mission["cycle"] == "none" and phase in ("charge", "stop", "none"):
+            self._StartMission()
+            return
+
+        if phase == "run":
+            gained = self._random.randint(15, 25)
+            mission["mssnM"] += 1
+            mission["sqft"] += gained
+            mission["batPct"] = max(0, mission["batPct"] - 1)
+            self.bbrun["sqft"] += gained
+            self._AddRunMinute()
+            self.binLevel += gained
+            if self.binLevel >= self.binCapacity:
+                mission["flags"] |= _BIN_FULL
+            self._Move()
+            if self.faultRate and self._random.random() < self.faultRate:
+                mission["phase"] = "stuck"
+                mission["error"] = self._random.choice(_STUCK_ERRORS)
+                self.bbrun["nStuck"] += 1
+            elif mission["sqft"] >= self.areaSqft or mission["batPct"] <= _LOW_BATTERY:
+                self._ReturnHome("hmPostMsn")
+        elif phase in ("hmPostMsn", "hmUsrDock"):
+            mission["batPct"] = max(0, mission["batPct"] - 1)
+            self._returnLeft -= 1
+            if self._returnLeft <= 0:
+                mission["phase"] = "charge"
+                mission["cycle"] = "none"
+                mission["pos"] = {"theta" : 0, "point" : {"x" : 0, "y" : 0}}
+        elif phase == "charge":
+            mission["batPct"] = min(100, mission["batPct"] + 2)
+        elif phase == "stop" and mission["cycle"] != "none":
+            mission["expireM"] -= 1
+            if mission["expireM"] <= 0:
+                mission["expireM"] = 0
+                mission["cycle"] = "none"
+
+    def _AddRunMinute(self):
+        self.bbrun["min"] += 1
+        if self.bbrun["min"] >= 60:
+            self.bbrun["min"] = 0
+            self.bbrun["hr"] += 1
+
+    def _Move(self):
+        """
+        Move along a back and forth pattern across the room
+        """
+        point = self.mission["pos"]["point"]
+        point["x"] += 50 * self._heading
+        if abs(point["x"]) > 400:
+            point["x"] = 400 * self._heading
+            point["y"] += 30
+            self._heading = -self._heading
+        self.mission["pos"]["theta"] = 0 if self._heading > 0 else 180
+
+    def _StartMission(self):
+        mission = self.mission
+        mission.update({"phase" : "run", "cycle" : "quick" if self.prefs["flags"] & 1025 == 1024 else "clean", "mssnM" : 0,
+                        "sqft" : 0, "expireM" : 0, "error" : 0, "notReady" : 0})
+        mission["nMssn"] += 1
+        if mission["flags"] & _BIN_MISSING:
+            mission["phase"] = "stop"
+            mission["notReady"] = 7
+
+    def _ReturnHome(self, phase):
+        self.mission["phase"] = phase
+        self.mission["expireM"] = 0
+        self._returnLeft = _RETURN_MINUTES
+
+    def _Command(self, op):
+        mission = self.mission
+        phase = mission["phase"]
+        if op == "start":
+            if mission["cycle"] == "none" and phase in ("charge", "stop", "none"):
+                self._StartMission()
+        elif op == "pause":
+            if phase == "run":
+                mission["phase"] = "stop"
+                mission["expireM"] = _PAUSE_EXPIRE_MINUTES
+        elif op == "resume":
+            if phase == "stop" and mission["cycle"] != "none":
+                mission["phase"] = "run"
+                mission["expireM"] = 0
+                mission["flags"] |= _RESUMING
+        elif op == "stop":
+            if phase in ("run", "stop", "stuck"):
+                mission.update({"phase" : "stop", "cycle" : "none", "expireM" : 0, "error" : 0})
+        elif op == "dock":
+            if phase in ("stop", "stuck", "none"):
+                mission["error"] = 0
+                self._ReturnHome("hmUsrDock")
+        else:
+            raise _UMIError(ERROR_BAD_ARGS)
+
+    def _Get(self, resource):
+        mission = self.mission
+        if resource == "mssn":
+            return json.loads(json.dumps(mission))
+        if resource == "prefs":
+            return dict(self.prefs)
+        if resource == "time":
+            day, time_of_day = divmod(int(self.minuteOfWeek), 24 * 60)
+            return {"d" : _DAYS[day], "h" : time_of_day // 60, "m" : time_of_day % 60}
+        if resource == "week":
+            return json.loads(json.dumps(self.week))
+        if resource == "wlstat":
+            return {"addr" : self.ipAddress, "bssid" : [36, 164, 60, 1, 2, 171], "dhcp" : 1, "dns1" : 16820416, "dns2" : 0,
+                    "gtwy" : 16820416, "mask" : 16777215, "sec" : 4, "strssi" : self._SignalStrength()}
+        if resource == "wllaststat":
+            return {"softap" : 0, "conn" : 1, "strssi" : self._SignalStrength()}
+        if resource == "sys":
+            return {"blid" : list(self.blid), "sw" : "v1.6.6", "mac" : "00:00:00:00:00:00", "batteryType" : "lith"}
+        if resource == "sku":
+            return {"sku" : "R980020"}
+        if resource == "cloudcfg":
+            return {"cloudEnv" : "prod", "svcEndpoints" : {"discovery" : "disc-prod.iot.irobotapi.com"}}
+        if resource == "bbrun":
+            return dict(self.bbrun)
+        if resource == "wlconfig":
+            return {"sec" : 4, "ssid" : "486f6d65"}
+        raise _UMIError(ERROR_UNKNOWN_RESOURCE)
+
+    def _SignalStrength(self):
+        self.signalStrength = min(95, max(10, self.signalStrength + self._random.randint(-2, 2)))
+        return self.signalStrength
+
+    def _Set(self, resource, value):
+        if not isinstance(value, dict):
+            raise _UMIError(ERROR_BAD_ARGS)
+        if resource == "cmd":
+            self._Command(value.get("op"))
+        elif resource == "prefs":
+            self.prefs.update(value)
+            self.name = self.prefs["name"]
+        elif resource == "time":
+            if not all(isinstance(value.get(key), int) for key in ("d", "h", "m")):
+                raise _UMIError(ERROR_BAD_ARGS)
+            self.minuteOfWeek = float(value["d"] % 7 * 24 * 60 + value["h"] * 60 + value["m"])
+        elif resource == "week":
+            if any(len(value.get(key, ())) != 7 for key in ("cycle", "h", "m")):
+                raise _UMIError(ERROR_BAD_ARGS)
+            self.week = {"cycle" : list(value["cycle"]), "h" : list(value["h"]), "m" : list(value["m"])}
+        else:
+            raise _UMIError(ERROR_UNKNOWN_RESOURCE)
+        return None
+
+    def Handle(self, request, authenticated=True):
+        """
+        Answer a /umi request
+
+        Args:
+            request:        the decoded request body, with do, args and id (dict)
+            authenticated:  whether the request had the right password (bool)
+
+        Returns:
+            The response body, with either ok or err (dict)
+        """
+        with self._lock:
+            self.requests += 1
+            self._Advance()
+            try:
+                cmd = request.get("do")
+                args = request.get("args")
+                if not isinstance(args, list) or not args:
+                    raise _UMIError(ERROR_BAD_ARGS)
+                if cmd == "get" and args == ["passwd"]:
+                    if not self.pairing:
+                        raise _UMIError(ERROR_NOT_PAIRING)
+                    result = {"passwd" : self.password}
+                elif not authenticated:
+                    raise _UMIError(ERROR_BAD_ARGS)
+                elif cmd == "get" and len(args) == 1:
+                    result = self._Get(args[0])
+                elif cmd == "get":
+                    if not self.multiGet:
+                        raise _UMIError(ERROR_BAD_ARGS)
+                    result = dict((resource, self._Get(resource)) for resource in args)
+                elif cmd == "set" and len(args) == 2:
+                    result = self._Set(args[0], args[1])
+                else:
+                    raise _UMIError(ERROR_BAD_ARGS)
+            except _UMIError as ex:
+                return {"err" : ex.errorCode, "id" : request.get("id")}
+            return {"ok" : result, "id" : request.get("id")}
+
+    def Status(self):
+        """
+        Get the raw mission state, as a "get mssn" request would
+
+        Returns:
+            The mission (dict)
+        """
+        with self._lock:
+            self._Advance()
+            return self._Get("mssn")
+
+    def BLID(self):
+        """
+        Get the robot BLID, as Robot.GetBLID decodes it
+
+        Returns:
+            The BLID (str)
+        """
+        return "".join(hex(byte)[2:] for byte in self.blid)
+
+    def Reported(self):
+        """
+        Get the robot state as the robot reports it over MQTT
+
+        Returns:
+            The reported state, as in the "reported" part of a shadow update (dict)
+        """
+        with self._lock:
+            self._Advance()
+            mission = self.mission
+            flags = self.prefs["flags"]
+            return {
+                "cleanMissionStatus" : dict((key, mission[key]) for key in _MISSION_STATUS_FIELDS),
+                "batPct" : mission["batPct"],
+                "bin" : {"present" : not mission["flags"] & _BIN_MISSING, "full" : bool(mission["flags"] & _BIN_FULL)},
+                "pose" : json.loads(json.dumps(mission["pos"])),
+                "carpetBoost" : flags & 80 == 0,
+                "vacHigh" : flags & 80 == 80,
+                "noAutoPasses" : bool(flags & 1024),
+                "twoPass" : flags & 1025 == 1025,
+                "binPause" : bool(flags & 32),
+                "openOnly" : bool(flags & 2),
+                "language" : self.prefs["lang"],
+                "timezone" : self.prefs["timezone"],
+                "name" : self.prefs["name"]
+            }
+
+    def Announcement(self):
+        """
+        Get the robot's answer to the UDP discovery query.  The ip field is the robot's address, with its port, since
+        the simulated robots all share a host
+
+        Returns:
+            The announcement (dict)
+        """
+        with self._lock:
+            sys_info = self._Get("sys")
+            return {"ver" : "3", "hostname" : "Roomba-{}".format(self.BLID()), "robotname" : self.prefs["name"],
+                    "ip" : self.address, "mac" : sys_info["mac"], "sw" : sys_info["sw"], "sku" : self._Get("sku")["sku"],
+                    "nc" : 0, "proto" : "http"}
+
+    def Fault(self, error=None):
+        """
+        Make the robot stuck, as if it had hit a problem while cleaning
+
+        Args:
+            error:  the error code to report, or None for a random one (int)
+        """
+        with self._lock:
+            self._Advance()
+            self.mission["phase"] = "stuck"
+            self.mission["error"] = error if error is not None else self._random.choice(_STUCK_ERRORS)
+            self.bbrun["nStuck"] += 1
+
+    def EmptyBin(self):
+        """
+        Empty the robot's bin
+        """
+        with self._lock:
+            self.binLevel = 0
+            self.mission["flags"] &= ~(_BIN_FULL | _BIN_MISSING)
+            if self.mission["notReady"] == 7:
+                self.mission["notReady"] = 0
+
+class _UMIError(Exception):
+    def __init__(self, errorCode):
+        super(_UMIError, self).__init__()
+        self.errorCode = errorCode
+
+class _Request(object):
+    __slots__ = ("path", "headers", "body")
+
+    def __init__(self, path, headers, body):
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+def _Response(status, reason, body=b"", close=False):
+    head = ["HTTP/1.1 {} {}".format(status, reason),
+            "Content-Type: application/json",
+            "Content-Length: {}".format(len(body))]
+    if close:
+        head.append("Connection: close")
+    return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+def _Password(headers):
+    """
+    Get the password from a Basic Authorization header
+
+    Returns:
+        The password, or None if there is none (str)
+    """
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "basic":
+        return None
+    try:
+        return base64.b64decode(token).decode("utf-8").partition(":")[2]
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+class _DiscoveryResponder(asyncio.DatagramProtocol):
+    """
+    Answer the UDP discovery query with an announcement from every online robot
+    """
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if data.strip() != b"irobotmcs":
+            return
+        for robot in self.simulator.robots:
+            if robot.online:
+                self.transport.sendto(json.dumps(robot.Announcement(), separators=(",", ":")).encode("utf-8"), addr)
+                self.simulator._stats["announced"] += 1
+
+def _DefaultSSLContext():
+    """
+    Create an SSL context that serves the bundled self signed certificate
+
+    Returns:
+        The server SSL context (ssl.SSLContext)
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(DEFAULT_CERTIFICATE)
+    return context
+
+class RobotSimulator(object):
+    """
+    Serves simulated robots' /umi endpoints from an asyncio event loop
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, sharedPort=False, sslContext=None, latency=0.0, latencyJitter=0.0,
+                 errorRate=0.0, dropRate=0.0, stallRate=0.0, stallTime=DEFAULT_STALL_TIME, maxConnections=None, seed=None,
+                 mqttPort=None, pushInterval=DEFAULT_PUSH_INTERVAL, discoveryPort=None):
+        """
+        Args:
+            host:           the address to listen on (str)
+            port:           the port for the shared port, or the first port of a range for one port per robot, or 0 to
+                            pick free ports (int)
+            sharedPort:     serve every robot on one port, telling them apart by password (bool)
+            sslContext:     the SSL context to serve with, None for the bundled self signed certificate, or False to
+                            serve plain HTTP (ssl.SSLContext)
+            latency:        seconds to wait before answering each request (float)
+            latencyJitter:  up to this many more seconds to wait, chosen at random for each request (float)
+            errorRate:      the fraction of requests to answer with a robot error (float)
+            dropRate:       the fraction of requests to close the connection on without answering (float)
+            stallRate:      the fraction of requests to never answer, until stallTime passes (float)
+            stallTime:      seconds to hold a stalled request before closing the connection (float)
+            maxConnections: the most connections each robot accepts at once; more are closed straight away, or None for
+                            no limit (int)
+            seed:           the seed for choosing which requests fail, or None to seed from the system (int)
+            mqttPort:       the port to serve every robot's MQTT broker on, telling them apart by BLID, 0 to pick a free
+                            port, or None to not serve MQTT (int)
+            pushInterval:   seconds between the checks for state changes to push to MQTT clients (float)
+            discoveryPort:  the UDP port to answer the discovery query on, 0 to pick a free port, or None to not answer
+                            it (int)
+        """
+        self.host = host
+        self.port = port
+        self.sharedPort = sharedPort
+        self.sslContext = _DefaultSSLContext() if sslContext is None else sslContext
+        self.latency = latency
+        self.latencyJitter = latencyJitter
+        self.errorRate = errorRate
+        self.dropRate = dropRate
+        self.stallRate = stallRate
+        self.stallTime = stallTime
+        self.maxConnections = maxConnections
+        self.mqttPort = mqttPort
+        self.pushInterval = pushInterval
+        self.discoveryPort = discoveryPort
+        # The address to send the discovery query to, if the simulator answers it; set when the simulator starts
+        self.discoveryAddress = None
+        self.robots = []
+        self._random = random.Random(seed)
+        self._byPassword = {}
+        self._byBLID = {}
+        self._connections = {}
+        self._servers = []
+        self._datagramTransport = None
+        self._tasks = set()
+        self._stats = dict.fromkeys(("requests", "robotErrors", "injectedErrors", "dropped", "stalled", "rejected",
+                                     "unauthorized", "connections", "mqttConnections", "published", "announced"), 0)
+        self._peakConnections = 0
+
+    async def __aenter__(self):
+        await self.Start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.Close()
+
+    def AddRobot(self, robot=None, **kwargs):
+        """
+        Add a robot to serve.  Robots must be added before the simulator is started
+
+        Args:
+            robot:  the robot to add, or None to create one (SimulatedRobot)
+            kwargs: arguments for creating the robot, see SimulatedRobot
+
+        Returns:
+            The robot (SimulatedRobot)
+        """
+        assert not self._servers, "robots must be added before the simulator is started"
+        if robot is None:
+            robot = SimulatedRobot(**kwargs)
+        assert robot.password not in self._byPassword, "every robot needs a different password"
+        self.robots.append(robot)
+        self._byPassword[robot.password] = robot
+        self._byBLID[robot.BLID()] = robot
+        self._connections[robot.password] = 0
+        return robot
+
+    async def Start(self):
+        """
+        Start listening, and set the address of every robot
+        """
+        ssl_context = self.sslContext or None
+        if self.mqttPort is not None:
+            server = await asyncio.start_server(self._HandleMQTT, self.host, self.mqttPort, ssl=ssl_context, backlog=1024)
+            self._servers.append(server)
+            mqtt_address = "{}:{}".format(self.host, server.sockets[0].getsockname()[1])
+            for robot in self.robots:
+                robot.mqttAddress = mqtt_address
+        if self.sharedPort:
+            server = await asyncio.start_server(self._HandleConnection, self.host, self.port, ssl=ssl_context,
+                                                backlog=1024)
+            self._servers.append(server)
+            address = "{}:{}".format(self.host, server.sockets[0].getsockname()[1])
+            for robot in self.robots:
+                robot.address = address
+        else:
+            ports = itertools.count(self.port) if self.port else itertools.repeat(0)
+            for robot, port in zip(self.robots, ports):
+                handler = lambda reader, writer, robot=robot: self._HandleConnection(reader, writer, robot)
+                server = await asyncio.start_server(handler, self.host, port, ssl=ssl_context)
+                self._servers.append(server)
+                robot.address = "{}:{}".format(self.host, server.sockets[0].getsockname()[1])
+        if self.discoveryPort is not None:
+            # After the robots have their addresses, which they announce
+            self._datagramTransport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _DiscoveryResponder(self), local_addr=(self.host, self.discoveryPort))
+            self.discoveryAddress = "{}:{}".format(self.host, self._datagramTransport.get_extra_info("sockname")[1])
+
+    async def Close(self):
+        """
+        Stop listening and close every open connection
+        """
+        for server in self._servers:
+            server.close()
+        if self._datagramTransport is not None:
+            self._datagramTransport.close()
+            self._datagramTransport = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    def Stats(self):
+        """
+        Get counts of the requests served and failures injected
+
+        Returns:
+            A dict of requests, robotErrors, injectedErrors, dropped, stalled, rejected, unauthorized, connections (open
+            now), peakConnections, mqttConnections (open now), published (MQTT messages) and announced (answers to the
+            discovery query) (dict)
+        """
+        stats = dict(self._stats)
+        stats["peakConnections"] = self._peakConnections
+        return stats
+
+    async def _ReadRequest(self, reader):
+        """
+        Read an HTTP request from a connection
+
+        Returns:
+            The request, or None if the connection was closed (_Request)
+        """
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        parts = request_line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+        return _Request(parts[1] if len(parts) > 1 else "", headers, body)
+
+    def _Attach(self, robot):
+        """
+        Count a new connection to a robot
+
+        Returns:
+            False if the robot is offline or has too many connections, and the connection should be closed (bool)
+        """
+        if not robot.online:
+            self._stats["dropped"] += 1
+            return False
+        if self.maxConnections is not None and self._connections[robot.password] >= self.maxConnections:
+            self._stats["rejected"] += 1
+            return False
+        self._connections[robot.password] += 1
+        self._stats["connections"] += 1
+        self._peakConnections = max(self._peakConnections, self._stats["connections"])
+        return True
+
+    def _Detach(self, robot):
+        self._connections[robot.password] -= 1
+        self._stats["connections"] -= 1
+
+    async def _HandleConnection(self, reader, writer, robot=None):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        attached = None
+        try:
+            if robot is not None:
+                if not self._Attach(robot):
+                    return
+                attached = robot
+            while True:
+                request = await self._ReadRequest(reader)
+                if request is None:
+                    return
+                response = await self._Respond(request, attached, robot is None)
+                if response is None:
+                    return
+                target, data, keep_alive = response
+                if attached is None and target is not None:
+                    if not self._Attach(target):
+                        return
+                    attached = target
+                writer.write(data)
+                await writer.drain()
+                if not keep_alive or (attached is not None and not attached.online):
+                    return
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if attached is not None:
+                self._Detach(attached)
+            writer.close()
+            self._tasks.discard(task)
+
+    async def _Respond(self, request, robot, shared):
+        """
+        Work out the response to a request, after any injected latency
+
+        Args:
+            request:    the request (_Request)
+            robot:      the robot the connection is for, or None if it is not known yet (SimulatedRobot)
+            shared:     whether the connection is to the shared port (bool)
+
+        Returns:
+            A tuple of (the robot that answered or None, the response (bytes), keep the connection open (bool)), or None
+            to close the connection without answering
+        """
+        self._stats["requests"] += 1
+        keep_alive = request.headers.get("connection", "").lower() != "close"
+        if request.path != "/umi":
+            return None, _Response(404, "Not Found", close=not keep_alive), keep_alive
+
+        password = _Password(request.headers)
+        if shared:
+            robot = self._byPassword.get(password) if password is not None else robot
+            if robot is None and password is None:
+                robot = next((candidate for candidate in self.robots if candidate.pairing), None)
+        authenticated = robot is not None and password == robot.password
+        if robot is None or (password is not None and not authenticated):
+            self._stats["unauthorized"] += 1
+            return None, _Response(401, "Unauthorized", close=not keep_alive), keep_alive
+        try:
+            umi_request = json.loads(request.body.decode("utf-8"))
+        except ValueError:
+            return robot, _Response(400, "Bad Request", close=not keep_alive), keep_alive
+        if not authenticated and not (umi_request.get("do") == "get" and umi_request.get("args") == ["passwd"]):
+            self._stats["unauthorized"] += 1
+            return None, _Response(401, "Unauthorized", close=not keep_alive), keep_alive
+        if not robot.online:
+            self._stats["dropped"] += 1
+            return None
+
+        delay = self.latency + (self._random.uniform(0, self.latencyJitter) if self.latencyJitter else 0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        roll = self._random.random()
+        if roll < self.dropRate:
+            self._stats["dropped"] += 1
+            return None
+        roll -= self.dropRate
+        if roll < self.stallRate:
+            self._stats["stalled"] += 1
+            await asyncio.sleep(self.stallTime)
+            return None
+        roll -= self.stallRate
+
+        if roll < self.errorRate:
+            self._stats["injectedErrors"] += 1
+            result = {"err" : ERROR_INJECTED, "id" : umi_request.get("id")}
+        else:
+            result = robot.Handle(umi_request, authenticated=authenticated)
+        if "err" in result:
+            self._stats["robotErrors"] += 1
+        body = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        return robot, _Response(200, "OK", body, close=not keep_alive), keep_alive
+
+    async def _HandleMQTT(self, reader, writer):
+        """
+        Serve one MQTT client: log it in to the robot with its BLID, then push the robot's state until it disconnects
+        """
+        from .stream import _Packet, _ReadPacket, _ParseConnect, _DecodeString, _CONNECT, _CONNACK, _SUBSCRIBE, \
+                            _SUBACK, _PINGREQ, _PINGRESP, _DISCONNECT, CONNACK_ACCEPTED, CONNACK_BAD_CREDENTIALS
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        pusher = None
+        try:
+            packet_type, _, body = await asyncio.wait_for(_ReadPacket(reader), 10)
+            if packet_type != _CONNECT:
+                return
+            _, username, password, _ = _ParseConnect(body)
+            robot = self._byBLID.get(username)
+            if robot is None or password != robot.password:
+                self._stats["unauthorized"] += 1
+                writer.write(_Packet(_CONNACK, 0, bytes((0, CONNACK_BAD_CREDENTIALS))))
+                await writer.drain()
+                return
+            if not robot.online:
+                self._stats["dropped"] += 1
+                return
+            writer.write(_Packet(_CONNACK, 0, bytes((0, CONNACK_ACCEPTED))))
+            self._stats["mqttConnections"] += 1
+            pusher = asyncio.ensure_future(self._Push(robot, writer))
+            while True:
+                packet_type, _, body = await _ReadPacket(reader)
+                if packet_type == _SUBSCRIBE:
+                    # Grant QoS 0 for every topic filter
+                    offset, granted = 2, bytearray()
+                    while offset < len(body):
+                        _, offset = _DecodeString(body, offset)
+                        offset += 1
+                        granted.append(0)
+                    writer.write(_Packet(_SUBACK, 0, body[:2] + bytes(granted)))
+                elif packet_type == _PINGREQ:
+                    writer.write(_Packet(_PINGRESP, 0))
+                elif packet_type == _DISCONNECT:
+                    return
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if pusher is not None:
+                pusher.cancel()
+                self._stats["mqttConnections"] -= 1
+            writer.close()
+            self._tasks.discard(task)
+
+    async def _Push(self, robot, writer):
+        """
+        Publish a shadow update with whatever has changed in a robot's reported state, every pushInterval, and drop
+        the connection if the robot goes offline
+        """
+        from .stream import _PublishPacket
+        topic = "$aws/things/{}/shadow/update".format(robot.BLID())
+        sent = {}
+        while robot.online:
+            reported = robot.Reported()
+            changed = dict((key, value) for key, value in reported.items() if sent.get(key) != value)
+            if changed:
+                payload = json.dumps({"state" : {"reported" : changed}}, separators=(",", ":")).encode("utf-8")
+                writer.write(_PublishPacket(topic, payload))
+                self._stats["published"] += 1
+                sent.update(changed)
+            await asyncio.sleep(self.pushInterval)
+        self._stats["dropped"] += 1
+        writer.transport.abort()
+
+class SimulatorThread(object):
+    """
+    Runs a RobotSimulator on its own event loop in a background thread, for use with the blocking Robot
+
+        with SimulatorThread(simulator):
+            ...
+    """
+
+    def __init__(self, simulator):
+        """
+        Args:
+            simulator:  the simulator to run (RobotSimulator)
+        """
+        self.simulator = simulator
+        self._loop = None
+        self._thread = None
+
+    def __enter__(self):
+        self.Start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Stop()
+
+    def Start(self):
+        """
+        Start the simulator, returning once it is listening
+        """
+        assert self._thread is None, "the simulator is already running"
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="RobotSimulator")
+        self._thread.daemon = True
+        self._thread.start()
+        try:
+            asyncio.run_coroutine_threadsafe(self.simulator.Start(), self._loop).result()
+        except BaseException:
+            self._Shutdown()
+            raise
+
+    def Stop(self):
+        """
+        Stop the simulator and wait for its thread to finish
+        """
+        if self._thread is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.simulator.Close(), self._loop).result()
+        finally:
+            self._Shutdown()
+
+    def _Shutdown(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        self._thread = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve simulated robots")
+    parser.add_argument("--robots", type=int, default=1, help="number of robots to simulate")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=0, help="the shared port, or the first port with one port per robot")
+    parser.add_argument("--shared-port", action="store_true", help="serve every robot on one port")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulated seconds per second")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering each request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests to answer with an error")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of requests to drop")
+    parser.add_argument("--max-connections", type=int, default=None, help="most connections per robot")
+    parser.add_argument("--mqtt-port", type=int, default=None, help="also serve MQTT on this port, or 0 for a free "
+                                                                      "port, and print each robot's BLID and MQTT address")
+    parser.add_argument("--discovery-port", type=int, default=None, help="also answer the UDP discovery query on this "
+                                                                           "port, or 0 for a free port")
+    parser.add_argument("--pairing", action="store_true", help="let the robots give out their password, as if the home "
+                                                               "button were held")
+    args = parser.parse_args()
+
+    simulator = RobotSimulator(host=args.host, port=args.port, sharedPort=args.shared_port, latency=args.latency,
+                               errorRate=args.error_rate, dropRate=args.drop_rate, maxConnections=args.max_connections,
+                               mqttPort=args.mqtt_port, discoveryPort=args.discovery_port)
+    for _ in range(args.robots):
+        simulator.AddRobot(speed=args.speed).pairing = args.pairing
+
+    async def serve():
+        async with simulator:
+            if simulator.discoveryAddress is not None:
+                print("discovery", simulator.discoveryAddress, flush=True)
+            for robot in simulator.robots:
+                if robot.mqttAddress is None:
+                    print(robot.address, robot.password, flush=True)
+                else:
+                    print(robot.address, robot.password, robot.BLID(), robot.mqttAddress, flush=True)
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
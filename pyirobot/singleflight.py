@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""
+Coalescing of identical concurrent requests
+
+When several threads ask a robot for the same resource at the same moment,
+only the first request is sent; the others wait for it and share its result.
+An optional result window also hands out a result for a short time after it
+arrives, to absorb bursts of callers that just miss each other.
+
+Every caller other than the one that made the request gets its own deep copy
+of the result, so callers cannot see each other's changes.
+"""
+
+from __future__ import print_function
+import copy
+import threading
+import time
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+def RequestKey(cmd, args):
+    """
+    Get the key that identical requests share
+
+    Args:
+        cmd:    the "do" argument for the request (str)
+        args:   the "args" argument for the request (str or list)
+
+    Returns:
+        The key, or None if the request should not be coalesced (tuple)
+    """
+    if cmd != "get":
+        return None
+    if isinstance(args, str):
+        return (cmd, args)
+    if isinstance(args, (list, tuple)) and all(isinstance(arg, str) for arg in args):
+        return (cmd,) + tuple(args)
+    return None
+
+class _Call(object):
+    """
+    A request in flight
+    """
+
+    __slots__ = ("event", "result", "error", "waiters", "generation")
+
+    def __init__(self, event, generation=0):
+        self.event = event
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.generation = generation
+
+class _SingleFlightBase(object):
+    """
+    Bookkeeping shared by SingleFlight and the asyncio version in pyirobot.aio
+    """
+
+    def __init__(self, window=0, clock=_monotonic):
+        """
+        Args:
+            window:     seconds to keep handing out a result after it arrives, or 0 to only share in-flight requests (float)
+            clock:      the function to get the current time from (callable)
+        """
+        self.window = window
+        self.clock = clock
+        self._calls = {}
+        self._recent = {}
+        # Moved on by Forget, so a request sent before it does not put its result in the window after it
+        self._generation = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.windowHits = 0
+
+    def _Recent(self, key):
+        """
+        Get a result from the result window, if there is one
+        """
+        recent = self._recent.get(key)
+        if recent is None:
+            return None
+        if self.clock() - recent[0] >= self.window:
+            del self._recent[key]
+            return None
+        self.windowHits += 1
+        return recent
+
+    def _Finish(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if self.window and call.error is None and call.generation == self._generation:
+            self._recent[key] = (self.clock(), call.result)
+
+    def Forget(self):
+        """
+        Discard every result in the result window, e.g. after a change to the robot's settings.  Requests already in
+        flight are not joined by later callers, nor do their results go into the window
+        """
+        self._generation += 1
+        self._recent.clear()
+        self._calls.clear()
+
+    def Stats(self):
+        """
+        Get how many calls were coalesced
+
+        Returns:
+            A dict of requests (sent), coalesced (calls that waited on another caller's request), windowHits and inFlight (dict)
+        """
+        return {"requests" : self.requests, "coalesced" : self.coalesced, "windowHits" : self.windowHits, "inFlight" : len(self._calls)}
+
+class SingleFlight(_SingleFlightBase):
+    """
+    Coalesces identical concurrent calls from many threads into one
+    """
+
+    def __init__(self, window=0, clock=_monotonic):
+        super(SingleFlight, self).__init__(window=window, clock=clock)
+        self._lock = threading.Lock()
+
+    def Do(self, key, fetch):
+        """
+        Get the result of fetch, sharing it with any other callers with the same key
+
+        Args:
+            key:    the key identical calls share (hashable)
+            fetch:  the function to get the result (callable)
+
+        Returns:
+            The result of fetch
+        """
+        with self._lock:
+            recent = self._Recent(key)
+            if recent is not None:
+                return copy.deepcopy(recent[1])
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(threading.Event(), self._generation)
+                self.requests += 1
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+
+        if leader:
+            try:
+                call.result = fetch()
+            except BaseException as ex:
+                call.error = ex
+            with self._lock:
+                self._Finish(key, call)
+            call.event.set()
+        else:
+            call.event.wait()
+
+        if call.error is not None:
+            raise call.error
+        # No one else can join the call once it has finished, so the leader only needs a copy if the result is shared
+        if leader and not call.waiters and not self.window:
+            return call.result
+        return copy.deepcopy(call.result)
+
+    def Forget(self):
+        with self._lock:
+            super(SingleFlight, self).Forget()
+
+    def Stats(self):
+        with self._lock:
+            return super(SingleFlight, self).Stats()
@@ -0,0 +1,633 @@
+#!/usr/bin/env python
+"""
+Push-based robot state over the robot's local MQTT interface
+
+Newer firmware serves MQTT 3.1.1 over TLS on port 8883.  A client logs in with
+the robot's BLID (Robot.GetBLID) as its client ID and user name and the robot's
+password (Robot.GetPassword), and the robot then publishes changes to its
+state as they happen, as AWS IoT shadow documents:
+
+    {"state" : {"reported" : {"batPct" : 97, "cleanMissionStatus" : {...}}}}
+
+Each message only holds the fields that changed.  RobotStream keeps one
+connection per robot open, merges the messages into the robot's full reported
+state, and decodes it into the same structures GetMission and
+GetCleaningPreferences return.  Updates are delivered to a callback, or by
+iterating over the stream:
+
+    stream = RobotStream(robotIP, blid, password)
+    async with stream:
+        async for update in stream:
+            if update.mission is not None:
+                print(update.mission["robotStatus"])
+
+If the connection drops, the stream reconnects on its own, with an exponential
+backoff while the robot cannot be reached.
+"""
+
+import asyncio
+import copy
+import inspect
+import logging
+import random
+import struct
+import time
+from . import DefaultCodec, _RobotBase
+
+DEFAULT_MQTT_PORT = 8883
+DEFAULT_KEEPALIVE = 60
+DEFAULT_CONNECT_TIMEOUT = 10
+# The most updates to hold for each "async for" loop that has fallen behind; the oldest are dropped after that
+DEFAULT_MAX_QUEUE = 1000
+
+_log = logging.getLogger(__name__)
+
+# MQTT control packet types
+_CONNECT = 1
+_CONNACK = 2
+_PUBLISH = 3
+_PUBACK = 4
+_SUBSCRIBE = 8
+_SUBACK = 9
+_PINGREQ = 12
+_PINGRESP = 13
+_DISCONNECT = 14
+
+# CONNACK return codes
+CONNACK_ACCEPTED = 0
+CONNACK_SERVER_UNAVAILABLE = 3
+CONNACK_BAD_CREDENTIALS = 4
+CONNACK_NOT_AUTHORIZED = 5
+
+# The longest remaining length the four byte encoding allows
+_MAX_PACKET_LENGTH = 268435455
+
+# The reported fields that go into GetMission and GetCleaningPreferences
+_MISSION_FIELDS = frozenset(("cleanMissionStatus", "batPct", "bin", "pose"))
+_PREFERENCE_FIELDS = frozenset(("carpetBoost", "vacHigh", "noAutoPasses", "twoPass", "binPause", "openOnly", "language",
+                                "timezone", "name"))
+
+# The "prefs" flag bits each combination of reported booleans stands for
+_CarpetBoostFlags = {(True, False) : 0, (True, True) : 0, (False, False) : 16, (False, True) : 80}
+_CleaningPassesFlags = {(False, False) : 0, (False, True) : 0, (True, False) : 1024, (True, True) : 1025}
+_BinPauseFlag = 32
+_OpenOnlyFlag = 2
+
+class MQTTError(IOError):
+    """
+    The robot refused an MQTT connection
+    """
+    def __init__(self, returnCode):
+        super(MQTTError, self).__init__("MQTT connection refused with return code {}".format(returnCode))
+        self.returnCode = returnCode
+
+def _EncodeString(value):
+    """
+    Encode a string as MQTT does, with a two byte length in front
+
+    Args:
+        value:  the string (str or bytes)
+
+    Returns:
+        The encoded string (bytes)
+    """
+    if not isinstance(value, bytes):
+        value = value.encode("utf-8")
+    return struct.pack("!H", len(value)) + value
+
+def _DecodeString(data, offset):
+    """
+    Decode an MQTT string
+
+    Args:
+        data:   the packet body (bytes)
+        offset: where the string starts (int)
+
+    Returns:
+        A tuple of (the string, the offset after it) (tuple of (str, int))
+    """
+    length, = struct.unpack_from("!H", data, offset)
+    end = offset + 2 + length
+    if end > len(data):
+        raise ValueError("MQTT string runs past the end of the packet")
+    return data[offset + 2:end].decode("utf-8"), end
+
+def _Packet(packetType, flags, body=b""):
+    """
+    Frame an MQTT control packet
+
+    Args:
+        packetType: the control packet type (int)
+        flags:      the four flag bits of the fixed header (int)
+        body:       the variable header and payload (bytes)
+
+    Returns:
+        The packet (bytes)
+    """
+    length = len(body)
+    assert length <= _MAX_PACKET_LENGTH, "MQTT packets cannot be longer than {} bytes".format(_MAX_PACKET_LENGTH)
+    header = bytearray((packetType << 4 | flags,))
+    while True:
+        byte = length & 0x7F
+        length >>= 7
+        header.append(byte | 0x80 if length else byte)
+        if not length:
+            break
+    return bytes(header) + body
+
+async def _ReadPacket(reader):
+    """
+    Read an MQTT control packet
+
+    Args:
+        reader: the connection to read from (asyncio.StreamReader)
+
+    Returns:
+        A tuple of (packet type, flags, body) (tuple of (int, int, bytes))
+    """
+    first = (await reader.readexactly(1))[0]
+    length = 0
+    for shift in (0, 7, 14, 21):
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+    else:
+        raise ValueError("Malformed MQTT remaining length")
+    body = await reader.readexactly(length) if length else b""
+    return first >> 4, first & 0x0F, body
+
+def _ConnectPacket(clientID, username, password, keepAlive):
+    """
+    Build a CONNECT packet for a clean MQTT 3.1.1 session
+    """
+    flags = 0x02
+    payload = _EncodeString(clientID)
+    if username is not None:
+        flags |= 0x80
+        payload += _EncodeString(username)
+    if password is not None:
+        flags |= 0x40
+        payload += _EncodeString(password)
+    body = _EncodeString("MQTT") + struct.pack("!BBH", 4, flags, keepAlive) + payload
+    return _Packet(_CONNECT, 0, body)
+
+def _ParseConnect(body):
+    """
+    Decode the body of a CONNECT packet
+
+    Returns:
+        A tuple of (client ID, user name or None, password or None, keep alive seconds)
+    """
+    protocol, offset = _DecodeString(body, 0)
+    if protocol != "MQTT":
+        raise ValueError("Unsupported MQTT protocol {}".format(protocol))
+    _, flags, keep_alive = struct.unpack_from("!BBH", body, offset)
+    client_id, offset = _DecodeString(body, offset + 4)
+    if flags & 0x04:
+        # Skip the will topic and message
+        _, offset = _DecodeString(body, offset)
+        _, offset = _DecodeString(body, offset)
+    username = password = None
+    if flags & 0x80:
+        username, offset = _DecodeString(body, offset)
+    if flags & 0x40:
+        password, offset = _DecodeString(body, offset)
+    return client_id, username, password, keep_alive
+
+def _PublishPacket(topic, payload, qos=0, packetID=None):
+    """
+    Build a PUBLISH packet
+    """
+    body = _EncodeString(topic)
+    if qos:
+        body += struct.pack("!H", packetID)
+    return _Packet(_PUBLISH, qos << 1, body + payload)
+
+def _ParsePublish(flags, body):
+    """
+    Decode the body of a PUBLISH packet
+
+    Returns:
+        A tuple of (topic, QoS, packet ID or None, payload) (tuple of (str, int, int, bytes))
+    """
+    topic, offset = _DecodeString(body, 0)
+    qos = (flags >> 1) & 0x03
+    packet_id = None
+    if qos:
+        packet_id, = struct.unpack_from("!H", body, offset)
+        offset += 2
+    return topic, qos, packet_id, body[offset:]
+
+def _SubscribePacket(packetID, topics, qos=0):
+    """
+    Build a SUBSCRIBE packet for a list of topic filters
+    """
+    body = struct.pack("!H", packetID)
+    for topic in topics:
+        body += _EncodeString(topic) + struct.pack("!B", qos)
+    return _Packet(_SUBSCRIBE, 0x02, body)
+
+def _Merge(target, delta):
+    """
+    Merge a partial reported state into the full reported state, recursing into objects
+
+    Args:
+        target: the full state, which is modified in place (dict)
+        delta:  the fields that changed (dict)
+    """
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _Merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+def _MissionFromReported(reported):
+    """
+    Convert reported state into the result of a "get mssn" request
+
+    Args:
+        reported:   the robot's reported state (dict)
+
+    Returns:
+        The raw mission, or None if the robot has not reported its mission status (dict)
+    """
+    status = reported.get("cleanMissionStatus")
+    if not isinstance(status, dict):
+        return None
+    bin_state = reported.get("bin") or {}
+    flags = 0
+    if bin_state.get("full"):
+        flags |= 1
+    if bin_state.get("present") is False:
+        flags |= 2
+    pose = reported.get("pose") or {}
+    point = pose.get("point") or {}
+    return {
+        "flags" : flags,
+        "cycle" : status.get("cycle", "none"),
+        "phase" : status.get("phase"),
+        "batPct" : reported.get("batPct", 0),
+        "expireM" : status.get("expireM", 0),
+        "rechrgM" : status.get("rechrgM", 0),
+        "error" : status.get("error", 0),
+        "notReady" : status.get("notReady", 0),
+        "mssnM" : status.get("mssnM", 0),
+        "sqft" : status.get("sqft", 0),
+        "nMssn" : status.get("nMssn", 0),
+        "pos" : {"theta" : pose.get("theta", 0), "point" : {"x" : point.get("x", 0), "y" : point.get("y", 0)}}
+    }
+
+def _PreferencesFromReported(reported):
+    """
+    Convert reported state into the result of a "get prefs" request
+
+    Args:
+        reported:   the robot's reported state (dict)
+
+    Returns:
+        The raw preferences, or None if the robot has not reported its cleaning preferences (dict)
+    """
+    if "carpetBoost" not in reported or "noAutoPasses" not in reported:
+        return None
+    flags = _CarpetBoostFlags[(bool(reported["carpetBoost"]), bool(reported.get("vacHigh")))]
+    flags |= _CleaningPassesFlags[(bool(reported["noAutoPasses"]), bool(reported.get("twoPass")))]
+    if reported.get("binPause"):
+        flags |= _BinPauseFlag
+    if reported.get("openOnly"):
+        flags |= _OpenOnlyFlag
+    return {"flags" : flags, "lang" : reported.get("language", 0), "timezone" : reported.get("timezone", ""),
+            "name" : reported.get("name", "")}
+
+class StreamUpdate(object):
+    """
+    A change to a robot's state pushed by the robot
+
+    Attributes:
+        stream:         the stream the update came from (RobotStream)
+        reported:       the fields the robot reported in this message (dict)
+        mission:        the decoded mission, as GetMission returns it, if any mission field changed, else None (dict)
+        preferences:    the decoded preferences, as GetCleaningPreferences returns them, if any preference changed,
+                        else None (dict)
+        received:       when the update arrived, on the time.monotonic clock (float)
+    """
+    __slots__ = ("stream", "reported", "mission", "preferences", "received")
+
+    def __init__(self, stream, reported, mission, preferences, received):
+        self.stream = stream
+        self.reported = reported
+        self.mission = mission
+        self.preferences = preferences
+        self.received = received
+
+    def __repr__(self):
+        return "StreamUpdate(blid={!r}, fields={!r})".format(self.stream.blid, sorted(self.reported))
+
+class RobotStream(object):
+    """
+    Keep an MQTT subscription to one robot open and decode the state it pushes
+
+    The latest decoded state is always in mission and preferences, and the
+    merged raw state in reported.  Every update is passed to the callback, if
+    there is one, which may be a plain function or a coroutine function, and to
+    every "async for" loop over the stream.  An exception from the callback is
+    logged and counted, and does not stop the stream.  A loop that falls more
+    than maxQueue updates behind loses the oldest ones.  The stream runs as a
+    task on the event loop from Start until Close.  If the robot refuses the
+    credentials the stream stops, and any loops over it raise MQTTError.
+    """
+
+    def __init__(self, robotIP, blid, password, callback=None, port=DEFAULT_MQTT_PORT, sslContext=None,
+                 keepAlive=DEFAULT_KEEPALIVE, connectTimeout=DEFAULT_CONNECT_TIMEOUT, backoffBase=1, maxBackoff=60,
+                 jitter=0.1, codec=None, maxQueue=DEFAULT_MAX_QUEUE):
+        """
+        Args:
+            robotIP:        the address of the robot, optionally with a port, which overrides port (str)
+            blid:           the robot BLID, from Robot.GetBLID (str)
+            password:       the robot password, from Robot.GetPassword (str)
+            callback:       function called with each StreamUpdate (callable)
+            port:           the robot's MQTT port (int)
+            sslContext:     the SSL context to connect with, None for the default, or False for plain MQTT
+                            (ssl.SSLContext)
+            keepAlive:      the MQTT keep alive interval in seconds; a connection that is silent for one and a half
+                            times this is treated as lost (int)
+            connectTimeout: the most seconds to wait for the robot to accept a connection (float)
+            backoffBase:    seconds to wait after the first failed connection, doubling with each failure (float)
+            maxBackoff:     the longest time to wait between connection attempts (float)
+            jitter:         the fraction each wait is randomly varied by (float)
+            codec:          the codec to decode messages with, or None for the default (codec.JSONCodec)
+            maxQueue:       the most updates to hold for each "async for" loop over the stream (int)
+        """
+        assert maxQueue > 0, "maxQueue must be at least 1"
+        assert 0 < keepAlive <= 65535, "keepAlive must be between 1 and 65535 seconds"
+        if ":" in robotIP:
+            host, _, robot_port = robotIP.rpartition(":")
+            port = int(robot_port)
+        else:
+            host = robotIP
+        self.ip = robotIP
+        self.host = host
+        self.port = port
+        self.blid = blid
+        self.password = password
+        self.callback = callback
+        self.keepAlive = keepAlive
+        self.connectTimeout = connectTimeout
+        self.backoffBase = backoffBase
+        self.maxBackoff = maxBackoff
+        self.jitter = jitter
+        self.codec = DefaultCodec() if codec is None else codec
+        self.maxQueue = maxQueue
+        if sslContext is None:
+            from .aio import _DefaultSSLContext
+            sslContext = _DefaultSSLContext()
+        self.sslContext = sslContext
+
+        # The robot's full reported state, merged from every message
+        self.reported = {}
+        self.mission = None
+        self.preferences = None
+        self.connected = False
+        # The error that ended the last connection, or None
+        self.lastError = None
+        # The last exception the callback raised, or None
+        self.lastCallbackError = None
+
+        self._decoder = _RobotBase(robotIP, password, codec=self.codec)
+        self._queues = []
+        self._task = None
+        self._writer = None
+        self._closed = False
+        self._failures = 0
+        self._connects = 0
+        self._messages = 0
+        self._updates = 0
+        self._dropped = 0
+        self._callbackErrors = 0
+
+    async def __aenter__(self):
+        self.Start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.Close()
+
+    def __aiter__(self):
+        return self._Iterate()
+
+    def Start(self):
+        """
+        Start the stream on the running event loop, if it is not already running
+        """
+        if self._task is None or self._task.done():
+            self._closed = False
+            self._task = asyncio.ensure_future(self.Run())
+
+    async def Close(self):
+        """
+        Disconnect from the robot and stop the stream.  Loops over the stream finish
+        """
+        self._closed = True
+        if self._writer is not None:
+            try:
+                self._writer.write(_Packet(_DISCONNECT, 0))
+            except (OSError, RuntimeError):
+                pass
+        if self._task is not None and asyncio.current_task() is not self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception): #pylint: disable=broad-except
+                # Anything the stream stopped with has already gone to the loops over it, and is in lastError
+                pass
+        self._task = None
+        self._Finish(None)
+
+    def Backoff(self, failures):
+        """
+        Get the time to wait before connecting again, before jitter
+
+        Args:
+            failures:   the number of connection attempts in a row that have failed (int)
+
+        Returns:
+            The interval in seconds (float)
+        """
+        return min(self.maxBackoff, self.backoffBase * (2 ** min(failures - 1, 32)))
+
+    async def Run(self):
+        """
+        Stay connected to the robot until the stream is closed, reconnecting whenever the connection is lost.  Start
+        runs this as a task
+
+        Raises:
+            MQTTError if the robot refuses the credentials
+        """
+        while not self._closed:
+            try:
+                await self._Session()
+            except MQTTError as ex:
+                self.lastError = ex
+                if ex.returnCode in (CONNACK_BAD_CREDENTIALS, CONNACK_NOT_AUTHORIZED):
+                    self._closed = True
+                    self._Finish(ex)
+                    raise
+            except (OSError, EOFError, ValueError, asyncio.TimeoutError) as ex:
+                # IncompleteReadError is an EOFError
+                self.lastError = ex
+            except Exception as ex:
+                # A bug rather than a lost connection; end the loops over the stream instead of leaving them waiting
+                self.lastError = ex
+                self._closed = True
+                self._Finish(ex)
+                raise
+            finally:
+                self.connected = False
+                self._writer = None
+            if self._closed:
+                break
+            self._failures += 1
+            delay = self.Backoff(self._failures)
+            await asyncio.sleep(delay * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def _Session(self):
+        """
+        Connect to the robot and handle messages until the connection is lost
+        """
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port,
+                                                                            ssl=self.sslContext or None),
+                                                    self.connectTimeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timed out connecting to {}".format(self.ip))
+        pinger = None
+        try:
+            writer.write(_ConnectPacket(self.blid, self.blid, self.password, self.keepAlive))
+            packet_type, _, body = await asyncio.wait_for(_ReadPacket(reader), self.connectTimeout)
+            if packet_type != _CONNACK or len(body) != 2:
+                raise ValueError("Expected CONNACK, got packet type {}".format(packet_type))
+            if body[1] != CONNACK_ACCEPTED:
+                raise MQTTError(body[1])
+            # Robots publish to their shadow topics whether or not anything is subscribed, but ask anyway in case
+            writer.write(_SubscribePacket(1, ["$aws/things/{}/#".format(self.blid)]))
+            self._writer = writer
+            self.connected = True
+            self._connects += 1
+            self._failures = 0
+            self.lastError = None
+            pinger = asyncio.ensure_future(self._Ping(writer))
+            while True:
+                packet_type, flags, body = await asyncio.wait_for(_ReadPacket(reader), self.keepAlive * 1.5)
+                if packet_type == _PUBLISH:
+                    topic, qos, packet_id, payload = _ParsePublish(flags, body)
+                    if qos == 1:
+                        writer.write(_Packet(_PUBACK, 0, struct.pack("!H", packet_id)))
+                    await self._HandleMessage(topic, payload)
+        finally:
+            if pinger is not None:
+                pinger.cancel()
+            writer.close()
+
+    async def _Ping(self, writer):
+        """
+        Send keep alive pings, so neither end gives up on a quiet connection
+        """
+        while True:
+            await asyncio.sleep(self.keepAlive / 2.0)
+            writer.write(_Packet(_PINGREQ, 0))
+
+    async def _HandleMessage(self, topic, payload):
+        """
+        Merge a message into the reported state, and deliver the update
+
+        Args:
+            topic:      the topic the message was published to (str)
+            payload:    the message body (bytes)
+        """
+        self._messages += 1
+        try:
+            document = self.codec.Decode(payload)
+            reported = document["state"]["reported"]
+        except (ValueError, KeyError, TypeError):
+            # Not a shadow update
+            return
+        if not isinstance(reported, dict) or not reported:
+            return
+        _Merge(self.reported, reported)
+
+        mission = preferences = None
+        if not _MISSION_FIELDS.isdisjoint(reported):
+            raw = _MissionFromReported(self.reported)
+            if raw is not None:
+                mission = self.mission = self._decoder._TransformMission(raw)
+        if not _PREFERENCE_FIELDS.isdisjoint(reported):
+            raw = _PreferencesFromReported(self.reported)
+            if raw is not None:
+                preferences = self.preferences = self._decoder._TransformCleaningPreferences(raw)
+
+        self._updates += 1
+        update = StreamUpdate(self, reported, mission, preferences, time.monotonic())
+        for queue in self._queues:
+            self._Offer(queue, update)
+        if self.callback is not None:
+            try:
+                result = self.callback(update)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as ex: #pylint: disable=broad-except
+                self._callbackErrors += 1
+                self.lastCallbackError = ex
+                _log.exception("Stream callback for %s failed", self.ip)
+
+    def _Offer(self, queue, item):
+        """
+        Put an item on a loop's queue, dropping the oldest update if the queue is full
+        """
+        if queue.full():
+            queue.get_nowait()
+            self._dropped += 1
+        queue.put_nowait(item)
+
+    def _Finish(self, error):
+        """
+        End every loop over the stream, with an error or cleanly
+        """
+        for queue in self._queues:
+            self._Offer(queue, error)
+
+    async def _Iterate(self):
+        """
+        Yield each update as it arrives, starting the stream if it is not running
+        """
+        queue = asyncio.Queue(self.maxQueue)
+        self._queues.append(queue)
+        try:
+            self.Start()
+            while True:
+                update = await queue.get()
+                if update is None:
+                    return
+                if isinstance(update, Exception):
+                    raise update
+                yield update
+        finally:
+            self._queues.remove(queue)
+
+    def Stats(self):
+        """
+        Get the stream counters
+
+        Returns:
+            A dict of connected, connects (successful connections), failures (connection attempts in a row that
+            failed), messages (received), updates (delivered), dropped (updates a slow loop over the stream missed)
+            and callbackErrors (dict)
+        """
+        return {
+            "connected" : self.connected,
+            "connects" : self._connects,
+            "failures" : self._failures,
+            "messages" : self._messages,
+            "updates" : self._updates,
+            "dropped" : self._dropped,
+            "callbackErrors" : self._callbackErrors
+        }
@@ -0,0 +1,690 @@
+#!/usr/bin/env python
+"""
+Append-only columnar store for mission and WiFi telemetry
+
+Each GetMission/GetWiFiStatus sample is stored as one row of fixed-width
+columns, one file per column, in a series of segment directories:
+
+    <root>/robots.json                  robot key -> numeric robot id
+    <root>/seg-00000001/manifest.json   committed row count, time range, index
+    <root>/seg-00000001/timestamp.col   one file per column
+    ...
+
+Reads memory-map the column files, so a time-range query for one robot only
+touches the pages it needs instead of parsing whole files.  Rows within a
+segment are in timestamp order, so the range is found by binary search on
+the timestamp column.  Compacting merges sealed segments and sorts them by
+robot and then timestamp, with an index of each robot's rows in the manifest,
+so a query for one robot goes straight to that robot's rows.  Each manifest
+records the segment's place in the store's order, so a compacted segment
+keeps the place of the segments it replaced.
+
+Writes are crash-safe: column data is written and flushed to disk before the
+manifest recording the new row count is atomically replaced, and on open any
+column data past the committed row count is discarded.
+
+This module needs Python 3.
+"""
+
+from __future__ import print_function
+import array
+import bisect
+import collections
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from . import ReadyStatus
+from .bulk import ROBOT_STATUSES, ToCode
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The columns in each row, and their array typecodes
+COLUMNS = collections.OrderedDict([
+    ("timestamp", "d"),
+    ("robot", "I"),
+    ("battery", "h"),
+    ("robotStatus", "h"),
+    ("readyStatus", "h"),
+    ("binStatus", "h"),
+    ("error", "h"),
+    ("x", "i"),
+    ("y", "i"),
+    ("theta", "h"),
+    ("sqft", "i"),
+    ("signalStrength", "h")
+])
+
+# The value stored for a field that was not in the sample, for each typecode
+MISSING = {
+    "h" : -2**15,
+    "i" : -2**31
+}
+
+DEFAULT_SEGMENT_ROWS = 1000000
+DEFAULT_FLUSH_ROWS = 1000
+
+def _FsyncDirectory(path):
+    """
+    Flush a directory's entries to disk, so a file created or renamed in it survives a crash
+    """
+    try:
+        handle = os.open(path, os.O_RDONLY)
+    except OSError:
+        # Directories cannot be opened on Windows, where renames are durable without this
+        return
+    try:
+        os.fsync(handle)
+    finally:
+        os.close(handle)
+
+def _WriteJSONAtomic(path, data):
+    """
+    Write a JSON file so that readers see either the old or the new contents, never a partial file
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as handle:
+        json.dump(data, handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+    _FsyncDirectory(os.path.dirname(os.path.abspath(path)))
+
+def _MissionRow(mission):
+    """
+    Get the column values from a GetMission result
+
+    Args:
+        mission:    the result of GetMission or GetMissionSnapshot (dict or MissionSnapshot)
+
+    Returns:
+        The values for the mission columns (dict)
+    """
+    if not isinstance(mission, dict):
+        mission = mission.ToDict()
+    row = {
+        "battery" : mission.get("batteryPercentage"),
+        "robotStatus" : ToCode(mission["robotStatus"]) if "robotStatus" in mission else None,
+        "readyStatus" : ToCode(mission.get("readyStatus", ReadyStatus.Unknown)),
+        "binStatus" : ToCode(mission["binStatus"]) if "binStatus" in mission else None,
+        "error" : mission.get("error", 0),
+        "sqft" : mission.get("missionCoveredSquareFootage")
+    }
+    position = mission.get("robotPosition")
+    if position is not None:
+        row["x"] = position["point"]["x"]
+        row["y"] = position["point"]["y"]
+        row["theta"] = position["theta"]
+    return row
+
+def _Search(timestamps, value, low, high):
+    """
+    Find the first row in a range of rows with a timestamp at or after a value
+    """
+    if numpy is not None:
+        return low + int(numpy.searchsorted(timestamps[low:high], value, side="left"))
+    return bisect.bisect_left(timestamps, value, low, high)
+
+class _Segment(object):
+    """
+    One directory of column files
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        manifest_path = os.path.join(path, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as handle:
+                self.manifest = json.load(handle)
+        else:
+            self.manifest = {"rows" : 0, "sealed" : False, "minTimestamp" : None, "maxTimestamp" : None, "robots" : None}
+        self._maps = {}
+        self._mappedRows = 0
+
+    @property
+    def rows(self):
+        return self.manifest["rows"]
+
+    @property
+    def order(self):
+        """
+        The segment's place in the store: the number in its name, or for a compacted segment, the number of the first
+        segment it replaced (int)
+        """
+        return self.manifest.get("order", int(self.name[4:]))
+
+    def _ColumnPath(self, name):
+        return os.path.join(self.path, name + ".col")
+
+    def Recover(self):
+        """
+        Discard any column data past the committed row count, left by a crash in the middle of a write
+        """
+        for name, typecode in COLUMNS.items():
+            path = self._ColumnPath(name)
+            size = self.rows * array.array(typecode).itemsize
+            if not os.path.exists(path):
+                assert size == 0, "missing column file {}".format(path)
+                open(path, "wb").close()
+            elif os.path.getsize(path) != size:
+                with open(path, "r+b") as handle:
+                    handle.truncate(size)
+
+    def Append(self, columns, count):
+        """
+        Append rows and commit them
+
+        Args:
+            columns:    the values for each column (dict of array.array)
+            count:      the number of rows (int)
+        """
+        for name in COLUMNS:
+            self.AppendColumn(name, columns[name])
+        timestamps = columns["timestamp"]
+        manifest = dict(self.manifest)
+        manifest["rows"] = self.rows + count
+        if manifest["minTimestamp"] is None:
+            manifest["minTimestamp"] = timestamps[0]
+        manifest["maxTimestamp"] = timestamps[-1]
+        self.WriteManifest(manifest)
+
+    def AppendColumn(self, name, values):
+        """
+        Write values to the end of a column file and flush them to disk, without committing them
+
+        Args:
+            name:   the column name (str)
+            values: the values (array.array or numpy.ndarray)
+        """
+        with open(self._ColumnPath(name), "ab") as handle:
+            handle.write(values.tobytes())
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def WriteManifest(self, manifest):
+        _WriteJSONAtomic(os.path.join(self.path, "manifest.json"), manifest)
+        self.manifest = manifest
+
+    def Column(self, name):
+        """
+        Get a column of the committed rows, memory-mapped
+
+        Args:
+            name:   the column name (str)
+
+        Returns:
+            The column (numpy.ndarray, or memoryview without NumPy)
+        """
+        if self._mappedRows != self.rows:
+            self.Close()
+            self._mappedRows = self.rows
+        if name not in self._maps:
+            size = self.rows * array.array(COLUMNS[name]).itemsize
+            if size == 0:
+                self._maps[name] = None
+            else:
+                with open(self._ColumnPath(name), "rb") as handle:
+                    self._maps[name] = mmap.mmap(handle.fileno(), size, access=mmap.ACCESS_READ)
+        mapped = self._maps[name]
+        if mapped is None:
+            return numpy.zeros(0, dtype=COLUMNS[name]) if numpy is not None else memoryview(array.array(COLUMNS[name]))
+        if numpy is not None:
+            return numpy.frombuffer(mapped, dtype=COLUMNS[name])
+        return memoryview(mapped).cast(COLUMNS[name])
+
+    def Rows(self, robotID, start, end):
+        """
+        Find the rows for a robot in a time range
+
+        Args:
+            robotID:    the numeric robot id, or None for every robot (int)
+            start:      the start of the range, inclusive (float)
+            end:        the end of the range, exclusive (float)
+
+        Returns:
+            The matching row numbers, as a (start, stop) range or a list of row numbers
+        """
+        if self.rows == 0 or self.manifest["maxTimestamp"] < start or self.manifest["minTimestamp"] >= end:
+            return (0, 0)
+        timestamps = self.Column("timestamp")
+        index = self.manifest["robots"]
+        if index is not None:
+            # Compacted segment: sorted by robot and then by timestamp
+            if robotID is None:
+                return [row for row_start, row_end in index.values()
+                        for row in range(_Search(timestamps, start, row_start, row_end),
+                                         _Search(timestamps, end, row_start, row_end))]
+            if str(robotID) not in index:
+                return (0, 0)
+            row_start, row_end = index[str(robotID)]
+            return (_Search(timestamps, start, row_start, row_end), _Search(timestamps, end, row_start, row_end))
+
+        row_start = _Search(timestamps, start, 0, self.rows)
+        row_end = _Search(timestamps, end, 0, self.rows)
+        if robotID is None:
+            return (row_start, row_end)
+        robots = self.Column("robot")[row_start:row_end]
+        if numpy is not None:
+            return (numpy.nonzero(robots == robotID)[0] + row_start).tolist()
+        return [row_start + idx for idx, value in enumerate(robots) if value == robotID]
+
+    def Close(self):
+        for mapped in self._maps.values():
+            if mapped is not None:
+                mapped.close()
+        self._maps = {}
+
+class TelemetryStore(object):
+    """
+    An append-only columnar store of robot telemetry with fast time-range queries
+
+        store = TelemetryStore("/var/lib/roomba-telemetry")
+        store.AppendMission(robot.ip, robot.GetMission())
+        store.AppendWiFiStatus(robot.ip, robot.GetWiFiStatus())
+        ...
+        battery = store.Query(robot.ip, start, end, columns=["timestamp", "battery"])
+
+    Rows must be appended in timestamp order.  The robotStatus, readyStatus
+    and binStatus columns hold the codes used by pyirobot.bulk, and fields that
+    were not in a sample hold the MISSING value for their column type.
+    """
+
+    def __init__(self, root, segmentRows=DEFAULT_SEGMENT_ROWS, flushRows=DEFAULT_FLUSH_ROWS):
+        """
+        Args:
+            root:           the directory to keep the store in (str)
+            segmentRows:    the number of rows to put in a segment before starting a new one (int)
+            flushRows:      the number of rows to buffer in memory before writing them to disk (int)
+        """
+        self.root = root
+        self.segmentRows = segmentRows
+        self.flushRows = flushRows
+        self._lock = threading.RLock()
+        self._pending = self._NewColumns()
+        self._pendingRows = 0
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+        robots_path = os.path.join(root, "robots.json")
+        self._robots = {}
+        if os.path.exists(robots_path):
+            with open(robots_path) as handle:
+                self._robots = json.load(handle)
+
+        self._segments = []
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if not name.startswith("seg-") or not os.path.isdir(path):
+                continue
+            if name.endswith(".tmp") or not os.path.exists(os.path.join(path, "manifest.json")):
+                # Left over from an interrupted compaction or segment creation, with no committed rows
+                shutil.rmtree(path)
+                continue
+            self._segments.append(_Segment(path))
+        self._RemoveReplaced()
+        self._segments.sort(key=lambda segment: segment.order)
+        timestamps = [segment.manifest["maxTimestamp"] for segment in self._segments if segment.rows]
+        self._lastTimestamp = max(timestamps) if timestamps else None
+        # Only the last segment takes appends; any other unsealed one was left behind by an older version, so seal it
+        # where it is
+        for segment in self._segments[:-1]:
+            if not segment.manifest["sealed"]:
+                segment.Recover()
+                manifest = dict(segment.manifest)
+                manifest["sealed"] = True
+                segment.WriteManifest(manifest)
+        if not self._segments or self._segments[-1].manifest["sealed"]:
+            self._NewSegment()
+        self._segments[-1].Recover()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def _LastSegmentName(self):
+        names = [name for name in os.listdir(self.root) if name.startswith("seg-") and not name.endswith(".tmp")]
+        return max(names) if names else None
+
+    def _RemoveReplaced(self):
+        """
+        Remove segments that a compacted segment replaced, in case a compaction was interrupted before removing them
+        """
+        replaced = set()
+        for segment in self._segments:
+            replaced.update(segment.manifest.get("replaces", []))
+        for segment in [segment for segment in self._segments if segment.name in replaced]:
+            self._segments.remove(segment)
+            shutil.rmtree(segment.path)
+
+    @staticmethod
+    def _NewColumns():
+        return collections.OrderedDict((name, array.array(typecode)) for name, typecode in COLUMNS.items())
+
+    def _NextSegmentPath(self):
+        last = self._LastSegmentName()
+        number = int(last[4:]) + 1 if last else 1
+        return os.path.join(self.root, "seg-{:08d}".format(number))
+
+    def _NewSegment(self):
+        path = self._NextSegmentPath()
+        os.makedirs(path)
+        _FsyncDirectory(self.root)
+        segment = _Segment(path)
+        segment.Recover()
+        manifest = dict(segment.manifest)
+        manifest["order"] = segment.order
+        segment.WriteManifest(manifest)
+        self._segments.append(segment)
+        return segment
+
+    def RobotID(self, robotKey, create=False):
+        """
+        Get the numeric id used in the robot column for a robot
+
+        Args:
+            robotKey:   the robot's IP address, BLID or other unique key (str)
+            create:     assign a new id if the robot is not in the store yet (bool)
+
+        Returns:
+            The robot id, or None if the robot is not in the store (int)
+        """
+        with self._lock:
+            robot_id = self._robots.get(robotKey)
+            if robot_id is None and create:
+                robot_id = len(self._robots)
+                robots = dict(self._robots)
+                robots[robotKey] = robot_id
+                _WriteJSONAtomic(os.path.join(self.root, "robots.json"), robots)
+                self._robots = robots
+            return robot_id
+
+    def Append(self, robotKey, values, timestamp=None):
+        """
+        Append a row
+
+        Args:
+            robotKey:   the robot's IP address, BLID or other unique key (str)
+            values:     the value of each column to set (dict)
+            timestamp:  the time of the sample, or None for now (float)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            if self._lastTimestamp is not None and timestamp < self._lastTimestamp:
+                raise ValueError("Rows must be appended in timestamp order")
+            robot_id = self.RobotID(robotKey, create=True)
+            for name, typecode in COLUMNS.items():
+                if name == "timestamp":
+                    value = timestamp
+                elif name == "robot":
+                    value = robot_id
+                else:
+                    value = values.get(name)
+                    if value is None:
+                        value = MISSING[typecode]
+                self._pending[name].append(value)
+            self._pendingRows += 1
+            self._lastTimestamp = timestamp
+            if self._pendingRows >= self.flushRows:
+                self.Flush()
+
+    def AppendMission(self, robotKey, mission, timestamp=None, wifiStatus=None):
+        """
+        Append a row from a GetMission result
+
+        Args:
+            robotKey:   the robot's IP address, BLID or other unique key (str)
+            mission:    the result of GetMission or GetMissionSnapshot (dict or MissionSnapshot)
+            timestamp:  the time of the sample, or None for now (float)
+            wifiStatus: the result of GetWiFiStatus at the same time, if there is one (dict)
+        """
+        values = _MissionRow(mission)
+        if wifiStatus is not None:
+            values["signalStrength"] = wifiStatus.get("signalStrength")
+        self.Append(robotKey, values, timestamp)
+
+    def AppendWiFiStatus(self, robotKey, wifiStatus, timestamp=None):
+        """
+        Append a row from a GetWiFiStatus result
+
+        Args:
+            robotKey:   the robot's IP address, BLID or other unique key (str)
+            wifiStatus: the result of GetWiFiStatus (dict)
+            timestamp:  the time of the sample, or None for now (float)
+        """
+        self.Append(robotKey, {"signalStrength" : wifiStatus.get("signalStrength")}, timestamp)
+
+    def Flush(self):
+        """
+        Write any buffered rows to disk, starting new segments as needed
+        """
+        with self._lock:
+            offset = 0
+            while offset < self._pendingRows:
+                segment = self._segments[-1]
+                count = min(self._pendingRows - offset, self.segmentRows - segment.rows)
+                segment.Append(dict((name, column[offset:offset + count]) for name, column in self._pending.items()), count)
+                offset += count
+                if segment.rows >= self.segmentRows:
+                    manifest = dict(segment.manifest)
+                    manifest["sealed"] = True
+                    segment.WriteManifest(manifest)
+                    self._NewSegment()
+            self._pending = self._NewColumns()
+            self._pendingRows = 0
+
+    def Query(self, robotKey=None, start=None, end=None, columns=None):
+        """
+        Get the rows for a robot in a time range, in timestamp order.  Rows that have not been flushed are not included.
+
+        Args:
+            robotKey:   the robot's IP address, BLID or other unique key, or None for every robot (str)
+            start:      the start of the range, inclusive, or None for the beginning (float)
+            end:        the end of the range, exclusive, or None for the end (float)
+            columns:    the columns to return, or None for all of them (list of str)
+
+        Returns:
+            The values of each column (OrderedDict of numpy.ndarray, or array.array without NumPy)
+        """
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        columns = list(COLUMNS) if columns is None else columns
+        result = collections.OrderedDict((name, []) for name in columns)
+        with self._lock:
+            robot_id = None
+            if robotKey is not None:
+                robot_id = self.RobotID(robotKey)
+                if robot_id is None:
+                    return collections.OrderedDict((name, array.array(COLUMNS[name])) for name in columns)
+            segments = sorted(self._segments, key=lambda segment: segment.manifest["minTimestamp"] or 0)
+            for segment in segments:
+                rows = segment.Rows(robot_id, start, end)
+                if isinstance(rows, tuple):
+                    if rows[0] == rows[1]:
+                        continue
+                    for name in columns:
+                        result[name].append(segment.Column(name)[rows[0]:rows[1]])
+                elif rows:
+                    for name in columns:
+                        column = segment.Column(name)
+                        result[name].append(column[rows] if numpy is not None else [column[row] for row in rows])
+
+        if numpy is not None:
+            merged = collections.OrderedDict((name, numpy.concatenate(parts) if parts else numpy.zeros(0, dtype=COLUMNS[name]))
+                                             for name, parts in result.items())
+            # Rows for every robot interleave across segments, and segments written by older versions can overlap
+            if len(segments) > 1 and "timestamp" in merged and numpy.any(numpy.diff(merged["timestamp"]) < 0):
+                order = numpy.argsort(merged["timestamp"], kind="stable")
+                merged = collections.OrderedDict((name, values[order]) for name, values in merged.items())
+            return merged
+        merged = collections.OrderedDict()
+        for name, parts in result.items():
+            column = array.array(COLUMNS[name])
+            for part in parts:
+                column.extend(part)
+            merged[name] = column
+        if len(segments) > 1 and "timestamp" in merged and \
+           any(earlier > later for earlier, later in zip(merged["timestamp"], merged["timestamp"][1:])):
+            order = sorted(range(len(merged["timestamp"])), key=merged["timestamp"].__getitem__)
+            merged = collections.OrderedDict((name, array.array(COLUMNS[name], [values[idx] for idx in order]))
+                                             for name, values in merged.items())
+        return merged
+
+    def Compact(self, targetRows=None):
+        """
+        Merge sealed segments into larger ones sorted by robot and timestamp, with an index of each robot's rows
+
+        Args:
+            targetRows: the most rows to put in a compacted segment, or None for segmentRows * 10 (int)
+        """
+        target_rows = self.segmentRows * 10 if targetRows is None else targetRows
+        with self._lock:
+            sealed = [segment for segment in self._segments if segment.manifest["sealed"]]
+            groups = []
+            group = []
+            for segment in sealed:
+                if group and sum(member.rows for member in group) + segment.rows > target_rows:
+                    groups.append(group)
+                    group = []
+                group.append(segment)
+            if group:
+                groups.append(group)
+
+            for group in groups:
+                if len(group) == 1 and group[0].manifest["robots"] is not None:
+                    continue
+                self._CompactGroup(group)
+
+    def _CompactGroup(self, group):
+        """
+        Replace a group of sealed segments with one compacted segment
+        """
+        final_path = self._NextSegmentPath()
+        tmp_path = final_path + ".tmp"
+        os.makedirs(tmp_path)
+        compacted = _Segment(tmp_path)
+        compacted.Recover()
+        # One column at a time, so a group of segmentRows * 10 rows is never all in memory at once
+        if numpy is not None:
+            rows, index = self._CompactSorted(group, compacted)
+        else:
+            rows, index = self._CompactByRobot(group, compacted)
+        manifest = dict(compacted.manifest)
+        manifest.update({"rows" : rows,
+                         "sealed" : True,
+                         "minTimestamp" : min(segment.manifest["minTimestamp"] for segment in group),
+                         "maxTimestamp" : max(segment.manifest["maxTimestamp"] for segment in group),
+                         "robots" : index,
+                         "replaces" : [segment.name for segment in group],
+                         # Its name sorts after the active segment's, so keep the group's place explicitly
+                         "order" : min(segment.order for segment in group)})
+        compacted.WriteManifest(manifest)
+        compacted.Close()
+        os.rename(tmp_path, final_path)
+        _FsyncDirectory(self.root)
+
+        for segment in group:
+            segment.Close()
+            self._segments.remove(segment)
+            shutil.rmtree(segment.path)
+        # The active segment stays last
+        self._segments.append(_Segment(final_path))
+        self._segments.sort(key=lambda segment: segment.order)
+
+    @staticmethod
+    def _CompactSorted(group, compacted):
+        """
+        Write the rows of a group of segments to a compacted segment in robot and timestamp order, with NumPy
+
+        Returns:
+            The number of rows and the index of each robot's rows (tuple of int, dict)
+        """
+        def concatenate(name):
+            return numpy.concatenate([segment.Column(name) for segment in group])
+
+        robots = concatenate("robot")
+        order = numpy.lexsort((concatenate("timestamp"), robots))
+        robots = robots.take(order)
+        robot_ids, starts = numpy.unique(robots, return_index=True)
+        ends = numpy.append(starts[1:], len(robots))
+        index = dict((str(robot_id), [start, end]) for robot_id, start, end in
+                     zip(robot_ids.tolist(), starts.tolist(), ends.tolist()))
+        for name in COLUMNS:
+            compacted.AppendColumn(name, robots if name == "robot" else concatenate(name).take(order))
+        return len(order), index
+
+    def _CompactByRobot(self, group, compacted):
+        """
+        Write the rows of a group of segments to a compacted segment in robot and timestamp order, without NumPy,
+        by collecting each robot's row numbers and writing each column in chunks of segmentRows
+
+        Returns:
+            The number of rows and the index of each robot's rows (tuple of int, dict)
+        """
+        def concatenate(name):
+            column = array.array(COLUMNS[name])
+            for segment in group:
+                column.frombytes(memoryview(segment.Column(name)).cast("B"))
+            return column
+
+        robot_rows = {}
+        for row, robot_id in enumerate(concatenate("robot")):
+            rows = robot_rows.get(robot_id)
+            if rows is None:
+                rows = robot_rows[robot_id] = array.array("L")
+            rows.append(row)
+        timestamps = concatenate("timestamp")
+        index = {}
+        position = 0
+        for robot_id in sorted(robot_rows):
+            rows = robot_rows[robot_id]
+            # Each segment's rows are in timestamp order, and only segments written by older versions overlap
+            if any(timestamps[earlier] > timestamps[later] for earlier, later in zip(rows, rows[1:])):
+                robot_rows[robot_id] = rows = array.array("L", sorted(rows, key=timestamps.__getitem__))
+            index[str(robot_id)] = [position, position + len(rows)]
+            position += len(rows)
+        del timestamps
+
+        for name in COLUMNS:
+            values = concatenate(name)
+            chunk = array.array(COLUMNS[name])
+            for robot_id in sorted(robot_rows):
+                rows = robot_rows[robot_id]
+                for offset in range(0, len(rows), self.segmentRows):
+                    chunk.extend(values[row] for row in rows[offset:offset + self.segmentRows])
+                    if len(chunk) >= self.segmentRows:
+                        compacted.AppendColumn(name, chunk)
+                        chunk = array.array(COLUMNS[name])
+            if chunk:
+                compacted.AppendColumn(name, chunk)
+        return position, index
+
+    def DropBefore(self, timestamp):
+        """
+        Delete sealed segments where every row is older than a time
+
+        Args:
+            timestamp:  the oldest time to keep (float)
+        """
+        with self._lock:
+            for segment in [segment for segment in self._segments
+                            if segment.manifest["sealed"] and segment.manifest["maxTimestamp"] < timestamp]:
+                segment.Close()
+                self._segments.remove(segment)
+                shutil.rmtree(segment.path)
+
+    def Close(self):
+        """
+        Flush buffered rows and unmap every segment
+        """
+        with self._lock:
+            self.Flush()
+            for segment in self._segments:
+                segment.Close()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+#pylint: skip-file
+"""
+The original, straightforward implementations of the response decoders, used to check that the optimized decoders give
+identical output and to benchmark against
+"""
+
+import socket
+import struct
+from pyirobot import BinStatus, MissionState, ReadyStatus, RobotStatus, _ErrorMessages, _MissionCycleToCleaningPasses
+
+def TransformMission(res):
+    res["batteryPercentage"] = res.pop("batPct")
+
+    if res["expireM"] <= 0:
+        res.pop("expireM")
+    else:
+        res["minutesUntilMissionCancelled"] = res.pop("expireM")
+
+    res["missionElapsedMinutes"] = res.pop("mssnM")
+
+    try:
+        res["readyStatus"] = ReadyStatus(res["notReady"])
+    except ValueError:
+        res["readyStatus"] = ReadyStatus.Unknown
+    if res["readyStatus"] != ReadyStatus.Unknown:
+        res.pop("notReady")
+
+    res["robotPosition"] = res.pop("pos")
+
+    if res["rechrgM"] <= 0:
+        res.pop("rechrgM")
+    else:
+        res["rechargeMinutesRemaining"] = res.pop("rechrgM")
+
+    res["missionCoveredSquareFootage"] = res.pop("sqft")
+
+    res["binStatus"] = BinStatus.Normal
+    if res["flags"] & MissionState.BinMissing.value == MissionState.BinMissing.value:
+        res["binStatus"] = BinStatus.Missing
+    elif res["flags"] & MissionState.BinFull.value == MissionState.BinFull.value:
+        res["binStatus"] = BinStatus.Full
+
+    try:
+        res["robotStatus"] = RobotStatus(res["phase"])
+    except ValueError:
+        res["robotStatus"] = RobotStatus.Unknown
+    if res["robotStatus"] == RobotStatus.Cleaning and res["flags"] & MissionState.Resuming.value == MissionState.Resuming.value:
+        res["robotStatus"] = RobotStatus.Resuming
+
+    if res["robotStatus"] != RobotStatus.Unknown:
+        res.pop("flags")
+        res.pop("phase")
+
+    if res["error"] == 0:
+        res.pop("error")
+    elif res["error"] in _ErrorMessages:
+        res["errorMessage"] = _ErrorMessages[res["error"]]
+
+    if res["cycle"] == "none":
+        res.pop("cycle")
+    elif res["cycle"] in _MissionCycleToCleaningPasses:
+        res["cycle"] = _MissionCycleToCleaningPasses[res["cycle"]]
+
+    return res
+
+def TransformWiFiDetails(res):
+    res["bssid"] = ":".join([i[2:] for i in map(hex, res["bssid"])])
+    res["dhcp"] = True if res["dhcp"] == 1 else False
+    res["ipAddress"] = socket.inet_ntoa(struct.pack("I", res.pop("addr")))
+    res["subnetMask"] = socket.inet_ntoa(struct.pack("I", res.pop("mask")))
+    res["router"] = socket.inet_ntoa(struct.pack("I", res.pop("gtwy")))
+    res["dns1"] = socket.inet_ntoa(struct.pack("I", res.pop("dns1")))
+    res["dns2"] = socket.inet_ntoa(struct.pack("I", res.pop("dns2")))
+    res["signalStrength"] = res.pop("strssi")
+    res["securityType"] = "WPA2" if res["sec"] == 4 else str(res["sec"])
+    res.pop("sec")
+
+    return res
+
+def DecodePreferencesFlags(flags):
+    from pyirobot import CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean
+    prefs = {}
+    for conf in (CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean):
+        pref_name = conf.PrefName()
+        test = flags & max(conf, key=lambda x: x.value).value
+        try:
+            prefs[pref_name] = conf(test)
+        except ValueError:
+            prefs[pref_name] = conf["Unknown"]
+    return prefs
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import json
+import pytest
+import types
+from .util import FakeRobot, RandomComplexString, RandomIP, SampleMission, SampleWiFiDetails
+
+def AsyncFakeRobot(answer, method="_PostToRobot", **kwargs):
+    """
+    The AsyncRobot version of util.FakeRobot, kept here as util is also imported by tests that run on Python 2.
+    answer may be a plain function or a coroutine function
+    """
+    from pyirobot.aio import AsyncRobot
+    robot = AsyncRobot(RandomIP(), RandomComplexString(64), **kwargs)
+    robot.sent = []
+    async def fake(self, cmd, args):
+        self.sent.append((cmd, args))
+        result = answer(cmd, args)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+    setattr(robot, method, types.MethodType(fake, robot))
+    return robot
+
+async def _StartUMIServer(responses):
+    """
+    Start a plain HTTP server on localhost that answers /umi requests from a dict of responses
+    """
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b"\r\n":
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            request = json.loads((await reader.readexactly(length)).decode("utf-8"))
+            body = json.dumps({"ok" : responses[request["args"][0]], "id" : request["id"]}).encode("utf-8")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: " + str(len(body)).encode("ascii") + b"\r\n\r\n" + body)
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, connections
+
+class Test_AsyncRobot(object):
+
+    def test_DecodeMatchesRobot(self):
+        responses = {"mssn" : SampleMission(phase="run", flags=8, error=17), "wlstat" : SampleWiFiDetails()}
+
+        def answer(cmd, args):
+            return dict(responses[args])
+
+        robot = FakeRobot(answer)
+        arobot = AsyncFakeRobot(answer)
+
+        assert asyncio.run(arobot.GetMission()) == robot.GetMission()
+        assert asyncio.run(arobot.GetWiFiDetails()) == robot.GetWiFiDetails()
+
+    def test_TruncatedResponse(self):
+        from pyirobot.aio import AsyncRobot
+        from pyirobot.retry import RetryPolicy
+
+        async def run():
+            async def handle(reader, writer):
+                await reader.readuntil(b"\r\n\r\n")
+                # Promise a body and hang up half way through it
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\n{\"ok\"")
+                await writer.drain()
+                writer.close()
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with AsyncRobot("127.0.0.1:{}".format(port), "password", sslContext=False,
+                                  retryPolicy=RetryPolicy(attempts=2, backoff=0.001)) as robot:
+                with pytest.raises(ConnectionError):
+                    await robot.GetMission()
+                retries, failures = robot.retries, robot.circuitBreaker.failures
+            server.close()
+            return retries, failures
+
+        # Retried, and counted by the circuit breaker, like any other network error
+        assert asyncio.run(run()) == (1, 2)
+
+    def test_KeepAlive(self):
+        from pyirobot import RobotStatus
+        from pyirobot.aio import AsyncRobot
+
+        async def run():
+            server, connections = await _StartUMIServer({"mssn" : SampleMission()})
+            port = server.sockets[0].getsockname()[1]
+            async with AsyncRobot("127.0.0.1:{}".format(port), "password", poolSize=2, sslContext=False) as robot:
+                for _ in range(5):
+                    mission = await robot.GetMission()
+                    assert mission["robotStatus"] == RobotStatus.Charging
+                missions = await asyncio.gather(*[robot.GetMission() for _ in range(10)])
+                assert len(missions) == 10
+            server.close()
+            await server.wait_closed()
+            return connections
+
+        connections = asyncio.run(run())
+        assert len(connections) <= 2
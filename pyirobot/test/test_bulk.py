@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import random
+import pytest
+from . import reference
+from .util import SampleMission
+
+@pytest.fixture(params=["numpy", "array"])
+def bulk(request, monkeypatch):
+    from pyirobot import bulk
+    if request.param == "numpy":
+        if bulk.numpy is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(bulk, "numpy", None)
+    return bulk
+
+class Test_BulkDecode(object):
+
+    def test_PreferencesFlags(self, bulk):
+        from pyirobot import CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean
+        flags = list(range(2048)) + [random.randint(0, 2**31) for _ in range(1000)]
+        columns = bulk.DecodePreferencesFlags(flags)
+        decoded = dict((name, bulk.ToEnums(codes, conf)) for name, codes, conf in
+                       zip(columns.keys(), columns.values(), (CarpetBoost, CleaningPasses, FinishWhenBinFull, EdgeClean)))
+        for idx, flag in enumerate(flags):
+            expected = reference.DecodePreferencesFlags(flag)
+            assert dict((name, decoded[name][idx]) for name in expected) == expected
+
+    def test_Missions(self, bulk):
+        from pyirobot import BinStatus, ReadyStatus, RobotStatus
+        records = [SampleMission(phase=random.choice(["none", "run", "stop", "charge", "stuck", "evac"]),
+                                 notReady=random.choice([-5, 0, 1, 3, 7, 15, 16, 17, 1000]),
+                                 flags=random.randint(0, 15),
+                                 error=random.choice([0, 1, 6, 17, 99]))
+                   for _ in range(2000)]
+        columns = bulk.DecodeMissions([r["flags"] for r in records],
+                                      [r["notReady"] for r in records],
+                                      [r["phase"] for r in records],
+                                      [r["error"] for r in records])
+        ready = bulk.ToEnums(columns["readyStatus"], ReadyStatus)
+        bins = bulk.ToEnums(columns["binStatus"], BinStatus)
+        statuses = bulk.ToEnums(columns["robotStatus"], RobotStatus)
+        for idx, record in enumerate(records):
+            expected = reference.TransformMission(dict(record))
+            assert ready[idx] == expected["readyStatus"]
+            assert bins[idx] == expected["binStatus"]
+            assert statuses[idx] == expected["robotStatus"]
+            assert columns["error"][idx] == record["error"]
+            assert columns["errorMessage"][idx] == expected.get("errorMessage")
+
+    def test_Empty(self, bulk):
+        assert len(bulk.DecodeMissions([], [], [], [])["robotStatus"]) == 0
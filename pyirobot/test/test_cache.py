@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+from .util import FakeRobot, SamplePreferences
+
+class _FakeClock(object):
+    def __init__(self):
+        self.now = 0
+    def __call__(self):
+        return self.now
+
+def _FakeRobot(cache):
+    def answer(cmd, args):
+        if cmd == "get":
+            return {"prefs" : SamplePreferences(), "sku" : {"sku" : "R980020"}, "mssn" : {}}[args]
+        return {}
+    return FakeRobot(answer, method="_SendToRobot", cache=cache)
+
+class Test_ResourceCache(object):
+
+    def test_ReadThroughAndExpiry(self):
+        from pyirobot.cache import ResourceCache
+        clock = _FakeClock()
+        robot = _FakeRobot(ResourceCache(ttls={"sku" : 10}, clock=clock))
+        assert robot.GetSKU() == {"sku" : "R980020"}
+        assert robot.GetSKU() == {"sku" : "R980020"}
+        assert len(robot.sent) == 1
+        clock.now = 11
+        robot.GetSKU()
+        assert len(robot.sent) == 2
+        assert robot.cache.Stats() == {"hits" : 1, "misses" : 2, "evictions" : 0, "size" : 1}
+
+    def test_SetInvalidates(self):
+        from pyirobot import CarpetBoost
+        from pyirobot.cache import ResourceCache
+        robot = _FakeRobot(ResourceCache())
+        prefs = robot.GetCleaningPreferences()
+        # Callers modifying the result must not modify the cache
+        prefs["name"] = "Changed"
+        assert robot.GetCleaningPreferences()["name"] == "Roomba"
+        robot.SetCarpetBoost(CarpetBoost.Perf)
+        robot.GetCleaningPreferences()
+        assert [cmd for cmd, _ in robot.sent] == ["get", "set", "get"]
+
+    def test_LRUEviction(self):
+        from pyirobot.cache import ResourceCache
+        cache = ResourceCache(maxSize=2)
+        robots = [_FakeRobot(cache) for _ in range(3)]
+        robots[0].GetSKU()
+        robots[1].GetSKU()
+        robots[0].GetSKU()
+        robots[2].GetSKU()
+        assert cache.evictions == 1
+        assert cache.Get(robots[1].ip, "sku") is None
+        assert cache.Get(robots[0].ip, "sku") is not None
+
+    def test_UncachedResource(self):
+        from pyirobot.cache import ResourceCache
+        robot = _FakeRobot(ResourceCache())
+        robot._PostToRobot("get", "mssn")
+        robot._PostToRobot("get", "mssn")
+        assert len(robot.sent) == 2
+        assert len(robot.cache) == 0
+
+    def test_GetInFlightDuringSet(self):
+        import threading
+        from pyirobot.cache import ResourceCache
+        started = threading.Event()
+        release = threading.Event()
+        prefs = {"name" : "Before"}
+        def answer(cmd, args):
+            if cmd == "set":
+                prefs.update(args[1])
+                return {}
+            if not started.is_set():
+                # The first get reads the robot before the set, and answers after it
+                value = dict(prefs)
+                started.set()
+                release.wait()
+                return value
+            return dict(prefs)
+        robot = FakeRobot(answer, method="_SendToRobot", cache=ResourceCache(), resultWindow=60)
+
+        results = {}
+        def get(name):
+            results[name] = robot._PostToRobot("get", "prefs")["name"]
+        slow = threading.Thread(target=get, args=("slow",))
+        slow.start()
+        started.wait()
+        robot._PostToRobot("set", ["prefs", {"name" : "After"}])
+        # A caller after the set does not join the request sent before it
+        after = threading.Thread(target=get, args=("after",))
+        after.start()
+        after.join(5)
+        release.set()
+        slow.join()
+
+        assert results == {"slow" : "Before", "after" : "After"}
+        # Neither the cache nor the result window keep the value from before the write
+        assert robot._PostToRobot("get", "prefs")["name"] == "After"
+        assert robot.cache.Get(robot.ip, "prefs") == {"name" : "After"}
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import datetime
+import json
+import sys
+import pytest
+from .util import RandomComplexString, RandomIP, SampleMission, SamplePreferences, SampleWiFiDetails
+
+def _Codecs():
+    from pyirobot.codec import CODECS
+    codecs = []
+    for codec_type in CODECS:
+        try:
+            codecs.append(codec_type())
+        except ImportError:
+            pass
+    return codecs
+
+@pytest.fixture(params=["json", "orjson", "ujson"])
+def codec(request):
+    from pyirobot.codec import GetCodec
+    try:
+        return GetCodec(request.param)
+    except ImportError:
+        pytest.skip("{} is not installed".format(request.param))
+
+class _FakeResponse(object):
+    def __init__(self, body):
+        self.content = body
+    def json(self):
+        raise AssertionError("the response should be decoded by the codec")
+
+class _RecordingTransport(object):
+    def __init__(self, body):
+        self.timeout = (5, 10)
+        self.body = body
+        self.sent = []
+    def Post(self, url, data, auth=None, timeout=None):
+        self.sent.append(data)
+        return _FakeResponse(self.body)
+
+class Test_Codec(object):
+
+    def test_EncodeMatchesJSONDumps(self, codec):
+        from pyirobot import _BuildUMIRequest
+        requests = [("get", "mssn", 1),
+                    ("get", ["prefs", "mssn"], 2),
+                    ("set", ["cmd", {"op" : "start"}], 3),
+                    ("set", ["prefs", {"flags" : 1024, "cleanMissionStatus" : {"phase" : u"café"}}], 4),
+                    ("set", ["week", {"cycle" : ["none", "start"], "h" : [9, 10], "m" : [0, 30]}], 5)]
+        for cmd, args, request_id in requests:
+            body = _BuildUMIRequest(cmd, args, request_id, codec)
+            expected = json.dumps({"do" : cmd, "args" : [args] if isinstance(args, str) else args, "id" : request_id})
+            assert body == expected.encode("utf-8")
+
+    def test_EncodeEnumsAndTimes(self, codec):
+        from pyirobot import CarpetBoost
+        body = codec.Encode({"boost" : CarpetBoost.Perf, "start" : datetime.time(9, 30)})
+        assert body == b'{"boost": "Perf", "start": "09:30:00"}'
+        with pytest.raises(TypeError):
+            codec.Encode({"bad" : object()})
+
+    def test_Decode(self, codec):
+        for body in (SampleMission(), SamplePreferences(), SampleWiFiDetails(), {"name" : u"Röömba"}):
+            data = json.dumps({"ok" : body}).encode("utf-8")
+            assert codec.Decode(data) == json.loads(data.decode("utf-8"))
+        assert codec.Decode(u'{"name": "Röömba"}'.encode("utf-8")) == {"name" : u"Röömba"}
+        with pytest.raises(ValueError):
+            codec.Decode(b'{"ok": ')
+
+    def test_Robot(self, codec):
+        from pyirobot import Robot
+        robot = Robot(RandomIP(), RandomComplexString(64), codec=codec)
+        robot.transport = _RecordingTransport(json.dumps({"ok" : SampleMission()}).encode("utf-8"))
+        assert robot.GetMission()["batteryPercentage"] == SampleMission()["batPct"]
+        assert robot.transport.sent == [b'{"do": "get", "args": ["mssn"], "id": 1}']
+
+    def test_Fallback(self, monkeypatch):
+        from pyirobot.codec import GetCodec
+        monkeypatch.setitem(sys.modules, "orjson", None)
+        monkeypatch.setitem(sys.modules, "ujson", None)
+        assert GetCodec().name == "json"
+        with pytest.raises(ImportError):
+            GetCodec("orjson")
+        with pytest.raises(ValueError):
+            GetCodec("yaml")
+
+    def test_Default(self):
+        from pyirobot import Robot
+        from pyirobot.codec import DefaultCodec
+        robot = Robot(RandomIP(), RandomComplexString(64))
+        assert robot.codec is DefaultCodec()
+        assert robot.codec.name == _Codecs()[0].name
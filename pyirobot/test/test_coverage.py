@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import random
+import pytest
+from .util import SampleMission
+
+@pytest.fixture(params=["numpy", "array"])
+def coverage(request, monkeypatch):
+    from pyirobot import coverage
+    if request.param == "numpy":
+        if coverage.numpy is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(coverage, "numpy", None)
+    return coverage
+
+def _Grid(grid):
+    return [list(row) for row in grid.Grid()]
+
+class Test_CoverageGrid(object):
+
+    def test_Line(self, coverage):
+        grid = coverage.CoverageGrid(cellSize=10)
+        grid.Add(0, 0)
+        grid.Add(49, 0)
+        assert [grid.Count(x, 0) for x in range(0, 60, 10)] == [1, 1, 1, 1, 1, 0]
+        grid.Add(0, 0)
+        assert grid.Count(20, 5) == 2
+        assert grid.CoveredCells() == 5
+        assert grid.CoveredArea() == 500
+
+    def test_Growth(self, coverage):
+        grid = coverage.CoverageGrid(cellSize=1, initialCells=4)
+        grid.Add(0, 0)
+        grid.Add(-50, 30)
+        grid.Add(100, -70)
+        assert grid.Count(0, 0) == 1
+        assert grid.Count(-50, 30) == 1
+        assert grid.Count(100, -70) == 1
+
+    def test_IncrementalMatchesBulk(self, coverage):
+        xs = [0]
+        ys = [0]
+        for _ in range(500):
+            xs.append(xs[-1] + random.randint(-40, 40))
+            ys.append(ys[-1] + random.randint(-40, 40))
+        incremental = coverage.CoverageGrid(cellSize=7, initialCells=8)
+        for x, y in zip(xs, ys):
+            incremental.Add(x, y)
+        bulk = coverage.CoverageGrid(cellSize=7, initialCells=8)
+        bulk.AddTrajectory(xs[:100], ys[:100])
+        bulk.AddTrajectory(xs[100:], ys[100:])
+        assert incremental.CoveredCells() == bulk.CoveredCells()
+        for x, y in zip(xs, ys):
+            assert incremental.Count(x, y) == bulk.Count(x, y)
+
+class Test_CoverageMap(object):
+
+    def test_Update(self, coverage):
+        from pyirobot import Robot
+        from pyirobot.mission import MissionSnapshot
+        coverage_map = coverage.CoverageMap(cellSize=10)
+        robot = Robot("127.0.0.1", "password")
+        for x in range(0, 100, 20):
+            coverage_map.Update(robot._TransformMission(SampleMission(pos={"point" : {"x" : x, "y" : 0}, "theta" : 0})))
+        assert len(coverage_map.trajectory) == 5
+        assert coverage_map.grid.CoveredCells() == 9
+
+        mission = robot._TransformMission(SampleMission(nMssn=43))
+        coverage_map.Update(MissionSnapshot.FromMission(mission))
+        assert len(coverage_map.trajectory) == 1
+        assert coverage_map.grid.CoveredCells() == 1
+        assert list(coverage_map.trajectory.x) == [2]
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import os
+import threading
+import time
+import pytest
+from .util import RandomComplexString, RandomIP
+
+def _Store(tmpdir):
+    from pyirobot.credentials import CredentialStore
+    return CredentialStore(os.path.join(str(tmpdir), "credentials.db"))
+
+class Test_CredentialStore(object):
+
+    def test_PutGet(self, tmpdir):
+        with _Store(tmpdir) as store:
+            sys_info = {"blid" : [1, 2, 171, 205], "sw" : "v1.6.6"}
+            record = store.Put("192.168.1.20", "password", sys=sys_info, sku={"sku" : "R980020"})
+            assert (record.ip, record.password, record.blid) == ("192.168.1.20", "password", "12abcd")
+            assert record.sys == sys_info and record.sku == {"sku" : "R980020"}
+            assert store.GetByBLID("12abcd") == record
+            assert "192.168.1.20" in store and "192.168.1.21" not in store
+            assert store.Get("192.168.1.21") is None
+            assert "password" not in repr(record)
+
+            # Fields that are not given keep their values
+            record = store.Put("192.168.1.20", "new password", name="Kitchen")
+            assert (record.password, record.name, record.blid, record.sku) == ("new password", "Kitchen", "12abcd", {"sku" : "R980020"})
+
+            assert store.Remove("192.168.1.20")
+            assert not store.Remove("192.168.1.20")
+            assert len(store) == 0
+
+    def test_AddressChange(self, tmpdir):
+        with _Store(tmpdir) as store:
+            store.Put("192.168.1.20", "password", blid="12abcd", name="Kitchen")
+            store.Put("192.168.1.44", "password", blid="12abcd")
+            assert [record.ip for record in store.Records()] == ["192.168.1.44"]
+            assert store.GetByBLID("12abcd").ip == "192.168.1.44"
+
+    def test_Persistent(self, tmpdir):
+        with _Store(tmpdir) as store:
+            store.PutMany([(RandomIP(), RandomComplexString(20)) for _ in range(10)])
+            records = store.Records()
+        with _Store(tmpdir) as store:
+            assert store.Records() == records
+            assert [record.ip for record in records] == sorted(record.ip for record in records)
+
+    def test_AtomicPutMany(self, tmpdir):
+        with _Store(tmpdir) as store:
+            with pytest.raises(AssertionError):
+                store.PutMany([("192.168.1.20", "password"), ("192.168.1.21", None)])
+            import sqlite3
+            store.PutMany([("192.168.1.20", "password", "12abcd"), ("192.168.1.21", "password", "34ef")])
+            with pytest.raises(sqlite3.Error):
+                # The last row cannot be stored, so none of the batch is written
+                store.PutMany([("192.168.1.22", "password", "56"), ("192.168.1.20", "password", None, "Hall"),
+                               ("192.168.1.23", "password", "34ef", object())])
+            assert len(store) == 2 and store.Get("192.168.1.20").name is None
+            assert store.GetByBLID("34ef").ip == "192.168.1.21"
+
+    def test_ConcurrentReaders(self, tmpdir):
+        path = os.path.join(str(tmpdir), "credentials.db")
+        from pyirobot.credentials import CredentialStore
+        writer = CredentialStore(path)
+        errors = []
+        counts = []
+
+        def read():
+            try:
+                reader = CredentialStore(path)
+                for _ in range(50):
+                    counts.append(len(reader.Records()))
+                reader.Close()
+            except Exception as ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for idx in range(50):
+            writer.PutMany([("10.0.{}.{}".format(idx, host), "password") for host in range(20)])
+        for thread in threads:
+            thread.join()
+        writer.Close()
+        assert not errors
+        # Readers only ever see whole batches
+        assert all(count % 20 == 0 for count in counts)
+
+    def test_Robots(self, tmpdir):
+        from pyirobot import Robot
+        from pyirobot.aio import AsyncRobot
+        from pyirobot.cache import ResourceCache
+        with _Store(tmpdir) as store:
+            store.PutMany([("10.0.{}.{}".format(idx // 250, idx % 250), "password{}".format(idx), None, None,
+                            {"blid" : [idx % 256, idx // 256]}, {"sku" : "R980020"}) for idx in range(2000)])
+            store.Close()
+            start = time.perf_counter()
+            cache = ResourceCache(maxSize=10000)
+            robots = store.Robots(cache=cache, poolSize=2)
+            elapsed = time.perf_counter() - start
+            assert len(robots) == 2000 and all(isinstance(robot, Robot) for robot in robots)
+            assert robots[0].transport.poolSize == 2
+            # No network calls for the static information
+            assert robots[0].GetSys() == {"blid" : [0, 0]}
+            assert robots[0].GetSKU() == {"sku" : "R980020"}
+            # Priming is not counted as fetching
+            assert cache.Stats()["misses"] == 0 and cache.Stats()["hits"] == 2
+
+            # A default sized cache is grown to hold every robot's primed entries
+            cache = ResourceCache()
+            robots = store.Robots(cache=cache)
+            assert cache.maxSize >= 4000 and cache.evictions == 0
+            assert robots[0].GetSys() == {"blid" : [0, 0]}
+            assert elapsed < 2
+
+            assert all(isinstance(robot, AsyncRobot) for robot in store.Robots(robotClass=AsyncRobot))
+            with store.Fleet(maxWorkers=4) as fleet:
+                assert len(fleet) == 2000 and fleet.maxWorkers == 4
+
+    def test_Enroll(self, tmpdir):
+        from pyirobot.simulator import RobotSimulator, SimulatorThread
+        sim = RobotSimulator()
+        robot = sim.AddRobot()
+        robot.pairing = True
+        with SimulatorThread(sim), _Store(tmpdir) as store:
+            record = store.Enroll(robot.address)
+            assert (record.password, record.blid, record.name) == (robot.password, robot.BLID(), robot.name)
+            assert record.sku == {"sku" : "R980020"}
+        assert sim.Stats()["requests"] == 4
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import itertools
+import random
+import pytest
+from . import reference
+from .util import RandomComplexString, RandomIP, SampleMission, SampleWiFiDetails
+
+_PHASES = ["none", "run", "stop", "charge", "resume", "hmPostMsn", "hmUsrDock", "stuck", "evac", ""]
+_NOT_READY = [-1, 0, 1, 2, 3, 4, 5, 7, 15, 16, 31, 99]
+
+def _Decode(transform, res):
+    from pyirobot import Robot
+    robot = Robot(RandomIP(), RandomComplexString(64))
+    return list(getattr(robot, transform)(dict(res)).items())
+
+class Test_FastDecode(object):
+
+    def test_MissionMatchesReference(self):
+        for phase, not_ready, flags in itertools.product(_PHASES, _NOT_READY, range(16)):
+            mission = SampleMission(phase=phase,
+                                    notReady=not_ready,
+                                    flags=flags,
+                                    error=random.choice([0, 1, 17, 99]),
+                                    cycle=random.choice(["none", "quick", "clean", "spot"]),
+                                    expireM=random.choice([-1, 0, 30]),
+                                    rechrgM=random.choice([0, 12]))
+            assert _Decode("_TransformMission", mission) == list(reference.TransformMission(dict(mission)).items())
+
+    def test_MissionUnhashableValues(self):
+        mission = SampleMission(phase=["run"], notReady={"a" : 1})
+        assert _Decode("_TransformMission", mission) == list(reference.TransformMission(dict(mission)).items())
+
+    def test_WiFiDetailsMatchesReference(self):
+        for _ in range(500):
+            details = SampleWiFiDetails(addr=random.randint(0, 2**32 - 1),
+                                        mask=random.choice([0, 16777215, 2**32 - 1]),
+                                        gtwy=random.randint(0, 2**32 - 1),
+                                        bssid=[random.randint(0, 300) for _ in range(6)],
+                                        dhcp=random.choice([0, 1, 2]),
+                                        sec=random.choice([0, 2, 4, 7]))
+            assert _Decode("_TransformWiFiDetails", details) == list(reference.TransformWiFiDetails(dict(details)).items())
+
+    def test_WiFiDetailsInvalidAddress(self):
+        import struct
+        for addr in (-1, 2**32):
+            with pytest.raises(struct.error):
+                _Decode("_TransformWiFiDetails", SampleWiFiDetails(addr=addr))
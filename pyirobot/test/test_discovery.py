@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import socket
+import time
+import pytest
+
+def _Simulator(count=3, discoveryPort=0, **kwargs):
+    from pyirobot.simulator import RobotSimulator
+    sim = RobotSimulator(seed=1, discoveryPort=discoveryPort, **kwargs)
+    for idx in range(count):
+        sim.AddRobot(seed=idx)
+    return sim
+
+def _ClosedPort():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+async def _Collect(generator):
+    return [robot async for robot in generator]
+
+class _SilentServer(object):
+    """
+    Accepts connections and never says anything, like a host that drops the TLS handshake
+    """
+
+    def __init__(self):
+        self.open = 0
+        self.peak = 0
+        self.address = None
+        self._server = None
+
+    async def _Handle(self, reader, writer):
+        self.open += 1
+        self.peak = max(self.peak, self.open)
+        try:
+            await reader.read()
+        finally:
+            self.open -= 1
+            writer.close()
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._Handle, "127.0.0.1", 0, backlog=1024)
+        self.address = "127.0.0.1:{}".format(self._server.sockets[0].getsockname()[1])
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._server.close()
+
+class Test_Targets(object):
+
+    def test_ExpandTargets(self):
+        import ipaddress
+        from pyirobot.discovery import ExpandTargets
+        assert list(ExpandTargets(["10.0.0.0/30"])) == ["10.0.0.1", "10.0.0.2"]
+        assert list(ExpandTargets(["10.0.0.254-10.0.1.1"], port=8443)) == \
+               ["10.0.0.254:8443", "10.0.0.255:8443", "10.0.1.0:8443", "10.0.1.1:8443"]
+        assert list(ExpandTargets([ipaddress.ip_network("10.0.0.8/31"), ipaddress.ip_address("10.0.0.20")])) == \
+               ["10.0.0.8", "10.0.0.9", "10.0.0.20"]
+        assert list(ExpandTargets(["10.0.0.5:8443", "roomba-kitchen.lan"], port=80)) == \
+               ["10.0.0.5:8443", "roomba-kitchen.lan:80"]
+
+        # A /8 is never held in memory
+        hosts = ExpandTargets(["10.0.0.0/8"])
+        start = time.perf_counter()
+        assert next(hosts) == "10.0.0.1"
+        assert time.perf_counter() - start < 0.1
+
+    def test_ParseAnnouncement(self):
+        from pyirobot.discovery import DiscoveredRobot, _ParseAnnouncement
+        data = b'{"ver":"3","hostname":"Roomba-3115850251687850","robotname":"Kitchen","ip":"192.168.1.20",' \
+               b'"mac":"aa:bb","sw":"v2.4.6-3","sku":"R980020"}'
+        assert _ParseAnnouncement(data, "192.168.1.20") == \
+               DiscoveredRobot("192.168.1.20", blid="3115850251687850", name="Kitchen", sku="R980020", sw="v2.4.6-3",
+                               mac="aa:bb", source="broadcast")
+        assert _ParseAnnouncement(b'{"hostname":"iRobot-1234"}', "10.0.0.3").ip == "10.0.0.3"
+        # Our own query, and other devices
+        assert _ParseAnnouncement(b"irobotmcs", "10.0.0.1") is None
+        assert _ParseAnnouncement(b'{"hostname":"printer"}', "10.0.0.4") is None
+        assert _ParseAnnouncement(b"[1, 2]", "10.0.0.4") is None
+
+class Test_Broadcast(object):
+
+    def test_Broadcast(self):
+        from pyirobot.discovery import RobotDiscovery
+        sim = _Simulator()
+        sim.robots[1].online = False
+
+        async def run():
+            async with sim:
+                discovery = RobotDiscovery(broadcastAddress=sim.discoveryAddress, broadcastTimeout=0.3)
+                return await _Collect(discovery.Broadcast()), discovery.Stats()
+
+        robots, stats = asyncio.run(run())
+        expected = [sim.robots[0], sim.robots[2]]
+        assert sorted(robot.ip for robot in robots) == sorted(robot.address for robot in expected)
+        by_ip = dict((robot.ip, robot) for robot in robots)
+        for robot in expected:
+            found = by_ip[robot.address]
+            assert (found.blid, found.name, found.sku, found.source) == (robot.BLID(), robot.name, "R980020", "broadcast")
+        # Every attempt is answered, but each robot is only yielded once
+        assert sim.Stats()["announced"] == 3 * 2
+        assert stats["announced"] == 2 and stats["probed"] == 0
+
+class Test_Sweep(object):
+
+    def test_Sweep(self):
+        from pyirobot.discovery import RobotDiscovery
+        sim = _Simulator(discoveryPort=None)
+        robots = sim.robots
+        robots[1].pairing = True
+
+        async def run():
+            async with sim, _SilentServer() as silent:
+                discovery = RobotDiscovery(timeout=(0.2, 0.2))
+                targets = [robot.address for robot in robots] + \
+                          ["127.0.0.1:{}".format(_ClosedPort()) for _ in range(5)] + [silent.address]
+                start = time.perf_counter()
+                found = await _Collect(discovery.Sweep(targets, passwords={robots[2].address : robots[2].password}))
+                return found, time.perf_counter() - start, discovery.Stats()
+
+        found, elapsed, stats = asyncio.run(run())
+        by_ip = dict((robot.ip, robot) for robot in found)
+        assert sorted(by_ip) == sorted(robot.address for robot in robots)
+        assert [by_ip[robot.address].pairing for robot in robots] == [False, True, False]
+        # The password is known for the last robot, so it is identified
+        known = by_ip[robots[2].address]
+        assert (known.blid, known.sku, known.sw) == (robots[2].BLID(), "R980020", "v1.6.6")
+        assert by_ip[robots[0].address].blid is None
+        assert stats == {"probed" : 9, "answered" : 3, "announced" : 0, "found" : 3}
+        # The silent host only costs one timeout
+        assert elapsed < 1.5
+
+    def test_SharedPort(self):
+        from pyirobot.discovery import RobotDiscovery
+        sim = _Simulator(discoveryPort=None, sharedPort=True)
+
+        async def run():
+            async with sim:
+                # Every robot is on one address, which only answers with a password
+                address = sim.robots[0].address
+                return await _Collect(RobotDiscovery().Sweep([address] * 3, passwords={address : "wrong"}))
+
+        found = asyncio.run(run())
+        assert [robot.ip for robot in found] == [sim.robots[0].address]
+
+    def test_BasicAuthIsNotARobot(self):
+        from pyirobot.discovery import RobotDiscovery
+
+        async def run():
+            async def handle(reader, writer):
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(b"HTTP/1.1 401 Unauthorized\r\nWWW-Authenticate: Basic\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+                writer.close()
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            address = "127.0.0.1:{}".format(server.sockets[0].getsockname()[1])
+            discovery = RobotDiscovery(sslContext=False, timeout=(0.5, 0.5))
+            # A router's admin page, say, asks for a password whatever it is sent
+            unknown = await discovery.Probe(address)
+            # But a 401 for a password we sent is how a robot answers a wrong one
+            known = await discovery.Probe(address, "password")
+            server.close()
+            return unknown, known
+
+        unknown, known = asyncio.run(run())
+        assert unknown is None
+        assert known is not None
+
+    def test_Concurrency(self):
+        from pyirobot.discovery import RobotDiscovery
+
+        async def run():
+            async with _SilentServer() as silent:
+                discovery = RobotDiscovery(maxConcurrent=10, timeout=(0.2, 0.2))
+                start = time.perf_counter()
+                found = await _Collect(discovery.Sweep([silent.address] * 40))
+                return found, time.perf_counter() - start, silent.peak
+
+        found, elapsed, peak = asyncio.run(run())
+        assert found == []
+        assert peak == 10
+        # Four rounds of ten timeouts, not forty
+        assert 0.7 < elapsed < 2.5
+
+    def test_StopEarly(self):
+        from pyirobot.discovery import RobotDiscovery
+        sim = _Simulator(discoveryPort=None)
+
+        async def run():
+            async with sim, _SilentServer() as silent:
+                discovery = RobotDiscovery(maxConcurrent=4, timeout=(5, 5))
+                sweep = discovery.Sweep([sim.robots[0].address] + [silent.address] * 20)
+                robot = await sweep.__anext__()
+                start = time.perf_counter()
+                await sweep.aclose()
+                await asyncio.sleep(0.05)
+                return robot, time.perf_counter() - start, silent.open
+
+        robot, elapsed, still_open = asyncio.run(run())
+        assert robot.ip == sim.robots[0].address
+        # Closing the sweep cancels the probes in flight
+        assert elapsed < 1 and still_open == 0
+
+class Test_Discover(object):
+
+    def test_Discover(self):
+        from pyirobot.discovery import RobotDiscovery
+        sim = _Simulator(count=4)
+        sim.robots[3].online = False
+
+        async def run():
+            async with sim:
+                discovery = RobotDiscovery(broadcastAddress=sim.discoveryAddress, broadcastTimeout=0.3, timeout=(0.2, 0.2))
+                targets = [robot.address for robot in sim.robots] + ["127.0.0.1:{}".format(_ClosedPort())]
+                return await _Collect(discovery.Discover(targets))
+
+        found = asyncio.run(run())
+        # Each robot once, whichever way found it first
+        assert sorted(robot.ip for robot in found) == sorted(robot.address for robot in sim.robots[:3])
+
+    def test_BareAnnouncedAddress(self):
+        from pyirobot.discovery import RobotDiscovery, DiscoveredRobot
+        sim = _Simulator(count=1, discoveryPort=None)
+        robot = sim.robots[0]
+
+        async def run():
+            async with sim:
+                host, _, port = robot.address.partition(":")
+                async def announce():
+                    # Real robots announce their address without the port
+                    yield DiscoveredRobot(host, blid=robot.BLID(), source="broadcast")
+                discovery = RobotDiscovery(port=int(port), timeout=(0.2, 0.2))
+                discovery.Broadcast = announce
+                return host, await _Collect(discovery.Discover([host]))
+
+        host, found = asyncio.run(run())
+        assert [(found_robot.ip, found_robot.source) for found_robot in found] in \
+               ([(host, "broadcast")], [(robot.address, "sweep")])
+
+    def test_BroadcastUnavailable(self):
+        from pyirobot.discovery import RobotDiscovery
+        sim = _Simulator(count=1, discoveryPort=None)
+
+        async def run():
+            async with sim:
+                discovery = RobotDiscovery(broadcastAddress="no-such-host.invalid")
+                swept = await _Collect(discovery.Discover([sim.robots[0].address]))
+                with pytest.raises(OSError):
+                    await _Collect(discovery.Discover())
+                return swept
+
+        assert [robot.source for robot in asyncio.run(run())] == ["sweep"]
+
+    def test_DiscoverRobots(self):
+        from pyirobot.discovery import DiscoverRobots
+        from pyirobot.simulator import SimulatorThread
+        sim = _Simulator(count=2)
+        seen = []
+        with SimulatorThread(sim):
+            found = DiscoverRobots(broadcastAddress=sim.discoveryAddress, broadcastTimeout=0.2, callback=seen.append)
+        assert found == seen
+        assert sorted(robot.blid for robot in found) == sorted(robot.BLID() for robot in sim.robots)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import json
+import threading
+import time
+import pytest
+from .util import RandomComplexString, RandomIP, SampleMission
+
+class _FakeResponse(object):
+    def __init__(self, body):
+        self.content = json.dumps(body).encode("utf-8")
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+class _SlowTransport(object):
+    """
+    Takes a while to answer each request, and records the order and concurrency of requests
+    """
+    def __init__(self, delay):
+        self.delay = delay
+        self.timeout = (5, 10)
+        self.order = []
+        self.active = 0
+        self.maxActive = 0
+        self.lock = threading.Lock()
+    def Post(self, url, data, auth=None, timeout=None):
+        request = json.loads(data)
+        with self.lock:
+            self.order.append(request["args"][0])
+            self.active += 1
+            self.maxActive = max(self.maxActive, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return _FakeResponse({"ok" : SampleMission()})
+
+def _Robot(dispatcher, delay=0.05, **kwargs):
+    from pyirobot import Robot
+    robot = Robot(RandomIP(), RandomComplexString(64), coalesce=False, dispatcher=dispatcher, **kwargs)
+    robot.transport = _SlowTransport(delay)
+    return robot
+
+def _Start(func):
+    thread = threading.Thread(target=func)
+    thread.start()
+    return thread
+
+class Test_RobotDispatcher(object):
+
+    def test_Priority(self):
+        from pyirobot.dispatch import RequestPriority, PRIORITY_CONTROL, PRIORITY_SETTINGS, PRIORITY_TELEMETRY
+        assert RequestPriority("get", "mssn") == PRIORITY_TELEMETRY
+        assert RequestPriority("get", ["prefs", "mssn"]) == PRIORITY_TELEMETRY
+        assert RequestPriority("set", ["cmd", {"op" : "dock"}]) == PRIORITY_CONTROL
+        assert RequestPriority("set", ["prefs", {"flags" : 0}]) == PRIORITY_SETTINGS
+
+    def test_Concurrency(self):
+        from pyirobot.dispatch import RobotDispatcher
+        robot = _Robot(RobotDispatcher(maxConcurrent=2))
+        threads = [_Start(robot.GetMission) for _ in range(6)]
+        for thread in threads:
+            thread.join()
+        assert robot.transport.maxActive == 2
+        stats = robot.dispatcher.Stats()
+        assert stats["waits"]["telemetry"]["count"] == 6
+        assert stats["waits"]["telemetry"]["maxWait"] > 0.05
+        assert (stats["active"], stats["queued"]) == (0, 0)
+
+    def test_ControlGoesFirst(self):
+        from pyirobot.dispatch import RobotDispatcher
+        robot = _Robot(RobotDispatcher(maxConcurrent=1), delay=0.1)
+        threads = [_Start(robot.GetMission)]
+        time.sleep(0.03)
+        threads += [_Start(robot.GetCloudConfig) for _ in range(3)]
+        time.sleep(0.03)
+        threads.append(_Start(robot.ReturnHome))
+        for thread in threads:
+            thread.join()
+        assert robot.transport.order == ["mssn", "cmd", "cloudcfg", "cloudcfg", "cloudcfg"]
+        waits = robot.dispatcher.Stats()["waits"]
+        assert waits["control"]["maxWait"] < waits["telemetry"]["maxWait"]
+
+    def test_Rate(self):
+        from pyirobot.dispatch import RobotDispatcher
+        robot = _Robot(RobotDispatcher(maxConcurrent=5, rate=20, burst=2), delay=0)
+        start = time.monotonic()
+        for _ in range(6):
+            robot.GetMission()
+        # Two from the burst, then one every 50ms
+        assert time.monotonic() - start >= 0.19
+
+    def test_Deadline(self):
+        from pyirobot.dispatch import RobotDispatcher
+        from pyirobot.retry import DeadlineExceeded
+        dispatcher = RobotDispatcher(maxConcurrent=1)
+        busy = _Robot(dispatcher, delay=0.3)
+        robot = _Robot(dispatcher, deadline=0.05)
+        thread = _Start(busy.GetMission)
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            robot.GetMission()
+        thread.join()
+        assert dispatcher.Stats()["queued"] == 0
+        robot.GetMission()
+
+class Test_AsyncRobotDispatcher(object):
+
+    def test_ControlGoesFirst(self):
+        from pyirobot.aio import AsyncRobotDispatcher
+        from pyirobot.dispatch import PRIORITY_CONTROL, PRIORITY_TELEMETRY
+        dispatcher = AsyncRobotDispatcher(maxConcurrent=1)
+        order = []
+
+        async def request(name, priority):
+            await dispatcher.Acquire(priority)
+            try:
+                order.append(name)
+                await asyncio.sleep(0.01)
+            finally:
+                dispatcher.Release()
+
+        async def run():
+            tasks = [asyncio.ensure_future(request("get{}".format(idx), PRIORITY_TELEMETRY)) for idx in range(3)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.ensure_future(request("dock", PRIORITY_CONTROL)))
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        assert order == ["get0", "dock", "get1", "get2"]
+        assert dispatcher.Stats()["waits"]["control"]["count"] == 1
+
+    def test_ReleaseWakesWithoutATask(self):
+        from pyirobot.aio import AsyncRobotDispatcher
+        dispatcher = AsyncRobotDispatcher(maxConcurrent=1)
+
+        async def run():
+            await dispatcher.Acquire()
+            waiter = asyncio.ensure_future(dispatcher.Acquire())
+            await asyncio.sleep(0)
+            tasks = len(asyncio.all_tasks())
+            # Release wakes the waiter directly, without starting a task to do it
+            dispatcher.Release()
+            assert len(asyncio.all_tasks()) == tasks
+            wait = await asyncio.wait_for(waiter, 1)
+            dispatcher.Release()
+            return wait
+
+        assert asyncio.run(run()) < 0.5
+        assert dispatcher.Stats()["active"] == 0
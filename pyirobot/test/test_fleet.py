@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import threading
+import time
+import pytest
+from .util import FakeRobot, SampleMission
+
+def _FakeRobot(delay=0, error=None):
+    def answer(cmd, args):
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return SampleMission()
+    return FakeRobot(answer)
+
+class Test_RobotFleet(object):
+
+    def test_ErrorsAreIsolated(self):
+        from pyirobot import RobotError, RobotStatus
+        from pyirobot.fleet import RobotFleet
+        robots = [_FakeRobot(), _FakeRobot(error=RobotError(3)), _FakeRobot(error=IOError("unreachable"))]
+        with RobotFleet(robots) as fleet:
+            results = fleet.GetMission()
+        assert [result.robot for result in results] == robots
+        assert results[0].ok and results[0].value["robotStatus"] == RobotStatus.Charging
+        assert isinstance(results[1].error, RobotError)
+        assert isinstance(results[2].error, IOError)
+
+    def test_Concurrent(self):
+        from pyirobot.fleet import RobotFleet
+        fleet = RobotFleet([_FakeRobot(delay=0.2) for _ in range(20)], maxWorkers=20)
+        start = time.time()
+        results = fleet.Call("GetMission")
+        assert time.time() - start < 1
+        assert all(result.ok for result in results)
+        fleet.Close()
+
+    def test_Stream(self):
+        from pyirobot.fleet import RobotFleet
+        slow = _FakeRobot(delay=0.3)
+        fast = _FakeRobot()
+        with RobotFleet([slow, fast]) as fleet:
+            order = [result.robot for result in fleet.Stream("GetMission")]
+        assert order == [fast, slow]
+
+    def test_UnknownMethod(self):
+        from pyirobot.fleet import RobotFleet
+        with pytest.raises(AttributeError):
+            RobotFleet().NotAMethod()
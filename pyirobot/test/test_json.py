@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import datetime
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+class Test_JSON(object):
+
+    def test_ToJSON(self):
+        from pyirobot import BinStatus, CarpetBoost, JSONEncoder, ToJSON
+        result = {"carpetBoost" : CarpetBoost.Perf, "binStatus" : BinStatus.Full, "start" : datetime.time(9, 30), "n" : 1}
+        expected = {"carpetBoost" : "Perf", "binStatus" : "Full", "start" : "09:30:00", "n" : 1}
+        assert json.loads(ToJSON(result)) == expected
+        assert json.loads(json.dumps(result, cls=JSONEncoder)) == expected
+        assert ToJSON({"b" : 1, "a" : 2}, sort_keys=True) == '{"a": 2, "b": 1}'
+        with pytest.raises(TypeError):
+            ToJSON({"bad" : object()})
+
+    def test_NoGlobalPatch(self):
+        from pyirobot import CarpetBoost
+        with pytest.raises(TypeError):
+            json.dumps(CarpetBoost.Perf)
+
+    def test_PatchJSONEncoder(self, monkeypatch):
+        from pyirobot import CarpetBoost, PatchJSONEncoder
+        monkeypatch.setattr(json.JSONEncoder, "default", json.JSONEncoder.default)
+        PatchJSONEncoder()
+        assert json.dumps([CarpetBoost.Perf, datetime.time(1, 2)]) == '["Perf", "01:02:00"]'
+        with pytest.raises(TypeError):
+            json.dumps(object())
+
+    def test_LazyImports(self):
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+        code = "import sys, pyirobot, pyirobot.mission; print(' '.join(m for m in ('requests', 'concurrent.futures', 'asyncio') if m in sys.modules))"
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=root, universal_newlines=True)
+        assert output.split() == []
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import json
+import pytest
+from .util import RandomComplexString, RandomIP, SampleMission
+
+class _FakeResponse(object):
+    def __init__(self, body):
+        self.content = json.dumps(body).encode("utf-8")
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+class _FakeTransport(object):
+    """
+    Answers /umi requests from a dict of responses, keyed by the first arg
+    """
+    def __init__(self, responses):
+        self.responses = responses
+    def Post(self, url, data, auth=None, timeout=None):
+        request = json.loads(data)
+        response = self.responses[request["args"][0]]
+        if isinstance(response, Exception):
+            raise response
+        return _FakeResponse(response)
+
+class Test_MetricsRegistry(object):
+
+    def test_NoHooksByDefault(self):
+        import pyirobot
+        assert pyirobot._RequestHooks == []
+
+    def test_RecordsRequests(self):
+        from pyirobot import Robot, RobotError
+        from pyirobot.metrics import MetricsRegistry
+        from pyirobot.retry import RetryPolicy
+        robot = Robot(RandomIP(), RandomComplexString(64), retryPolicy=RetryPolicy(attempts=1))
+        robot.transport = _FakeTransport({"mssn" : {"ok" : SampleMission()},
+                                          "cmd" : {"err" : 3},
+                                          "wllaststat" : IOError("connection reset")})
+        events = []
+        with MetricsRegistry() as registry:
+            from pyirobot.metrics import AddHook, RemoveHook
+            AddHook(events.append)
+            try:
+                robot.GetMission()
+                robot.GetMission()
+                with pytest.raises(RobotError):
+                    robot.StartCleaning()
+                with pytest.raises(IOError):
+                    robot.GetWiFiStatus()
+            finally:
+                RemoveHook(events.append)
+
+        assert [(event.cmd, event.resource, event.ok) for event in events] == \
+               [("get", "mssn", True), ("get", "mssn", True), ("set", "cmd", False), ("get", "wllaststat", False)]
+        assert events[2].errorCode == 3
+        assert events[3].responseBytes is None
+
+        stats = registry.Stats()
+        assert stats[("get", "mssn")]["count"] == 2
+        assert stats[("get", "mssn")]["responseBytes"] == 2 * len(json.dumps({"ok" : SampleMission()}))
+        assert stats[("set", "cmd")]["robotErrors"] == {3 : 1}
+        assert stats[("get", "wllaststat")]["transportErrors"] == {"OSError" : 1}
+
+        text = registry.ExportPrometheus()
+        assert 'pyirobot_request_duration_seconds_count{cmd="get",resource="mssn"} 2' in text
+        assert 'pyirobot_request_duration_seconds_bucket{cmd="get",resource="mssn",le="+Inf"} 2' in text
+        assert 'pyirobot_robot_errors_total{cmd="set",resource="cmd",code="3"} 1' in text
+        assert 'pyirobot_transport_errors_total{cmd="get",resource="wllaststat",exception="OSError"} 1' in text
+
+        # Uninstalled, so this is not recorded
+        robot.GetMission()
+        assert registry.Stats()[("get", "mssn")]["count"] == 2
+
+    def test_StaticCalls(self):
+        from pyirobot import Robot
+        from pyirobot.metrics import MetricsRegistry
+        transport = _FakeTransport({"passwd" : {"ok" : {"passwd" : "secret"}}})
+        with MetricsRegistry(perRobot=True) as registry:
+            assert Robot.GetPassword("10.1.2.3", transport=transport) == "secret"
+        assert list(registry.Stats()) == [("get", "passwd", "10.1.2.3")]
+
+    def test_Histogram(self):
+        from pyirobot.metrics import MetricsRegistry, RequestEvent
+        registry = MetricsRegistry(buckets=(0.1, 0.2, 0.4))
+        for latency in (0.05, 0.15, 0.15, 0.3, 1.0):
+            registry.Record(RequestEvent("1.1.1.1", "get", "mssn", latency, 10, 20, None))
+        assert registry.Quantile(0.5, "get", "mssn") == pytest.approx(0.175)
+        assert registry.Quantile(1.0, "get", "mssn") == 0.4
+        assert registry.Quantile(0.5, "get", "prefs") is None
+        text = registry.ExportPrometheus()
+        assert 'le="0.1"} 1' in text
+        assert 'le="0.2"} 3' in text
+        assert 'le="0.4"} 4' in text
+        assert 'pyirobot_request_bytes_total{cmd="get",resource="mssn"} 50' in text
+
+    def test_Async(self):
+        from pyirobot.aio import AsyncRobot
+        from pyirobot.metrics import MetricsRegistry
+        from .test_aio import _StartUMIServer
+
+        async def run():
+            server, _ = await _StartUMIServer({"mssn" : SampleMission()})
+            port = server.sockets[0].getsockname()[1]
+            async with AsyncRobot("127.0.0.1:{}".format(port), "password", sslContext=False) as robot:
+                await robot.GetMission()
+            server.close()
+            await server.wait_closed()
+
+        with MetricsRegistry() as registry:
+            asyncio.run(run())
+        stats = registry.Stats()[("get", "mssn")]
+        assert stats["count"] == 1
+        assert stats["responseBytes"] > 0
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import json
+import sys
+import pytest
+from .util import FakeRobot, SampleMission
+
+def _FakeRobot(**mission):
+    return FakeRobot(lambda cmd, args: SampleMission(**mission))
+
+class Test_MissionSnapshot(object):
+
+    def test_FixedFields(self):
+        from pyirobot import BinStatus, CleaningPasses, ReadyStatus, RobotStatus
+        snapshot = _FakeRobot(phase="run", cycle="quick", flags=1, error=17, rechrgM=10, batPct=80).GetMissionSnapshot()
+        assert snapshot.robotStatus == RobotStatus.Cleaning
+        assert snapshot.readyStatus == ReadyStatus.Ready
+        assert snapshot.binStatus == BinStatus.Full
+        assert snapshot.cycle == CleaningPasses.One
+        assert snapshot.error == 17
+        assert snapshot.errorMessage == "The cleaning job is incomplete."
+        assert snapshot.rechargeMinutesRemaining == 10
+        assert snapshot.minutesUntilMissionCancelled is None
+        assert (snapshot.x, snapshot.y, snapshot.theta) == (2, -22, -79)
+        assert not hasattr(snapshot, "__dict__")
+
+    def test_RoundTrip(self):
+        from pyirobot import ToJSON
+        from pyirobot.mission import MissionSnapshot
+        for mission in ({}, {"phase" : "bogus", "notReady" : 99, "expireM" : 5}, {"phase" : "stuck", "error" : 1, "extraField" : [1, 2]}):
+            robot = _FakeRobot(**mission)
+            snapshot = robot.GetMissionSnapshot()
+            assert snapshot.ToDict() == robot.GetMission()
+            assert MissionSnapshot.FromMission(snapshot.ToDict()) == snapshot
+            assert json.loads(snapshot.ToJSON()) == json.loads(ToJSON(robot.GetMission()))
+
+    def test_Memory(self):
+        robot = _FakeRobot(phase="run")
+        mission = robot.GetMission()
+        snapshot = robot.GetMissionSnapshot()
+        dict_size = sys.getsizeof(mission) + sys.getsizeof(mission["robotPosition"]) + sys.getsizeof(mission["robotPosition"]["point"])
+        assert sys.getsizeof(snapshot) < dict_size / 2
+
+def _Mission(**mission):
+    return _FakeRobot(**mission).GetMission()
+
+class _FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+class Test_MissionWatcher(object):
+
+    def test_Changes(self):
+        from pyirobot import BinStatus, RobotStatus
+        from pyirobot.mission import MissionWatcher, Transition
+        watcher = MissionWatcher(keyframeEvery=None, keyframeInterval=None)
+        first = watcher.Update(_Mission(phase="run", mssnM=1))
+        assert first.keyframe and first.sequence == 1 and not first.transitions
+        assert first.fields["robotStatus"] == RobotStatus.Cleaning and "error" not in first.fields
+
+        # Identical polls produce nothing
+        assert watcher.Update(_Mission(phase="run", mssnM=1)) is None
+
+        change = watcher.Update(_Mission(phase="stuck", mssnM=2, flags=1, error=9))
+        assert not change.keyframe and change.sequence == 2
+        assert change.fields == {"robotStatus" : RobotStatus.Stuck, "missionElapsedMinutes" : 2, "binStatus" : BinStatus.Full,
+                                 "error" : 9, "errorMessage" : "The bumper is stuck, or the bumper sensor is dirty."}
+        assert change.transitions == [Transition("robotStatus", RobotStatus.Cleaning, RobotStatus.Stuck),
+                                      Transition("binStatus", BinStatus.Normal, BinStatus.Full)]
+
+        # Fields that are no longer set are sent as None
+        change = watcher.Update(_Mission(phase="stuck", mssnM=2, flags=1))
+        assert change.fields == {"error" : None, "errorMessage" : None}
+
+    def test_Apply(self):
+        from pyirobot.mission import MissionWatcher
+        watcher = MissionWatcher()
+        missions = [_Mission(), _Mission(phase="run"), _Mission(phase="run", pos={"point" : {"x" : 5, "y" : 1}, "theta" : 3}),
+                    _Mission(phase="hmUsrDock", error=17), _Mission()]
+        snapshot = None
+        for mission in missions:
+            change = watcher.Update(mission)
+            snapshot = change.Apply(snapshot)
+            assert snapshot.ToDict() == mission
+
+    def test_Keyframes(self):
+        from pyirobot.mission import MissionWatcher
+        clock = _FakeClock()
+        watcher = MissionWatcher(keyframeEvery=2, keyframeInterval=60, clock=clock)
+        keyframes = [watcher.Update(_Mission(mssnM=minute)).keyframe for minute in range(5)]
+        assert keyframes == [True, False, False, True, False]
+
+        # A quiet robot gets a keyframe every keyframeInterval
+        assert watcher.Update(_Mission(mssnM=4)) is None
+        clock.now += 60
+        change = watcher.Update(_Mission(mssnM=4))
+        assert change.keyframe and change.fields["missionElapsedMinutes"] == 4
+
+        watcher.Reset()
+        assert watcher.Update(_Mission(mssnM=4)).keyframe
+
+    def test_JSON(self):
+        from pyirobot.mission import MissionWatcher
+        watcher = MissionWatcher()
+        watcher.Update(_Mission())
+        change = watcher.Update(_Mission(phase="run", batPct=99))
+        assert json.loads(change.ToJSON()) == {"seq" : 2, "fields" : {"robotStatus" : "Cleaning", "batteryPercentage" : 99},
+                                               "transitions" : [{"field" : "robotStatus", "previous" : "Charging", "current" : "Cleaning"}]}
+        from pyirobot import ToJSON
+        change = watcher.Update(_Mission(phase="run", batPct=98))
+        assert len(change.ToJSON()) < len(ToJSON(_Mission(phase="run", batPct=98))) / 5
+
+class Test_WatchMission(object):
+
+    def test_Robot(self):
+        missions = [SampleMission(), SampleMission(), SampleMission(phase="run"), SampleMission(phase="run", mssnM=1)]
+        def answer(cmd, args):
+            if not missions:
+                raise ConnectionError("unreachable")
+            return missions.pop(0)
+        robot = FakeRobot(answer)
+        changes = robot.WatchMission(interval=0)
+        assert next(changes).keyframe
+        assert list(next(changes).fields) == ["robotStatus"]
+        assert next(changes).fields == {"missionElapsedMinutes" : 1}
+        with pytest.raises(ConnectionError):
+            next(changes)
+
+    def test_AsyncRobot(self):
+        import asyncio
+        from pyirobot import RobotStatus
+        from .test_aio import AsyncFakeRobot
+        missions = iter([SampleMission(), SampleMission(), SampleMission(phase="stuck", error=1)])
+        robot = AsyncFakeRobot(lambda cmd, args: next(missions))
+
+        async def run():
+            changes = []
+            async for change in robot.WatchMission(interval=0):
+                changes.append(change)
+                if len(changes) == 2:
+                    break
+            return changes
+
+        keyframe, change = asyncio.run(run())
+        assert keyframe.keyframe and not change.keyframe
+        assert [(t.previous, t.current) for t in change.transitions] == [(RobotStatus.Charging, RobotStatus.Stuck)]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import threading
+import time
+import pytest
+from .util import FakeRobot, SampleMission
+
+def _FakeRobot(phase="charge", fail=False):
+    def answer(cmd, args):
+        if fail:
+            raise IOError("unreachable")
+        return SampleMission(phase=phase)
+    return FakeRobot(answer)
+
+class Test_MissionPoller(object):
+
+    def test_Interval(self):
+        from pyirobot import ReadyStatus, RobotStatus
+        from pyirobot.poller import MissionPoller
+        poller = MissionPoller(errorInterval=5)
+        assert poller.Interval({"robotStatus" : RobotStatus.Charging, "readyStatus" : ReadyStatus.Charging}) == 300
+        assert poller.Interval({"robotStatus" : RobotStatus.Cleaning, "readyStatus" : ReadyStatus.Ready}) == 5
+        assert poller.Interval({"robotStatus" : RobotStatus.Idle, "readyStatus" : ReadyStatus.BinMissing}) == 5
+        assert poller.Interval({"robotStatus" : RobotStatus.Idle, "error" : 6}) == 5
+
+    def test_Backoff(self):
+        from pyirobot.poller import MissionPoller
+        poller = MissionPoller(backoffBase=2, maxBackoff=30)
+        assert [poller.Backoff(failures) for failures in range(1, 7)] == [2, 4, 8, 16, 30, 30]
+
+    def test_StopStart(self):
+        from pyirobot import RobotStatus
+        from pyirobot.poller import MissionPoller
+        def answer(cmd, args):
+            time.sleep(0.05)
+            return SampleMission(phase="run")
+        robot = FakeRobot(answer)
+        poller = MissionPoller(intervals={RobotStatus.Cleaning : 0.001, RobotStatus.Unknown : 10})
+        poller.Add(robot, delay=0)
+        with poller:
+            time.sleep(0.02)
+        # The poll that was in progress at Stop is still scheduled afterwards
+        polls = len(robot.sent)
+        assert polls >= 1
+        assert poller.Stats()["scheduled"] == 1
+        with poller:
+            time.sleep(0.2)
+        assert len(robot.sent) > polls
+
+    def test_AdaptivePolling(self):
+        from pyirobot import RobotStatus
+        from pyirobot.poller import MissionPoller
+        cleaning = _FakeRobot(phase="run")
+        charging = _FakeRobot(phase="charge")
+        down = _FakeRobot(fail=True)
+        results = []
+        intervals = {RobotStatus.Cleaning : 0.02, RobotStatus.Charging : 10, RobotStatus.Unknown : 10}
+        poller = MissionPoller(callback=lambda robot, mission, error: results.append((robot, error)),
+                               workers=2, intervals=intervals, backoffBase=0.05, maxBackoff=10)
+        for robot in (cleaning, charging, down):
+            poller.Add(robot, delay=0)
+        with poller:
+            time.sleep(0.3)
+        stats = poller.Stats()
+        assert len(cleaning.sent) > 5
+        assert len(charging.sent) == 1
+        assert 2 <= len(down.sent) < 5
+        assert stats["robots"] == 3
+        assert stats["failures"] == len(down.sent)
+        assert poller.LastMission(charging)["robotStatus"] == RobotStatus.Charging
+        assert all(isinstance(error, IOError) for robot, error in results if robot is down)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import pytest
+from .util import FakeRobot, SamplePreferences
+
+def _Answer(cmd, args):
+    return SamplePreferences() if cmd == "get" else {}
+
+class Test_PreferencesTransaction(object):
+
+    def test_SingleWrite(self):
+        from pyirobot import CarpetBoost, CleaningPasses, EdgeClean, FinishWhenBinFull
+        robot = FakeRobot(_Answer)
+        with robot.PreferencesTransaction() as transaction:
+            transaction.Set(CarpetBoost.Perf).Set(EdgeClean.Off)
+            transaction.Set(FinishWhenBinFull.On)
+            transaction["timezone"] = "US/Pacific"
+        assert transaction.written
+        assert [cmd for cmd, _ in robot.sent] == ["get", "set"]
+        _, (name, prefs) = robot.sent[1]
+        assert name == "prefs"
+        assert prefs["flags"] == CarpetBoost.Perf.value + CleaningPasses.Two.value + FinishWhenBinFull.On.value + EdgeClean.Off.value
+        assert prefs["timezone"] == "US/Pacific"
+
+    def test_SkipUnchanged(self):
+        from pyirobot import FinishWhenBinFull
+        robot = FakeRobot(_Answer)
+        robot.SetFinishWhenBinFull(FinishWhenBinFull.Off)
+        assert [cmd for cmd, _ in robot.sent] == ["get"]
+        with robot.PreferencesTransaction(skipUnchanged=False):
+            pass
+        assert [cmd for cmd, _ in robot.sent] == ["get", "get", "set"]
+
+    def test_RollbackOnError(self):
+        from pyirobot import CarpetBoost
+        robot = FakeRobot(_Answer)
+        with pytest.raises(RuntimeError):
+            with robot.PreferencesTransaction() as transaction:
+                transaction.Set(CarpetBoost.Eco)
+                raise RuntimeError()
+        assert [cmd for cmd, _ in robot.sent] == ["get"]
+        # The lock was released
+        with robot.PreferencesTransaction(skipUnchanged=False):
+            pass
+
+    def test_WrongType(self):
+        robot = FakeRobot(_Answer)
+        with pytest.raises(AssertionError):
+            with robot.PreferencesTransaction() as transaction:
+                transaction.Set("carpetBoost", 80)
+
+    def test_Async(self):
+        from pyirobot import CarpetBoost, EdgeClean
+        from .test_aio import AsyncFakeRobot
+        robot = AsyncFakeRobot(_Answer)
+
+        async def run():
+            async with robot.PreferencesTransaction() as transaction:
+                transaction.Set(CarpetBoost.Perf)
+                transaction.Set(EdgeClean.Off)
+            await robot.SetEdgeClean(EdgeClean.On)
+        asyncio.run(run())
+        assert [cmd for cmd, _ in robot.sent] == ["get", "set", "get"]
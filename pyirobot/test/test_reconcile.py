@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import datetime
+import pytest
+
+@pytest.fixture
+def simulator():
+    from pyirobot.simulator import RobotSimulator, SimulatorThread
+    sim = RobotSimulator(seed=1)
+    for idx in range(3):
+        sim.AddRobot(seed=idx)
+    thread = SimulatorThread(sim)
+    thread.Start()
+    yield sim
+    thread.Stop()
+
+def _Schedule(**days):
+    schedule = dict((day, {"clean" : False, "startTime" : datetime.time(9, 0)}) for day in
+                    ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"))
+    for day, start in days.items():
+        schedule[day] = {"clean" : True, "startTime" : start}
+    return schedule
+
+def _Standard():
+    from pyirobot import CarpetBoost, EdgeClean
+    from pyirobot.reconcile import DesiredState
+    return DesiredState(schedule=_Schedule(Monday=datetime.time(10, 30), Thursday=datetime.time(14, 0)),
+                        preferences=[CarpetBoost.Perf, EdgeClean.On], timezone="America/Denver", maxClockDrift=2)
+
+class Test_Diff(object):
+
+    def test_ClockDrift(self):
+        from pyirobot.reconcile import ClockDrift
+        now = datetime.datetime(2024, 1, 7, 23, 59)
+        assert ClockDrift({"weekday" : "Sunday", "time" : datetime.time(23, 58)}, now) == 1
+        # Across the end of the week
+        assert ClockDrift({"weekday" : "Monday", "time" : datetime.time(0, 2)}, now) == 3
+        assert ClockDrift({"weekday" : "Thursday", "time" : datetime.time(23, 59)}, now) == 3 * 24 * 60
+
+    def test_Diff(self):
+        from pyirobot import CarpetBoost, CleaningPasses, EdgeClean
+        from pyirobot.reconcile import Change, DesiredState, Diff
+        now = datetime.datetime(2024, 1, 1, 9, 0)
+        current = {
+            "prefs" : {"carpetBoost" : CarpetBoost.Auto, "cleaningPasses" : CleaningPasses.Two, "edgeClean" : EdgeClean.On,
+                       "timezone" : "America/Chicago", "name" : "Roomba", "lang" : 0},
+            "week" : _Schedule(Friday=datetime.time(9, 0)),
+            "time" : {"weekday" : "Monday", "time" : datetime.time(9, 1)}
+        }
+        desired = DesiredState(schedule={"Friday" : {"clean" : False, "startTime" : datetime.time(0, 0)},
+                                         "Monday" : {"clean" : False, "startTime" : datetime.time(0, 0)}},
+                               preferences={"carpetBoost" : CarpetBoost.Perf, "edgeClean" : EdgeClean.On},
+                               timezone="America/Chicago", maxClockDrift=1)
+        changes, writes = Diff(desired, current, now)
+        assert changes == [Change("prefs", "carpetBoost", CarpetBoost.Auto, CarpetBoost.Perf),
+                           Change("week", "Friday", {"clean" : True, "startTime" : datetime.time(9, 0)},
+                                  {"clean" : False, "startTime" : datetime.time(0, 0)})]
+        assert [resource for resource, _ in writes] == ["prefs", "week"]
+        prefs = writes[0][1]
+        assert prefs["carpetBoost"] == CarpetBoost.Perf and prefs["cleaningPasses"] == CleaningPasses.Two
+        assert writes[1][1]["Friday"]["clean"] is False and writes[1][1]["Tuesday"] == current["week"]["Tuesday"]
+
+        # Nothing to do once the robot matches
+        assert Diff(desired, {"prefs" : prefs, "week" : writes[1][1], "time" : current["time"]}, now) == ([], [])
+
+    def test_Resources(self):
+        from pyirobot.reconcile import DesiredState
+        assert DesiredState().Resources() == []
+        assert DesiredState(timezone="UTC", maxClockDrift=0).Resources() == ["prefs", "time"]
+        assert _Standard().Override(schedule=None, timezone=None).Resources() == ["prefs", "time"]
+
+class Test_Reconciler(object):
+
+    def test_Reconcile(self, simulator):
+        from pyirobot import CarpetBoost, Robot
+        from pyirobot.reconcile import Reconciler, Summarize
+        robots = [Robot(sim.address, sim.password) for sim in simulator.robots]
+        # The first robot already has the standard configuration
+        standard = _Standard()
+        robots[0].SetSchedule(standard.schedule)
+        robots[0].SetTimezone("America/Denver")
+        robots[0].SetCarpetBoost(CarpetBoost.Perf)
+        robots[0].SetTimeNow()
+
+        reconciler = Reconciler(maxWorkers=2)
+        targets = [(robot, standard) for robot in robots]
+        dry_run = reconciler.Reconcile(targets, dryRun=True)
+        assert [bool(result.changes) for result in dry_run] == [False, True, True]
+        assert all(result.written == [] for result in dry_run)
+        assert Summarize(dry_run) == {"robots" : 3, "inSync" : 1, "changed" : 2, "failed" : 0, "writes" : 0}
+
+        requests = simulator.Stats()["requests"]
+        results = reconciler.Reconcile(targets)
+        assert [result.written for result in results] == [[], ["prefs", "week"], ["prefs", "week"]]
+        # One snapshot of three resources is three reads without multi-get, plus the writes
+        assert simulator.Stats()["requests"] - requests == 3 * 3 + 4
+
+        assert Summarize(reconciler.Reconcile(targets))["inSync"] == 3
+        assert robots[1].GetSchedule() == standard.schedule
+        assert robots[2].GetCleaningPreferences()["timezone"] == "America/Denver"
+        for robot in robots:
+            robot.Close()
+
+    def test_Clock(self, simulator):
+        from pyirobot import Robot
+        from pyirobot.reconcile import DesiredState, Reconciler
+        now = datetime.datetime.now()
+        with Robot(simulator.robots[0].address, simulator.robots[0].password) as robot:
+            robot.SetTime(now - datetime.timedelta(minutes=30))
+            result = Reconciler(clock=lambda: now).ReconcileRobot(robot, DesiredState(maxClockDrift=5))
+            assert result.changes[0].field == "drift" and 29 <= result.changes[0].current <= 31
+            assert result.written == ["time"]
+            assert Reconciler().ReconcileRobot(robot, DesiredState(maxClockDrift=5)).changes == []
+
+    def test_Cache(self, simulator):
+        from pyirobot import Robot
+        from pyirobot.cache import ResourceCache
+        from pyirobot.reconcile import DesiredState, Reconciler
+        sim = simulator.robots[0]
+        with Robot(sim.address, sim.password, cache=ResourceCache()) as robot:
+            robot.GetCleaningPreferences()
+            # A change made behind the cache's back is still seen
+            sim.prefs["timezone"] = "Europe/London"
+            result = Reconciler().ReconcileRobot(robot, DesiredState(timezone="America/Chicago"))
+            assert result.written == ["prefs"]
+
+    def test_Errors(self, simulator):
+        from pyirobot import Robot
+        from pyirobot.reconcile import Reconciler, Summarize
+        from pyirobot.retry import RetryPolicy
+        simulator.robots[1].online = False
+        robots = [Robot(sim.address, sim.password, retryPolicy=RetryPolicy(attempts=1)) for sim in simulator.robots]
+        results = Reconciler().Reconcile([(robot, _Standard()) for robot in robots])
+        assert [result.ok for result in results] == [True, False, True]
+        assert isinstance(results[1].error, IOError)
+        assert Summarize(results)["failed"] == 1
+        for robot in robots:
+            robot.Close()
+
+    def test_AsyncReconciler(self):
+        from pyirobot.aio import AsyncRobot
+        from pyirobot.reconcile import AsyncReconciler, Summarize
+        from pyirobot.simulator import RobotSimulator
+        sim = RobotSimulator(sharedPort=True)
+        robots = [sim.AddRobot(seed=idx) for idx in range(5)]
+
+        async def run():
+            async with sim:
+                clients = [AsyncRobot(robot.address, robot.password) for robot in robots]
+                reconciler = AsyncReconciler(maxWorkers=2)
+                first = await reconciler.Reconcile([(client, _Standard()) for client in clients])
+                second = await reconciler.Reconcile([(client, _Standard()) for client in clients])
+                for client in clients:
+                    await client.Close()
+                return first, second
+
+        first, second = asyncio.run(run())
+        assert all(result.written == ["prefs", "week"] for result in first)
+        assert Summarize(second) == {"robots" : 5, "inSync" : 5, "changed" : 0, "failed" : 0, "writes" : 0}
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import json
+import time
+import pytest
+from .util import RandomComplexString, RandomIP, SampleMission
+
+class _FakeResponse(object):
+    def __init__(self, body):
+        self.content = json.dumps(body).encode("utf-8")
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+class _FlakyTransport(object):
+    """
+    Fails the first failures requests with an IOError, then answers every request with a mission
+    """
+    def __init__(self, failures, timeout=(5, 10)):
+        self.failures = failures
+        self.timeout = timeout
+        self.calls = []
+    def Post(self, url, data, auth=None, timeout=None):
+        self.calls.append(timeout)
+        if len(self.calls) <= self.failures:
+            raise IOError("connection refused")
+        return _FakeResponse({"ok" : SampleMission()})
+
+class _FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def _Robot(failures, **kwargs):
+    from pyirobot import Robot
+    from pyirobot.retry import RetryPolicy
+    kwargs.setdefault("retryPolicy", RetryPolicy(attempts=3, backoff=0.001))
+    robot = Robot(RandomIP(), RandomComplexString(64), **kwargs)
+    robot.transport = _FlakyTransport(failures)
+    return robot
+
+class Test_RetryPolicy(object):
+
+    def test_Delay(self):
+        from pyirobot import RobotError
+        from pyirobot.retry import RetryPolicy, CircuitOpenError
+        policy = RetryPolicy(attempts=3, backoff=1, maxBackoff=1.5)
+        assert 0 <= policy.Delay("get", IOError(), 1) <= 1
+        assert 0 <= policy.Delay("get", IOError(), 2) <= 1.5
+        assert policy.Delay("get", IOError(), 3) is None
+        assert policy.Delay("set", IOError(), 1) is None
+        assert policy.Delay("get", RobotError(3), 1) is None
+        assert policy.Delay("get", CircuitOpenError("1.2.3.4", 5), 1) is None
+        assert policy.Delay("get", IOError(), 1, remaining=0) is None
+
+    def test_RetriesGets(self):
+        robot = _Robot(2)
+        assert robot.GetMission()["batteryPercentage"] == 100
+        assert len(robot.transport.calls) == 3
+        assert robot.retries == 2
+        assert robot.circuitBreaker.failures == 0
+
+    def test_DoesNotRetrySets(self):
+        robot = _Robot(1)
+        with pytest.raises(IOError):
+            robot.StartCleaning()
+        assert len(robot.transport.calls) == 1
+        assert robot.retries == 0
+
+    def test_GivesUp(self):
+        robot = _Robot(10)
+        with pytest.raises(IOError):
+            robot.GetMission()
+        assert len(robot.transport.calls) == 3
+        assert robot.retries == 2
+
+    def test_Deadline(self):
+        from pyirobot.retry import DeadlineExceeded
+        robot = _Robot(0, deadline=2)
+        robot.GetMission()
+        assert max(robot.transport.calls[0]) <= 2
+        robot.deadline = 0
+        with pytest.raises(DeadlineExceeded):
+            robot.GetMission()
+
+class Test_CircuitBreaker(object):
+
+    def test_States(self):
+        from pyirobot.retry import CircuitBreaker, CircuitOpenError
+        clock = _FakeClock()
+        breaker = CircuitBreaker(failureThreshold=2, resetTimeout=10, clock=clock)
+        breaker.Allow()
+        breaker.RecordFailure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.RecordFailure()
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError) as error:
+            breaker.Allow("1.2.3.4")
+        assert error.value.retryAfter == 10
+
+        clock.now += 10
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.Allow()
+        # Only one trial request at a time
+        with pytest.raises(CircuitOpenError):
+            breaker.Allow()
+        breaker.RecordFailure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        clock.now += 10
+        breaker.Allow()
+        breaker.RecordSuccess()
+        assert breaker.Stats() == {"state" : CircuitBreaker.CLOSED, "failures" : 0, "opened" : 2}
+
+    def test_FailsFast(self):
+        from pyirobot import RobotError
+        from pyirobot.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+        clock = _FakeClock()
+        robot = _Robot(100, retryPolicy=RetryPolicy(attempts=1), circuitBreaker=CircuitBreaker(failureThreshold=3, resetTimeout=30, clock=clock))
+        for _ in range(3):
+            with pytest.raises(IOError):
+                robot.GetMission()
+        with pytest.raises(CircuitOpenError):
+            robot.GetMission()
+        assert len(robot.transport.calls) == 3
+
+        clock.now += 30
+        robot.transport.failures = 0
+        robot.GetMission()
+        assert robot.circuitBreaker.state == CircuitBreaker.CLOSED
+
+    def test_TrialEndsWithoutAnswer(self):
+        from pyirobot.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+        clock = _FakeClock()
+        robot = _Robot(100, retryPolicy=RetryPolicy(attempts=1), circuitBreaker=CircuitBreaker(failureThreshold=1, resetTimeout=30, clock=clock))
+        with pytest.raises(IOError):
+            robot.GetMission()
+        assert robot.circuitBreaker.state == CircuitBreaker.OPEN
+
+        # The trial gets a body that is not JSON, e.g. an HTML error page, which is neither an answer nor a network error
+        clock.now += 30
+        post = robot.transport.Post
+        robot.transport.Post = lambda url, data, auth=None, timeout=None: type("Response", (object,), {"content" : b"<html>"})()
+        with pytest.raises(ValueError):
+            robot.GetMission()
+        assert robot.circuitBreaker.state == CircuitBreaker.HALF_OPEN
+
+        # So the next request is let through as the trial, and closes the breaker
+        robot.transport.Post = post
+        robot.transport.failures = 0
+        robot.GetMission()
+        assert robot.circuitBreaker.state == CircuitBreaker.CLOSED
+
+    def test_CancelledTrial(self):
+        from pyirobot.aio import AsyncRobot
+        from pyirobot.retry import CircuitBreaker
+        clock = _FakeClock()
+        breaker = CircuitBreaker(failureThreshold=1, resetTimeout=30, clock=clock)
+        breaker.RecordFailure()
+        clock.now += 30
+        robot = AsyncRobot(RandomIP(), RandomComplexString(64), circuitBreaker=breaker)
+
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(60)
+
+        async def run():
+            robot.transport.Post = hang
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(robot.GetMission(), 0.05)
+            # The cancelled trial was given back
+            return breaker.Allow() is not None
+
+        assert asyncio.run(run())
+
+    def test_RobotErrorIsNotAFailure(self):
+        from pyirobot import RobotError
+        robot = _Robot(0)
+        robot.transport.Post = lambda url, data, auth=None, timeout=None: _FakeResponse({"err" : 7})
+        for _ in range(10):
+            with pytest.raises(RobotError):
+                robot.GetMission()
+        assert robot.circuitBreaker.failures == 0
+        assert robot.retries == 0
+
+class Test_AsyncTimeouts(object):
+
+    def test_ReadTimeout(self):
+        from pyirobot.aio import AsyncRobot
+        from pyirobot.retry import RetryPolicy
+
+        async def run():
+            async def handle(reader, writer):
+                await reader.read()
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with AsyncRobot("127.0.0.1:{}".format(port), "password", sslContext=False, timeout=(1, 0.1),
+                                  retryPolicy=RetryPolicy(attempts=2, backoff=0.001)) as robot:
+                start = time.monotonic()
+                with pytest.raises(TimeoutError):
+                    await robot.GetMission()
+                elapsed = time.monotonic() - start
+                retries = robot.retries
+            server.close()
+            return elapsed, retries
+
+        elapsed, retries = asyncio.run(run())
+        assert elapsed < 5
+        assert retries == 1
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import time
+import pytest
+
+class _FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+def _Request(robot, cmd, *args):
+    return robot.Handle({"do" : cmd, "args" : list(args), "id" : 1})
+
+def _SimulatedRobot(**kwargs):
+    from pyirobot.simulator import SimulatedRobot
+    clock = _FakeClock()
+    # One simulated minute per clock second
+    robot = SimulatedRobot(seed=1, clock=clock, speed=60, **kwargs)
+    return robot, clock
+
+class Test_SimulatedRobot(object):
+
+    def test_Mission(self):
+        robot, clock = _SimulatedRobot(areaSqft=200)
+        assert _Request(robot, "get", "mssn")["ok"]["phase"] == "charge"
+        _Request(robot, "set", "cmd", {"op" : "start"})
+        clock.now += 5
+        mission = _Request(robot, "get", "mssn")["ok"]
+        assert (mission["phase"], mission["mssnM"], mission["batPct"]) == ("run", 5, 95)
+        assert 75 <= mission["sqft"] <= 125
+        assert mission["pos"]["point"] != {"x" : 0, "y" : 0}
+
+        # Finishes the area, returns home and charges
+        clock.now += 20
+        mission = _Request(robot, "get", "mssn")["ok"]
+        assert (mission["phase"], mission["cycle"], mission["pos"]["point"]) == ("charge", "none", {"x" : 0, "y" : 0})
+        robot.mission["batPct"] = 50
+        clock.now += 1
+        assert _Request(robot, "get", "mssn")["ok"]["batPct"] == 52
+        clock.now += 3600
+        assert _Request(robot, "get", "mssn")["ok"]["batPct"] == 100
+
+    def test_PauseResumeDock(self):
+        robot, clock = _SimulatedRobot(areaSqft=10000)
+        _Request(robot, "set", "cmd", {"op" : "start"})
+        clock.now += 2
+        _Request(robot, "set", "cmd", {"op" : "pause"})
+        mission = _Request(robot, "get", "mssn")["ok"]
+        assert (mission["phase"], mission["expireM"]) == ("stop", 90)
+        _Request(robot, "set", "cmd", {"op" : "resume"})
+        mission = _Request(robot, "get", "mssn")["ok"]
+        assert (mission["phase"], mission["flags"] & 8) == ("run", 8)
+        clock.now += 1
+        assert _Request(robot, "get", "mssn")["ok"]["flags"] & 8 == 0
+
+        # Docking only works once the robot is stopped
+        _Request(robot, "set", "cmd", {"op" : "dock"})
+        assert _Request(robot, "get", "mssn")["ok"]["phase"] == "run"
+        _Request(robot, "set", "cmd", {"op" : "stop"})
+        _Request(robot, "set", "cmd", {"op" : "dock"})
+        assert _Request(robot, "get", "mssn")["ok"]["phase"] == "hmUsrDock"
+        clock.now += 2
+        assert _Request(robot, "get", "mssn")["ok"]["phase"] == "charge"
+        assert _Request(robot, "set", "cmd", {"op" : "fly"})["err"]
+
+    def test_PausedMissionExpires(self):
+        robot, clock = _SimulatedRobot(areaSqft=10000)
+        _Request(robot, "set", "cmd", {"op" : "start"})
+        _Request(robot, "set", "cmd", {"op" : "pause"})
+        clock.now += 90
+        mission = _Request(robot, "get", "mssn")["ok"]
+        assert (mission["phase"], mission["cycle"], mission["expireM"]) == ("stop", "none", 0)
+
+    def test_Fault(self):
+        robot, clock = _SimulatedRobot(areaSqft=10000, faultRate=1.0)
+        _Request(robot, "set", "cmd", {"op" : "start"})
+        clock.now += 1
+        mission = _Request(robot, "get", "mssn")["ok"]
+        assert mission["phase"] == "stuck" and mission["error"] > 0
+        assert _Request(robot, "get", "bbrun")["ok"]["nStuck"] == 1
+
+    def test_BinFull(self):
+        robot, clock = _SimulatedRobot(areaSqft=10000, binCapacity=100)
+        _Request(robot, "set", "cmd", {"op" : "start"})
+        clock.now += 10
+        assert _Request(robot, "get", "mssn")["ok"]["flags"] & 1
+        robot.EmptyBin()
+        assert _Request(robot, "get", "mssn")["ok"]["flags"] & 1 == 0
+
+    def test_TimeAndSchedule(self):
+        robot, clock = _SimulatedRobot()
+        _Request(robot, "set", "time", {"d" : 1, "h" : 8, "m" : 58})
+        assert _Request(robot, "get", "time")["ok"] == {"d" : "mon", "h" : 8, "m" : 58}
+        week = {"cycle" : ["none", "start", "none", "none", "none", "none", "none"], "h" : [9] * 7, "m" : [0] * 7}
+        _Request(robot, "set", "week", week)
+        assert _Request(robot, "get", "week")["ok"] == week
+        clock.now += 3
+        assert _Request(robot, "get", "mssn")["ok"]["phase"] == "run"
+        assert _Request(robot, "get", "time")["ok"] == {"d" : "mon", "h" : 9, "m" : 1}
+        assert _Request(robot, "set", "week", {"cycle" : []})["err"]
+
+        # The next scheduled start is found without stepping through every minute of the week
+        _Request(robot, "set", "cmd", {"op" : "stop"})
+        clock.now += 7 * 24 * 60
+        assert _Request(robot, "get", "mssn")["ok"]["phase"] == "run"
+
+    def test_Resources(self):
+        robot, clock = _SimulatedRobot()
+        for resource in ("prefs", "mssn", "time", "week", "wlstat", "wllaststat", "sys", "sku", "cloudcfg", "bbrun", "wlconfig"):
+            assert isinstance(_Request(robot, "get", resource)["ok"], dict)
+        assert _Request(robot, "get", "nope")["err"]
+        assert _Request(robot, "get", "prefs", "mssn")["err"]
+        robot.multiGet = True
+        assert set(_Request(robot, "get", "prefs", "mssn")["ok"]) == set(["prefs", "mssn"])
+        assert _Request(robot, "get", "passwd")["err"]
+        robot.pairing = True
+        assert _Request(robot, "get", "passwd")["ok"] == {"passwd" : robot.password}
+
+@pytest.fixture
+def simulator():
+    from pyirobot.simulator import RobotSimulator, SimulatorThread
+    def start(count=1, **kwargs):
+        sim = RobotSimulator(seed=1, **kwargs)
+        for idx in range(count):
+            sim.AddRobot(seed=idx)
+        thread = SimulatorThread(sim)
+        thread.Start()
+        threads.append(thread)
+        return sim
+    threads = []
+    yield start
+    for thread in threads:
+        thread.Stop()
+
+class Test_RobotSimulator(object):
+
+    def test_Robot(self, simulator):
+        from pyirobot import CarpetBoost, Robot, RobotStatus
+        sim = simulator(count=2)
+        assert sim.robots[0].address != sim.robots[1].address
+        with Robot(sim.robots[0].address, sim.robots[0].password) as robot:
+            assert robot.GetMission()["robotStatus"] == RobotStatus.Charging
+            robot.StartCleaning()
+            assert robot.GetMission()["robotStatus"] == RobotStatus.Cleaning
+            robot.SetCarpetBoost(CarpetBoost.Perf)
+            assert robot.GetCleaningPreferences()["carpetBoost"] == CarpetBoost.Perf
+            assert robot.GetWiFiDetails()["securityType"] == "WPA2"
+            assert len(robot.GetSnapshot(["prefs", "mssn", "sys"])) == 3
+        assert Robot.GetBLID(sim.robots[0].address, sim.robots[0].password) == "".join(hex(i)[2:] for i in sim.robots[0].blid)
+        sim.robots[1].pairing = True
+        assert Robot.GetPassword(sim.robots[1].address) == sim.robots[1].password
+        assert sim.Stats()["requests"] >= 9
+
+    def test_SharedPort(self):
+        from pyirobot.aio import AsyncRobot
+        from pyirobot.retry import RetryPolicy
+        from pyirobot.simulator import RobotSimulator
+        sim = RobotSimulator(sharedPort=True)
+        robots = [sim.AddRobot(seed=idx) for idx in range(50)]
+
+        async def run():
+            async with sim:
+                clients = [AsyncRobot(robot.address, robot.password) for robot in robots]
+                names = await asyncio.gather(*[client.GetCleaningPreferences() for client in clients])
+                # A wrong password is not a network error, so it is not retried and the robot is not marked down
+                stranger = AsyncRobot(robots[0].address, "wrong", retryPolicy=RetryPolicy(attempts=3))
+                with pytest.raises(ValueError):
+                    await stranger.GetMission()
+                assert stranger.retries == 0 and stranger.circuitBreaker.failures == 0
+                for client in clients + [stranger]:
+                    await client.Close()
+                return [prefs["name"] for prefs in names]
+
+        assert len(set(robot.address for robot in robots)) == 1
+        assert asyncio.run(run()) == [robot.name for robot in robots]
+        assert sim.Stats()["unauthorized"] == 1
+
+    def test_Latency(self, simulator):
+        from pyirobot import Robot
+        sim = simulator(latency=0.1)
+        with Robot(sim.robots[0].address, sim.robots[0].password) as robot:
+            start = time.monotonic()
+            robot.GetMission()
+            assert time.monotonic() - start >= 0.1
+
+    def test_Errors(self, simulator):
+        from pyirobot import Robot, RobotError
+        sim = simulator(errorRate=1.0)
+        with Robot(sim.robots[0].address, sim.robots[0].password) as robot:
+            with pytest.raises(RobotError):
+                robot.GetMission()
+        assert sim.Stats()["injectedErrors"] == 1
+
+    def test_DropsAndStalls(self, simulator):
+        from pyirobot import Robot
+        from pyirobot.retry import RetryPolicy
+        sim = simulator(dropRate=1.0)
+        with Robot(sim.robots[0].address, sim.robots[0].password, retryPolicy=RetryPolicy(attempts=2, backoff=0)) as robot:
+            with pytest.raises(IOError):
+                robot.GetMission()
+        assert sim.Stats()["dropped"] == 2
+
+        sim = simulator(stallRate=1.0, stallTime=5)
+        with Robot(sim.robots[0].address, sim.robots[0].password, timeout=(1, 0.2), retryPolicy=RetryPolicy(attempts=1)) as robot:
+            start = time.monotonic()
+            with pytest.raises(IOError):
+                robot.GetMission()
+            assert time.monotonic() - start < 2
+        assert sim.Stats()["stalled"] == 1
+
+    def test_Offline(self, simulator):
+        from pyirobot import Robot
+        from pyirobot.retry import RetryPolicy
+        sim = simulator()
+        sim.robots[0].online = False
+        with Robot(sim.robots[0].address, sim.robots[0].password, retryPolicy=RetryPolicy(attempts=1)) as robot:
+            with pytest.raises(IOError):
+                robot.GetMission()
+            sim.robots[0].online = True
+            robot.GetMission()
+
+    def test_ConnectionLimit(self):
+        from pyirobot.aio import AsyncRobot
+        from pyirobot.retry import RetryPolicy
+        from pyirobot.simulator import RobotSimulator
+        sim = RobotSimulator(latency=0.05, maxConnections=1)
+        robot = sim.AddRobot()
+
+        async def run():
+            async with sim:
+                client = AsyncRobot(robot.address, robot.password, poolSize=4, coalesce=False, retryPolicy=RetryPolicy(attempts=1))
+                results = await asyncio.gather(*[client.GetMission() for _ in range(4)], return_exceptions=True)
+                await client.Close()
+                return results
+
+        results = asyncio.run(run())
+        errors = [result for result in results if isinstance(result, Exception)]
+        assert 1 <= len(errors) <= 3 and all(isinstance(error, IOError) for error in errors)
+        assert sim.Stats()["rejected"] == len(errors)
+        assert sim.Stats()["peakConnections"] == 1
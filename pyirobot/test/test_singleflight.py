@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import threading
+import time
+import pytest
+from .util import FakeRobot, RandomComplexString, RandomIP, SampleMission, SamplePreferences
+
+def _SlowRobot(**kwargs):
+    """
+    A robot whose requests take a little while, counting how many are sent
+    """
+    def answer(cmd, args):
+        time.sleep(0.1)
+        if args == "prefs":
+            return SamplePreferences()
+        return SampleMission()
+    return FakeRobot(answer, method="_SendToRobot", **kwargs)
+
+def _Concurrently(count, func):
+    results = [None] * count
+    def run(idx):
+        results[idx] = func()
+    threads = [threading.Thread(target=run, args=(idx,)) for idx in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+class Test_SingleFlight(object):
+
+    def test_CoalescesConcurrentGets(self):
+        robot = _SlowRobot()
+        missions = _Concurrently(10, robot.GetMission)
+        assert robot.sent == [("get", "mssn")]
+        assert all(mission == missions[0] for mission in missions)
+        assert len(set(id(mission) for mission in missions)) == 10
+        assert robot.singleFlight.Stats() == {"requests" : 1, "coalesced" : 9, "windowHits" : 0, "inFlight" : 0}
+
+        robot.GetMission()
+        assert len(robot.sent) == 2
+
+    def test_Disabled(self):
+        robot = _SlowRobot(coalesce=False)
+        _Concurrently(5, robot.GetMission)
+        assert len(robot.sent) == 5
+
+    def test_SetsAreNotCoalesced(self):
+        robot = _SlowRobot()
+        _Concurrently(3, robot.StartCleaning)
+        assert len(robot.sent) == 3
+
+    def test_ResultWindow(self):
+        from pyirobot import CarpetBoost
+        robot = _SlowRobot(resultWindow=60)
+        robot.GetMission()
+        robot.GetMission()
+        assert len(robot.sent) == 1
+        assert robot.singleFlight.Stats()["windowHits"] == 1
+
+        robot.GetCleaningPreferences()
+        robot.SetCarpetBoost(CarpetBoost.Perf)
+        assert robot.sent[-1][0] == "set"
+        # The set discards the window, so this goes to the robot
+        robot.GetMission()
+        assert robot.sent[-1] == ("get", "mssn")
+
+    def test_WindowExpires(self):
+        from pyirobot.singleflight import SingleFlight
+        now = [0.0]
+        flight = SingleFlight(window=2, clock=lambda: now[0])
+        calls = []
+        fetch = lambda: calls.append(1) or {"value" : len(calls)}
+        assert flight.Do("key", fetch) == {"value" : 1}
+        now[0] = 1.9
+        assert flight.Do("key", fetch) == {"value" : 1}
+        now[0] = 2.0
+        assert flight.Do("key", fetch) == {"value" : 2}
+
+    def test_ErrorsAreShared(self):
+        from pyirobot.singleflight import SingleFlight
+        flight = SingleFlight()
+        def fetch():
+            time.sleep(0.1)
+            raise IOError("unreachable")
+        def call():
+            try:
+                flight.Do("key", fetch)
+            except IOError as ex:
+                return ex
+        errors = _Concurrently(4, call)
+        assert all(isinstance(error, IOError) for error in errors)
+        assert flight.Stats()["requests"] == 1
+
+    def test_RequestIDs(self):
+        from pyirobot import Robot
+        robot = Robot(RandomIP(), RandomComplexString(64))
+        ids = []
+        def allocate():
+            for _ in range(1000):
+                ids.append(robot._GetRequestID())
+        _Concurrently(8, allocate)
+        assert sorted(ids) == list(range(1, 8001))
+
+    def test_Async(self):
+        from .test_aio import AsyncFakeRobot
+        async def answer(cmd, args):
+            await asyncio.sleep(0.05)
+            return SampleMission()
+        robot = AsyncFakeRobot(answer, method="_SendToRobot")
+
+        async def run():
+            return await asyncio.gather(*[robot.GetMission() for _ in range(20)])
+        missions = asyncio.run(run())
+        assert robot.sent == [("get", "mssn")]
+        assert len(set(id(mission) for mission in missions)) == 20
+        assert robot.singleFlight.Stats()["coalesced"] == 19
+
+    def test_AsyncLeaderCancelled(self):
+        from pyirobot.aio import AsyncSingleFlight
+        flight = AsyncSingleFlight()
+        calls = []
+        async def fetch():
+            calls.append(None)
+            await asyncio.sleep(0.05)
+            return {"calls" : len(calls)}
+
+        async def run():
+            leader = asyncio.ensure_future(flight.Do("mssn", fetch))
+            await asyncio.sleep(0)
+            waiters = [asyncio.ensure_future(flight.Do("mssn", fetch)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            # The caller that happened to send the request times out, the others still get an answer
+            leader.cancel()
+            return await asyncio.gather(*waiters), leader.cancelled()
+
+        results, cancelled = asyncio.run(run())
+        assert cancelled
+        assert results == [{"calls" : 2}] * 3
+        assert len(calls) == 2
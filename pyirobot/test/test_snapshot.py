@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+from .util import FakeRobot, SampleMission, SamplePreferences, SampleWiFiDetails
+
+_RAW = {
+    "mssn" : SampleMission,
+    "prefs" : SamplePreferences,
+    "wlstat" : SampleWiFiDetails,
+    "sku" : lambda: {"sku" : "R980020"}
+}
+
+def _FakeRobot(multiGet):
+    from pyirobot import RobotError
+    def answer(cmd, args):
+        if isinstance(args, list):
+            if not multiGet:
+                raise RobotError(-32602)
+            return dict((arg, _RAW[arg]()) for arg in args)
+        return _RAW[args]()
+    return FakeRobot(answer)
+
+class Test_GetSnapshot(object):
+
+    def test_MultiGet(self):
+        from pyirobot import RobotStatus
+        robot = _FakeRobot(multiGet=True)
+        snapshot = robot.GetSnapshot(["mssn", "prefs", "wlstat", "sku"])
+        assert robot.sent == [("get", ["mssn", "prefs", "wlstat", "sku"])]
+        assert robot.supportsMultiGet is True
+        assert snapshot["mssn"]["robotStatus"] == RobotStatus.Charging
+        assert snapshot["wlstat"]["ipAddress"] == "192.168.0.100"
+        assert snapshot["sku"] == {"sku" : "R980020"}
+
+    def test_ConcurrentFallback(self):
+        from pyirobot import CleaningPasses
+        robot = _FakeRobot(multiGet=False)
+        status = robot.GetStatus()
+        assert status["cleaningPreferences"]["cleaningPasses"] == CleaningPasses.Two
+        assert robot.supportsMultiGet is False
+
+        # The robot is only probed once
+        del robot.sent[:]
+        robot.GetSnapshot(["mssn", "prefs"])
+        assert sorted(args for _, args in robot.sent) == ["mssn", "prefs"]
+        robot.Close()
+
+    def test_InvalidResource(self):
+        robot = _FakeRobot(multiGet=True)
+        with pytest.raises(AssertionError):
+            robot.GetSnapshot(["passwd"])
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import asyncio
+import pytest
+
+def _Simulator(count=1, **kwargs):
+    from pyirobot.simulator import RobotSimulator
+    sim = RobotSimulator(seed=1, mqttPort=0, pushInterval=0.02, **kwargs)
+    for idx in range(count):
+        sim.AddRobot(seed=idx)
+    return sim
+
+def _Stream(robot, **kwargs):
+    from pyirobot.stream import RobotStream
+    return RobotStream(robot.mqttAddress, robot.BLID(), robot.password, backoffBase=0.02, **kwargs)
+
+async def _Next(iterator, timeout=5):
+    return await asyncio.wait_for(iterator.__anext__(), timeout)
+
+class Test_Packets(object):
+
+    def test_RoundTrip(self):
+        from pyirobot.stream import _Packet, _ReadPacket, _ParsePublish, _PublishPacket, _PUBLISH
+        payload = b"x" * 20000
+
+        async def run():
+            reader = asyncio.StreamReader()
+            reader.feed_data(_PublishPacket("$aws/things/1/shadow/update", payload, qos=1, packetID=7) + _Packet(12, 0))
+            reader.feed_eof()
+            first = await _ReadPacket(reader)
+            second = await _ReadPacket(reader)
+            return first, second
+
+        (packet_type, flags, body), second = asyncio.run(run())
+        assert packet_type == _PUBLISH
+        assert _ParsePublish(flags, body) == ("$aws/things/1/shadow/update", 1, 7, payload)
+        assert second == (12, 0, b"")
+        # Remaining lengths use a variable length encoding
+        assert _Packet(3, 0, b"x" * 321)[:3] == bytes((0x30, 0xC1, 0x02))
+
+    def test_Connect(self):
+        from pyirobot.stream import _ConnectPacket, _ParseConnect
+        packet = _ConnectPacket("blid", "blid", "pa:ss", 60)
+        assert _ParseConnect(packet[2:]) == ("blid", "blid", "pa:ss", 60)
+
+    def test_Merge(self):
+        from pyirobot.stream import _Merge
+        reported = {"batPct" : 90, "cleanMissionStatus" : {"phase" : "charge", "sqft" : 0}}
+        _Merge(reported, {"cleanMissionStatus" : {"phase" : "run"}, "bin" : {"full" : False}})
+        assert reported == {"batPct" : 90, "cleanMissionStatus" : {"phase" : "run", "sqft" : 0}, "bin" : {"full" : False}}
+
+class Test_RobotStream(object):
+
+    def test_MatchesGetters(self):
+        from pyirobot.aio import AsyncRobot
+        sim = _Simulator()
+        robot = sim.robots[0]
+        # Auto carpet boost, one pass, edge clean off
+        robot.prefs["flags"] = 1024 + 2
+
+        async def run():
+            async with sim, AsyncRobot(robot.address, robot.password) as client:
+                async with _Stream(robot) as stream:
+                    update = await _Next(stream.__aiter__())
+                    return update, stream, await client.GetMission(), await client.GetCleaningPreferences()
+
+        update, stream, mission, prefs = asyncio.run(run())
+        assert update.mission == mission == stream.mission
+        assert update.preferences == prefs == stream.preferences
+        assert update.stream is stream
+
+    @pytest.mark.parametrize("flags", [0, 16, 80, 1024, 1025, 32, 2, 80 + 1025 + 32 + 2])
+    def test_PreferencesFlags(self, flags):
+        from pyirobot.stream import _PreferencesFromReported
+        from pyirobot.simulator import SimulatedRobot
+        robot = SimulatedRobot(seed=1)
+        robot.prefs["flags"] = flags
+        assert _PreferencesFromReported(robot.Reported())["flags"] == flags
+
+    def test_Changes(self):
+        from pyirobot import RobotStatus
+        sim = _Simulator()
+        robot = sim.robots[0]
+        statuses = []
+
+        async def run():
+            async with sim:
+                stream = _Stream(robot, callback=lambda update: statuses.append(update.mission and update.mission["robotStatus"]))
+                async with stream:
+                    updates = stream.__aiter__()
+                    await _Next(updates)
+                    robot.Handle({"do" : "set", "args" : ["cmd", {"op" : "start"}], "id" : 1})
+                    update = await _Next(updates)
+                    return update
+
+        update = asyncio.run(run())
+        assert "cleanMissionStatus" in update.reported
+        assert update.preferences is None
+        assert update.mission["robotStatus"] == RobotStatus.Cleaning
+        assert statuses[:2] == [RobotStatus.Charging, RobotStatus.Cleaning]
+
+    def test_AsyncCallback(self):
+        sim = _Simulator()
+
+        async def run():
+            async with sim:
+                done = asyncio.Event()
+                async def callback(update):
+                    await asyncio.sleep(0)
+                    done.set()
+                async with _Stream(sim.robots[0], callback=callback):
+                    await asyncio.wait_for(done.wait(), 5)
+            return True
+
+        assert asyncio.run(run())
+
+    def test_CallbackError(self):
+        sim = _Simulator()
+        robot = sim.robots[0]
+
+        def callback(update):
+            raise KeyError("bug in the callback")
+
+        async def run():
+            async with sim:
+                async with _Stream(robot, callback=callback) as stream:
+                    updates = stream.__aiter__()
+                    await _Next(updates)
+                    robot.Handle({"do" : "set", "args" : ["cmd", {"op" : "start"}], "id" : 1})
+                    # The stream is still running and delivering updates
+                    await _Next(updates)
+                    return stream.Stats(), stream.lastCallbackError
+
+        stats, error = asyncio.run(run())
+        assert stats["callbackErrors"] >= 2 and stats["connects"] == 1
+        assert isinstance(error, KeyError)
+
+    def test_BoundedQueue(self):
+        import json
+        from pyirobot.stream import RobotStream
+
+        async def run():
+            stream = RobotStream("127.0.0.1", "blid", "password", maxQueue=3)
+            queue = asyncio.Queue(stream.maxQueue)
+            stream._queues.append(queue)
+            for battery in range(10):
+                payload = json.dumps({"state" : {"reported" : {"batPct" : battery}}}).encode("utf-8")
+                await stream._HandleMessage("$aws/things/blid/shadow/update", payload)
+            # The end of the stream always gets through
+            stream._Finish(None)
+            items = [queue.get_nowait() for _ in range(queue.qsize())]
+            return items, stream.Stats()
+
+        items, stats = asyncio.run(run())
+        assert [item.reported["batPct"] for item in items[:-1]] == [8, 9]
+        assert items[-1] is None
+        assert stats["dropped"] == 8
+
+    def test_Reconnect(self):
+        sim = _Simulator()
+        robot = sim.robots[0]
+
+        async def run():
+            async with sim:
+                async with _Stream(robot) as stream:
+                    updates = stream.__aiter__()
+                    await _Next(updates)
+                    robot.online = False
+                    while stream.connected:
+                        await asyncio.sleep(0.01)
+                    await asyncio.sleep(0.1)
+                    assert stream.Stats()["failures"] >= 1
+                    robot.online = True
+                    # The whole state is pushed again on the new connection
+                    update = await _Next(updates)
+                    return update, stream.Stats()
+
+        update, stats = asyncio.run(run())
+        assert "cleanMissionStatus" in update.reported and "carpetBoost" in update.reported
+        assert stats["connects"] == 2 and stats["connected"]
+        assert sim.Stats()["mqttConnections"] == 0
+
+    def test_BadCredentials(self):
+        from pyirobot.stream import RobotStream, MQTTError, CONNACK_BAD_CREDENTIALS
+        sim = _Simulator()
+        robot = sim.robots[0]
+
+        async def run():
+            async with sim:
+                stream = RobotStream(robot.mqttAddress, robot.BLID(), "wrong")
+                with pytest.raises(MQTTError) as error:
+                    async for update in stream:
+                        pass
+                await stream.Close()
+                return error.value
+
+        assert asyncio.run(run()).returnCode == CONNACK_BAD_CREDENTIALS
+        assert sim.Stats()["unauthorized"] == 1
+
+    def test_Backoff(self):
+        from pyirobot.stream import RobotStream
+        stream = RobotStream("127.0.0.1", "blid", "password", backoffBase=2, maxBackoff=30)
+        assert [stream.Backoff(failures) for failures in (1, 2, 3, 10)] == [2, 4, 8, 30]
+        assert (stream.host, stream.port) == ("127.0.0.1", 8883)
+        assert RobotStream("127.0.0.1:1883", "blid", "password").port == 1883
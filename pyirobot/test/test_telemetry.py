@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import os
+import pytest
+from .util import RandomComplexString, RandomIP, SampleMission
+
+@pytest.fixture(params=["numpy", "array"])
+def telemetry(request, monkeypatch):
+    from pyirobot import telemetry
+    if request.param == "numpy":
+        if telemetry.numpy is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(telemetry, "numpy", None)
+    return telemetry
+
+def _Mission(**overrides):
+    from pyirobot import Robot
+    robot = Robot(RandomIP(), RandomComplexString(64))
+    return robot._TransformMission(SampleMission(**overrides))
+
+def _Fill(store, robots, count):
+    for ts in range(count):
+        for idx, robot in enumerate(robots):
+            store.Append(robot, {"battery" : ts % 100, "x" : idx, "y" : ts}, timestamp=float(ts))
+
+class Test_TelemetryStore(object):
+
+    def test_AppendMission(self, telemetry, tmpdir):
+        from pyirobot import RobotStatus, BinStatus
+        from pyirobot.bulk import ToCode
+        with telemetry.TelemetryStore(str(tmpdir)) as store:
+            store.AppendMission("robot1", _Mission(batPct=55, phase="stuck", flags=1), timestamp=10.0, wifiStatus={"signalStrength" : -40})
+            store.AppendWiFiStatus("robot1", {"signalStrength" : -45}, timestamp=11.0)
+            store.Flush()
+            rows = store.Query("robot1")
+        assert list(rows["timestamp"]) == [10.0, 11.0]
+        assert list(rows["battery"]) == [55, telemetry.MISSING["h"]]
+        assert rows["robotStatus"][0] == ToCode(RobotStatus.Stuck)
+        assert rows["binStatus"][0] == ToCode(BinStatus.Full)
+        assert (rows["x"][0], rows["y"][0], rows["theta"][0]) == (2, -22, -79)
+        assert list(rows["signalStrength"]) == [-40, -45]
+
+    def test_OutOfOrder(self, telemetry, tmpdir):
+        with telemetry.TelemetryStore(str(tmpdir)) as store:
+            store.Append("robot1", {}, timestamp=5.0)
+            with pytest.raises(ValueError):
+                store.Append("robot2", {}, timestamp=4.0)
+
+    def test_RangeQuery(self, telemetry, tmpdir):
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=50, flushRows=7) as store:
+            _Fill(store, ["a", "b", "c"], 100)
+            store.Flush()
+            assert len(os.listdir(str(tmpdir))) > 5
+            rows = store.Query("b", 20.0, 65.0, columns=["timestamp", "x", "y"])
+            assert list(rows) == ["timestamp", "x", "y"]
+            assert list(rows["y"]) == list(range(20, 65))
+            assert set(rows["x"]) == {1}
+            assert len(store.Query(None, 20.0, 30.0)["timestamp"]) == 30
+            assert len(store.Query("unknown")["timestamp"]) == 0
+
+    def test_Reopen(self, telemetry, tmpdir):
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=40) as store:
+            _Fill(store, ["a", "b"], 50)
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=40) as store:
+            assert list(store.Query("a")["y"]) == list(range(50))
+            with pytest.raises(ValueError):
+                store.Append("a", {}, timestamp=1.0)
+            store.Append("a", {"y" : 50}, timestamp=50.0)
+            store.Flush()
+            assert list(store.Query("a")["y"]) == list(range(51))
+
+    def test_TornWrite(self, telemetry, tmpdir):
+        with telemetry.TelemetryStore(str(tmpdir)) as store:
+            _Fill(store, ["a"], 10)
+        # Simulate a crash after some column data was written but before the manifest was updated
+        segment = [name for name in os.listdir(str(tmpdir)) if name.startswith("seg-")][0]
+        with open(os.path.join(str(tmpdir), segment, "battery.col"), "ab") as handle:
+            handle.write(b"\x01\x02\x03")
+        with telemetry.TelemetryStore(str(tmpdir)) as store:
+            store.Append("a", {"battery" : 77}, timestamp=10.0)
+            store.Flush()
+            assert list(store.Query("a")["battery"]) == list(range(10)) + [77]
+
+    def test_Compact(self, telemetry, tmpdir):
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=30, flushRows=1000) as store:
+            _Fill(store, ["a", "b", "c"], 60)
+            store.Flush()
+            before = dict((robot, store.Query(robot, 15.0, 45.0)) for robot in "abc")
+            everything = store.Query()
+            store.Compact()
+            segments = [name for name in os.listdir(str(tmpdir)) if name.startswith("seg-")]
+            assert len(segments) == 2
+            for robot in "abc":
+                after = store.Query(robot, 15.0, 45.0)
+                assert dict((name, list(values)) for name, values in after.items()) == \
+                       dict((name, list(values)) for name, values in before[robot].items())
+            assert list(store.Query()["timestamp"]) == list(everything["timestamp"])
+            store.Append("a", {"y" : 60}, timestamp=60.0)
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=30) as store:
+            assert list(store.Query("a")["y"]) == list(range(61))
+
+    def test_CompactReopen(self, telemetry, tmpdir):
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=2, flushRows=1) as store:
+            _Fill(store, ["a"], 9)
+            store.Compact()
+        # The compacted segment keeps its place before the active segment, which is still the one appended to
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=2, flushRows=1) as store:
+            for ts in range(9, 14):
+                store.Append("a", {"y" : ts}, timestamp=float(ts))
+            store.Compact()
+            assert list(store.Query("a")["y"]) == list(range(14))
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=2, flushRows=1) as store:
+            assert list(store.Query("a")["y"]) == list(range(14))
+            assert sum(1 for segment in store._segments if not segment.manifest["sealed"]) == 1
+
+    def test_UnsealedSegmentsAreSealed(self, telemetry, tmpdir):
+        import json
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=3, flushRows=1) as store:
+            _Fill(store, ["a"], 8)
+        # As an older version could leave the store: an unsealed segment that is not the last one
+        segments = sorted(name for name in os.listdir(str(tmpdir)) if name.startswith("seg-"))
+        manifest_path = os.path.join(str(tmpdir), segments[0], "manifest.json")
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+        manifest["sealed"] = False
+        with open(manifest_path, "w") as handle:
+            json.dump(manifest, handle)
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=3, flushRows=1) as store:
+            assert [segment.manifest["sealed"] for segment in store._segments] == [True, True, False]
+            store.Compact()
+            assert list(store.Query("a")["y"]) == list(range(8))
+
+    def test_DropBefore(self, telemetry, tmpdir):
+        with telemetry.TelemetryStore(str(tmpdir), segmentRows=10) as store:
+            _Fill(store, ["a"], 35)
+            store.Flush()
+            store.DropBefore(20.0)
+            assert list(store.Query("a")["y"]) == list(range(20, 35))
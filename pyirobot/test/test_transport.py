@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+#pylint: skip-file
+
+from __future__ import print_function
+import pytest
+from .util import RandomComplexString, RandomIP
+
+class Test_HTTPSTransport(object):
+
+    def test_SessionReuse(self):
+        from pyirobot.transport import HTTPSTransport
+        transport = HTTPSTransport(poolSize=3, idleTimeout=None)
+        session = transport._GetSession()
+        assert transport._GetSession() is session
+        assert session.get_adapter("https://127.0.0.1/umi")._pool_maxsize == 3
+        transport.Close()
+        assert transport._session is None
+
+    def test_SharedSSLContext(self):
+        import ssl
+        from pyirobot.transport import HTTPSTransport
+        contexts = []
+        for _ in range(2):
+            transport = HTTPSTransport()
+            adapter = transport._GetSession().get_adapter("https://127.0.0.1/umi")
+            contexts.append(adapter.poolmanager.connection_pool_kw["ssl_context"])
+            transport.Close()
+        assert contexts[0] is contexts[1]
+        assert contexts[0].verify_mode == ssl.CERT_NONE
+
+    def test_IdleExpiry(self):
+        from pyirobot.transport import HTTPSTransport
+        transport = HTTPSTransport(idleTimeout=10)
+        session = transport._GetSession()
+        transport._lastUsed -= 11
+        assert transport._GetSession() is not session
+        transport.Close()
+
+    def test_RobotContextManager(self):
+        from pyirobot import Robot
+        with Robot(RandomIP(), RandomComplexString(64), poolSize=5) as robot:
+            robot.transport._GetSession()
+            assert robot.transport.poolSize == 5
+        assert robot.transport._session is None
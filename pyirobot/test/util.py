@@ -3,6 +3,7 @@
 
 import random
 import string
+import types
 
 def RandomIP():
     return "{}.{}.{}.{}".format(random.randint(1,254),
@@ -11,4 +12,61 @@ def RandomIP():
                                 random.randint(1,254))
 
 def RandomComplexString(length):
-    return "".join(random.choice(string.ascii_letters + string.digits + string.punctuation + " ") for i in range(length))
\ No newline at end of file
+    return "".join(random.choice(string.ascii_letters + string.digits + string.punctuation + " ") for i in range(length))
+
+def SampleMission(**overrides):
+    mission = {
+        "batPct" : 100,
+        "cycle" : "none",
+        "error" : 0,
+        "expireM" : 0,
+        "flags" : 0,
+        "mssnM" : 0,
+        "nMssn" : 42,
+        "notReady" : 0,
+        "phase" : "charge",
+        "pos" : {"point" : {"x" : 2, "y" : -22}, "theta" : -79},
+        "rechrgM" : 0,
+        "sqft" : 0
+    }
+    mission.update(overrides)
+    return mission
+
+def SampleWiFiDetails(**overrides):
+    details = {
+        "addr" : 1677764800,
+        "bssid" : [36, 164, 60, 1, 2, 171],
+        "dhcp" : 1,
+        "dns1" : 16820416,
+        "dns2" : 0,
+        "gtwy" : 16820416,
+        "mask" : 16777215,
+        "sec" : 4,
+        "strssi" : 52
+    }
+    details.update(overrides)
+    return details
+
+def SamplePreferences(**overrides):
+    prefs = {
+        "flags" : 1025 + 32,
+        "lang" : 0,
+        "name" : "Roomba",
+        "timezone" : "America/Chicago"
+    }
+    prefs.update(overrides)
+    return prefs
+
+def FakeRobot(answer, method="_PostToRobot", **kwargs):
+    """
+    A Robot that never touches the network: method answers every request with answer(cmd, args), and each
+    (cmd, args) is recorded in robot.sent
+    """
+    from pyirobot import Robot
+    robot = Robot(RandomIP(), RandomComplexString(64), **kwargs)
+    robot.sent = []
+    def fake(self, cmd, args):
+        self.sent.append((cmd, args))
+        return answer(cmd, args)
+    setattr(robot, method, types.MethodType(fake, robot))
+    return robot
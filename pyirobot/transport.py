@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+HTTPS transport for talking to the robot's local /umi interface
+"""
+
+from __future__ import print_function
+import threading
+import time
+
+_monotonic = getattr(time, "monotonic", time.time)
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_IDLE_TIMEOUT = 60
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_TIMEOUT = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+
+_requests = None
+_sslContext = None
+
+def _ImportRequests():
+    """
+    Import requests the first time a transport needs it, so that importing pyirobot stays cheap for programs that never
+    talk to a robot over HTTPS
+
+    Returns:
+        The requests module (module)
+    """
+    global _requests
+    if _requests is None:
+        import requests
+        # Disable SSL warning from requests - the Roomba's SSL certificate is self signed
+        from requests.packages.urllib3.exceptions import InsecureRequestWarning
+        requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+        _requests = requests
+    return _requests
+
+def _SSLContext():
+    """
+    Get the SSL context every transport connects with, which does not verify the robot's self signed certificate.
+    Without one, urllib3 makes a new context for every connection and loads the system CA certificates into it, which
+    takes tens of milliseconds while holding the GIL
+
+    Returns:
+        The shared SSL context (ssl.SSLContext)
+    """
+    global _sslContext
+    if _sslContext is None:
+        import ssl
+        context = ssl.SSLContext(getattr(ssl, "PROTOCOL_TLS_CLIENT", ssl.PROTOCOL_SSLv23))
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        _sslContext = context
+    return _sslContext
+
+class HTTPSTransport(object):
+    """
+    A pool of persistent keep-alive HTTPS connections to a robot
+
+    Connections are kept open between requests so that steady-state polling
+    does not pay for a TCP connect and TLS handshake on every call.  If the
+    pool has not been used for idleTimeout seconds it is thrown away and
+    rebuilt on the next request, since the robot drops idle connections on its
+    side anyway.
+
+    Every request has a connect and a read timeout, so a robot that drops off
+    the network cannot block the caller indefinitely.
+    """
+
+    def __init__(self, poolSize=DEFAULT_POOL_SIZE, idleTimeout=DEFAULT_IDLE_TIMEOUT, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            poolSize:       the maximum number of connections to keep open (int)
+            idleTimeout:    seconds of inactivity before the pool is discarded, or None to never expire (float)
+            timeout:        the (connect, read) timeouts for each request, in seconds (tuple of float)
+        """
+        self.poolSize = poolSize
+        self.idleTimeout = idleTimeout
+        self.timeout = timeout
+        self._session = None
+        self._lastUsed = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def _CreateSession(self):
+        """
+        Create a new requests session with a connection pool sized for this transport
+
+        Returns:
+            A new session (requests.Session)
+        """
+        requests = _ImportRequests()
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.poolSize)
+        adapter.init_poolmanager(1, self.poolSize, ssl_context=_SSLContext())
+        session.mount("https://", adapter)
+        session.verify = False
+        session.headers.update({"Content-Type" : "application/json",
+                                "Connection" : "keep-alive"})
+        return session
+
+    def _GetSession(self):
+        """
+        Get the current session, creating a new one if there is none or the
+        current one has been idle too long
+
+        Returns:
+            The session to use for the next request (requests.Session)
+        """
+        with self._lock:
+            now = _monotonic()
+            if self._session is not None and self.idleTimeout is not None and now - self._lastUsed > self.idleTimeout:
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = self._CreateSession()
+            self._lastUsed = now
+            return self._session
+
+    def Post(self, url, data, auth=None, timeout=None):
+        """
+        Post data to the robot over a pooled connection
+
+        Args:
+            url:        the URL to post to (str)
+            data:       the request body (bytes)
+            auth:       the (username, password) to authenticate with (tuple)
+            timeout:    the (connect, read) timeouts for this request, or None for the transport's timeouts (tuple of float)
+
+        Returns:
+            The HTTP response (requests.Response)
+        """
+        # verify is passed here as well as set on the session, because requests lets REQUESTS_CA_BUNDLE override the session
+        return self._GetSession().post(url, data=data, auth=auth, timeout=self.timeout if timeout is None else timeout,
+                                       verify=False)
+
+    def Close(self):
+        """
+        Close all of the open connections in the pool
+        """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -11,11 +11,14 @@ setup(
     description = "Control iRobot cleaning robots",
     license = "MIT",
     keywords = "irobot roomba",
+    # pyirobot.telemetry and the asyncio modules (aio, discovery, simulator, stream) need Python 3
     packages = ["pyirobot"],
+    package_data = {"pyirobot" : ["simulator.pem"]},
     url = "https://github.com/cseelye/pyirobot",
     long_description = open(os.path.join(os.path.dirname(__file__), "README.rst")).read(),
     install_requires = [
         "enum34>=1.1.6",
+        "futures>=3.0.5; python_version < '3.0'",
         "requests>=2.12.3",
     ]
 )